@@ -35,11 +35,14 @@ setup(
     packages=find_packages(),
     package_data={'yapyseq': ['seq_schema.yaml']},
     data_files=[('.', ['VERSION'])],
+    python_requires='>=3.8',
     install_requires=['ruamel.yaml', 'yamale', 'click'],
+    extras_require={'fast': ['ruamel.yaml.clib']},
     tests_require=['pytest'],
     license="MPL-2.0",
     classifiers=[
         "Programming Language :: Python :: 3",
+        "Programming Language :: Python :: 3 :: Only",
         "License :: OSI Approved :: Mozilla Public License 2.0 (MPL 2.0)",
         "Operating System :: OS Independent",
     ],
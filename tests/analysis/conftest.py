@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+
+
+def make_activation(aid, nid, node_type, previous, pid=None, **timestamps):
+    """Describe an activation like Activation.to_dict."""
+    return {'activation': aid, 'nid': nid, 'type': node_type,
+            'label': 'Node {}'.format(nid), 'previous': previous, 'pid': pid,
+            'timestamps': timestamps}
+
+
+@pytest.fixture
+def activations():
+    """A split into a fast and a slow function node, then a sync.
+
+    The slow node 3 is on the critical path, the fast node 2 has a slack of
+    1.4 s.
+    """
+    return [
+        make_activation(0, 0, 'start', [], ready=0.0, dispatched=0.0),
+        make_activation(1, 1, 'parallel_split', [0], ready=0.0,
+                        dispatched=0.1),
+        make_activation(2, 2, 'function', [1], pid=11, ready=0.1,
+                        dispatched=0.2, started=0.3, pre_done=0.3,
+                        function_done=1.3, post_done=1.3, received=1.4),
+        make_activation(3, 3, 'function', [1], pid=12, ready=0.1,
+                        dispatched=0.2, started=0.4, pre_done=0.5,
+                        function_done=2.5, post_done=2.6, received=2.7),
+        make_activation(4, 4, 'parallel_sync', [2], ready=1.4,
+                        dispatched=1.4),
+        make_activation(5, 4, 'parallel_sync', [3], ready=2.7,
+                        dispatched=2.8),
+        make_activation(6, 5, 'stop', [4, 5], ready=2.8, dispatched=2.9)]
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import pytest
+from yapyseq.analysis import *
+
+
+class TestAnalyze(object):
+
+    def test_critical_path(self, activations):
+        analysis = analyze(activations)
+        assert analysis.duration == pytest.approx(2.9)
+        assert analysis.critical_path == [0, 1, 3, 5, 6]
+
+    def test_slack(self, activations):
+        analysis = analyze(activations)
+        for aid in (0, 1, 3, 5, 6):
+            assert analysis.slack[aid] == pytest.approx(0)
+        assert analysis.slack[2] == pytest.approx(1.4)
+        assert analysis.slack[4] == pytest.approx(1.4)
+        # The sync node is critical through its last activation
+        node_slack = get_node_slack(analysis)
+        assert node_slack[2] == pytest.approx(1.4)
+        assert node_slack[4] == pytest.approx(0)
+
+    def test_breakdown(self, activations):
+        analysis = analyze(activations)
+        expected = {'transition': 0, 'queued': 0.4, 'process start': 0.2,
+                    'wrappers pre': 0.1, 'function': 2.0,
+                    'wrappers post': 0.1, 'result transfer': 0.1}
+        assert list(analysis.critical_breakdown) == list(CATEGORIES)
+        for category, value in expected.items():
+            assert analysis.critical_breakdown[category] == \
+                pytest.approx(value)
+        assert sum(analysis.critical_breakdown.values()) == \
+            pytest.approx(analysis.duration)
+        assert get_overhead(analysis.critical_breakdown) == pytest.approx(0.7)
+        assert analysis.breakdown['function'] == pytest.approx(3.0)
+
+    def test_workers(self, activations):
+        analysis = analyze(activations)
+        workers = dict([(w.pid, w) for w in analysis.workers])
+        assert sorted(workers) == [11, 12]
+        assert workers[11].lifetime == pytest.approx(1.2)
+        assert workers[11].busy == pytest.approx(1.0)
+        assert workers[12].busy == pytest.approx(2.2)
+
+    def test_unknown_previous(self, activations):
+        with pytest.raises(TraceFileError):
+            analyze(activations[:2] + activations[3:])
+
+    def test_format(self, activations):
+        analysis = analyze(activations)
+        lines = format_analysis(analysis, top=2)
+        assert lines[0] == 'Run of 2.900 s, 7 activation(s).'
+        assert 'Critical path (5 activation(s)):' in lines
+        assert '  function                2.000 s  69.0 %' in lines
+        assert 'Workers idle 13.5 % of their life (2 worker(s)). ' \
+               'Most idle:' in lines
+        assert lines[lines.index('Nodes with the least slack:') + 1] == \
+            '     0.000 s  Node 0 (critical)'
+        json.dumps(analysis_to_dict(analysis))
+
+
+class TestLoad(object):
+
+    def test_load_chrome_trace(self, tmp_path, activations):
+        """Check that activations are read from the events of a trace."""
+        events = [{'name': 'function', 'ph': 'X', 'args': a}
+                  for a in reversed(activations)]
+        events.append({'name': 'function', 'ph': 'X',
+                       'args': {'activation': 2}})
+        path = tmp_path / "trace.json"
+        path.write_text(json.dumps({'traceEvents': events}))
+        assert load_activations(str(path)) == activations
+
+    @pytest.mark.parametrize("content", ['not json', '{}',
+                                         '{"traceEvents": []}'])
+    def test_load_invalid(self, tmp_path, content):
+        path = tmp_path / "trace.json"
+        path.write_text(content)
+        with pytest.raises(TraceFileError):
+            load_activations(str(path))
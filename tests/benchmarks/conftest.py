@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from yapyseq.benchmarks.generators import write_function_dir
+
+
+@pytest.fixture(scope="module")
+def func_dir(tmp_path_factory):
+    """Directory of the functions of the generated sequences."""
+    return write_function_dir(str(tmp_path_factory.mktemp("functions")))
+
+
+@pytest.fixture
+def measures():
+    """Measures of two scenarios, as given by run_suite."""
+    return {'line': {'startup': 0.1, 'overhead_per_node': 0.01,
+                     'throughput': 100.0, 'peak_memory': 1000,
+                     'activations': 12},
+            'loop': {'startup': 0.1, 'overhead_per_node': 0.02,
+                     'throughput': 50.0, 'peak_memory': 1000,
+                     'activations': 23}}
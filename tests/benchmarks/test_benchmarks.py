@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import copy
+import json
+import multiprocessing as mp
+import time
+import pytest
+from yapyseq import SequenceRunner
+from yapyseq.benchmarks import generators, suite
+from yapyseq.benchmarks.suite import *
+
+
+class TestGenerators(object):
+
+    @pytest.mark.parametrize("name", list(SCENARIOS))
+    def test_generated_sequence(self, name, func_dir):
+        """Check that generated sequences run and count their activations."""
+        generated = generate(name, scale=0.1)
+        runner = SequenceRunner(generated.builder, func_dir, logger=False,
+                                trace=True)
+        runner.run()
+        activations = runner.trace.activations
+        assert len(activations) == generated.activations
+        assert len([a for a in activations if a.node_type == 'function']) \
+            == generated.function_activations
+        assert all([r.exception is None
+                    for r in runner.variables['results'].values()])
+
+    def test_too_many_wrappers(self):
+        with pytest.raises(ValueError):
+            generators.wrapped(1, generators.MAX_WRAPPERS + 1)
+
+
+class TestBaseline(object):
+
+    def test_save_and_load(self, tmp_path, measures):
+        path = str(tmp_path / "baseline.json")
+        save_baseline(path, measures, scale=0.5)
+        baseline = load_baseline(path)
+        assert baseline['scale'] == 0.5
+        assert baseline['scenarios'] == measures
+
+    @pytest.mark.parametrize("content", ['not json', '[]', '{"version": 0}'])
+    def test_load_invalid(self, tmp_path, content):
+        path = tmp_path / "baseline.json"
+        path.write_text(content)
+        with pytest.raises(BaselineError):
+            load_baseline(str(path))
+
+    def test_compare(self, measures):
+        baseline = make_baseline(measures)
+        new_measures = copy.deepcopy(measures)
+        # Worse beyond the tolerance
+        new_measures['line']['overhead_per_node'] = 0.013
+        new_measures['line']['throughput'] = 70.0
+        # Worse within the tolerance, and better
+        new_measures['loop']['startup'] = 0.11
+        new_measures['loop']['peak_memory'] = 500
+        regressions = compare_to_baseline(new_measures, baseline, 0.2)
+        assert [(r.scenario, r.metric) for r in regressions] == [
+            ('line', 'overhead_per_node'), ('line', 'throughput')]
+        assert regressions[0].change == pytest.approx(0.3)
+        assert regressions[1].change == pytest.approx(0.3)
+        assert len(describe_regressions(regressions)) == 2
+        assert compare_to_baseline(new_measures, baseline, 0.5) == []
+
+    def test_compare_missing_scenario(self, measures):
+        baseline = make_baseline({'line': measures['line']})
+        assert compare_to_baseline(measures, baseline) == []
+
+    def test_compare_other_scale(self, measures):
+        with pytest.raises(BaselineError):
+            compare_to_baseline(measures, make_baseline(measures, scale=2))
+
+    def test_compare_without_peak_memory(self, measures):
+        """peak_memory is None without the resource module."""
+        baseline = make_baseline(measures)
+        new_measures = copy.deepcopy(measures)
+        new_measures['line']['peak_memory'] = None
+        assert compare_to_baseline(new_measures, baseline) == []
+        assert format_measures(new_measures)[1].endswith('n/a')
+
+
+class TestSuite(object):
+
+    def test_run_suite(self):
+        measures = run_suite(['line'], scale=0.1, repeat=1)
+        assert list(measures) == ['line']
+        assert set(METRICS).issubset(measures['line'])
+
+    def test_failed_scenario(self):
+        """The error of a scenario is given instead of waiting forever."""
+        # No run gives no best duration
+        with pytest.raises(ScenarioError, match="ValueError"):
+            run_suite(['line'], scale=0.1, repeat=0)
+
+    def test_process_exited(self):
+        """A process that exits without measures is not waited forever."""
+        ctx = mp.get_context('spawn')
+        queue = ctx.Queue()
+        process = ctx.Process(target=time.sleep, args=(0,))
+        process.start()
+        with pytest.raises(ScenarioError, match="exited with code 0"):
+            suite._get_measures('line', process, queue)
+        process.join()
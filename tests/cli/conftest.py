@@ -0,0 +1,14 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+
+
+@pytest.fixture
+def valid_seq_dir():
+    return "tests/sequencereader/sequences/valid/"
+
+
+@pytest.fixture
+def invalid_seq_dir():
+    return "tests/sequencereader/sequences/invalid/"
@@ -0,0 +1,207 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+import json
+import os
+from click.testing import CliRunner
+from yapyseq.cli import *
+from yapyseq.server import submit_request
+from yapyseq.benchmarks.imports import SCENARIOS, get_loaded_heavy_modules
+
+
+class TestCheck(object):
+
+    def test_find_sequence_files(self, valid_seq_dir, invalid_seq_dir):
+        """Check that paths, directories and globs are expanded."""
+        paths = find_sequence_files([
+            valid_seq_dir,
+            os.path.join(invalid_seq_dir, "bad_id_*.yaml"),
+            os.path.join(valid_seq_dir, "complexity_1.yaml"),
+            "missing.yaml"])
+        assert len(paths) == len(os.listdir(valid_seq_dir)) + 3 + 1
+        assert "missing.yaml" in paths
+        assert paths == sorted(paths)
+
+    @pytest.mark.parametrize("jobs", ["1", "2"])
+    def test_check_many_files(self, valid_seq_dir, invalid_seq_dir, jobs):
+        """Check the text output and the exit status of a batch check."""
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'check', '-j', jobs,
+            os.path.join(valid_seq_dir, "complexity_[1-3].yaml"),
+            os.path.join(invalid_seq_dir, "bad_id_0.yaml")])
+        assert result.exit_code == 1
+        assert "Not valid: {}".format(
+            os.path.join(invalid_seq_dir, "bad_id_0.yaml")) in result.output
+        assert "4 file(s) checked, 3 valid, 1 not valid." in result.output
+
+    def test_check_json(self, valid_seq_dir):
+        """Check the JSON summary of a batch check."""
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'check', '--format', 'json', '-j', '2',
+            os.path.join(valid_seq_dir, "complexity_[1-3].yaml"),
+            "missing.yaml"])
+        assert result.exit_code == 1
+        summary = json.loads(result.output)
+        assert summary['files'] == 4
+        assert summary['valid'] == 3
+        assert summary['invalid'] == 1
+        results = dict([(r['path'], r) for r in summary['results']])
+        assert results["missing.yaml"]['error'] == 'file'
+        assert not results["missing.yaml"]['valid']
+
+    def test_check_valid(self, valid_seq_dir):
+        """Check the exit status when every file is valid."""
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'check', os.path.join(valid_seq_dir, "complexity_6.yaml")])
+        assert result.exit_code == 0
+
+
+class TestRun(object):
+
+    def test_run_trace(self, tmp_path):
+        path = str(tmp_path / "trace.json")
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'run', '--no-log', '--trace', path,
+            'tests/sequencerunner/sequences/one_function_node.yaml',
+            'tests/sequencerunner/functions'])
+        assert result.exit_code == 0
+        with open(path) as f:
+            trace = json.load(f)
+        assert trace['otherData'] == {'name': 'one_function_node'}
+        assert 'function' in [e['name'] for e in trace['traceEvents']]
+
+    def test_run_profile(self, tmp_path):
+        directory = str(tmp_path / "profiles")
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'run', '--no-log', '--profile', '--profile-dir', directory,
+            'tests/sequencerunner/sequences/one_function_node.yaml',
+            'tests/sequencerunner/functions'])
+        assert result.exit_code == 0
+        assert sorted(os.listdir(directory)) == [
+            'profile.collapsed', 'return_hello_world.pstats']
+
+    def test_run_exception_logged(self, tmp_path):
+        """Check that an exception of the run is written in the log file."""
+        path = str(tmp_path / "run.log")
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'run', '--log-file', path,
+            'tests/sequencerunner/sequences/condition_error.yaml',
+            'tests/sequencerunner/functions'])
+        assert isinstance(result.exception, NameError)
+        with open(path) as f:
+            content = f.read()
+        assert 'An exception was raised during the run' in content
+        assert "NameError: name 'undefined_variable' is not defined" in \
+            content
+
+    def test_run_summary(self):
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'run', '--no-log', '--summary', '--trace-memory',
+            'tests/sequencerunner/sequences/one_function_node.yaml',
+            'tests/sequencerunner/functions'])
+        assert result.exit_code == 0
+        for resource in ('wall time', 'user time', 'system time', 'max rss',
+                         'memory peak'):
+            assert 'Nodes by {}:'.format(resource) in result.output
+        assert 'Node 1 (return_hello_world) (1 activation(s))' in \
+            result.output
+
+    def test_analyze(self, tmp_path):
+        path = str(tmp_path / "trace.json")
+        CliRunner().invoke(yapyseq_main_cli, [
+            'run', '--no-log', '--trace', path,
+            'tests/sequencerunner/sequences/simple_parallel.yaml',
+            'tests/sequencerunner/functions'])
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'analyze', '--format', 'json', path])
+        assert result.exit_code == 0
+        analysis = json.loads(result.output)
+        # The branch of nodes 3 and 5 sleeps the longest
+        assert [a['nid'] for a in analysis['critical_path']] == \
+            [0, 1, 3, 5, 6, 7]
+        assert analysis['node_slack']['4'] > 0.2
+        assert len(analysis['workers']) == 4
+        result = CliRunner().invoke(yapyseq_main_cli, ['analyze', path])
+        assert result.exit_code == 0
+        assert 'runner overhead' in result.output
+
+    def test_analyze_not_trace(self):
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'analyze', 'tests/sequencerunner/sequences/simple_parallel.yaml'])
+        assert result.exit_code == 1
+        assert "Error" in result.output
+
+    def test_graph(self, tmp_path):
+        trace_path = str(tmp_path / "trace.json")
+        dot_path = str(tmp_path / "graph.dot")
+        CliRunner().invoke(yapyseq_main_cli, [
+            'run', '--no-log', '--trace', trace_path,
+            'tests/sequencerunner/sequences/simple_loop.yaml',
+            'tests/sequencerunner/functions'])
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'graph', '--trace', trace_path, '--color-by', 'activations',
+            '-o', dot_path, 'tests/sequencerunner/sequences/simple_loop.yaml'])
+        assert result.exit_code == 0
+        with open(dot_path) as f:
+            dot = f.read()
+        assert dot.startswith('digraph "simple_loop" {')
+        assert '  3 -> 2 [label="counter > 0\\nx9"' in dot
+
+class TestSubmit(object):
+
+    def test_submit(self, server):
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'submit', '--socket', server.socket_path, '--format', 'json',
+            'tests/sequencerunner/sequences/one_function_node.yaml',
+            'tests/sequencerunner/functions'])
+        assert result.exit_code == 0
+        node_result = json.loads(result.output)['results']['1']
+        assert node_result['returned'] == repr("Hello world!")
+        assert node_result['exception'] is None
+        assert node_result['resources']['wall_time'] > 0
+
+    def test_submit_shutdown_server(self, server):
+        submit_request({'command': 'shutdown'}, server.socket_path)
+        result = CliRunner().invoke(yapyseq_main_cli, [
+            'submit', '--socket', server.socket_path,
+            'tests/sequencerunner/sequences/one_function_node.yaml',
+            'tests/sequencerunner/functions'])
+        assert result.exit_code == 1
+        assert "Error" in result.output
+
+class TestBench(object):
+
+    def test_bench_baseline(self, tmp_path):
+        """Check that a run is not a regression of itself."""
+        path = str(tmp_path / "baseline.json")
+        args = ['bench', 'line', '--scale', '0.1', '--repeat', '1']
+        result = CliRunner().invoke(yapyseq_main_cli,
+                                    args + ['--save-baseline', path])
+        assert result.exit_code == 0
+        assert result.output.splitlines()[-1].startswith('line ')
+        result = CliRunner().invoke(
+            yapyseq_main_cli, args + ['--baseline', path, '--tolerance', '10'])
+        assert result.exit_code == 0
+        assert 'No regression.' in result.output
+
+    def test_bench_unknown_scenario(self):
+        result = CliRunner().invoke(yapyseq_main_cli, ['bench', 'missing'])
+        assert result.exit_code == 1
+        assert "Unknown scenario: missing" in result.output
+
+class TestStartTime(object):
+
+    @pytest.mark.parametrize("scenario", list(SCENARIOS))
+    def test_no_heavy_module(self, scenario):
+        """Check that heavy modules are only imported when needed."""
+        assert get_loaded_heavy_modules(SCENARIOS[scenario]) == []
+
+    def test_lazy_public_objects(self):
+        """Check that public objects are imported on access."""
+        import yapyseq
+        from yapyseq.sequencereader import SequenceReader
+        assert yapyseq.SequenceReader is SequenceReader
+        assert "SequenceRunner" in dir(yapyseq)
+        with pytest.raises(AttributeError):
+            yapyseq.NotAnObject
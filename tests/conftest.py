@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import threading
+import pytest
+from yapyseq.server import SequenceServer, submit_request
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path, monkeypatch):
+    """Keep the cache files of the tests out of the cache of the user."""
+    path = tmp_path / "cache_home"
+    monkeypatch.setenv("XDG_CACHE_HOME", str(path))
+    return path
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A SequenceServer listening in a thread, stopped at the end."""
+    server = SequenceServer(str(tmp_path / "yapyseq.sock"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    while server._server is None or not os.path.exists(server.socket_path):
+        thread.join(0.01)
+    yield server
+    try:
+        submit_request({'command': 'shutdown'}, server.socket_path)
+    except OSError:
+        # Already stopped by the test
+        pass
+    thread.join()
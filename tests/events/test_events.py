@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import asyncio
+import threading
+import time
+import pytest
+from yapyseq import SequenceRunner
+from yapyseq.events import *
+
+
+def make_events(count):
+    return [NodeEngaged(float(i), i, 'function') for i in range(count)]
+
+
+class TestEventSubscription(object):
+
+    @pytest.mark.parametrize("drop_policy, expected", [
+        (DropPolicy.DROP_OLDEST, [2, 3, 4]),
+        (DropPolicy.DROP_NEWEST, [0, 1, 2]),
+    ])
+    def test_drop_policy(self, drop_policy, expected):
+        subscription = EventSubscription(maxsize=3, drop_policy=drop_policy)
+        for event in make_events(5):
+            subscription.put(event)
+        subscription.close()
+        assert [e.nid for e in subscription] == expected
+        assert subscription.dropped == 2
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            EventSubscription(maxsize=0)
+
+    def test_event_types(self):
+        subscription = EventSubscription(event_types=[TransitionTaken])
+        assert not subscription.put(NodeEngaged(0.0, 1, 'start'))
+        assert subscription.put(TransitionTaken(0.0, 1, 2))
+        subscription.close()
+        assert not subscription.put(TransitionTaken(0.0, 2, 3))
+        assert list(subscription) == [TransitionTaken(0.0, 1, 2)]
+
+    def test_get_timeout(self):
+        subscription = EventSubscription()
+        assert subscription.get(timeout=0.01) is None
+        assert not subscription.closed
+
+    def test_iterator_waits_for_events(self):
+        subscription = EventSubscription()
+
+        def publish():
+            for event in make_events(3):
+                subscription.put(event)
+            subscription.close()
+
+        thread = threading.Thread(target=publish)
+        thread.start()
+        assert list(subscription) == make_events(3)
+        thread.join()
+
+    def test_async_iterator(self):
+        subscription = EventSubscription()
+        for event in make_events(3):
+            subscription.put(event)
+        subscription.close()
+
+        async def read():
+            return [event async for event in subscription]
+
+        assert asyncio.run(read()) == make_events(3)
+
+    def test_callback(self):
+        received = []
+
+        def callback(event):
+            received.append(event)
+            if event.nid == 1:
+                raise RuntimeError("ignored")
+
+        subscription = EventSubscription(callback=callback)
+        for event in make_events(3):
+            subscription.put(event)
+        subscription.close(wait=True)
+        assert received == make_events(3)
+
+    def test_close_timeout(self):
+        subscription = EventSubscription(callback=lambda e: time.sleep(0.5))
+        for event in make_events(3):
+            subscription.put(event)
+        start = time.monotonic()
+        subscription.close(timeout=0.1)
+        assert time.monotonic() - start < 0.4
+        assert subscription.closed
+
+
+class TestEventDispatcher(object):
+
+    def test_publish(self):
+        dispatcher = EventDispatcher()
+        assert not dispatcher.active
+        first = dispatcher.subscribe()
+        second = dispatcher.subscribe(maxsize=1,
+                                      drop_policy=DropPolicy.DROP_NEWEST)
+        assert dispatcher.active
+        for event in make_events(2):
+            dispatcher.publish(event)
+        dispatcher.unsubscribe(second)
+        dispatcher.publish(NodeEngaged(2.0, 2, 'function'))
+        dispatcher.close()
+        assert not dispatcher.active
+        assert first.closed and second.closed
+        assert list(first) == make_events(3)
+        assert list(second) == make_events(1)
+        assert second.dropped == 1
+
+
+class TestRunnerEvents(object):
+
+    def test_run_events(self, func_dir, sequence):
+        runner = SequenceRunner(sequence, func_dir, logger=False)
+        subscription = runner.events.subscribe()
+        runner.run()
+        events = list(subscription)
+        assert subscription.closed
+        assert subscription.dropped == 0
+
+        engaged = [e.nid for e in events if isinstance(e, NodeEngaged)]
+        assert sorted(engaged) == [0, 1, 2, 3, 4, 5, 6, 6, 7]
+        dispatched = [e for e in events if isinstance(e, NodeDispatched)]
+        assert sorted([e.nid for e in dispatched]) == [2, 3, 4, 5]
+        assert set([e.function_name for e in dispatched]) == \
+            {'return_timestamp_after_sleep'}
+        finished = [e for e in events if isinstance(e, NodeFinished)]
+        assert [e.nid for e in finished] == [2, 3, 4, 5]
+        assert all([e.result.nid == e.nid for e in finished])
+        transitions = [(e.source, e.target) for e in events
+                       if isinstance(e, TransitionTaken)]
+        assert sorted(transitions) == [(0, 1), (1, 2), (1, 3), (2, 4),
+                                       (3, 5), (4, 6), (5, 6), (6, 7)]
+        syncs = [e for e in events if isinstance(e, SyncCompleted)]
+        assert [(e.nid, e.synchronized) for e in syncs] == [(6, [4, 5])]
+
+        assert isinstance(events[-1], RunFinished)
+        assert events[-1].sequence == 'simple_parallel'
+        assert events[-1].duration > 0
+        times = [e.time for e in events]
+        assert times[0] <= times[-1]
+
+    def test_run_callback(self, func_dir, short_sequence):
+        received = []
+        runner = SequenceRunner(short_sequence, func_dir, logger=False)
+        runner.events.subscribe(received.append,
+                                event_types=[NodeEngaged, RunFinished])
+        runner.run()
+        # The callback got every event when run returns
+        assert [type(e) for e in received] == \
+            [NodeEngaged] * 3 + [RunFinished]
+
+    def test_slow_callback(self, func_dir, short_sequence):
+        """Check that a slow callback does not keep run from returning."""
+        runner = SequenceRunner(short_sequence, func_dir, logger=False)
+        runner.events.subscribe(lambda event: time.sleep(5))
+        start = time.monotonic()
+        runner.run()
+        assert time.monotonic() - start < CLOSE_TIMEOUT + 2
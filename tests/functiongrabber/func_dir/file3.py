@@ -0,0 +1,23 @@
+#!/usr/bin/env python
+# -*- coding: latin-1 -*-
+
+# Caf: this file is not encoded in utf-8.
+
+import functools
+
+
+async def function_3_async():
+    return "This is function_3_async."
+
+
+@functools.lru_cache()
+def function_3_decorated():
+    return "This is function_3_decorated."
+
+
+class WrapperThreeNoBase:
+    def pre(self):
+        return """
+def function_3_in_string():
+    pass
+"""
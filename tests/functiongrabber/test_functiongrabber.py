@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 # coding: utf-8
 
+import os
+import sys
 import pytest
-from yapyseq.functiongrabber import FunctionGrabber, \
-    ItemExistenceError, ItemUniquenessError, UnknownItem
+from yapyseq.functiongrabber import FunctionGrabber, FunctionIndex, \
+    ItemExistenceError, ItemUniquenessError, UnknownItem, ItemReference, \
+    resolve_item, default_index_cache_path
 
 
 class TestSearchItemsInFile(object):
@@ -29,6 +32,17 @@ class TestSearchItemsInFile(object):
         ret = fg._search_items_in_file(file_path, functions, "function")
         assert ret == set()
 
+    def test_search_items_in_file_special_defs(self, func_dir):
+        fg = FunctionGrabber()
+        file_path = "{}/file3.py".format(func_dir)
+        functions = {"function_3_async", "function_3_decorated",
+                     "function_3_in_string"}
+        ret = fg._search_items_in_file(file_path, functions, "function")
+        assert ret == {"function_3_async", "function_3_decorated"}
+        ret = fg._search_items_in_file(file_path, {"WrapperThreeNoBase"},
+                                       "class")
+        assert ret == {"WrapperThreeNoBase"}
+
     def test_search_items_in_file_nonexistent(self, func_dir):
         fg = FunctionGrabber()
         file_path = "nonexistent_file.py".format(func_dir)
@@ -82,6 +96,53 @@ class TestGetFunction(object):
         f = fg.get_function("function_1_1")
         assert f() == "This is function_1_1."
 
+    def test_get_function_lazy(self, func_dir):
+        fg = FunctionGrabber(lazy=True)
+        functions = {"function_1_1"}
+        fg.import_functions(func_dir, functions)
+        f = fg.get_function("function_1_1")
+        assert isinstance(f, ItemReference)
+        assert resolve_item(f)() == "This is function_1_1."
+
+    def test_import_functions_lazy_nonexistent_func(self, func_dir):
+        fg = FunctionGrabber(lazy=True)
+        functions = {'function_which_does_not_exist'}
+        with pytest.raises(ItemExistenceError):
+            fg.import_functions(func_dir, functions)
+
+    def test_get_function_qualified(self, func_dir):
+        fg = FunctionGrabber()
+        functions = {"os.path:join", "function_1_1"}
+        fg.import_functions(func_dir, functions)
+        assert fg.get_function("os.path:join") is os.path.join
+
+    def test_get_function_qualified_no_scan(self):
+        fg = FunctionGrabber()
+        sys_path = list(sys.path)
+        fg.import_functions(".", {"os.path:join"})
+        assert fg._indexes == {}
+        assert sys.path == sys_path
+
+    def test_get_function_qualified_lazy(self):
+        fg = FunctionGrabber(lazy=True)
+        fg.import_functions(".", {"os.path:join"})
+        f = fg.get_function("os.path:join")
+        assert f == ItemReference("os.path:join", None)
+        assert resolve_item(f) is os.path.join
+
+    @pytest.mark.parametrize("name", ["spam_module:spam", "os.path:",
+                                      "os path:join"])
+    def test_import_functions_qualified_nonexistent(self, name):
+        fg = FunctionGrabber(lazy=True)
+        with pytest.raises(ItemExistenceError):
+            fg.import_functions(".", {name})
+
+    def test_import_functions_no_path_duplicates(self, func_dir):
+        fg = FunctionGrabber()
+        fg.import_functions(func_dir, {"function_1_1", "function_1_2"})
+        entries = [p for p in sys.path if p.endswith("func_dir")]
+        assert len(entries) == 1
+
     def test_get_function_unknown_func(self):
         fg = FunctionGrabber()
         with pytest.raises(UnknownItem):
@@ -137,3 +198,87 @@ class TestGetWrapper(object):
         fg = FunctionGrabber()
         with pytest.raises(UnknownItem):
             wrap = fg.get_wrappers({"foo"})
+
+
+class TestFunctionIndex(object):
+
+    def test_locate(self, func_dir):
+        index = FunctionIndex(func_dir)
+        index.update()
+        locations = index.locate({"function_1_1", "function_redundant",
+                                  "function_foo"}, "function")
+        assert len(locations["function_1_1"]) == 1
+        assert len(locations["function_redundant"]) == 2
+        assert locations["function_foo"] == []
+
+    def test_update_unchanged_files(self, tmp_path):
+        (tmp_path / "mod.py").write_text("def spam():\n    pass\n")
+        cache_path = str(tmp_path / "cache" / "index.json")
+        index = FunctionIndex(str(tmp_path), cache_path)
+        assert index.update() == {"mod.py"}
+        assert os.path.isfile(cache_path)
+        # A new index loads the cache and does not scan anything
+        index = FunctionIndex(str(tmp_path), cache_path)
+        assert index.update() == set()
+        assert len(index.locate({"spam"}, "function")["spam"]) == 1
+
+    def test_update_modified_file(self, tmp_path):
+        mod_path = tmp_path / "mod.py"
+        mod_path.write_text("def spam():\n    pass\n")
+        index = FunctionIndex(str(tmp_path))
+        index.update()
+        mod_path.write_text("def egg():\n    pass\n")
+        assert index.update() == {"mod.py"}
+        assert index.locate({"spam", "egg"}, "function") == {
+            "spam": [], "egg": [str(mod_path)]}
+
+    def test_update_removed_file(self, tmp_path):
+        mod_path = tmp_path / "mod.py"
+        mod_path.write_text("def spam():\n    pass\n")
+        index = FunctionIndex(str(tmp_path))
+        index.update()
+        os.remove(str(mod_path))
+        assert index.update() == {"mod.py"}
+        assert index.locate({"spam"}, "function") == {"spam": []}
+
+    def test_index_cache(self, func_dir, cache_home):
+        """Check that indexes are only saved on demand, and that unused
+        index files are removed."""
+        FunctionGrabber().import_functions(func_dir, {"function_1_1"})
+        assert not cache_home.exists()
+        old_path = cache_home / "yapyseq" / "index-old.json"
+        old_path.parent.mkdir(parents=True)
+        old_path.write_text("{}")
+        os.utime(str(old_path), (0, 0))
+        fg = FunctionGrabber(index_cache=True)
+        fg.import_functions(func_dir, {"function_1_1"})
+        assert os.path.isfile(default_index_cache_path(func_dir))
+        assert not old_path.exists()
+
+
+class TestRefresh(object):
+
+    def test_new_and_removed_files(self, tmp_path):
+        """Check that a grabber finds added files and forgets removed files
+        without being refreshed."""
+        (tmp_path / "first_mod.py").write_text("def first():\n    pass\n")
+        fg = FunctionGrabber()
+        fg.import_functions(str(tmp_path), {"first"})
+        (tmp_path / "second_mod.py").write_text("def second():\n    pass\n")
+        fg.import_functions(str(tmp_path), {"second"})
+        assert callable(fg.get_function("second"))
+        os.remove(str(tmp_path / "second_mod.py"))
+        with pytest.raises(ItemExistenceError):
+            fg.import_functions(str(tmp_path), {"second"})
+
+    def test_refresh_reloads_modified_module(self, tmp_path):
+        mod_path = tmp_path / "refreshed_mod.py"
+        mod_path.write_text("def refreshed():\n    return 1\n")
+        fg = FunctionGrabber()
+        fg.import_functions(str(tmp_path), {"refreshed"})
+        assert fg.get_function("refreshed")() == 1
+        assert fg.refresh(str(tmp_path)) == set()
+        mod_path.write_text("def refreshed():\n    return 1000\n")
+        assert fg.refresh(str(tmp_path)) == {os.path.realpath(str(mod_path))}
+        fg.import_functions(str(tmp_path), {"refreshed"})
+        assert fg.get_function("refreshed")() == 1000
@@ -0,0 +1,37 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from yapyseq.nodes import StartNode, StopNode, FunctionNode, VariableNode
+
+
+@pytest.fixture
+def nodes():
+    """A loop of a function node and a variable node, with two stop nodes.
+
+    Node 4 is never reached.
+    """
+    return {
+        0: StartNode(0, [{'target': 1}]),
+        1: FunctionNode(1, "spam", [{'target': 2}], name="Spam node"),
+        2: VariableNode(2, {'i': 'i + 1'}, [
+            {'target': 1, 'condition': 'i < 2'},
+            {'target': 3, 'condition': 'i == 2'},
+            {'target': 4, 'condition': 'i > 2'}]),
+        3: StopNode(3),
+        4: StopNode(4)}
+
+
+@pytest.fixture
+def activations():
+    """Activations of a run of `nodes`, with two iterations of the loop."""
+    activations = []
+    for aid, nid, previous, ready, end in (
+            (0, 0, [], 0.0, 0.0), (1, 1, [0], 0.0, 1.0),
+            (2, 2, [1], 1.0, 1.0), (3, 1, [2], 1.0, 4.0),
+            (4, 2, [3], 4.0, 4.0), (5, 3, [4], 4.0, 4.0)):
+        activations.append({
+            'activation': aid, 'nid': nid, 'type': None, 'label': None,
+            'previous': previous, 'pid': None,
+            'timestamps': {'ready': ready, 'dispatched': end}})
+    return activations
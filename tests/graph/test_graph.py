@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from yapyseq.graph import *
+
+
+class TestActivity(object):
+
+    def test_node_activity(self, activations):
+        activity = collect_node_activity(activations)
+        assert sorted(activity) == [0, 1, 2, 3]
+        assert activity[1] == NodeActivity(2, 4.0)
+        assert activity[2] == NodeActivity(2, 0.0)
+
+    def test_count_transitions(self, activations):
+        # The last activation is led twice by the same node
+        activations[5]['previous'] = [2, 4]
+        assert count_transitions(activations) == {
+            (0, 1): 1, (1, 2): 2, (2, 1): 1, (2, 3): 1}
+
+    def test_heat_color(self):
+        assert heat_color(0) == '0.150 0.150 1.000'
+        assert heat_color(1) == '0.000 1.000 1.000'
+        assert heat_color(2) == heat_color(1)
+
+
+class TestDot(object):
+
+    def test_structure(self, nodes):
+        dot = sequence_to_dot(nodes, name="loop")
+        assert dot.startswith('digraph "loop" {\n')
+        assert '  1 [label="Spam node\\nspam", shape="box"];' in dot
+        assert '  2 -> 1 [label="i < 2"];' in dot
+        assert '  0 -> 1;' in dot
+        assert 'activation' not in dot
+
+    @pytest.mark.parametrize("color_by, hot", [("time", 1),
+                                               ("activations", 2)])
+    def test_heatmap(self, nodes, activations, color_by, hot):
+        dot = sequence_to_dot(nodes, activations, color_by=color_by)
+        assert '  {} [fillcolor="{}"'.format(hot, heat_color(1)) in dot
+        assert 'Spam node\\nspam\\n2 activation(s), 4.000 s' in dot
+        assert '  1 -> 2 [label="x2", penwidth="4.0"];' in dot
+        assert '  2 -> 1 [label="i < 2\\nx1", penwidth="2.5"];' in dot
+        assert '  2 -> 4 [color="gray", label="i > 2\\nx0", ' \
+               'style="dashed"];' in dot
+        assert '  4 [label="Node 4\\nstop\\nnot activated", ' \
+               'shape="doublecircle", style="dashed"];' in dot
+
+    def test_bad_color(self, nodes):
+        with pytest.raises(ValueError):
+            sequence_to_dot(nodes, color_by="memory")
+
+
+class TestRender(object):
+
+    def test_bad_format(self, nodes, tmp_path):
+        with pytest.raises(ValueError):
+            render(sequence_to_dot(nodes), str(tmp_path / "graph.gif"), 'gif')
+
+    def test_no_graphviz(self, nodes, tmp_path, monkeypatch):
+        monkeypatch.setattr('shutil.which', lambda name: None)
+        with pytest.raises(GraphRenderError):
+            render(sequence_to_dot(nodes), str(tmp_path / "graph.svg"))
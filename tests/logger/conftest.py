@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+
+
+@pytest.fixture
+def func_dir():
+    return "tests/sequencerunner/functions"
+
+
+@pytest.fixture
+def sequence():
+    return "tests/sequencerunner/sequences/simple_parallel.yaml"
+
+
+@pytest.fixture
+def short_sequence():
+    return "tests/sequencerunner/sequences/one_function_node.yaml"
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import logging
+import pytest
+from yapyseq import SequenceRunner
+from yapyseq.logger import *
+
+
+def read_lines(path):
+    with open(path) as f:
+        return f.read().splitlines()
+
+
+class TestRunLog(object):
+
+    def test_queued_records(self, tmp_path):
+        """Check that records of the listener are written when it stops."""
+        path = str(tmp_path / "run.log")
+        run_log = RunLog("spam", file_path=path, entry_format="%(message)s")
+        run_log.logger.info("before %d", 1)
+        run_log.start()
+        assert run_log.is_listening
+        values = [2]
+        run_log.logger.info("during %s", values)
+        # The message is formatted when it is logged, not when it is written
+        values.append(3)
+        run_log.logger.debug("not written")
+        run_log.stop()
+        run_log.logger.info("after")
+        run_log.close()
+        assert read_lines(path) == ["before 1", "during [2]", "after"]
+
+    def test_json_records(self, tmp_path):
+        path = str(tmp_path / "run.log")
+        run_log = RunLog("spam", file_path=path, log_format="json",
+                         fields={"sequence": "eggs"})
+        run_log.start()
+        run_log.logger.info("Node %d", 3,
+                            extra=event_fields("node_engaged", nid=3))
+        try:
+            raise ValueError("bad")
+        except ValueError:
+            run_log.logger.exception("Failed")
+        run_log.close()
+        records = [json.loads(line) for line in read_lines(path)]
+        assert records[0]["message"] == "Node 3"
+        assert records[0]["event"] == "node_engaged"
+        assert records[0]["nid"] == 3
+        assert records[0]["sequence"] == "eggs"
+        assert records[1]["level"] == "ERROR"
+        assert "ValueError: bad" in records[1]["exception"]
+
+    def test_bad_format(self):
+        with pytest.raises(ValueError):
+            RunLog("spam", log_format="xml")
+
+    def test_get_logger_single_handler(self, tmp_path):
+        name = "yapyseq.tests.single_handler"
+        get_logger(name, file_path=str(tmp_path / "first.log"))
+        logger = get_logger(name, file_path=str(tmp_path / "second.log"),
+                            entry_format="%(message)s")
+        logger.info("spam")
+        assert len(logger.handlers) == 1
+        assert read_lines(str(tmp_path / "first.log")) == []
+        assert read_lines(str(tmp_path / "second.log")) == ["spam"]
+
+
+class TestRunnerLog(object):
+
+    def test_one_handler_per_run(self, short_sequence, func_dir, tmp_path):
+        """Check that every runner writes its records once."""
+        paths = [str(tmp_path / "{}.log".format(i)) for i in range(3)]
+        for path in paths:
+            SequenceRunner(short_sequence, func_dir, log_file=path).run()
+        for path in paths:
+            lines = read_lines(path)
+            assert len([l for l in lines if "Running sequence" in l]) == 1
+            assert len(lines) == len(read_lines(paths[0]))
+
+    def test_log_file_closed(self, short_sequence, func_dir, tmp_path):
+        """Check that the file of the log is closed at the end of the run."""
+        path = str(tmp_path / "run.log")
+        runner = SequenceRunner(short_sequence, func_dir, log_file=path)
+        runner.run()
+        assert runner._run_log.handler.stream is None
+        assert "END of the run" in read_lines(path)[-1]
+
+    def test_log_file_closed_on_error(self, func_dir, tmp_path,
+                                      monkeypatch):
+        """Check that the file of the log is closed if the initialization
+        fails, and that a closed log drops its records."""
+        path = str(tmp_path / "run.log")
+        closed = []
+        close = RunLog.close
+        monkeypatch.setattr(RunLog, "close",
+                            lambda self: closed.append(self) or close(self))
+        with pytest.raises(ImportError):
+            SequenceRunner(
+                "tests/sequencerunner/sequences/import_error.yaml", func_dir,
+                log_file=path)
+        assert len(closed) == 1
+        assert closed[0].handler.stream is None
+        monkeypatch.undo()
+        run_log = RunLog("spam", file_path=path, entry_format="%(message)s")
+        run_log.logger.info("written")
+        run_log.close()
+        assert run_log.closed
+        run_log.logger.info("dropped")
+        assert read_lines(path) == ["written"]
+        assert run_log.handler.stream is None
+
+    def test_disabled_log(self, short_sequence, func_dir):
+        """Check that disabling the log of a runner keeps the others."""
+        SequenceRunner(short_sequence, func_dir, logger=False)
+        assert logging.getLogger("yapyseq.tests").isEnabledFor(logging.ERROR)
+
+    def test_json_node_events(self, sequence, func_dir, tmp_path):
+        path = str(tmp_path / "run.log")
+        SequenceRunner(sequence, func_dir, log_file=path,
+                       log_format="json").run()
+        records = [json.loads(line) for line in read_lines(path)]
+        assert all([r["sequence"] == "simple_parallel" for r in records])
+        engaged = [r for r in records if r.get("event") == "node_engaged"]
+        assert sorted(set([r["nid"] for r in engaged])) == list(range(8))
+        assert [r["next"] for r in engaged if r["nid"] == 1] == [[2, 3]]
+        terminated = [r for r in records
+                      if r.get("event") == "function_terminated"]
+        assert sorted([r["nid"] for r in terminated]) == [2, 3, 4, 5]
+        assert not any([r["failed"] for r in terminated])
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from yapyseq.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    """A registry with a counter, a gauge and a histogram."""
+    registry = MetricsRegistry()
+    registry.counter('test_total', 'A counter.', ['kind']).inc(kind='a')
+    registry.gauge('test_gauge', 'A gauge.').set(3)
+    histogram = registry.histogram('test_seconds', 'A histogram.',
+                                   ['name'], buckets=[0.1, 1])
+    for value in (0.05, 0.1, 0.5, 2):
+        histogram.observe(value, name='x')
+    return registry
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import math
+from urllib.request import urlopen
+import pytest
+from yapyseq.metrics import *
+
+
+class TestMetrics(object):
+
+    def test_counter(self, registry):
+        counter = registry.counter('test_total', 'A counter.', ['kind'])
+        counter.inc(2, kind='a')
+        assert counter.get(kind='a') == 3
+        assert counter.get(kind='b') == 0
+        with pytest.raises(ValueError):
+            counter.inc(-1, kind='a')
+        with pytest.raises(ValueError):
+            counter.inc(spam='a')
+
+    def test_histogram(self, registry):
+        histogram = registry.get('test_seconds')
+        assert histogram.get(name='x') == {
+            'buckets': {0.1: 2, 1: 3, math.inf: 4}, 'sum': 2.65, 'count': 4}
+
+    def test_register_other_type(self, registry):
+        with pytest.raises(ValueError):
+            registry.gauge('test_total', 'Not a counter.')
+
+    def test_render(self, registry):
+        assert registry.render() == (
+            '# HELP test_total A counter.\n'
+            '# TYPE test_total counter\n'
+            'test_total{kind="a"} 1\n'
+            '# HELP test_gauge A gauge.\n'
+            '# TYPE test_gauge gauge\n'
+            'test_gauge 3\n'
+            '# HELP test_seconds A histogram.\n'
+            '# TYPE test_seconds histogram\n'
+            'test_seconds_bucket{name="x",le="0.1"} 2\n'
+            'test_seconds_bucket{name="x",le="1"} 3\n'
+            'test_seconds_bucket{name="x",le="+Inf"} 4\n'
+            'test_seconds_sum{name="x"} 2.65\n'
+            'test_seconds_count{name="x"} 4\n')
+
+    def test_label_escaping(self):
+        assert format_labels({'a': 'x"y\\z\n'}) == '{a="x\\"y\\\\z\\n"}'
+
+    def test_write(self, registry, tmp_path):
+        path = str(tmp_path / "metrics.prom")
+        registry.write(path)
+        with open(path) as f:
+            assert f.read() == registry.render()
+
+    def test_server(self, registry):
+        server = MetricsServer(registry, 0)
+        server.start()
+        try:
+            url = 'http://127.0.0.1:{}/metrics'.format(server.port)
+            with urlopen(url) as response:
+                assert response.headers['Content-Type'] == CONTENT_TYPE
+                assert response.read().decode() == registry.render()
+        finally:
+            server.stop()
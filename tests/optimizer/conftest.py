@@ -0,0 +1,9 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+
+
+@pytest.fixture
+def constants():
+    return {'name': 'world', 'count': 3, 'debug': False, 'items': [1, 2]}
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from collections import OrderedDict
+import pytest
+from yapyseq.common import Literal, evaluate_kwargs
+from yapyseq.nodes import StartNode, StopNode, FunctionNode, VariableNode, \
+    ParallelSplitNode, ParallelSyncNode
+from yapyseq.optimizer import *
+
+
+class TestFoldExpression(object):
+
+    @pytest.mark.parametrize("expr, value", [
+        ("'hello ' + name", "hello world"),
+        ("count * 2", 6),
+        ("not debug", True),
+        ("len(items) + count", 5),
+        ("(count, name)", (3, "world")),
+        ("max(count, 10)", 10)])
+    def test_fold(self, constants, expr, value):
+        assert fold_expression(expr, constants) == (True, value)
+
+    @pytest.mark.parametrize("expr", [
+        "count + spam",               # unknown variable
+        "results[1].returned",        # not a constant
+        "name.upper()",               # attribute access
+        "open(name)",                 # impure built-in
+        "items",                      # mutable value
+        "[count]",                    # mutable value
+        "[x for x in items]",         # comprehension
+        "count / 0",                  # error kept for the run
+        "count +"])                   # syntax error
+    def test_no_fold(self, constants, expr):
+        assert fold_expression(expr, constants) == (False, None)
+
+    def test_no_fold_not_expression(self, constants):
+        assert fold_expression(42, constants) == (False, None)
+        assert fold_expression(None, constants) == (False, None)
+
+    def test_foldable_constants(self, constants):
+        nodes = {1: FunctionNode(1, "spam", [{'target': 2}],
+                                 return_var_name="count"),
+                 2: VariableNode(2, {'name': "'egg'"}, [{'target': 3}])}
+        assert get_foldable_constants(nodes, constants) == {
+            'debug': False, 'items': [1, 2]}
+
+
+class TestOptimizeNodes(object):
+
+    def test_function_node(self, constants):
+        node = FunctionNode(
+            1, "spam", [{'target': 2, 'condition': "count > 0"}],
+            function_kwargs={'a': "'hello ' + name", 'b': "results",
+                             'c': 42},
+            wrappers=OrderedDict([('Wrapper', {'x': "count"})]))
+        optimized, simplifications = optimize_node(node, constants)
+        assert optimized is not node
+        assert optimized._function_kwargs == {
+            'a': Literal("hello world"), 'b': "results", 'c': 42}
+        assert optimized._wrappers_desc == {'Wrapper': {'x': 3}}
+        assert optimized._transitions[0]._condition is None
+        assert [s.kind for s in simplifications] == [
+            'condition', 'argument', 'wrapper argument']
+        # Folded values are given as is to the function
+        assert evaluate_kwargs(optimized._function_kwargs,
+                               {'results': {}}) == {
+            'a': "hello world", 'b': {}, 'c': 42}
+        # The original node is not modified
+        assert node._function_kwargs['a'] == "'hello ' + name"
+
+    def test_unchanged_node(self, constants):
+        node = VariableNode(1, {'spam': "egg"}, [{'target': 2}])
+        assert optimize_node(node, constants) == (node, [])
+
+    def test_all_transitions_false(self, constants):
+        """Transitions are kept to raise NoTransitionError at run time."""
+        node = StartNode(0, [{'target': 1, 'condition': "debug"}])
+        assert optimize_node(node, constants) == (node, [])
+
+    def test_prune_transitions(self, constants):
+        nodes = {0: StartNode(0, [{'target': 1}]),
+                 1: ParallelSplitNode(1, [{'target': 2},
+                                          {'target': 3,
+                                           'condition': "debug"}]),
+                 2: StopNode(2),
+                 3: VariableNode(3, {'v': "1"}, [{'target': 4}]),
+                 4: StopNode(4)}
+        optimized = optimize_nodes(nodes, constants)
+        assert optimized.nodes[1].get_all_next_node_ids() == {2}
+        # Pruned transitions are kept, as without the optimization
+        assert optimized.prev_node_ids == {1: {0}, 2: {1}, 3: {1}, 4: {3}}
+        assert [(s.nid, s.kind) for s in optimized.simplifications] == [
+            (1, 'pruned transition'), (3, 'variable'),
+            (3, 'unreachable node'), (4, 'unreachable node')]
+        assert len(describe_simplifications(optimized.simplifications)) == 4
+        # Input nodes are not modified
+        assert nodes[1].get_all_next_node_ids() == {2, 3}
+
+    def test_remove_variable_nodes(self, constants):
+        """Variable nodes with constant values are removed, and their
+        variables are folded in the next nodes."""
+        nodes = {0: StartNode(0, [{'target': 1}]),
+                 1: VariableNode(1, {'total': "count * 2"},
+                                 [{'target': 2, 'condition': "count > 0"}]),
+                 2: VariableNode(2, {'label': "str(total)"}, [{'target': 3}]),
+                 3: FunctionNode(3, "spam", [{'target': 4}],
+                                 function_kwargs={'a': "label + name"}),
+                 4: StopNode(4)}
+        optimized = optimize_nodes(nodes, constants)
+        assert set(optimized.nodes) == {0, 3, 4}
+        assert optimized.nodes[0].get_all_next_node_ids() == {3}
+        assert optimized.nodes[3]._function_kwargs == {
+            'a': Literal("6world")}
+        assert optimized.prev_node_ids == {3: {0}, 4: {3}}
+        assert optimized.variables == {'total': 6, 'label': "6"}
+        assert [(s.nid, s.kind) for s in optimized.simplifications
+                if s.kind == 'variable node'] == [(1, 'variable node'),
+                                                  (2, 'variable node')]
+
+    def test_keep_variable_nodes(self, constants):
+        """Variable nodes are kept if removing them changes the run."""
+        nodes = {0: StartNode(0, [{'target': 1}]),
+                 1: ParallelSplitNode(1, [{'target': i}
+                                          for i in range(2, 7)]),
+                 # Their variable is assigned by both of them
+                 2: VariableNode(2, {'v': "1"}, [{'target': 6}]),
+                 3: VariableNode(3, {'v': "2"}, [{'target': 6}]),
+                 # Its transition depends on a variable
+                 4: VariableNode(4, {'w': "1"},
+                                 [{'target': 6, 'condition': "v > 0"}]),
+                 # Node 1 already leads to the sync node
+                 5: VariableNode(5, {'x': "1"}, [{'target': 6}]),
+                 6: ParallelSyncNode(6, [{'target': 7}]),
+                 7: StopNode(7)}
+        optimized = optimize_nodes(nodes, constants)
+        assert set(optimized.nodes) == set(nodes)
+        assert optimized.variables == {}
+
+    def test_keep_variable_nodes_before_sync(self, constants):
+        """A variable node leading to a sync node is kept if several nodes
+        lead to it: the sync node would wait for all of them."""
+        nodes = {0: StartNode(0, [{'target': 1}]),
+                 1: ParallelSplitNode(1, [{'target': 2}, {'target': 3}]),
+                 2: FunctionNode(2, "spam", [{'target': 4}]),
+                 3: FunctionNode(3, "spam", [{'target': 4}]),
+                 4: VariableNode(4, {'v': "1"}, [{'target': 5}]),
+                 5: ParallelSyncNode(5, [{'target': 6}]),
+                 6: StopNode(6)}
+        optimized = optimize_nodes(nodes, constants)
+        assert set(optimized.nodes) == set(nodes)
+        assert optimized.prev_node_ids[5] == {4}
@@ -0,0 +1,29 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import cProfile
+import pytest
+
+
+def fibonacci(n):
+    return n if n < 2 else fibonacci(n - 1) + fibonacci(n - 2)
+
+
+def outer():
+    total = 0
+    for _ in range(3):
+        total += fibonacci(15)
+    return total + inner()
+
+
+def inner():
+    return fibonacci(12)
+
+
+@pytest.fixture
+def raw_stats():
+    """Statistics of a profiled call, as sent by a function node."""
+    profiler = cProfile.Profile()
+    profiler.runcall(outer)
+    profiler.create_stats()
+    return profiler.stats
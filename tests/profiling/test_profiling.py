@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import pstats
+from yapyseq.profiling import ProfileCollector, collapse_stats, \
+    frame_label, COLLAPSED_FILE_NAME
+
+
+class TestCollapseStats(object):
+
+    def test_frame_label(self):
+        """Check the labels of Python and built-in functions."""
+        assert frame_label(('/a/b/spam.py', 12, 'egg')) == 'egg (spam.py:12)'
+        assert frame_label(('~', 0, '<built-in method sum>')) == \
+            '<built-in method sum>'
+        assert frame_label(('x.py', 1, 'a;b')) == 'a,b (x.py:1)'
+
+    def test_stacks(self, raw_stats):
+        """Check that stacks follow the calls and share the whole time."""
+        stacks = collapse_stats(raw_stats, root='node')
+        assert all(stack.startswith('node;outer (conftest.py:') for stack in
+                   stacks)
+        # fibonacci is called by outer and by inner
+        frames = [stack.split(';') for stack in stacks]
+        assert any(f[2].startswith('fibonacci') for f in frames
+                   if len(f) > 2)
+        assert any(f[2].startswith('inner') and f[3].startswith('fibonacci')
+                   for f in frames if len(f) > 3)
+        # Recursive calls are not unrolled
+        assert all(len([f for f in stack if f.startswith('fibonacci')]) <= 1
+                   for stack in frames)
+        # Stacks share the time of the profiled call
+        outer_time = [s for func, s in raw_stats.items()
+                      if func[2] == 'outer'][0][3]
+        total = sum(stacks.values()) / 1000000
+        assert abs(total - outer_time) <= outer_time * 0.01 + 0.0001
+
+
+class TestProfileCollector(object):
+
+    def test_merge(self, raw_stats):
+        """Check that the profiles of a function are merged."""
+        collector = ProfileCollector()
+        assert collector.functions == []
+        collector.add('spam', raw_stats)
+        calls = collector.get_stats('spam').total_calls
+        collector.add('spam', raw_stats)
+        collector.add('egg', raw_stats)
+        assert collector.functions == ['egg', 'spam']
+        assert collector.get_activation_count('spam') == 2
+        assert collector.get_stats('spam').total_calls == 2 * calls
+        stacks = collector.collapsed_stacks()
+        assert any(stack.startswith('egg;') for stack in stacks)
+        assert any(stack.startswith('spam;') for stack in stacks)
+
+    def test_write(self, raw_stats, tmpdir):
+        """Check the written pstats and collapsed stacks files."""
+        collector = ProfileCollector()
+        collector.add('module:spam', raw_stats)
+        directory = os.path.join(str(tmpdir), 'profiles')
+        paths = collector.write(directory)
+        assert paths == [os.path.join(directory, 'module.spam.pstats'),
+                         os.path.join(directory, COLLAPSED_FILE_NAME)]
+        stats = pstats.Stats(paths[0])
+        assert stats.total_calls == \
+            collector.get_stats('module:spam').total_calls
+        with open(paths[1]) as f:
+            lines = f.read().splitlines()
+        assert lines
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            assert stack.startswith('module:spam;outer')
+            assert int(count) > 0
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from yapyseq.resources import NodeResources, add_resources
+
+
+@pytest.fixture
+def totals():
+    """Totals of three nodes, without memory peak for the third one."""
+    totals = dict()
+    for nid, resources in (
+            (1, NodeResources(1.0, 0.5, 0.1, 2048, 100)),
+            (1, NodeResources(2.0, 1.0, 0.1, 1024, 300)),
+            (2, NodeResources(0.5, 2.5, 0.0, 4096, 200)),
+            (3, NodeResources(0.1, 0.1, 0.3, 512, None))):
+        totals[nid] = add_resources(totals.get(nid), resources)
+    return totals
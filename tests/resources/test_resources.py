@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+import resource
+from yapyseq.resources import ResourceTotals, take_snapshot, get_max_rss, \
+    measure_resources, rank_nodes, format_summary, parse_size, \
+    limit_resources
+
+
+class TestMeasure(object):
+
+    def test_measure_resources(self):
+        """Check that the CPU time spent since a snapshot is measured."""
+        snapshot = take_snapshot()
+        sum(range(2 * 10 ** 6))
+        resources = measure_resources(snapshot, memory_peak=12)
+        assert resources.wall_time > 0
+        assert resources.user_time + resources.system_time > 0
+        assert resources.max_rss == get_max_rss() > 0
+        assert resources.memory_peak == 12
+
+
+class TestTotals(object):
+
+    def test_add_resources(self, totals):
+        """Check that times are added up and memory is the maximum."""
+        assert totals[1] == ResourceTotals(2, 3.0, 1.5, 0.2, 2048, 300)
+        assert totals[3].memory_peak is None
+
+    @pytest.mark.parametrize("field,expected", [
+        ('wall_time', [1, 2, 3]),
+        ('user_time', [2, 1, 3]),
+        ('system_time', [3, 1, 2]),
+        ('max_rss', [2, 1, 3]),
+        ('memory_peak', [1, 2]),
+    ])
+    def test_rank_nodes(self, totals, field, expected):
+        """Check the order of the nodes for each resource."""
+        assert [nid for nid, _ in rank_nodes(totals, field)] == expected
+
+    def test_format_summary(self, totals):
+        """Check the titles, the units and the limit of the summary."""
+        lines = format_summary(totals, {1: 'first'}, top=1)
+        assert lines == [
+            'Nodes by wall time:',
+            '       3.000 s  first (2 activation(s))',
+            'Nodes by user time:',
+            '       2.500 s  Node 2 (1 activation(s))',
+            'Nodes by system time:',
+            '       0.300 s  Node 3 (1 activation(s))',
+            'Nodes by max rss:',
+            '       4.0 KiB  Node 2 (1 activation(s))',
+            'Nodes by memory peak:',
+            '         300 B  first (2 activation(s))']
+        assert format_summary(dict()) == []
+
+
+class TestLimits(object):
+
+    @pytest.mark.parametrize("size,expected", [
+        (1000, 1000),
+        ("1000", 1000),
+        ("512K", 512 * 1024),
+        ("100 MB", 100 * 1024 ** 2),
+        ("1.5g", int(1.5 * 1024 ** 3)),
+        ("2GiB", 2 * 1024 ** 3),
+    ])
+    def test_parse_size(self, size, expected):
+        assert parse_size(size) == expected
+
+    @pytest.mark.parametrize("size", ["12 eggs", "M", "", 0, "-1K", True])
+    def test_parse_invalid_size(self, size):
+        with pytest.raises(ValueError):
+            parse_size(size)
+
+    def test_memory_limit(self):
+        """Check that allocations above the limit fail, and that the limit
+           is restored.
+        """
+        before = resource.getrlimit(resource.RLIMIT_AS)
+        with pytest.raises(MemoryError):
+            with limit_resources(memory_limit=100 * 1024 ** 2):
+                bytearray(10 ** 9)
+        assert resource.getrlimit(resource.RLIMIT_AS) == before
+        with limit_resources(memory_limit=100 * 1024 ** 2):
+            bytearray(10 ** 6)
+
+    def test_cpu_time_limit(self):
+        """Check that the callback is called when the CPU time limit is
+           exceeded, and that the limit is restored.
+        """
+        def on_cpu_time_limit():
+            raise RuntimeError("CPU time limit")
+
+        before = resource.getrlimit(resource.RLIMIT_CPU)
+        with pytest.raises(RuntimeError):
+            with limit_resources(cpu_time_limit=0.1,
+                                 on_cpu_time_limit=on_cpu_time_limit):
+                while True:
+                    pass
+        assert resource.getrlimit(resource.RLIMIT_CPU) == before
+
+    def test_no_limit(self):
+        before = resource.getrlimit(resource.RLIMIT_AS)
+        with limit_resources():
+            assert resource.getrlimit(resource.RLIMIT_AS) == before
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+import os
+from yapyseq.sequencebuilder import *
+from yapyseq.sequencereader import load_sequence_file, SequenceStructureError
+
+
+def build_complexity_6():
+    """Build the sequence of the file complexity_6.yaml."""
+    builder = SequenceBuilder({"name": "complexity 6", "one": 1})
+    builder.constant("bool", True)
+    builder.start(nid=0, name="start node").transition(2)
+    builder.start(nid=8, name="second start node").transition(1)
+    builder.stop(nid=1, name="stop node")
+    builder.function("dummy_function", nid=2, name="Dummy node function",
+                     return_var_name="spam",
+                     wrappers=[{"WrapperSpam": {"arg": "value"}},
+                               "WrapperEgg"]).transition(5)
+    builder.function("spam_function", nid=3, name="Dummy node function",
+                     wrappers=["WrapperFoo"]).transition(6)
+    builder.function("egg_function", nid=4, name="Dummy node function",
+                     wrappers=[{"WrapperBar": {}}]).transition(7)
+    builder.parallel_split(nid=5, name="A parallel splitter node")
+    builder.transition(3).transition(4)
+    builder.parallel_sync(nid=6, name="A parallel synchronizer node")
+    builder.transition(1)
+    builder.variable({"a": 1, "b": 2}, nid=7).transition(6)
+    return builder
+
+
+class TestSequenceBuilder(object):
+
+    def test_same_document_as_file(self, valid_seq_dir):
+        """Check that the builder gives the document of a sequence file."""
+        loaded = load_sequence_file(
+            os.path.join(valid_seq_dir, "complexity_6.yaml"))
+        document = build_complexity_6().to_document()
+        assert document['sequence']['constants'] == \
+            loaded['sequence']['constants']
+        assert sorted(document['sequence']['nodes'], key=lambda n: n['id']) \
+            == sorted(loaded['sequence']['nodes'], key=lambda n: n['id'])
+
+    @pytest.mark.parametrize("check", [True, False])
+    def test_build(self, schema_path, check):
+        """Check the nodes created from a builder."""
+        reader = build_complexity_6().build(schema_path, check=check)
+        node_dict = reader.get_node_dict()
+        assert set(node_dict) == set(range(9))
+        assert node_dict[2].function_name == "dummy_function"
+        assert node_dict[2].wrapper_names == {"WrapperSpam", "WrapperEgg"}
+        assert reader.get_start_node_ids() == {0, 8}
+        assert reader.get_prev_node_ids(6) == {3, 7}
+        assert reader.get_constants()['bool'] is True
+        assert reader.seq_file_path is None
+
+    def test_automatic_ids(self):
+        """Check that nodes without ID get the next free one."""
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        assert builder.current_id == 0
+        builder.variable({"a": "1"}, nid=5).transition(6)
+        builder.stop()
+        assert builder.current_id == 6
+
+    def test_builder_errors(self):
+        """Check the errors detected while building."""
+        builder = SequenceBuilder().start().stop()
+        with pytest.raises(SequenceBuilderError):
+            builder.transition(0)
+        with pytest.raises(SequenceBuilderError):
+            builder.start(nid=0)
+        with pytest.raises(SequenceBuilderError):
+            builder.transition(1, source=42)
+        with pytest.raises(SequenceBuilderError):
+            builder.stop(nid="1")
+
+    def test_structure_errors(self, schema_path):
+        """Check that the structure is checked even without schema check."""
+        builder = SequenceBuilder().start().transition(3).stop()
+        with pytest.raises(SequenceStructureError):
+            builder.build(schema_path, check=False)
@@ -2,6 +2,7 @@
 # coding: utf-8
 
 import pytest
+import importlib.util
 import os
 
 from yapyseq.sequencereader import *
@@ -35,6 +36,206 @@ class TestSequenceReaderInitAndCheck(object):
             SequenceReader(seq_path, schema_path)
 
 
+    def test_all_structure_errors(self, schema_path):
+        """Test that all the errors of the node graph are reported."""
+        seq_path = os.path.join(INVALID_SEQ_PATH, "multiple_errors_0.yaml")
+        with pytest.raises(SequenceStructureError) as exc_info:
+            SequenceReader(seq_path, schema_path, cache=False)
+        errors = exc_info.value.errors
+        assert len(errors) == 3
+        assert "[1]" in errors[0]
+        assert "nonexistent targets: [5]" in errors[1]
+        assert "start nodes: [0]" in errors[2]
+
+    def test_check_sequence_structure_unreachable(self):
+        """Test the detection of nodes that cannot be reached."""
+        nodes = [{'id': 0, 'type': 'start', 'transitions': [{'target': 1}]},
+                 {'id': 1, 'type': 'stop'},
+                 {'id': 2, 'type': 'variable', 'transitions': [{'target': 3}]},
+                 {'id': 3, 'type': 'variable', 'transitions': [{'target': 2}]}]
+        errors = check_sequence_structure(nodes)
+        assert errors == ["The following nodes cannot be reached from a "
+                          "start node: [2, 3]"]
+
+    def test_schema_cache(self, schema_path):
+        """Test that the schema is only built once."""
+        assert get_schema(schema_path) is get_schema(schema_path)
+
+    def test_check_sequence_file_document(self, schema_path):
+        """Test that the checked document is returned."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        loaded = SequenceReader.check_sequence_file(seq_path, schema_path)
+        assert len(loaded['sequence']['nodes']) == 9
+
+
+class TestCompiledSequenceCache(object):
+
+    def test_compiled_sequence_saved(self, schema_path, tmp_path):
+        """Test that a compiled sequence is saved in the cache directory."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        SequenceReader(seq_path, schema_path, cache=str(tmp_path))
+        assert len(list(tmp_path.glob("*.pickle"))) == 1
+
+    def test_compiled_sequence_loaded(self, schema_path, tmp_path,
+                                      monkeypatch):
+        """Test that a cached sequence is neither checked nor parsed."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        first = SequenceReader(seq_path, schema_path, cache=str(tmp_path))
+
+        def fail(*args, **kwargs):
+            raise AssertionError("Sequence must not be checked or parsed")
+        monkeypatch.setattr(SequenceReader, "check_sequence_document", fail)
+        monkeypatch.setattr(SequenceReader, "_parse_sequence", fail)
+        second = SequenceReader(seq_path, schema_path, cache=str(tmp_path))
+        assert second.get_constants() == first.get_constants()
+        assert second.get_node_dict().keys() == first.get_node_dict().keys()
+        assert second.get_prev_node_ids(6) == {3, 7}
+
+    def test_compiled_sequence_modified(self, schema_path, tmp_path):
+        """Test that a modified sequence is checked and parsed again."""
+        seq_path = tmp_path / "sequence.yaml"
+        with open(os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")) as f:
+            seq_path.write_text(f.read())
+        cache_dir = tmp_path / "cache"
+        SequenceReader(str(seq_path), schema_path, cache=str(cache_dir))
+        seq_path.write_text(seq_path.read_text().replace(
+            "complexity 6", "modified"))
+        reader = SequenceReader(str(seq_path), schema_path,
+                                cache=str(cache_dir))
+        assert reader.get_constants()['name'] == "modified"
+        assert len(list(cache_dir.glob("*.pickle"))) == 2
+
+    def test_compiled_sequence_opt_in(self, schema_path, cache_home):
+        """Test that compiled sequences are only saved on demand."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        SequenceReader(seq_path, schema_path)
+        assert not cache_home.exists()
+        SequenceReader(seq_path, schema_path, cache=True)
+        assert len(list(cache_home.glob("yapyseq/sequences/*.pickle"))) == 1
+
+    def test_compiled_sequence_bytecode(self, schema_path, tmp_path,
+                                        monkeypatch):
+        """Test that compiled sequences depend on the bytecode version."""
+        with open(os.path.join(VALID_SEQ_PATH, "complexity_6.yaml"),
+                  'rb') as f:
+            content = f.read()
+        path = compiled_sequence_path(content, str(tmp_path), schema_path)
+        monkeypatch.setattr(importlib.util, "MAGIC_NUMBER", b"spam")
+        assert compiled_sequence_path(content, str(tmp_path),
+                                      schema_path) != path
+
+    def test_compiled_sequence_corrupted(self, schema_path, tmp_path):
+        """Test that a compiled sequence that cannot be read is a miss."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        SequenceReader(seq_path, schema_path, cache=str(tmp_path))
+        compiled_path, = tmp_path.glob("*.pickle")
+        compiled_path.write_bytes(b"not a pickle")
+        reader = SequenceReader(seq_path, schema_path, cache=str(tmp_path))
+        assert reader.get_prev_node_ids(6) == {3, 7}
+        # The file has been replaced by a valid one
+        assert compiled_path.read_bytes() != b"not a pickle"
+
+    def test_compiled_sequence_pruned(self, schema_path, tmp_path):
+        """Test that unused compiled sequences are removed."""
+        old_path = tmp_path / "old.pickle"
+        old_path.write_bytes(b"")
+        os.utime(str(old_path), (0, 0))
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        SequenceReader(seq_path, schema_path, cache=str(tmp_path))
+        assert not old_path.exists()
+        assert len(list(tmp_path.glob("*.pickle"))) == 1
+
+
+class TestSequenceReaderSources(object):
+
+    def test_from_string(self, schema_path, tmp_path):
+        """Check that a sequence can be read from a string."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        with open(seq_path) as f:
+            content = f.read()
+        reader = SequenceReader.from_string(content, schema_path,
+                                            cache=str(tmp_path))
+        assert reader.seq_file_path is None
+        assert set(reader.get_node_dict()) == \
+            set(SequenceReader(seq_path, schema_path).get_node_dict())
+
+    def test_from_stream(self, schema_path):
+        """Check that a sequence can be read from a stream."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        with open(seq_path, 'rb') as f:
+            reader = SequenceReader.from_stream(f, schema_path, cache=False)
+        assert reader.seq_file_path == seq_path
+        assert reader.get_start_node_ids() == {0, 8}
+
+    def test_from_invalid_string(self, schema_path):
+        """Check that a sequence read from a string is checked."""
+        seq_path = os.path.join(INVALID_SEQ_PATH, "multiple_errors_0.yaml")
+        with open(seq_path) as f:
+            content = f.read()
+        with pytest.raises(SequenceStructureError):
+            SequenceReader.from_string(content, schema_path, cache=False)
+
+
+class TestLowMemoryLoader(object):
+
+    @pytest.mark.parametrize("seq_name", ["complexity_{}.yaml".format(i)
+                                          for i in range(1, 7)])
+    def test_same_nodes(self, schema_path, seq_name):
+        """Check that the low-memory loader gives the same sequence."""
+        seq_path = os.path.join(VALID_SEQ_PATH, seq_name)
+        readers = [SequenceReader(seq_path, schema_path, cache=False,
+                                  low_memory=low_memory)
+                   for low_memory in (False, True)]
+        node_dicts = [r.get_node_dict() for r in readers]
+        assert set(node_dicts[0]) == set(node_dicts[1])
+        for nid, node in node_dicts[0].items():
+            other = node_dicts[1][nid]
+            assert type(node) is type(other)
+            state, other_state = node.__getstate__(), other.__getstate__()
+            if isinstance(node, TransitionalNode):
+                assert node.get_all_next_node_ids() == \
+                    other.get_all_next_node_ids()
+                del state['_transitions'], other_state['_transitions']
+            assert state == other_state
+            assert readers[0].get_prev_node_ids(nid) == \
+                readers[1].get_prev_node_ids(nid)
+        assert readers[0].get_constants() == readers[1].get_constants()
+
+    @pytest.mark.parametrize("seq_name", os.listdir(INVALID_SEQ_PATH))
+    def test_invalid_sequence(self, schema_path, seq_name):
+        """Check that invalid sequences are detected while streaming."""
+        seq_path = os.path.join(INVALID_SEQ_PATH, seq_name)
+        with pytest.raises(SequenceFileError):
+            SequenceReader(seq_path, schema_path, cache=False,
+                           low_memory=True)
+
+    def test_chunks(self, schema_path, monkeypatch):
+        """Check the validation of the nodes by chunks."""
+        monkeypatch.setattr("yapyseq.sequencereader.STREAM_CHUNK_SIZE", 2)
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        reader = SequenceReader(seq_path, schema_path, cache=False,
+                                low_memory=True)
+        assert len(reader.get_nodes()) == 9
+
+    def test_bad_layout(self, tmp_path, schema_path):
+        """Check that unexpected top-level keys are detected."""
+        seq_path = tmp_path / "bad_layout.yaml"
+        seq_path.write_text("sequence:\n  nodes: []\nother: 1\n")
+        with pytest.raises(SequenceFileError):
+            SequenceReader(str(seq_path), schema_path, cache=False,
+                           low_memory=True)
+
+    def test_compiled_sequence(self, schema_path, tmp_path):
+        """Check that both loaders share the compiled sequence cache."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        SequenceReader(seq_path, schema_path, cache=str(tmp_path),
+                       low_memory=True)
+        with open(seq_path, 'rb') as f:
+            content = f.read()
+        assert os.path.isfile(compiled_sequence_path(content, str(tmp_path),
+                                                     schema_path))
+
+
 class TestSequenceReaderParsing(object):
 
     def test_node_objects(self, schema_path):
@@ -82,6 +283,19 @@ class TestSequenceReaderParsing(object):
         assert n.get_all_next_node_ids() == {6}
         assert n.variables == {'a': 1, 'b': 2}
 
+    def test_nodes_are_shared_and_immutable(self, schema_path):
+        """Check that nodes are not copied, and cannot be modified."""
+        seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
+        reader = SequenceReader(seq_path, schema_path, cache=False)
+        node = reader.get_node_dict()[2]
+        assert node is reader.get_node_dict()[2]
+        assert node in reader.get_nodes()
+        assert not hasattr(node, '__dict__')
+        with pytest.raises(AttributeError):
+            node._function_name = "other_function"
+        with pytest.raises(AttributeError):
+            node.new_attribute = None
+
     def test_get_node_function_names(self, schema_path):
         """Test SequenceReader.get_node_function_names."""
         seq_path = os.path.join(VALID_SEQ_PATH, "complexity_6.yaml")
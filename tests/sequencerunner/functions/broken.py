@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+raise ImportError("This module cannot be imported.")
+
+
+def function_from_broken_module():
+    pass
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 # coding: utf-8
 
-from time import sleep, time
+from time import sleep, time, process_time
 from typing import Any
 
 
@@ -21,3 +21,13 @@ def write_arg_in_file(arg: Any, file: str) -> None:
 
 def return_arg(arg: Any) -> any:
     return arg
+
+
+def allocate(size: int) -> int:
+    return len(bytearray(size))
+
+
+def use_cpu(seconds: float) -> None:
+    end = process_time() + seconds
+    while process_time() < end:
+        pass
@@ -4,8 +4,12 @@
 import pytest
 import os
 from yapyseq.sequencerunner import *
+from yapyseq.functiongrabber import ItemReference
+from yapyseq.sequencebuilder import SequenceBuilder
+from yapyseq.metrics import MetricsRegistry
 from yapyseq.nodes import NodeFunctionTimeout, NodeWrapperPreError, \
-                          NodeWrapperInitError, NodeWrapperPostError
+                          NodeWrapperInitError, NodeWrapperPostError, \
+                          NodeMemoryLimitExceeded, NodeCpuTimeLimitExceeded
 
 
 class TestSequenceRunner(object):
@@ -31,6 +35,213 @@ class TestSequenceRunner(object):
         assert node_result.exception is None
         assert node_result.returned == "Hello world!"
 
+    def test_sequence_sources(self, func_dir, seq_dir):
+        """Check that a sequence can be given as a reader, a builder or a
+           stream.
+        """
+        sequence = os.path.join(seq_dir, "one_function_node.yaml")
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        builder.function("return_hello_world").transition(2)
+        builder.stop()
+        with open(sequence) as f:
+            content = f.read()
+        with open(sequence) as stream:
+            sources = [SequenceReader.from_string(content, cache=False),
+                       builder, stream]
+            for source in sources:
+                runner = SequenceRunner(source, func_dir, logger=False)
+                runner.run()
+                node_result = runner.variables['results'][1]
+                assert node_result.returned == "Hello world!"
+        with pytest.raises(TypeError):
+            SequenceRunner(42, func_dir, logger=False)
+
+    def test_sequence_path_keyword(self, func_dir, seq_dir):
+        """Check the deprecated keyword of the sequence file path."""
+        sequence = os.path.join(seq_dir, "one_function_node.yaml")
+        with pytest.warns(DeprecationWarning):
+            runner = SequenceRunner(sequence_path=sequence, func_dir=func_dir,
+                                    logger=False)
+        runner.run()
+        assert runner.variables['results'][1].returned == "Hello world!"
+        with pytest.warns(DeprecationWarning), pytest.raises(TypeError):
+            SequenceRunner(sequence, func_dir, logger=False,
+                           sequence_path=sequence)
+
+    def test_constant_folding(self, func_dir, seq_dir):
+        """Check that the run of an optimized sequence gives the same results
+           as without optimization, and that a parallel sync still waits for
+           a pruned transition.
+        """
+        sequence = os.path.join(seq_dir, "constant_folding.yaml")
+        nids = dict()
+        for optimize in (True, False):
+            runner = SequenceRunner(sequence, func_dir, {'debug': False},
+                                    logger=False, optimize=optimize,
+                                    trace=True)
+            runner.run()
+            assert runner.variables['results'][2].returned == "hello world"
+            assert 3 not in runner.variables['results']
+            assert runner.variables['total'] == 6
+            assert runner.variables['label'] == "3"
+            # The sync node waits for node 3 forever
+            assert runner._sync_history[5]
+            nids[optimize] = sorted([a.nid for a in runner.trace.activations])
+        assert runner.simplifications == []
+        runner = SequenceRunner(sequence, func_dir, {'debug': False},
+                                logger=False)
+        assert set([s.kind for s in runner.simplifications]) == {
+            'argument', 'condition', 'pruned transition', 'variable',
+            'variable node', 'unreachable node'}
+        # The variable node 4 has been removed by the optimizer
+        assert nids[False] == [0, 1, 2, 4, 5, 5]
+        assert nids[True] == [0, 1, 2, 5, 5]
+
+    def test_constant_folding_given_constants(self, func_dir, seq_dir):
+        """Check that a transition with a condition always true is kept,
+           with or without optimization.
+        """
+        sequence = os.path.join(seq_dir, "constant_folding.yaml")
+        for optimize in (True, False):
+            runner = SequenceRunner(sequence, func_dir, {'debug': True},
+                                    logger=False, optimize=optimize)
+            runner.run()
+            assert runner.variables['results'][3].returned == "debug"
+            assert runner._sync_history[5] == set()
+        assert runner.simplifications == []
+        assert runner.variables['results'][2].returned == "hello world"
+
+    def test_trace(self, func_dir, seq_dir):
+        """Check that every activation is recorded with its phases and the
+           activations that led to it.
+        """
+        sequence = os.path.join(seq_dir, "constant_folding.yaml")
+        runner = SequenceRunner(sequence, func_dir, {'debug': True},
+                                logger=False, trace=True)
+        runner.run()
+        activations = runner.trace.activations
+        # The variable node 4 has been removed by the optimizer
+        assert sorted([a.nid for a in activations]) == [0, 1, 2, 3, 5, 5, 5,
+                                                        6]
+        by_nid = dict([(a.nid, a) for a in activations])
+        function = by_nid[2]
+        assert function.pid not in (None, os.getpid())
+        timestamps = [function.timestamps[p] for p in (
+            'ready', 'dispatched', 'started', 'pre_done', 'function_done',
+            'post_done', 'received')]
+        assert timestamps == sorted(timestamps)
+        assert function.previous == [by_nid[1].aid]
+        assert set(by_nid[1].timestamps) == {'ready', 'dispatched'}
+        # The stop node is led by every activation of the sync node
+        assert sorted(by_nid[6].previous) == sorted(
+            [a.aid for a in activations if a.nid == 5])
+        assert SequenceRunner(sequence, func_dir, {'debug': False},
+                              logger=False).trace is None
+
+    def test_metrics(self, func_dir, seq_dir):
+        """Check the metrics of a run, and that runners can share them."""
+        sequence = os.path.join(seq_dir, "constant_folding.yaml")
+        registry = MetricsRegistry()
+        for _ in range(2):
+            runner = SequenceRunner(sequence, func_dir, {'debug': False},
+                                    logger=False, metrics=registry)
+            runner.run()
+        assert runner.metrics is registry
+        activations = registry.get('yapyseq_node_activations_total')
+        assert activations.get(type='function') == 2
+        assert activations.get(type='parallel_sync') == 4
+        assert registry.get('yapyseq_function_failures_total').get(
+            function='return_arg') == 0
+        duration = registry.get('yapyseq_function_duration_seconds').get(
+            function='return_arg')
+        assert duration['count'] == 2
+        assert 0 < duration['sum'] < 1
+        assert registry.get('yapyseq_queue_wait_seconds').get(
+            function='return_arg')['count'] == 2
+        assert registry.get('yapyseq_running_nodes').get() == 0
+        assert registry.get('yapyseq_ready_nodes').get() == 0
+        assert SequenceRunner(sequence, func_dir, {'debug': False},
+                              logger=False).metrics is None
+        with pytest.raises(ValueError):
+            SequenceRunner(sequence, func_dir, logger=False, metrics="spam")
+
+    def test_profile(self, func_dir):
+        """Check that functions are profiled per node or for the whole run,
+           and that profiles are not kept in the results.
+        """
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        builder.function("return_hello_world", profile=True).transition(2)
+        builder.function("return_arg", {'arg': '1'},
+                         timeout=10).transition(3)
+        builder.function("return_hello_world", profile=True).transition(4)
+        builder.stop()
+        runner = SequenceRunner(builder, func_dir, logger=False)
+        runner.run()
+        profiles = runner.profiles
+        assert profiles.functions == ['return_hello_world']
+        assert profiles.get_activation_count('return_hello_world') == 2
+        assert runner.variables['results'][1].profile_stats is None
+        assert runner.variables['results'][1].returned == "Hello world!"
+
+        # Functions with a timeout are profiled in their sub-process
+        runner = SequenceRunner(builder, func_dir, logger=False,
+                                profile=True)
+        runner.run()
+        assert runner.profiles.functions == ['return_arg',
+                                             'return_hello_world']
+        stats = runner.profiles.get_stats('return_arg').stats
+        assert 'return_arg' in [func[2] for func in stats]
+
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        builder.function("return_hello_world").transition(2)
+        builder.stop()
+        assert SequenceRunner(builder, func_dir,
+                              logger=False).profiles is None
+
+    def test_resources(self, func_dir):
+        """Check that results carry the resources of their node, that
+           conditions can read them, and that they are added up per node.
+        """
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        builder.variable({'count': '0'}, nid=1).transition(2)
+        builder.function("allocate", {'size': '10 ** 7'}, nid=2)
+        builder.transition(3, "results[2].resources.memory_peak >= 10 ** 7 "
+                              "and count < 1")
+        builder.transition(4, "results[2].resources.memory_peak < 10 ** 7 "
+                              "or count >= 1")
+        builder.variable({'count': 'count + 1'}, nid=3).transition(2)
+        builder.stop(nid=4)
+        runner = SequenceRunner(builder, func_dir, logger=False,
+                                trace_memory=True)
+        runner.run()
+        assert runner.variables['count'] == 1
+        resources = runner.variables['results'][2].resources
+        assert resources.wall_time > 0
+        assert resources.user_time >= 0 and resources.system_time >= 0
+        assert resources.max_rss > 10 ** 7
+        totals = runner.resources[2]
+        assert totals.activations == 2
+        assert totals.wall_time > resources.wall_time
+        assert totals.memory_peak == resources.memory_peak
+        summary = runner.get_resource_summary()
+        assert 'Nodes by memory peak:' in summary
+        assert any('Node 2 (allocate) (2 activation(s))' in line
+                   for line in summary)
+
+        # Without tracemalloc, the memory peak is not measured
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        builder.function("allocate", {'size': '10'}, nid=1).transition(2)
+        builder.stop()
+        runner = SequenceRunner(builder, func_dir, logger=False)
+        runner.run()
+        assert runner.variables['results'][1].resources.memory_peak is None
+        assert 'Nodes by memory peak:' not in runner.get_resource_summary()
+
     def test_multiple_variable_nodes(self, func_dir, seq_dir):
         """Check that variable nodes correctly update the sequence variables."""
         sequence = os.path.join(seq_dir, "multiple_variable_nodes.yaml")
@@ -59,6 +270,33 @@ class TestSequenceRunner(object):
         assert type(results[1].exception.function) is NodeFunctionTimeout
         assert results[2].exception is None
 
+    def test_timeout_metrics(self, func_dir, seq_dir):
+        """Check that timeouts are counted as timeouts and failures."""
+        sequence = os.path.join(seq_dir, "timeout.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False,
+                                metrics=True)
+        runner.run()
+        function = "return_timestamp_after_sleep"
+        assert runner.metrics.get('yapyseq_function_timeouts_total').get(
+            function=function) == 1
+        assert runner.metrics.get('yapyseq_function_failures_total').get(
+            function=function) == 1
+
+    def test_resource_limits(self, func_dir, seq_dir):
+        """Check that the memory and CPU time limits of function nodes give
+           their own exceptions, and that the run goes on.
+        """
+        sequence = os.path.join(seq_dir, "resource_limits.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False)
+        runner.run()
+        results = runner.variables['results']
+        assert type(results[1].exception.function) is NodeMemoryLimitExceeded
+        assert type(results[2].exception.function) is \
+            NodeCpuTimeLimitExceeded
+        assert results[2].resources.user_time < 5
+        assert results[3].exception is None
+        assert results[3].returned == 10 ** 6
+
     def test_conditional_transitions(self, func_dir, seq_dir):
         sequence = os.path.join(seq_dir, "multiple_function_nodes.yaml")
         runner = SequenceRunner(sequence, func_dir, logger=False)
@@ -82,6 +320,14 @@ class TestSequenceRunner(object):
         for nid in range(*nid_range):
             assert results[nid].returned < results[nid + 1].returned
 
+    def test_sync_after_variable_node(self, func_dir, seq_dir):
+        """Check that a variable node can be synchronized."""
+        sequence = os.path.join(seq_dir, "variable_sync.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False)
+        runner.run()
+        assert 5 in runner.variables['results']
+        assert runner._sync_history[4] == set()
+
     def test_simple_loop(self, func_dir, seq_dir):
         """Check that a simple loop can be achieved."""
         result_file = "tests/sequencerunner/loop_file.txt"
@@ -135,3 +381,57 @@ class TestSequenceRunner(object):
         assert isinstance(runner.variables["results"][
                           1].exception.wrappers.cause,
                           RuntimeError)
+
+    def test_lazy_import(self, func_dir, seq_dir):
+        """Check that functions are imported when their node is dispatched."""
+        sequence = os.path.join(seq_dir, "wrappers.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False,
+                                import_mode=ImportMode.LAZY)
+        function_callable, wrapper_classes = runner._callables[2]
+        assert isinstance(function_callable, ItemReference)
+        assert all(isinstance(c, ItemReference)
+                   for c in wrapper_classes.values())
+        runner.run()
+        os.remove("tests/sequencerunner/wrap.txt")
+        assert callable(runner._callables[2][0])
+        assert runner.variables["results"][2].returned == "FOO"
+
+    def test_worker_import(self, func_dir, seq_dir):
+        """Check that functions are only imported in node processes."""
+        sequence = os.path.join(seq_dir, "one_function_node.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False,
+                                import_mode=ImportMode.WORKER)
+        runner.run()
+        assert isinstance(runner._callables[1][0], ItemReference)
+        assert runner.variables["results"][1].returned == "Hello world!"
+
+    def test_worker_import_error(self, func_dir, seq_dir):
+        """Check that an import error in a node process is a node result."""
+        sequence = os.path.join(seq_dir, "import_error.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False,
+                                import_mode=ImportMode.WORKER)
+        runner.run()
+        result = runner.variables["results"][1]
+        assert isinstance(result.exception.function, ImportError)
+
+    def test_lazy_import_error(self, func_dir, seq_dir):
+        """Check that an import error at dispatch is a node result."""
+        sequence = os.path.join(seq_dir, "import_error.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False,
+                                import_mode=ImportMode.LAZY, trace=True)
+        runner.run()
+        assert runner.status is SeqRunnerStatus.STOPPED
+        result = runner.variables["results"][1]
+        assert isinstance(result.exception.function, ImportError)
+        assert result.exception.function.name == "ImportError"
+        assert sorted([a.nid for a in runner.trace.activations]) == [0, 1, 2]
+
+    def test_qualified_names(self, func_dir, seq_dir):
+        """Check functions and wrappers given as "package.module:name"."""
+        sequence = os.path.join(seq_dir, "qualified_names.yaml")
+        runner = SequenceRunner(sequence, func_dir, logger=False)
+        runner.run()
+        results = runner.variables["results"]
+        assert results[1].exception is None
+        assert results[1].returned == "egg"
+        assert results[2].returned == "Hello world!"
@@ -0,0 +1,20 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import os
+import shutil
+import pytest
+
+
+@pytest.fixture
+def seq_path():
+    return os.path.abspath(
+        "tests/sequencerunner/sequences/one_function_node.yaml")
+
+
+@pytest.fixture
+def func_dir(tmp_path):
+    """Copy of the functions of the runner tests, that tests can modify."""
+    directory = str(tmp_path / "functions")
+    shutil.copytree("tests/sequencerunner/functions", directory)
+    return directory
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import logging
+import os
+import pytest
+from yapyseq.server import SequenceServer, ServerError, submit_request
+
+
+def run_request(seq_path, func_dir, **kwargs):
+    request = {'command': 'run', 'sequence': seq_path,
+               'function_dir': func_dir}
+    request.update(kwargs)
+    return request
+
+
+class TestSequenceServer(object):
+
+    def test_ping(self, server):
+        response = submit_request({'command': 'ping'}, server.socket_path)
+        assert response == {'status': 'ok', 'pid': os.getpid()}
+
+    def test_run(self, server, seq_path, func_dir):
+        response = submit_request(run_request(seq_path, func_dir),
+                                  server.socket_path)
+        assert list(response['results']) == ['1']
+        node_result = response['results']['1']
+        assert node_result['returned'] == repr("Hello world!")
+        assert node_result['exception'] is None
+        assert set(node_result['resources']) == {
+            'wall_time', 'user_time', 'system_time', 'max_rss', 'memory_peak'}
+        assert response['duration'] > 0
+
+    @pytest.mark.parametrize("import_mode", ["eager", "lazy", "worker"])
+    def test_run_import_modes(self, server, seq_path, func_dir, import_mode):
+        response = submit_request(
+            run_request(seq_path, func_dir, import_mode=import_mode),
+            server.socket_path)
+        assert response['results']['1']['returned'] == repr("Hello world!")
+
+    def test_run_keeps_reader(self, server, seq_path, func_dir):
+        submit_request(run_request(seq_path, func_dir), server.socket_path)
+        reader = server._readers[os.path.realpath(seq_path)][2]
+        submit_request(run_request(seq_path, func_dir), server.socket_path)
+        assert server._readers[os.path.realpath(seq_path)][2] is reader
+
+    def test_run_reloads_modified_function(self, server, seq_path, func_dir):
+        # Modules are imported by file name: use a name not imported by other
+        # tests
+        func_path = os.path.join(func_dir, "reloaded_functions.py")
+        os.rename(os.path.join(func_dir, "functions.py"), func_path)
+        submit_request(run_request(seq_path, func_dir), server.socket_path)
+        with open(func_path) as f:
+            content = f.read()
+        with open(func_path, 'w') as f:
+            f.write(content.replace('"Hello world!"', '"Hello again, world!"'))
+        response = submit_request(run_request(seq_path, func_dir),
+                                  server.socket_path)
+        assert response['results']['1']['returned'] == repr(
+            "Hello again, world!")
+
+    def test_run_relative_path(self, server, func_dir):
+        with pytest.raises(ServerError, match="absolute"):
+            submit_request(run_request(
+                "tests/sequencerunner/sequences/one_function_node.yaml",
+                func_dir), server.socket_path)
+
+    def test_unknown_command(self, server):
+        with pytest.raises(ServerError, match="ValueError"):
+            submit_request({'command': 'foo'}, server.socket_path)
+
+    def test_second_server(self, server):
+        with pytest.raises(OSError):
+            SequenceServer(server.socket_path).serve_forever()
+
+    def test_no_server(self, tmp_path):
+        with pytest.raises(OSError):
+            submit_request({'command': 'ping'}, str(tmp_path / "none.sock"))
+
+    def test_default_logger(self, tmp_path):
+        """Servers without logger share a logger with a single NullHandler.
+        """
+        servers = [SequenceServer(str(tmp_path / "{}.sock".format(i)))
+                   for i in range(2)]
+        assert servers[0].logger is servers[1].logger
+        assert len([h for h in servers[0].logger.handlers
+                    if type(h) is logging.NullHandler]) == 1
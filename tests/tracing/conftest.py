@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import pytest
+from yapyseq.nodes import StartNode, FunctionNode, NodeTimings
+from yapyseq.tracing import TraceRecorder
+
+
+@pytest.fixture
+def recorder():
+    """A recorder with a start node followed by a function node."""
+    recorder = TraceRecorder(pid=100)
+    start = StartNode(0, [{'target': 1}])
+    function = FunctionNode(1, "spam", [{'target': 2}], name="Spam node")
+    aid = recorder.new_activation(start, [], 10.0)
+    recorder.mark(aid, 'dispatched', 10.001)
+    aid = recorder.new_activation(function, [aid], 10.001)
+    recorder.mark(aid, 'dispatched', 10.002)
+    recorder.add_node_timings(aid, NodeTimings(200, 10.01, 10.02, 10.5, 10.6))
+    recorder.mark(aid, 'received', 10.61)
+    return recorder
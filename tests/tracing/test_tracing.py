@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+import json
+import pytest
+from yapyseq.nodes import StopNode, NodeTimings
+from yapyseq.tracing import *
+
+
+class TestTraceRecorder(object):
+
+    def test_activations(self, recorder):
+        start, function = recorder.activations
+        assert (start.aid, start.node_type, start.pid) == (0, 'start', None)
+        assert function.to_dict() == {
+            'activation': 1, 'nid': 1, 'type': 'function',
+            'label': 'Spam node (spam)', 'previous': [0], 'pid': 200,
+            'timestamps': {'ready': 10.001, 'dispatched': 10.002,
+                           'started': 10.01, 'pre_done': 10.02,
+                           'function_done': 10.5, 'post_done': 10.6,
+                           'received': 10.61}}
+
+    def test_missing_timings(self, recorder):
+        """Phases that did not happen are not recorded."""
+        aid = recorder.new_activation(StopNode(2), [1], 11.0)
+        recorder.add_node_timings(aid, None)
+        recorder.add_node_timings(aid, NodeTimings(300, 11.1, None, None,
+                                                   None))
+        assert recorder.activations[aid].timestamps == {'ready': 11.0,
+                                                        'started': 11.1}
+
+    def test_chrome_trace(self, recorder):
+        events = recorder.to_chrome_trace('seq')['traceEvents']
+        spans = dict([(e['name'], e) for e in events if e['ph'] == 'X'])
+        assert set(spans) == {'Spam node (spam)'} | set(
+            [name for name, _, _ in FUNCTION_SPANS])
+        # Phases of the function node are on the track of its process
+        assert set([e['tid'] for e in spans.values()]) == {200}
+        assert spans['function']['ts'] == pytest.approx(10020000)
+        assert spans['function']['dur'] == pytest.approx(480000)
+        assert spans['Spam node (spam)']['dur'] == pytest.approx(609000)
+        instants = [e for e in events if e['ph'] == 'i']
+        assert len(instants) == 1
+        assert instants[0]['tid'] == 100
+        assert instants[0]['args']['activation'] == 0
+
+    def test_write_chrome_trace(self, recorder, tmp_path):
+        path = str(tmp_path / "trace.json")
+        recorder.write_chrome_trace(path, 'seq')
+        with open(path) as f:
+            assert json.load(f) == json.loads(json.dumps(
+                recorder.to_chrome_trace('seq')))
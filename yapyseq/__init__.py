@@ -1,9 +1,47 @@
-from .functiongrabber import FunctionGrabber
-from .sequencerunner import SequenceRunner
-from .sequencereader import SequenceReader
-
-from .functiongrabber import ItemUniquenessError, ItemExistenceError, \
-                             UnknownItem
-from .sequencerunner import UnknownNodeTypeError, ReadOnlyError
-from .sequencereader import SequenceFileError
-from .common import NodeWrapper
+"""
+Public API of yapyseq.
+
+Objects are imported from their module the first time they are accessed, so
+that importing yapyseq, for instance to run its command line, does not import
+heavy dependencies like ruamel.yaml, yamale or multiprocessing.
+"""
+
+from importlib import import_module
+
+# Keys are the names of the public objects, values are their modules
+_PUBLIC_OBJECTS = {
+    'FunctionGrabber': 'functiongrabber',
+    'FunctionIndex': 'functiongrabber',
+    'SequenceRunner': 'sequencerunner',
+    'SequenceReader': 'sequencereader',
+    'SequenceBuilder': 'sequencebuilder',
+
+    'ItemUniquenessError': 'functiongrabber',
+    'ItemExistenceError': 'functiongrabber',
+    'UnknownItem': 'functiongrabber',
+    'UnknownNodeTypeError': 'sequencerunner',
+    'ReadOnlyError': 'sequencerunner',
+    'ImportMode': 'common',
+    'SequenceFileError': 'sequencereader',
+    'SequenceStructureError': 'sequencereader',
+    'SequenceBuilderError': 'sequencebuilder',
+    'NodeWrapper': 'common',
+    'DropPolicy': 'events',
+}
+
+__all__ = list(_PUBLIC_OBJECTS)
+
+
+def __getattr__(name):
+    """Import a public object the first time it is accessed."""
+    if name not in _PUBLIC_OBJECTS:
+        raise AttributeError("module {!r} has no attribute {!r}".format(
+            __name__, name))
+    value = getattr(import_module('.' + _PUBLIC_OBJECTS[name], __name__),
+                    name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(list(globals()) + __all__))
@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Analysis of the activations recorded during a run (see `yapyseq.tracing`).
+
+Activations and the activations that led to them form a graph without cycle,
+rebuilt from a trace file with `load_activations`. `analyze` finds in it:
+    * the critical path: the chain of activations that determined the
+      duration of the run. Making any other activation faster does not make
+      the run shorter.
+    * the slack of every activation: how much longer it could have been
+      without making the run longer.
+    * the idle time of the workers, the processes of function nodes: the part
+      of their life spent starting and sending their result, instead of
+      running the wrappers and the function.
+    * the time spent in each category of CATEGORIES, for the whole run and
+      on the critical path. Categories other than FUNCTION_CATEGORIES are the
+      overhead of the runner.
+
+The cost of an activation is the time from the end of the last activation
+that led to it, to its own end. The end of a function node is the reception
+of its result, the end of another node is its processing by the runner.
+"""
+
+from typing import Dict, List, Union
+from collections import namedtuple, OrderedDict
+import json
+
+# ------------------------------------------------------------------------------
+# Custom exception for this module
+# ------------------------------------------------------------------------------
+
+
+class TraceFileError(ValueError):
+    """Raised when a trace file does not contain activations."""
+
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# Use of a worker, the process of one activation of a function node:
+#   * lifetime: from the start of the process to the reception of its result.
+#   * busy: time spent in the wrappers and the function.
+WorkerUsage = namedtuple("WorkerUsage", "aid nid label pid lifetime busy")
+
+# Result of `analyze`:
+#   * start, duration: start of the run (time.time()) and duration in seconds.
+#   * activations: dictionary where keys are IDs of activations and values
+#     their descriptions (see `Activation.to_dict`).
+#   * critical_path: IDs of the activations of the critical path, in order.
+#   * slack: dictionary where keys are IDs of activations and values their
+#     slack in seconds.
+#   * breakdown, critical_breakdown: dictionaries where keys are CATEGORIES
+#     and values the time spent in them, in seconds, by every activation and
+#     on the critical path.
+#   * workers: list of WorkerUsage namedtuples.
+RunAnalysis = namedtuple("RunAnalysis",
+                         "start duration activations critical_path slack "
+                         "breakdown critical_breakdown workers")
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Categories of time. The time between two recorded phases of an activation
+# goes to the category of the later phase. 'transition' is the time between
+# the end of the previous activations and the node getting ready.
+CATEGORIES = OrderedDict([('transition', None),
+                          ('queued', 'dispatched'),
+                          ('process start', 'started'),
+                          ('wrappers pre', 'pre_done'),
+                          ('function', 'function_done'),
+                          ('wrappers post', 'post_done'),
+                          ('result transfer', 'received')])
+
+# Categories of the execution of the functions of the sequence. Others are the
+# overhead of the runner.
+FUNCTION_CATEGORIES = ('wrappers pre', 'function', 'wrappers post')
+
+# Phases of an activation, in chronological order (see yapyseq.tracing)
+_PHASES = ('ready', 'dispatched', 'started', 'pre_done', 'function_done',
+           'post_done', 'received')
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def load_activations(path: str) -> List[Dict]:
+    """Read the activations of a trace file written by `yapyseq run --trace`.
+
+    Args:
+        path: the path of the Chrome trace file.
+
+    Returns:
+        The descriptions of the activations, sorted by ID. See
+        `Activation.to_dict`.
+
+    Raises:
+        TraceFileError: if the file is not a trace of yapyseq.
+    """
+    with open(path) as f:
+        try:
+            trace = json.load(f)
+        except ValueError as exc:
+            raise TraceFileError("{} is not a JSON file: {}".format(path, exc))
+    events = trace.get('traceEvents') if isinstance(trace, dict) else trace
+    if not isinstance(events, list):
+        raise TraceFileError("{} is not a Chrome trace.".format(path))
+    activations = dict()
+    for event in events:
+        args = event.get('args') if isinstance(event, dict) else None
+        # Spans of phases only give the ID of their activation
+        if isinstance(args, dict) and 'timestamps' in args:
+            activations[args['activation']] = args
+    if not activations:
+        raise TraceFileError("{} does not contain any activation of "
+                             "node.".format(path))
+    return [activations[aid] for aid in sorted(activations)]
+
+
+def get_end_time(activation: Dict) -> float:
+    """Get the end of an activation, the time of its last recorded phase.
+
+    Args:
+        activation: the description of the activation.
+
+    Returns:
+        A timestamp (time.time()).
+    """
+    timestamps = activation['timestamps']
+    return max([timestamps[p] for p in _PHASES if p in timestamps])
+
+
+def analyze(activations: List[Dict]) -> RunAnalysis:
+    """Find the critical path, the slacks and the overhead of a run.
+
+    Args:
+        activations: the descriptions of the activations, see
+            `load_activations`, or `Activation.to_dict` for the activations of
+            `SequenceRunner.trace`.
+
+    Returns:
+        A RunAnalysis namedtuple.
+
+    Raises:
+        TraceFileError: if there is no activation, or if an activation is led
+            by an unknown one.
+    """
+    if not activations:
+        raise TraceFileError("There is no activation to analyze.")
+    by_id = OrderedDict([(a['activation'], a) for a in
+                         sorted(activations, key=lambda a: a['activation'])])
+    successors: Dict[int, List[int]] = dict([(aid, []) for aid in by_id])
+    for aid, activation in by_id.items():
+        for previous in activation['previous']:
+            if previous not in by_id:
+                raise TraceFileError(
+                    "Activation {} is led by the unknown activation "
+                    "{}.".format(aid, previous))
+            successors[previous].append(aid)
+    start = min([a['timestamps']['ready'] for a in by_id.values()])
+    end = dict([(aid, get_end_time(a)) for aid, a in by_id.items()])
+
+    # Forward pass: activations are led by activations of lower IDs, so IDs
+    # are a topological order. The earliest finish is the observed end.
+    cost, trigger = dict(), dict()
+    for aid, activation in by_id.items():
+        previous = activation['previous']
+        trigger[aid] = max(previous, key=lambda p: (end[p], p)) \
+            if previous else None
+        origin = start if trigger[aid] is None else end[trigger[aid]]
+        cost[aid] = max(end[aid] - origin, 0)
+    finish = dict()
+    for aid, activation in by_id.items():
+        finish[aid] = max([finish[p] for p in activation['previous']] or
+                          [0]) + cost[aid]
+    duration = max(finish.values())
+
+    # Backward pass: latest finish that does not delay the end of the run
+    latest = dict()
+    for aid in reversed(by_id):
+        latest[aid] = min([latest[s] - cost[s] for s in successors[aid]] or
+                          [duration])
+    # Timestamps of traces are rounded to the microsecond
+    slack = dict([(aid, max(round(latest[aid] - finish[aid], 6), 0))
+                  for aid in by_id])
+
+    # The critical path ends with the last activation, and goes back through
+    # the activations that led to each one last
+    critical_path = [max(by_id, key=lambda aid: (finish[aid], aid))]
+    while trigger[critical_path[-1]] is not None:
+        critical_path.append(trigger[critical_path[-1]])
+    critical_path.reverse()
+
+    breakdown = _new_breakdown()
+    critical_breakdown = _new_breakdown()
+    workers = []
+    for aid, activation in by_id.items():
+        times = _get_category_times(activation, end, trigger[aid], start)
+        for category, value in times.items():
+            breakdown[category] += value
+        if activation['type'] == 'function':
+            ts = activation['timestamps']
+            first = ts.get('dispatched', ts['ready'])
+            lifetime = end[aid] - first
+            busy = sum([times[c] for c in FUNCTION_CATEGORIES])
+            workers.append(WorkerUsage(aid, activation['nid'],
+                                       activation['label'],
+                                       activation.get('pid'), lifetime, busy))
+    for aid in critical_path:
+        times = _get_category_times(by_id[aid], end, trigger[aid], start)
+        for category, value in times.items():
+            critical_breakdown[category] += value
+
+    return RunAnalysis(start, duration, by_id, critical_path, slack,
+                       breakdown, critical_breakdown, workers)
+
+
+def get_node_slack(analysis: RunAnalysis) -> Dict[int, float]:
+    """Get the slack of every node, the minimum of its activations.
+
+    Args:
+        analysis: the result of `analyze`.
+
+    Returns:
+        A dictionary where keys are node IDs and values slacks in seconds.
+    """
+    node_slack = dict()
+    for aid, activation in analysis.activations.items():
+        nid = activation['nid']
+        node_slack[nid] = min(node_slack.get(nid, analysis.slack[aid]),
+                              analysis.slack[aid])
+    return node_slack
+
+
+def get_overhead(breakdown: Dict[str, float]) -> float:
+    """Get the overhead of the runner in a breakdown of time.
+
+    Args:
+        breakdown: dictionary where keys are CATEGORIES and values times.
+
+    Returns:
+        The time of the categories that are not FUNCTION_CATEGORIES.
+    """
+    return sum([value for category, value in breakdown.items()
+                if category not in FUNCTION_CATEGORIES])
+
+
+def format_analysis(analysis: RunAnalysis, top: int = 10) -> List[str]:
+    """Describe the analysis of a run in a human readable way.
+
+    Args:
+        analysis: the result of `analyze`.
+        top: (optional) the number of nodes and workers listed.
+
+    Returns:
+        Lines of text.
+    """
+    lines = ['Run of {:.3f} s, {} activation(s).'.format(
+        analysis.duration, len(analysis.activations))]
+
+    lines.append('')
+    lines.append('Critical path ({} activation(s)):'.format(
+        len(analysis.critical_path)))
+    for aid in analysis.critical_path:
+        activation = analysis.activations[aid]
+        lines.append('  {:>10}  {:>10}  {}'.format(
+            '+{:.3f} s'.format(activation['timestamps']['ready'] -
+                               analysis.start),
+            '{:.3f} s'.format(get_end_time(activation) -
+                              activation['timestamps']['ready']),
+            activation['label']))
+
+    for title, breakdown, total in (
+            ('Time on the critical path:', analysis.critical_breakdown,
+             analysis.duration),
+            ('Time of all the activations:', analysis.breakdown,
+             sum(analysis.breakdown.values()))):
+        lines.append('')
+        lines.append(title)
+        overhead = get_overhead(breakdown)
+        for category, value in list(breakdown.items()) + [
+                ('function execution', total - overhead),
+                ('runner overhead', overhead)]:
+            lines.append('  {:<20} {:>10}  {:>6}'.format(
+                category, '{:.3f} s'.format(value), _percent(value, total)))
+
+    node_slack = get_node_slack(analysis)
+    labels = dict([(a['nid'], a['label'])
+                   for a in analysis.activations.values()])
+    lines.append('')
+    lines.append('Nodes with the least slack:')
+    for nid, value in sorted(node_slack.items(),
+                             key=lambda item: (item[1], item[0]))[:top]:
+        lines.append('  {:>10}  {}{}'.format(
+            '{:.3f} s'.format(value), labels[nid],
+            ' (critical)' if value == 0 else ''))
+
+    if analysis.workers:
+        lifetime = sum([w.lifetime for w in analysis.workers])
+        busy = sum([w.busy for w in analysis.workers])
+        lines.append('')
+        lines.append('Workers idle {} of their life ({} worker(s)). '
+                     'Most idle:'.format(_percent(lifetime - busy, lifetime),
+                                         len(analysis.workers)))
+        for worker in sorted(analysis.workers,
+                             key=lambda w: (-_idle(w), w.aid))[:top]:
+            lines.append('  {:>6}  {} (pid {}, {:.3f} s)'.format(
+                _percent(_idle(worker), 1), worker.label, worker.pid,
+                worker.lifetime))
+    return lines
+
+
+def analysis_to_dict(analysis: RunAnalysis) -> Dict:
+    """Describe the analysis of a run with JSON types.
+
+    Args:
+        analysis: the result of `analyze`.
+
+    Returns:
+        A dictionary that can be written as JSON.
+    """
+    return {
+        'duration': analysis.duration,
+        'activations': len(analysis.activations),
+        'critical_path': [{'activation': aid,
+                           'nid': analysis.activations[aid]['nid'],
+                           'label': analysis.activations[aid]['label']}
+                          for aid in analysis.critical_path],
+        'slack': dict([(str(aid), value)
+                       for aid, value in analysis.slack.items()]),
+        'node_slack': dict([(str(nid), value) for nid, value in
+                            get_node_slack(analysis).items()]),
+        'breakdown': dict(analysis.breakdown),
+        'critical_breakdown': dict(analysis.critical_breakdown),
+        'overhead': get_overhead(analysis.breakdown),
+        'critical_overhead': get_overhead(analysis.critical_breakdown),
+        'workers': [dict(w._asdict(), idle=_idle(w))
+                    for w in analysis.workers]}
+
+
+# ------------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------------
+
+
+def _new_breakdown() -> Dict[str, float]:
+    """Create a breakdown of time with every category at 0."""
+    return OrderedDict([(category, 0.0) for category in CATEGORIES])
+
+
+def _get_category_times(activation: Dict, end: Dict[int, float],
+                        trigger: Union[int, None],
+                        start: float) -> Dict[str, float]:
+    """Split the cost of an activation among CATEGORIES.
+
+    Args:
+        activation: the description of the activation.
+        end: dictionary where keys are IDs of activations and values their
+            ends.
+        trigger: the ID of the activation that led to this one last, or None.
+        start: the start of the run.
+
+    Returns:
+        A dictionary where keys are categories and values times in seconds.
+    """
+    times = _new_breakdown()
+    timestamps = activation['timestamps']
+    origin = start if trigger is None else end[trigger]
+    times['transition'] = max(timestamps['ready'] - origin, 0)
+    phase_categories = dict([(phase, category)
+                             for category, phase in CATEGORIES.items()])
+    previous = max(timestamps['ready'], origin)
+    for phase in _PHASES[1:]:
+        if phase in timestamps:
+            times[phase_categories[phase]] += max(timestamps[phase] -
+                                                  previous, 0)
+            previous = max(timestamps[phase], previous)
+    return times
+
+
+def _idle(worker: WorkerUsage) -> float:
+    """Get the idle fraction of the life of a worker."""
+    if worker.lifetime <= 0:
+        return 0.0
+    return max(worker.lifetime - worker.busy, 0) / worker.lifetime
+
+
+def _percent(value: float, total: float) -> str:
+    """Format a part of a total as a percentage."""
+    return '{:.1f} %'.format(100 * value / total if total else 0)
@@ -0,0 +1,14 @@
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmarks of the internal overhead of yapyseq.
+
+Every module of this package can be run as a script, for instance:
+
+    python -m yapyseq.benchmarks.discovery --help
+
+The suite of `suite.py`, run by `yapyseq bench`, measures the whole runner
+on the sequences of `generators.py` and compares them with a baseline.
+"""
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the footprint of the runner process for each import mode.
+
+A function directory is generated with a module whose import is slow and
+allocates a large amount of memory, like modules depending on big
+libraries. A sequence running one of its functions is then initialized and run
+with every `ImportMode`, each time in a fresh interpreter. The startup time
+(initialization of the `SequenceRunner`) and the peak RSS of the runner process
+are reported.
+"""
+
+from typing import Dict
+import multiprocessing as mp
+import os
+import resource
+import tempfile
+import time
+
+import click
+
+from yapyseq.sequencerunner import SequenceRunner, ImportMode
+
+HEAVY_MODULE = '''\
+import time
+
+# Emulate a module with heavy dependencies
+time.sleep({import_time})
+BALLAST = b"x" * {ballast_size}
+
+
+def heavy_function():
+    return len(BALLAST)
+'''
+
+SEQUENCE = '''\
+sequence:
+  nodes:
+  - id: 0
+    type: start
+    transitions:
+    - target: 1
+  - id: 1
+    type: function
+    function: heavy_function
+    transitions:
+    - target: 2
+  - id: 2
+    type: stop
+'''
+
+
+def make_function_dir(directory: str, import_time: float,
+                      ballast_mb: int) -> str:
+    """Write the heavy module and the sequence in a directory.
+
+    Args:
+        directory: Directory where files are written.
+        import_time: Duration of the import of the heavy module, in seconds.
+        ballast_mb: Memory allocated by the heavy module, in MB.
+
+    Returns:
+        The path to the sequence file.
+    """
+    with open(os.path.join(directory, 'heavy.py'), 'w') as f:
+        f.write(HEAVY_MODULE.format(import_time=import_time,
+                                    ballast_size=ballast_mb * 1024 * 1024))
+    seq_path = os.path.join(directory, 'heavy.yaml')
+    with open(seq_path, 'w') as f:
+        f.write(SEQUENCE)
+    return seq_path
+
+
+def _measure(seq_path: str, func_dir: str, mode_name: str,
+             queue: mp.Queue) -> None:
+    """Run the sequence and put the measures in the queue.
+
+    Must be called in a fresh process to get a meaningful peak RSS.
+    """
+    start = time.perf_counter()
+    runner = SequenceRunner(seq_path, func_dir, logger=False,
+                            import_mode=ImportMode[mode_name])
+    startup = time.perf_counter() - start
+    runner.run()
+    total = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux, and does not include children
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    queue.put({'startup': startup, 'total': total, 'max_rss_mb': max_rss})
+
+
+def run_benchmark(seq_path: str, func_dir: str) -> Dict[str, Dict]:
+    """Measure the runner process for every import mode.
+
+    Args:
+        seq_path: Path to the sequence generated by `make_function_dir`.
+        func_dir: The function directory.
+
+    Returns:
+        A dictionary where keys are the names of the import modes and values
+        are dictionaries of measures.
+    """
+    # Spawn a new interpreter for each mode, so that nothing is inherited
+    ctx = mp.get_context('spawn')
+    measures = dict()
+    for mode in ImportMode:
+        queue = ctx.Queue()
+        process = ctx.Process(target=_measure,
+                              args=(seq_path, func_dir, mode.name, queue))
+        process.start()
+        measures[mode.name.lower()] = queue.get()
+        process.join()
+    return measures
+
+
+@click.command()
+@click.option('--import-time', default=0.5, show_default=True,
+              help='Duration of the import of the heavy module, in seconds.')
+@click.option('--ballast', default=200, show_default=True,
+              help='Memory allocated by the heavy module, in MB.')
+def main(import_time, ballast):
+    """Compare the runner process footprint of the import modes."""
+    with tempfile.TemporaryDirectory() as directory:
+        seq_path = make_function_dir(directory, import_time, ballast)
+        measures = run_benchmark(seq_path, directory)
+    click.echo('{:<8} {:>12} {:>12} {:>16}'.format(
+        'mode', 'startup (s)', 'total (s)', 'runner RSS (MB)'))
+    for mode, m in measures.items():
+        click.echo('{:<8} {:>12.3f} {:>12.3f} {:>16.1f}'.format(
+            mode, m['startup'], m['total'], m['max_rss_mb']))
+
+
+if __name__ == '__main__':
+    main()
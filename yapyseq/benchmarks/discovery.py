@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the discovery of functions in a function directory.
+
+A synthetic tree of Python modules is generated, then the following
+approaches are compared:
+    * mmap+regex: the historical approach of `FunctionGrabber`, one regex
+      search per file and per item type, run sequentially.
+    * ast (cold): `FunctionIndex.update()` without any cache, every file is
+      parsed.
+    * ast (warm): `FunctionIndex.update()` with a cache file that is up to
+      date, no file is read.
+"""
+
+from typing import Dict, Set
+import mmap
+import os
+import re
+import tempfile
+import time
+
+import click
+
+from yapyseq.functiongrabber import FunctionIndex
+
+# Template of a generated module. Each module has its own function and class
+# names so that every item is unique in the tree.
+MODULE_TEMPLATE = '''\
+import os
+
+
+def function_{i}_a(arg):
+    """Dummy function."""
+    return os.path.join(str(arg), "a")
+
+
+@staticmethod
+def function_{i}_b(arg):
+    return [x * 2 for x in range(arg)]
+
+
+async def function_{i}_c():
+    return None
+
+
+class Wrapper{i}(object):
+    def pre(self):
+        return "{i}"
+
+    def post(self):
+        pass
+'''
+
+
+def make_tree(directory: str, modules: int, per_dir: int = 100) -> None:
+    """Generate a tree of Python modules.
+
+    Args:
+        directory: Directory where modules are written.
+        modules: Number of modules to generate.
+        per_dir: Number of modules in each sub-directory.
+    """
+    for i in range(modules):
+        sub_dir = os.path.join(directory, 'pkg_{}'.format(i // per_dir))
+        os.makedirs(sub_dir, exist_ok=True)
+        with open(os.path.join(sub_dir, 'mod_{}.py'.format(i)), 'w') as f:
+            f.write(MODULE_TEMPLATE.format(i=i))
+
+
+def search_mmap_regex(directory: str, item_set: Set,
+                      item_type: str) -> Dict[str, int]:
+    """Count the items of a directory, the way FunctionGrabber used to.
+
+    Args:
+        directory: The directory to search in.
+        item_set: Names of the items to search for.
+        item_type: "function" or "class".
+
+    Returns:
+        A dictionary where keys are item names and values the number of files
+        defining them.
+    """
+    type_pattern = "def" if item_type == "function" else "class"
+    spattern = r"^{} (".format(type_pattern)
+    for item in item_set:
+        spattern = spattern + "{}|".format(item)
+    spattern = spattern + r")\s*\("
+    bpattern = bytes(spattern, "utf-8")
+
+    counter_dict = dict([(i, 0) for i in item_set])
+    for (path, dir_list, file_list) in os.walk(directory):
+        for file_name in file_list:
+            if file_name.endswith(".py"):
+                file_path = os.path.join(path, file_name)
+                with open(file_path, 'rb', 0) as f:
+                    with mmap.mmap(f.fileno(), 0,
+                                   access=mmap.ACCESS_READ) as mfile:
+                        found = re.findall(bpattern, mfile, re.MULTILINE)
+                for item in found:
+                    counter_dict[item.decode('utf-8')] += 1
+    return counter_dict
+
+
+def run_benchmark(directory: str, modules: int) -> Dict[str, float]:
+    """Run the discovery benchmark on a directory generated beforehand.
+
+    Args:
+        directory: Directory generated by `make_tree`.
+        modules: Number of modules in the directory.
+
+    Returns:
+        A dictionary where keys are the names of the approaches and values the
+        durations in seconds.
+    """
+    # Items are picked in the whole tree, as a sequence would do
+    functions = set(['function_{}_a'.format(i)
+                     for i in range(0, modules, max(1, modules // 50))])
+    wrappers = set(['Wrapper{}'.format(i)
+                    for i in range(0, modules, max(1, modules // 10))])
+    durations = dict()
+
+    start = time.perf_counter()
+    search_mmap_regex(directory, functions, "function")
+    search_mmap_regex(directory, wrappers, "class")
+    durations['mmap+regex'] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache_path = os.path.join(cache_dir, 'index.json')
+
+        start = time.perf_counter()
+        index = FunctionIndex(directory, cache_path)
+        index.update()
+        index.locate(functions, "function")
+        index.locate(wrappers, "class")
+        durations['ast (cold)'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        index = FunctionIndex(directory, cache_path)
+        index.update()
+        index.locate(functions, "function")
+        index.locate(wrappers, "class")
+        durations['ast (warm)'] = time.perf_counter() - start
+
+    return durations
+
+
+@click.command()
+@click.option('--modules', '-n', default=10000, show_default=True,
+              help='Number of modules in the synthetic tree.')
+def main(modules):
+    """Compare function discovery approaches on a synthetic tree."""
+    with tempfile.TemporaryDirectory() as directory:
+        make_tree(directory, modules)
+        durations = run_benchmark(directory, modules)
+    click.echo('Discovery on {} modules:'.format(modules))
+    for name, duration in durations.items():
+        click.echo('  {:<12} {:8.3f} s'.format(name, duration))
+
+
+if __name__ == '__main__':
+    main()
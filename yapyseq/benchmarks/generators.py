@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Generators of synthetic sequences with canonical shapes.
+
+Every generator returns a `GeneratedSequence`, with a `SequenceBuilder` and
+the number of node activations of a run, so that the overhead per node can be
+computed. Function nodes call functions that do nothing, written by
+`write_function_dir`, so that the measured time is the time of yapyseq.
+"""
+
+from collections import namedtuple
+import os
+
+from yapyseq.sequencebuilder import SequenceBuilder
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# A generated sequence and the number of activations of a run:
+# activations counts every node, function_activations the function nodes only
+GeneratedSequence = namedtuple("GeneratedSequence",
+                               "builder activations function_activations")
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Maximum number of wrappers of a node, see `wrapped`
+MAX_WRAPPERS = 10
+
+# Functions called by the generated sequences
+FUNCTIONS_MODULE = '''\
+from yapyseq import NodeWrapper
+
+
+def noop(value=None):
+    return value
+'''
+
+# Wrappers of the generated sequences. A wrapper class can only appear once
+# per node, so MAX_WRAPPERS classes are written.
+WRAPPER_CLASS = '''
+
+class NoopWrapper{index}(NodeWrapper):
+    def __init__(self, value=None):
+        self.value = value
+
+    def pre(self):
+        return self.value
+
+    def post(self):
+        pass
+'''
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def write_function_dir(directory: str) -> str:
+    """Write the functions of the generated sequences in a directory.
+
+    Args:
+        directory: an existing directory.
+
+    Returns:
+        The directory, to give to the runner.
+    """
+    with open(os.path.join(directory, 'bench_functions.py'), 'w') as f:
+        f.write(FUNCTIONS_MODULE)
+        for index in range(MAX_WRAPPERS):
+            f.write(WRAPPER_CLASS.format(index=index))
+    return directory
+
+
+def line(size: int) -> GeneratedSequence:
+    """Generate a line of function nodes.
+
+    Args:
+        size: the number of function nodes.
+    """
+    builder = SequenceBuilder()
+    builder.start(nid=0).transition(1)
+    for nid in range(1, size + 1):
+        builder.function('noop', {'value': str(nid)}, nid=nid)
+        builder.transition(nid + 1)
+    builder.stop(nid=size + 1)
+    return GeneratedSequence(builder, size + 2, size)
+
+
+def split_sync(width: int) -> GeneratedSequence:
+    """Generate function nodes run in parallel between a split and a sync.
+
+    Args:
+        width: the number of parallel function nodes.
+    """
+    builder = SequenceBuilder()
+    builder.start(nid=0).transition(1)
+    builder.parallel_split(nid=1)
+    for nid in range(2, width + 2):
+        builder.transition(nid, source=1)
+        builder.function('noop', {'value': str(nid)}, nid=nid)
+        builder.transition(width + 2)
+    builder.parallel_sync(nid=width + 2).transition(width + 3)
+    builder.stop(nid=width + 3)
+    # The sync node is activated by every branch
+    return GeneratedSequence(builder, 2 * width + 3, width)
+
+
+def loop(iterations: int) -> GeneratedSequence:
+    """Generate a loop of a function node and a variable node.
+
+    Args:
+        iterations: the number of iterations of the loop.
+    """
+    builder = SequenceBuilder()
+    builder.start(nid=0).transition(1)
+    builder.variable({'i': '0'}, nid=1).transition(2)
+    builder.function('noop', {'value': 'i'}, nid=2, return_var_name='last')
+    builder.transition(3)
+    builder.variable({'i': 'i + 1'}, nid=3)
+    builder.transition(2, 'i < {}'.format(iterations))
+    builder.transition(4, 'i >= {}'.format(iterations))
+    builder.stop(nid=4)
+    return GeneratedSequence(builder, 2 * iterations + 3, iterations)
+
+
+def nested(depth: int) -> GeneratedSequence:
+    """Generate nested parallel splits and syncs.
+
+    Each level is a split into a function node and the next level, followed
+    by a sync that leads to the sync of the level above.
+
+    Args:
+        depth: the number of nested levels.
+    """
+    builder = SequenceBuilder()
+    builder.start(nid=0).transition(1)
+    stop = 3 * depth + 1
+    for level in range(depth):
+        split, function, sync = 3 * level + 1, 3 * level + 2, 3 * level + 3
+        builder.parallel_split(nid=split).transition(function)
+        if level + 1 < depth:
+            builder.transition(split + 3)
+        builder.function('noop', nid=function).transition(sync)
+        builder.parallel_sync(nid=sync).transition(sync - 3 if level else stop)
+    builder.stop(nid=stop)
+    # Every sync is activated by its two branches, except the innermost one
+    return GeneratedSequence(builder, 4 * depth + 1, depth)
+
+
+def wrapped(size: int, wrappers: int) -> GeneratedSequence:
+    """Generate a line of function nodes with many wrappers.
+
+    Args:
+        size: the number of function nodes.
+        wrappers: the number of wrappers of every node, at most MAX_WRAPPERS.
+
+    Raises:
+        ValueError: if there are too many wrappers.
+    """
+    if wrappers > MAX_WRAPPERS:
+        raise ValueError("At most {} wrappers per node, got {}.".format(
+            MAX_WRAPPERS, wrappers))
+    builder = SequenceBuilder()
+    builder.start(nid=0).transition(1)
+    for nid in range(1, size + 1):
+        builder.function(
+            'noop', {'value': 'wrappers'}, nid=nid,
+            wrappers=[{'NoopWrapper{}'.format(w): {'value': str(w)}}
+                      for w in range(wrappers)])
+        builder.transition(nid + 1)
+    builder.stop(nid=size + 1)
+    return GeneratedSequence(builder, size + 2, size)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the start time of yapyseq.
+
+Each scenario is run several times in a new Python process, and the best wall
+time is kept. The heavy modules loaded by each scenario are listed: none of
+them should be loaded before a command needs them.
+"""
+
+from typing import Dict, List
+import json
+import subprocess
+import sys
+import time
+
+import click
+
+# Modules that must not be imported by `import yapyseq` or `yapyseq --help`
+HEAVY_MODULES = ['ruamel.yaml', 'yamale', 'multiprocessing', 'pkg_resources',
+                 'concurrent.futures']
+
+# Keys are scenario names, values are Python code to run
+SCENARIOS = {
+    'import yapyseq': 'import yapyseq',
+    'import yapyseq.cli': 'import yapyseq.cli',
+    'yapyseq --help': ('from yapyseq.cli import yapyseq_main_cli\n'
+                       'yapyseq_main_cli(["--help"])'),
+    # Client of `yapyseq submit`
+    'import yapyseq.server': 'import yapyseq.server',
+}
+
+# Code appended to a scenario to list the heavy modules it loaded
+LIST_MODULES_CODE = """
+import json, sys
+print(json.dumps([m for m in {} if m in sys.modules]), file=sys.stderr)
+"""
+
+
+def get_loaded_heavy_modules(code: str) -> List[str]:
+    """Get the heavy modules loaded by some Python code.
+
+    Args:
+        code: Python code, run in a new process.
+
+    Returns:
+        The names of the modules of HEAVY_MODULES loaded by the code.
+    """
+    code = 'try:\n{}\nexcept SystemExit:\n    pass\n{}'.format(
+        '\n'.join(['    ' + line for line in code.splitlines()]),
+        LIST_MODULES_CODE.format(HEAVY_MODULES))
+    output = subprocess.run([sys.executable, '-c', code],
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            check=True).stderr
+    return json.loads(output.decode().splitlines()[-1])
+
+
+def measure_start_time(code: str, repeat: int) -> float:
+    """Measure the best wall time of a new Python process running some code.
+
+    Args:
+        code: Python code to run.
+        repeat: Number of runs.
+
+    Returns:
+        The best duration, in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code],
+                       stdout=subprocess.DEVNULL, check=True)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def run_benchmark(repeat: int) -> Dict[str, Dict]:
+    """Measure every scenario.
+
+    Args:
+        repeat: Number of runs of each scenario.
+
+    Returns:
+        A dictionary where keys are the scenario names, and values
+        dictionaries with the best duration in seconds ('time') and the heavy
+        modules loaded ('modules').
+    """
+    results = {'python': {'time': measure_start_time('pass', repeat),
+                          'modules': []}}
+    for name, code in SCENARIOS.items():
+        results[name] = {'time': measure_start_time(code, repeat),
+                         'modules': get_loaded_heavy_modules(code)}
+    return results
+
+
+@click.command()
+@click.option('--repeat', '-r', default=10, show_default=True,
+              help='Number of runs of each scenario.')
+@click.option('--max-time', type=float,
+              help=('Maximum time in milliseconds of each scenario, above the '
+                    'start time of Python. Exit status is 1 if a scenario is '
+                    'slower, or if it loads a heavy module.'))
+def main(repeat, max_time):
+    """Measure the start time of yapyseq and its command line."""
+    results = run_benchmark(repeat)
+    base = results['python']['time']
+    failed = False
+    click.echo('{:>20} {:>10} {:>12}  {}'.format(
+        'scenario', 'time (ms)', 'yapyseq (ms)', 'heavy modules'))
+    for name, result in results.items():
+        own_time = (result['time'] - base) * 1000
+        click.echo('{:>20} {:>10.1f} {:>12.1f}  {}'.format(
+            name, result['time'] * 1000, own_time,
+            ', '.join(result['modules']) or '-'))
+        if result['modules'] or (max_time is not None and own_time > max_time):
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
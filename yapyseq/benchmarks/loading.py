@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the loading of big sequence files.
+
+A sequence file of a given size is generated, then loaded by a
+`SequenceReader` without cache, with and without `low_memory`. Each load is
+done in a new Python process, and the following values are measured:
+    * time: the duration of the initialization of the `SequenceReader`.
+    * peak RSS: the maximum resident set size of the process.
+"""
+
+from typing import Dict
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import click
+
+# Code run in a new process to load a sequence file.
+# Arguments are the path to the file and the value of low_memory.
+LOAD_CODE = """
+import json, resource, sys, time
+from yapyseq.sequencereader import SequenceReader
+start = time.perf_counter()
+reader = SequenceReader(sys.argv[1], cache=False,
+                        low_memory=(sys.argv[2] == 'True'))
+duration = time.perf_counter() - start
+print(json.dumps({'time': duration, 'nodes': len(reader.get_nodes()),
+                  'rss': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss}))
+"""
+
+NODE_TEMPLATE = """
+  - id: {nid}
+    type: function
+    name: Function node number {nid}
+    function: function_{nid}
+    timeout: 10
+    return: result_{nid}
+    arguments:
+      value: counter + {nid}
+      label: "'node {nid}'"
+    wrappers:
+    - Wrapper: {{arg: counter}}
+    transitions:
+    - target: {next_nid}
+      condition: counter >= 0
+"""
+
+
+def write_sequence(path: str, size: int) -> int:
+    """Write a sequence file of function nodes in a line.
+
+    Args:
+        path: Path to the file to write.
+        size: Approximate size of the file, in bytes.
+
+    Returns:
+        The number of nodes of the sequence.
+    """
+    with open(path, 'w') as f:
+        f.write("sequence:\n  constants:\n    counter: 0\n  nodes:\n")
+        f.write("  - id: 0\n    type: start\n    transitions:\n"
+                "    - target: 1\n")
+        nid = 1
+        while f.tell() < size:
+            f.write(NODE_TEMPLATE.format(nid=nid, next_nid=nid + 1))
+            nid += 1
+        f.write("  - id: {}\n    type: stop\n".format(nid))
+    return nid + 1
+
+
+def measure_load(path: str, low_memory: bool) -> Dict:
+    """Load a sequence file in a new process.
+
+    Args:
+        path: Path to the sequence file.
+        low_memory: Value of the argument `low_memory` of the reader.
+
+    Returns:
+        A dictionary with the load duration in seconds ('time'), the number
+        of nodes ('nodes') and the peak RSS in kilobytes ('rss').
+    """
+    output = subprocess.run(
+        [sys.executable, '-c', LOAD_CODE, path, str(low_memory)],
+        stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output.decode())
+
+
+@click.command()
+@click.option('--size', '-s', default=100, show_default=True,
+              help='Size of the generated sequence file, in MB.')
+def main(size):
+    """Measure load time and peak memory of a big sequence file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'sequence.yaml')
+        nodes = write_sequence(path, size * 1000000)
+        click.echo('{} nodes, {:.1f} MB'.format(
+            nodes, os.path.getsize(path) / 1000000))
+        click.echo('{:>12} {:>10} {:>14}'.format(
+            'low_memory', 'time (s)', 'peak RSS (MB)'))
+        for low_memory in (False, True):
+            result = measure_load(path, low_memory)
+            click.echo('{:>12} {:>10.2f} {:>14.0f}'.format(
+                str(low_memory), result['time'], result['rss'] / 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the memory footprint of node objects.
+
+Sequences of function nodes are instantiated, and the following values are
+measured:
+    * memory: the memory allocated per node, measured with tracemalloc.
+    * copy: the duration of a deep copy of all the nodes, as it was done by
+      `SequenceReader.get_node_dict` before nodes became immutable.
+"""
+
+from typing import Dict, List
+from collections import OrderedDict
+import copy
+import time
+import tracemalloc
+
+import click
+
+from yapyseq.nodes import FunctionNode
+
+
+def make_nodes(size: int) -> List[FunctionNode]:
+    """Instantiate function nodes with a wrapper and a conditional transition.
+
+    Args:
+        size: Number of nodes.
+
+    Returns:
+        The list of node objects.
+    """
+    return [FunctionNode(nid, 'function_{}'.format(nid),
+                         [{'target': nid + 1, 'condition': 'counter > 0'}],
+                         function_kwargs={'value': 'counter'},
+                         name='node {}'.format(nid),
+                         wrappers=OrderedDict([('Wrapper', {})]))
+            for nid in range(size)]
+
+
+def run_benchmark(sizes: List[int]) -> Dict[int, Dict[str, float]]:
+    """Measure the memory per node and the copy duration for each size.
+
+    Args:
+        sizes: Numbers of nodes.
+
+    Returns:
+        A dictionary where keys are sizes, and values dictionaries with the
+        bytes allocated per node and the deep copy duration in seconds.
+    """
+    results = dict()
+    for size in sizes:
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        nodes = make_nodes(size)
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        copy.deepcopy(dict([(n.nid, n) for n in nodes]))
+        copy_duration = time.perf_counter() - start
+        results[size] = {'memory': (after - before) / size,
+                         'copy': copy_duration}
+    return results
+
+
+@click.command()
+@click.option('--size', '-n', 'sizes', multiple=True, type=int,
+              default=[1000, 10000, 100000], show_default=True,
+              help='Number of nodes to instantiate.')
+def main(sizes):
+    """Measure the memory used by node objects."""
+    results = run_benchmark(sizes)
+    click.echo('{:>8} {:>14} {:>12}'.format('nodes', 'bytes/node', 'copy (s)'))
+    for size, values in results.items():
+        click.echo('{:>8} {:>14.0f} {:>12.4f}'.format(
+            size, values['memory'], values['copy']))
+
+
+if __name__ == '__main__':
+    main()
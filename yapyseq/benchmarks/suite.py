@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark suite of the overhead of yapyseq, with regression checks.
+
+Every scenario runs a sequence generated by `yapyseq.benchmarks.generators`
+in a fresh interpreter, and measures (see METRICS):
+    * startup: import of the runner and initialization of a first runner,
+      with the check of the sequence, in seconds.
+    * overhead_per_node: duration of a run divided by the number of node
+      activations, in seconds. Functions do nothing, so it is the time spent
+      by yapyseq for each node.
+    * throughput: node activations per second.
+    * peak_memory: peak RSS of the runner process, in bytes. Processes of
+      the function nodes are not included. It is None on platforms without
+      the resource module, like Windows.
+Durations of runs are the best of several runs.
+
+Measures can be saved as a JSON baseline, and compared with a baseline to
+detect regressions. Baselines depend on the machine, so they must be
+recorded on the machine that compares them.
+
+Run it with `yapyseq bench`, or `python -m yapyseq.benchmarks.suite`.
+"""
+
+from typing import Dict, List, Iterable, Callable
+from collections import namedtuple, OrderedDict
+from queue import Empty as EmptyQueueException
+import json
+import multiprocessing as mp
+import platform
+import tempfile
+import time
+import traceback
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+from yapyseq.benchmarks import generators
+
+# ------------------------------------------------------------------------------
+# Custom exception for this module
+# ------------------------------------------------------------------------------
+
+
+class BaselineError(ValueError):
+    """Raised when a baseline cannot be used."""
+
+
+class ScenarioError(RuntimeError):
+    """Raised when a scenario cannot be measured."""
+
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# A scenario of the suite: generator is a function of generators, called with
+# the sizes in args multiplied by the scale of the suite.
+Scenario = namedtuple("Scenario", "name description generator args")
+
+# A metric worse than its baseline by more than the tolerance.
+# change is the relative change, positive when the metric is worse.
+Regression = namedtuple("Regression",
+                        "scenario metric baseline value change")
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Version of the format of baseline files
+BASELINE_VERSION = 1
+
+# Metrics of every scenario, and the direction in which they are better
+METRICS = OrderedDict([('startup', 'lower'),
+                       ('overhead_per_node', 'lower'),
+                       ('throughput', 'higher'),
+                       ('peak_memory', 'lower')])
+
+SCENARIOS = OrderedDict([(s.name, s) for s in (
+    Scenario('line', 'a line of function nodes', generators.line, (50,)),
+    Scenario('split_sync', 'function nodes between a split and a sync',
+             generators.split_sync, (20,)),
+    Scenario('loop', 'iterations of a function node and a variable node',
+             generators.loop, (50,)),
+    Scenario('nested', 'nested parallel splits and syncs',
+             generators.nested, (10,)),
+    Scenario('wrapped', 'function nodes with many wrappers',
+             generators.wrapped, (20, 10)),
+)])
+
+# Default tolerance of the comparison with a baseline, as a fraction
+DEFAULT_TOLERANCE = 0.2
+
+# Interval at which the process of a scenario is checked, in seconds
+POLL_INTERVAL = 1
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def generate(name: str, scale: float = 1) -> generators.GeneratedSequence:
+    """Generate the sequence of a scenario.
+
+    Args:
+        name: the name of the scenario, a key of SCENARIOS.
+        scale: (optional) factor applied to the number of nodes or
+            iterations of the scenario. The number of wrappers is not scaled.
+
+    Returns:
+        A GeneratedSequence namedtuple.
+    """
+    scenario = SCENARIOS[name]
+    size = max(1, int(round(scenario.args[0] * scale)))
+    return scenario.generator(size, *scenario.args[1:])
+
+
+def _measure(name: str, scale: float, repeat: int, func_dir: str,
+             queue: mp.Queue) -> None:
+    """Measure a scenario and put the measures in the queue.
+
+    Must be called in a fresh interpreter, so that the startup includes the
+    imports and the peak RSS only depends on the scenario. If the scenario
+    fails, the traceback is put in the queue instead of the measures.
+    """
+    try:
+        start = time.perf_counter()
+        from yapyseq.sequencerunner import SequenceRunner
+        generated = generate(name, scale)
+        startup = None
+        run_times = []
+        for _ in range(repeat):
+            runner = SequenceRunner(generated.builder, func_dir,
+                                    logger=False)
+            if startup is None:
+                startup = time.perf_counter() - start
+            run_start = time.perf_counter()
+            runner.run()
+            run_times.append(time.perf_counter() - run_start)
+        run_time = min(run_times)
+        # ru_maxrss is in kilobytes on Linux, and does not include children
+        peak_memory = None if resource is None else resource.getrusage(
+            resource.RUSAGE_SELF).ru_maxrss * 1024
+    except Exception:
+        queue.put(traceback.format_exc())
+        return
+    queue.put({'startup': startup,
+               'overhead_per_node': run_time / generated.activations,
+               'throughput': generated.activations / run_time,
+               'peak_memory': peak_memory,
+               'activations': generated.activations})
+
+
+def _get_measures(name: str, process: mp.Process, queue: mp.Queue) -> Dict:
+    """Wait for the measures of a scenario from its process.
+
+    Raises:
+        ScenarioError: if the scenario failed, or if its process exited
+            without giving its measures.
+    """
+    exited = False
+    while True:
+        try:
+            measures = queue.get(timeout=POLL_INTERVAL)
+        except EmptyQueueException:
+            # The queue is read once more after the exit of the process, in
+            # case the measures were given right before it
+            if exited:
+                raise ScenarioError(
+                    "The process of scenario {} exited with code {} without "
+                    "giving its measures.".format(name, process.exitcode))
+            exited = process.exitcode is not None
+            continue
+        if not isinstance(measures, dict):
+            raise ScenarioError("Scenario {} failed:\n{}".format(
+                name, measures))
+        return measures
+
+
+def run_suite(names: Iterable[str] = None, scale: float = 1,
+              repeat: int = 3,
+              progress: Callable[[str], None] = None) -> Dict[str, Dict]:
+    """Measure scenarios, each one in a fresh interpreter.
+
+    Args:
+        names: (optional) names of the scenarios to run. Default is every
+            scenario of SCENARIOS.
+        scale: (optional) factor applied to the sizes of the scenarios.
+        repeat: (optional) number of runs of every scenario. The best run is
+            kept.
+        progress: (optional) function called with the name of every scenario
+            before it is run.
+
+    Returns:
+        A dictionary where keys are names of scenarios and values
+        dictionaries of their measures (see METRICS), with the number of
+        activations of a run.
+
+    Raises:
+        KeyError: if a scenario does not exist.
+        ScenarioError: if a scenario cannot be measured.
+    """
+    names = list(names) if names else list(SCENARIOS)
+    for name in names:
+        if name not in SCENARIOS:
+            raise KeyError("Unknown scenario: {}".format(name))
+    ctx = mp.get_context('spawn')
+    measures = OrderedDict()
+    with tempfile.TemporaryDirectory() as directory:
+        func_dir = generators.write_function_dir(directory)
+        for name in names:
+            if progress:
+                progress(name)
+            queue = ctx.Queue()
+            process = ctx.Process(target=_measure,
+                                  args=(name, scale, repeat, func_dir, queue))
+            process.start()
+            try:
+                measures[name] = _get_measures(name, process, queue)
+            finally:
+                process.join()
+    return measures
+
+
+def make_baseline(measures: Dict[str, Dict], scale: float = 1) -> Dict:
+    """Create a baseline from measures.
+
+    Args:
+        measures: the measures of `run_suite`.
+        scale: (optional) the scale of the measures.
+
+    Returns:
+        A dictionary that can be written as JSON.
+    """
+    return {'version': BASELINE_VERSION, 'scale': scale,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'scenarios': measures}
+
+
+def save_baseline(path: str, measures: Dict[str, Dict],
+                  scale: float = 1) -> None:
+    """Write measures as a JSON baseline file.
+
+    Args:
+        path: the path of the file.
+        measures: the measures of `run_suite`.
+        scale: (optional) the scale of the measures.
+    """
+    with open(path, 'w') as f:
+        json.dump(make_baseline(measures, scale), f, indent=2)
+
+
+def load_baseline(path: str) -> Dict:
+    """Read a JSON baseline file.
+
+    Args:
+        path: the path of the file.
+
+    Returns:
+        The baseline, see `make_baseline`.
+
+    Raises:
+        BaselineError: if the file is not a baseline of this version.
+    """
+    with open(path) as f:
+        try:
+            baseline = json.load(f)
+        except ValueError as exc:
+            raise BaselineError("{} is not a JSON file: {}".format(path, exc))
+    if not isinstance(baseline, dict) or \
+            baseline.get('version') != BASELINE_VERSION:
+        raise BaselineError("{} is not a baseline of version {}.".format(
+            path, BASELINE_VERSION))
+    return baseline
+
+
+def compare_to_baseline(measures: Dict[str, Dict], baseline: Dict,
+                        tolerance: float = DEFAULT_TOLERANCE,
+                        scale: float = 1) -> List[Regression]:
+    """Find the metrics that are worse than their baseline.
+
+    Scenarios and metrics missing from the baseline are not compared.
+
+    Args:
+        measures: the measures of `run_suite`.
+        baseline: the baseline, see `load_baseline`.
+        tolerance: (optional) the relative change above which a worse metric
+            is a regression, for instance 0.2 for 20 %.
+        scale: (optional) the scale of the measures.
+
+    Returns:
+        The list of Regression namedtuples, empty if nothing regressed.
+
+    Raises:
+        BaselineError: if the baseline has been measured with another scale.
+    """
+    if baseline.get('scale', 1) != scale:
+        raise BaselineError(
+            "The baseline has been measured with scale {}, not {}.".format(
+                baseline.get('scale', 1), scale))
+    regressions = []
+    for name, scenario_measures in measures.items():
+        reference = baseline['scenarios'].get(name, dict())
+        for metric, better in METRICS.items():
+            if not reference.get(metric) or \
+                    scenario_measures.get(metric) is None:
+                continue
+            value = scenario_measures[metric]
+            change = (value - reference[metric]) / reference[metric]
+            if better == 'higher':
+                change = -change
+            if change > tolerance:
+                regressions.append(Regression(name, metric, reference[metric],
+                                              value, change))
+    return regressions
+
+
+def format_measures(measures: Dict[str, Dict]) -> List[str]:
+    """Describe measures as a table.
+
+    Args:
+        measures: the measures of `run_suite`.
+
+    Returns:
+        Lines of text.
+    """
+    lines = ['{:<12} {:>12} {:>14} {:>16} {:>14}'.format(
+        'scenario', 'startup (s)', 'per node (ms)', 'throughput (/s)',
+        'peak RSS (MB)')]
+    for name, m in measures.items():
+        peak_memory = 'n/a' if m['peak_memory'] is None else '{:.1f}'.format(
+            m['peak_memory'] / 1024 ** 2)
+        lines.append('{:<12} {:>12.3f} {:>14.3f} {:>16.1f} {:>14}'.format(
+            name, m['startup'], m['overhead_per_node'] * 1000,
+            m['throughput'], peak_memory))
+    return lines
+
+
+def describe_regressions(regressions: List[Regression]) -> List[str]:
+    """Describe regressions in a human readable way.
+
+    Args:
+        regressions: the list of Regression namedtuples.
+
+    Returns:
+        One line of text per regression.
+    """
+    return ['{} {}: {:.6g} instead of {:.6g} ({:+.1f} % worse)'.format(
+        r.scenario, r.metric, r.value, r.baseline, r.change * 100)
+        for r in regressions]
+
+
+if __name__ == '__main__':
+    from yapyseq.cli import bench
+    bench()
@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Benchmark of the structural validation of sequences.
+
+Sequences of increasing sizes are generated, and the time spent to check the
+structure of their node graph is measured with:
+    * legacy: the historical per-node loop of `check_sequence_file`, which
+      rebuilds the sets of ids at every node, in quadratic time.
+    * linear: `check_sequence_structure`.
+    * schema: (optional) the yamale validation done before the structural
+      checks, for reference.
+"""
+
+from typing import Dict, List
+from collections import Counter
+import time
+
+import click
+import yamale
+
+from yapyseq.sequencereader import check_sequence_structure, get_schema
+
+
+def make_node_dicts(size: int) -> List[Dict]:
+    """Generate the nodes of a sequence document.
+
+    The sequence is a line of variable nodes, between a start and a stop node.
+
+    Args:
+        size: Total number of nodes.
+
+    Returns:
+        The list of nodes, as found in a sequence document.
+    """
+    nodes = [{'id': 0, 'type': 'start', 'transitions': [{'target': 1}]}]
+    for nid in range(1, size - 1):
+        nodes.append({'id': nid, 'type': 'variable',
+                      'variables': {'counter': 'counter + 1'},
+                      'transitions': [{'target': nid + 1,
+                                       'condition': 'counter > 0'}]})
+    nodes.append({'id': size - 1, 'type': 'stop'})
+    return nodes
+
+
+def check_legacy(node_dicts: List[Dict]) -> None:
+    """Check the structure of a sequence the way yapyseq used to."""
+    item_ids = [i['id'] for i in node_dicts]
+    non_unique_ids = [k for k, v in Counter(item_ids).items() if v > 1]
+    if non_unique_ids:
+        raise ValueError(non_unique_ids)
+    start_nids = [i['id'] for i in node_dicts if i['type'] == "start"]
+    for node in node_dicts:
+        if 'transitions' in node:
+            targets = set([t['target'] for t in node['transitions']])
+        else:
+            targets = set()
+        if targets.difference(set(item_ids)):
+            raise ValueError(node['id'])
+        if targets.intersection(set(start_nids)):
+            raise ValueError(node['id'])
+
+
+def run_benchmark(sizes: List[int], legacy_max: int,
+                  with_schema: bool) -> Dict[int, Dict[str, float]]:
+    """Measure the validation durations for each size.
+
+    Args:
+        sizes: Numbers of nodes of the generated sequences.
+        legacy_max: Biggest size measured with the legacy check.
+        with_schema: True to measure the yamale validation as well.
+
+    Returns:
+        A dictionary where keys are sizes, and values dictionaries of durations
+        in seconds, for each approach.
+    """
+    results = dict()
+    for size in sizes:
+        node_dicts = make_node_dicts(size)
+        durations = dict()
+        if size <= legacy_max:
+            start = time.perf_counter()
+            check_legacy(node_dicts)
+            durations['legacy'] = time.perf_counter() - start
+        start = time.perf_counter()
+        errors = check_sequence_structure(node_dicts)
+        durations['linear'] = time.perf_counter() - start
+        assert not errors, errors
+        if with_schema:
+            schema = get_schema()
+            start = time.perf_counter()
+            yamale.validate(schema, [({'sequence': {'nodes': node_dicts}},
+                                      None)])
+            durations['schema'] = time.perf_counter() - start
+        results[size] = durations
+    return results
+
+
+@click.command()
+@click.option('--size', '-n', 'sizes', multiple=True, type=int,
+              default=[1000, 10000, 100000], show_default=True,
+              help='Number of nodes of a generated sequence.')
+@click.option('--legacy-max', default=20000, show_default=True,
+              help='Biggest sequence checked with the legacy algorithm.')
+@click.option('--with-schema', is_flag=True,
+              help='Measure the yamale validation as well.')
+def main(sizes, legacy_max, with_schema):
+    """Measure structural validation time against sequence size."""
+    results = run_benchmark(sizes, legacy_max, with_schema)
+    click.echo('{:>8} {:>12} {:>12} {:>12}'.format(
+        'nodes', 'legacy (s)', 'linear (s)', 'schema (s)'))
+    for size, durations in results.items():
+        click.echo('{:>8} {:>12} {:>12} {:>12}'.format(
+            size, *['{:.4f}'.format(durations[k]) if k in durations else '-'
+                    for k in ('legacy', 'linear', 'schema')]))
+
+
+if __name__ == '__main__':
+    main()
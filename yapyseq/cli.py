@@ -5,12 +5,19 @@
 This Source Code Form is subject to the terms of the Mozilla Public
 License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Modules of yapyseq and their dependencies are imported by the commands that
+need them, so that the command line starts quickly.
 """
 
+from typing import Dict, Iterable, Iterator, List
+import glob
+import os
+import sys
+
 import click
-import pkg_resources
 
-from yapyseq import SequenceReader, SequenceFileError, SequenceRunner
+from yapyseq.common import ImportMode, get_resource_path
 
 
 @click.group()
@@ -19,31 +26,184 @@ def yapyseq_main_cli():
     pass
 
 
-@yapyseq_main_cli.command()
-@click.argument('sequence_file', type=click.Path(exists=True))
-def check(sequence_file):
-    """Check content validity of a sequence file.
+def find_sequence_files(patterns: Iterable[str]) -> List[str]:
+    """Get the sequence files matching given paths and patterns.
 
-    SEQUENCE_FILE is the path to the sequence file to check.
+    Args:
+        patterns: paths to sequence files, paths to directories where every
+            .yaml and .yml file is searched recursively, or glob patterns
+            (`**` matches any number of sub-directories).
+
+    Returns:
+        The sorted list of paths, without duplicates. A pattern which matches
+        nothing is kept as is, so that it is reported as a missing file.
     """
-    schema = pkg_resources.resource_filename('yapyseq', 'seq_schema.yaml')
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for dirpath, _, filenames in os.walk(pattern):
+                paths.update([os.path.join(dirpath, f) for f in filenames
+                              if f.endswith(('.yaml', '.yml'))])
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            matches = [p for p in glob.glob(pattern, recursive=True)
+                       if os.path.isfile(p)]
+            paths.update(matches if matches else [pattern])
+    return sorted(paths)
+
+
+def check_one_file(seq_file_path: str, schema_path: str,
+                   warm_cache: bool = False,
+                   low_memory: bool = False) -> Dict:
+    """Check a sequence file and describe the result.
+
+    Args:
+        seq_file_path: path to the sequence file to check.
+        schema_path: path to the schema of sequences.
+        warm_cache: True to save the compiled form of the sequence.
+        low_memory: True to parse the sequence file node by node.
+
+    Returns:
+        A dictionary with the keys:
+            * 'path': the given path.
+            * 'valid': True if the sequence file is valid.
+            * 'error': None if valid, else 'sequence' if the sequence is not
+              valid, or 'file' if the file cannot be read.
+            * 'message': None if valid, else the description of the error.
+    """
+    from yapyseq.sequencereader import SequenceReader, SequenceFileError
     try:
-        SequenceReader.check_sequence_file(sequence_file, schema)
+        if warm_cache or low_memory:
+            SequenceReader(seq_file_path, schema_path, cache=warm_cache,
+                           low_memory=low_memory)
+        else:
+            SequenceReader.check_sequence_file(seq_file_path, schema_path)
     except SequenceFileError as e:  # Must be catch before OSError
-        msg = click.style('Sequence file not valid ! See details below.',
-                          bold=True, fg='red')
-        click.echo(msg)
-        click.echo(e)
+        error, message = 'sequence', str(e)
     except (FileNotFoundError, OSError) as e:
-        msg = click.style(('Error while trying to open sequence file ! '
-                           'See details below.'),
-                          bold=True, fg='red')
-        click.echo(msg)
-        click.echo(e)
+        error, message = 'file', str(e)
     else:
-        msg = click.style('Sequence file is valid !',
-                          bold=True, fg='green')
-        click.echo(msg)
+        error, message = None, None
+    return {'path': seq_file_path, 'valid': error is None, 'error': error,
+            'message': message}
+
+
+def iter_check_results(paths: List[str], schema_path: str, jobs: int,
+                       **kwargs) -> Iterator[Dict]:
+    """Check sequence files concurrently.
+
+    Args:
+        paths: paths to the sequence files to check.
+        schema_path: path to the schema of sequences.
+        jobs: number of processes checking files. With 1, files are checked
+            in the current process.
+        kwargs: other arguments of `check_one_file`.
+
+    Yields:
+        The results of `check_one_file`, as soon as they are available.
+    """
+    if jobs <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield check_one_file(path, schema_path, **kwargs)
+        return
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from yapyseq.sequencereader import get_schema
+    # The schema is built once per process, then cached by get_schema
+    with ProcessPoolExecutor(max_workers=jobs, initializer=get_schema,
+                             initargs=(schema_path,)) as executor:
+        futures = [executor.submit(check_one_file, path, schema_path,
+                                   **kwargs)
+                   for path in paths]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+@yapyseq_main_cli.command()
+@click.argument('sequence_files', nargs=-1, required=True)
+@click.option('--warm-cache', is_flag=True,
+              help=('Save the compiled form of the sequences in the cache, so '
+                    'that next runs skip their check and parsing.'))
+@click.option('--low-memory', is_flag=True,
+              help=('Parse and check the sequence files node by node, without '
+                    'holding a whole file in memory.'))
+@click.option('--jobs', '-j', type=click.IntRange(min=1),
+              help='Number of processes checking files. Default is the '
+                   'number of CPUs.')
+@click.option('--format', 'output_format', default='text', show_default=True,
+              type=click.Choice(['text', 'json']),
+              help=('Output format. text prints each result as soon as it is '
+                    'available. json prints a summary of all the results.'))
+def check(sequence_files, warm_cache, low_memory, jobs, output_format):
+    """Check content validity of sequence files.
+
+    SEQUENCE_FILES are paths to sequence files, directories where .yaml and
+    .yml files are searched recursively, or glob patterns.
+
+    Exit status is 1 if at least one sequence file is not valid.
+    """
+    schema = get_resource_path('seq_schema.yaml')
+    paths = find_sequence_files(sequence_files)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    results = []
+    for result in iter_check_results(paths, schema, min(jobs, len(paths)),
+                                     warm_cache=warm_cache,
+                                     low_memory=low_memory):
+        results.append(result)
+        if output_format == 'text':
+            if result['valid']:
+                click.echo('{} {}'.format(
+                    click.style('Valid:', bold=True, fg='green'),
+                    result['path']))
+            else:
+                click.echo('{} {}'.format(
+                    click.style('Not valid:' if result['error'] == 'sequence'
+                                else 'Cannot open:', bold=True, fg='red'),
+                    result['path']))
+                click.echo(result['message'])
+
+    invalid = len([r for r in results if not r['valid']])
+    if output_format == 'json':
+        import json
+        click.echo(json.dumps({
+            'files': len(results),
+            'valid': len(results) - invalid,
+            'invalid': invalid,
+            'results': sorted(results, key=lambda r: r['path'])}, indent=2))
+    else:
+        msg = '{} file(s) checked, {} valid, {} not valid.'.format(
+            len(results), len(results) - invalid, invalid)
+        click.echo(click.style(msg, bold=True,
+                               fg='red' if invalid else 'green'))
+    if invalid:
+        sys.exit(1)
+
+
+def parse_constants(constant: Iterable) -> Dict:
+    """Evaluate the constants given in the command line.
+
+    Args:
+        constant: 3-tuples (name, type, value) given with the option
+            --constant.
+
+    Returns:
+        A dictionary where keys are the names of the constants, and values
+        their evaluated values.
+
+    Raises:
+        click.BadOptionUsage: if a type is not supported.
+    """
+    constant_dict = {}
+    available_types = ['str', 'float', 'int', 'bool']
+    # Evaluate every constant value
+    for c in constant:
+        if c[1] not in available_types:
+            raise click.BadOptionUsage(
+                option_name='--constant',
+                message='Constant type must be in {}'.format(available_types))
+        constant_dict[c[0]] = eval('{}("{}")'.format(c[1], c[2]))
+    return constant_dict
 
 
 @yapyseq_main_cli.command()
@@ -54,7 +214,53 @@ def check(sequence_file):
                     'Type must be a valid python built-in type.'))
 @click.option('--no-log', is_flag=True,
               help='Use this option to deactivate logging.')
-def run(sequence_file, function_dir, constant, no_log):
+@click.option('--log-file', type=click.Path(dir_okay=False),
+              help='Write the log in this file instead of the console.')
+@click.option('--log-format', default='text', show_default=True,
+              type=click.Choice(['text', 'json']),
+              help=('Format of the log. json writes one object per line, '
+                    'with the fields of the events of the nodes.'))
+@click.option('--import-mode', default='eager', show_default=True,
+              type=click.Choice([m.name.lower() for m in ImportMode]),
+              help=('When node functions are imported: all of them before the '
+                    'run (eager), each one the first time its node is '
+                    'dispatched (lazy), or only in the processes running the '
+                    'nodes (worker).'))
+@click.option('--low-memory', is_flag=True,
+              help=('Parse the sequence file node by node, without holding '
+                    'the whole file in memory.'))
+@click.option('--no-optimize', is_flag=True,
+              help=('Do not replace the expressions that only depend on '
+                    'constants by their values before the run.'))
+@click.option('--show-optimizations', is_flag=True,
+              help='Print the simplifications done before the run.')
+@click.option('--trace', 'trace_path', type=click.Path(dir_okay=False),
+              help=('Write the timings of every node activation in this file, '
+                    'as a Chrome trace that can be opened in Perfetto.'))
+@click.option('--metrics-port', type=int,
+              help=('Serve the metrics of the run in the Prometheus text '
+                    'format on this local HTTP port.'))
+@click.option('--metrics-file', type=click.Path(dir_okay=False),
+              help=('Write the metrics of the run in this file at the end, '
+                    'in the Prometheus text format.'))
+@click.option('--profile', is_flag=True,
+              help=('Run the function of every function node under cProfile, '
+                    'and not only the nodes with "profile: true".'))
+@click.option('--profile-dir', type=click.Path(file_okay=False),
+              default='profiles', show_default=True,
+              help=('Directory where the profiles of the functions are '
+                    'written: one .pstats file per function, and the '
+                    'collapsed stacks for flame graphs.'))
+@click.option('--trace-memory', is_flag=True,
+              help=('Measure the peak of memory allocated by every function '
+                    'with tracemalloc. It slows the functions down.'))
+@click.option('--summary', is_flag=True,
+              help=('Print the function nodes that used the most time and '
+                    'memory at the end of the run.'))
+def run(sequence_file, function_dir, constant, no_log, log_file, log_format,
+        import_mode, low_memory, no_optimize, show_optimizations, trace_path,
+        metrics_port, metrics_file, profile, profile_dir, trace_memory,
+        summary):
     """Run a sequence.
 
     SEQUENCE_FILE is the path to the sequence file to check.
@@ -64,21 +270,290 @@ def run(sequence_file, function_dir, constant, no_log):
     As many constants as wanted can be given. For each constant, you must give
     the name, the type and the value. Example: -c var_name bool True
     """
-    constant_dict = {}
-    available_types = ['str', 'float', 'int', 'bool']
-    # Evaluate every constant value
-    for c in constant:
-        if c[1] not in available_types:
-            raise click.BadOptionUsage(
-                option_name='--constant',
-                message='Constant type must be in {}'.format(available_types))
-        constant_dict[c[0]] = eval('{}("{}")'.format(c[1], c[2]))
+    constant_dict = parse_constants(constant)
 
-    runner = SequenceRunner(sequence_file, function_dir, logger=(not no_log))
+    from yapyseq.functiongrabber import FunctionGrabber
+    from yapyseq.sequencereader import SequenceReader
+    from yapyseq.sequencerunner import SequenceRunner
+    sequence = SequenceReader(sequence_file, cache=True,
+                              low_memory=low_memory)
+    import_mode = ImportMode[import_mode.upper()]
+    # The console keeps the index of the function directory between runs
+    function_grabber = FunctionGrabber(
+        index_cache=True, lazy=(import_mode is not ImportMode.EAGER))
+    runner = SequenceRunner(sequence, function_dir, constant_dict,
+                            logger=(not no_log),
+                            log_file=log_file, log_format=log_format,
+                            import_mode=import_mode,
+                            function_grabber=function_grabber,
+                            optimize=(not no_optimize),
+                            trace=bool(trace_path),
+                            metrics=bool(metrics_port or metrics_file),
+                            profile=profile,
+                            trace_memory=trace_memory)
+    if metrics_port:
+        from yapyseq.metrics import MetricsServer
+        metrics_server = MetricsServer(runner.metrics, metrics_port)
+        metrics_server.start()
+    if show_optimizations:
+        from yapyseq.optimizer import describe_simplifications
+        for line in describe_simplifications(runner.simplifications):
+            click.echo(line)
     try:
+        # Exceptions of the run are logged by the runner
         runner.run(blocking=True)
-    except Exception as exc:
-        # Log the exceptions if they occur
-        runner._logger.exception('An exception was raised during the run'
-                                 ' of the sequence.')
-        raise exc
+    finally:
+        if trace_path:
+            runner.trace.write_chrome_trace(trace_path, runner.basename)
+        if metrics_file:
+            runner.metrics.write(metrics_file)
+        if metrics_port:
+            metrics_server.stop()
+        if runner.profiles is not None and runner.profiles.functions:
+            runner.profiles.write(profile_dir)
+        if summary:
+            for line in runner.get_resource_summary():
+                click.echo(line)
+
+
+@yapyseq_main_cli.command()
+@click.option('--socket', 'socket_path', type=click.Path(),
+              help=('Path of the Unix socket to listen on. Default is '
+                    '$XDG_RUNTIME_DIR/yapyseq.sock, or yapyseq.sock in the '
+                    'cache directory of yapyseq.'))
+@click.option('--no-log', is_flag=True,
+              help='Use this option to deactivate logging.')
+@click.option('--metrics-port', type=int,
+              help=('Serve the metrics of all the runs in the Prometheus text '
+                    'format on this local HTTP port.'))
+def serve(socket_path, no_log, metrics_port):
+    """Run sequences submitted with `yapyseq submit`.
+
+    Sequences, function indexes and imported modules are kept between runs.
+    Modified sequence files and function files are reloaded.
+    """
+    from yapyseq.logger import get_logger
+    from yapyseq.server import SequenceServer
+    logger = None if no_log else get_logger(name='yapyseq.server')
+    metrics_server = None
+    if metrics_port:
+        from yapyseq.metrics import MetricsRegistry, MetricsServer
+        metrics_server = MetricsServer(MetricsRegistry(), metrics_port)
+        metrics_server.start()
+    server = SequenceServer(socket_path, logger,
+                            metrics_server.registry if metrics_server else None)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if metrics_server:
+            metrics_server.stop()
+
+
+@yapyseq_main_cli.command()
+@click.argument('sequence_file', type=click.Path(exists=True))
+@click.argument('function_dir', type=click.Path(exists=True))
+@click.option('--constant', '-c', multiple=True, type=(str, str, str),
+              help=('NAME TYPE VALUE. '
+                    'Type must be a valid python built-in type.'))
+@click.option('--import-mode', default='eager', show_default=True,
+              type=click.Choice([m.name.lower() for m in ImportMode]),
+              help='When node functions are imported. See `yapyseq run`.')
+@click.option('--socket', 'socket_path', type=click.Path(),
+              help='Path of the Unix socket of the server.')
+@click.option('--format', 'output_format', default='text', show_default=True,
+              type=click.Choice(['text', 'json']),
+              help='Output format of the results.')
+def submit(sequence_file, function_dir, constant, import_mode, socket_path,
+           output_format):
+    """Run a sequence in a server started with `yapyseq serve`.
+
+    SEQUENCE_FILE and FUNCTION_DIR are the same as in `yapyseq run`.
+    The results of the function nodes are printed.
+
+    Exit status is 1 if the server cannot run the sequence, or if a function
+    node raised an exception.
+    """
+    from yapyseq.server import ServerError, submit_request
+    request = {'command': 'run',
+               'sequence': os.path.abspath(sequence_file),
+               'function_dir': os.path.abspath(function_dir),
+               'constants': parse_constants(constant),
+               'import_mode': import_mode}
+    try:
+        response = submit_request(request, socket_path)
+    except (OSError, ServerError) as exc:
+        click.echo('{}: {}'.format(click.style('Error', bold=True, fg='red'),
+                                   exc), err=True)
+        sys.exit(1)
+    failed = [nid for nid, r in response['results'].items() if r['exception']]
+    if output_format == 'json':
+        import json
+        click.echo(json.dumps(response, indent=2))
+    else:
+        for nid, result in sorted(response['results'].items(),
+                                  key=lambda i: int(i[0])):
+            if result['exception']:
+                click.echo('{} {}: {}'.format(
+                    click.style('Node {}'.format(nid), bold=True, fg='red'),
+                    'exception', result['exception']))
+            else:
+                click.echo('{}: {}'.format(
+                    click.style('Node {}'.format(nid), bold=True),
+                    result['returned']))
+        click.echo('Sequence run in {:.3f} s.'.format(response['duration']))
+    if failed:
+        sys.exit(1)
+
+
+@yapyseq_main_cli.command()
+@click.argument('scenarios', nargs=-1)
+@click.option('--scale', type=click.FloatRange(min=0, min_open=True),
+              default=1, show_default=True,
+              help='Factor applied to the number of nodes of the scenarios.')
+@click.option('--repeat', type=click.IntRange(min=1), default=3,
+              show_default=True,
+              help='Number of runs of every scenario. The best run is kept.')
+@click.option('--baseline', 'baseline_path',
+              type=click.Path(exists=True, dir_okay=False),
+              help=('JSON baseline to compare with. Exit status is 1 if a '
+                    'metric is worse than its baseline by more than the '
+                    'tolerance.'))
+@click.option('--save-baseline', 'save_path', type=click.Path(dir_okay=False),
+              help='Write the measures in this file, as a JSON baseline.')
+@click.option('--tolerance', type=click.FloatRange(min=0), default=0.2,
+              show_default=True,
+              help=('Relative change of a metric above which it is a '
+                    'regression, for instance 0.2 for 20 %.'))
+@click.option('--format', 'output_format', default='text', show_default=True,
+              type=click.Choice(['text', 'json']),
+              help='Output format of the measures.')
+def bench(scenarios, scale, repeat, baseline_path, save_path, tolerance,
+          output_format):
+    """Measure the overhead of yapyseq on synthetic sequences.
+
+    SCENARIOS are the names of the scenarios to run: line, split_sync, loop,
+    nested and wrapped. Default is all of them.
+
+    Exit status is 1 if a scenario is unknown or fails, if the baseline
+    cannot be used, or if a metric regressed.
+    """
+    from yapyseq.benchmarks import suite
+    baseline = None
+    try:
+        if baseline_path:
+            baseline = suite.load_baseline(baseline_path)
+        measures = suite.run_suite(
+            scenarios, scale, repeat,
+            progress=(lambda name: click.echo('Running {}...'.format(name),
+                                              err=True)))
+        regressions = [] if baseline is None else suite.compare_to_baseline(
+            measures, baseline, tolerance, scale)
+    except (KeyError, suite.BaselineError, suite.ScenarioError) as exc:
+        click.echo('{}: {}'.format(click.style('Error', bold=True, fg='red'),
+                                   exc.args[0]), err=True)
+        sys.exit(1)
+    if save_path:
+        suite.save_baseline(save_path, measures, scale)
+    if output_format == 'json':
+        import json
+        click.echo(json.dumps({
+            'scale': scale, 'scenarios': measures,
+            'regressions': [r._asdict() for r in regressions]}, indent=2))
+    else:
+        for line in suite.format_measures(measures):
+            click.echo(line)
+        if baseline is not None:
+            if regressions:
+                click.echo(click.style('{} regression(s):'.format(
+                    len(regressions)), bold=True, fg='red'))
+                for line in suite.describe_regressions(regressions):
+                    click.echo('  ' + line)
+            else:
+                click.echo(click.style('No regression.', bold=True,
+                                       fg='green'))
+    if regressions:
+        sys.exit(1)
+
+
+@yapyseq_main_cli.command()
+@click.argument('trace_file', type=click.Path(exists=True, dir_okay=False))
+@click.option('--top', type=click.IntRange(min=1), default=10,
+              show_default=True,
+              help='Number of nodes and workers listed.')
+@click.option('--format', 'output_format', default='text', show_default=True,
+              type=click.Choice(['text', 'json']),
+              help='Output format of the analysis.')
+def analyze(trace_file, top, output_format):
+    """Find what determined the duration of a run.
+
+    TRACE_FILE is a trace written by `yapyseq run --trace`. The critical
+    path of the run, the slack of the nodes, the idle time of the processes
+    of function nodes, and the time spent by the runner instead of the
+    functions are printed.
+
+    Exit status is 1 if the file is not a trace of yapyseq.
+    """
+    from yapyseq.analysis import (TraceFileError, load_activations,
+                                  analyze as analyze_run, analysis_to_dict,
+                                  format_analysis)
+    try:
+        analysis = analyze_run(load_activations(trace_file))
+    except TraceFileError as exc:
+        click.echo('{}: {}'.format(click.style('Error', bold=True, fg='red'),
+                                   exc), err=True)
+        sys.exit(1)
+    if output_format == 'json':
+        import json
+        click.echo(json.dumps(analysis_to_dict(analysis), indent=2))
+    else:
+        for line in format_analysis(analysis, top):
+            click.echo(line)
+
+
+@yapyseq_main_cli.command()
+@click.argument('sequence_file', type=click.Path(exists=True))
+@click.option('--trace', 'trace_path',
+              type=click.Path(exists=True, dir_okay=False),
+              help=('Trace written by `yapyseq run --trace`. Nodes are '
+                    'coloured by what they did in this run, and transitions '
+                    'labelled with the number of times they were followed.'))
+@click.option('--color-by', default='time', show_default=True,
+              type=click.Choice(['time', 'activations']),
+              help=('Colour nodes by their cumulative time or by their '
+                    'number of activations in the trace.'))
+@click.option('--output', '-o', 'output_path', type=click.Path(dir_okay=False),
+              help=('File to write. .svg, .png and .pdf files are rendered '
+                    'with the program dot of Graphviz, other files get the '
+                    'DOT source. Default is to print the DOT source.'))
+def graph(sequence_file, trace_path, color_by, output_path):
+    """Draw the graph of a sequence, as a heatmap of a run.
+
+    SEQUENCE_FILE is the path to the sequence file to draw.
+
+    Exit status is 1 if the sequence or the trace cannot be read, or if
+    Graphviz cannot render the graph.
+    """
+    from yapyseq.analysis import TraceFileError, load_activations
+    from yapyseq.graph import (RENDER_FORMATS, GraphRenderError, render,
+                               sequence_to_dot)
+    from yapyseq.sequencereader import SequenceReader, SequenceFileError
+    try:
+        reader = SequenceReader(sequence_file, cache=True)
+        activations = load_activations(trace_path) if trace_path else None
+        dot = sequence_to_dot(
+            reader.get_node_dict(), activations, color_by,
+            os.path.splitext(os.path.basename(sequence_file))[0])
+        extension = os.path.splitext(output_path or '')[1][1:].lower()
+        if extension in RENDER_FORMATS:
+            render(dot, output_path, extension)
+        elif output_path:
+            with open(output_path, 'w') as f:
+                f.write(dot)
+        else:
+            click.echo(dot, nl=False)
+    except (SequenceFileError, TraceFileError, GraphRenderError) as exc:
+        click.echo('{}: {}'.format(click.style('Error', bold=True, fg='red'),
+                                   exc), err=True)
+        sys.exit(1)
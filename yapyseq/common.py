@@ -7,8 +7,22 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
 import abc
+import fnmatch
+import os
+import time
+from collections import namedtuple
+from enum import Enum
+from types import CodeType
 from typing import Dict, Any
 
+# ------------------------------------------------------------------------------
+# Custom types
+# ------------------------------------------------------------------------------
+
+# A value that is not evaluated as a Python expression, even if it is a string.
+# Used for the expressions folded by `yapyseq.optimizer`.
+Literal = namedtuple("Literal", "value")
+
 # ------------------------------------------------------------------------------
 # Custom exceptions
 # ------------------------------------------------------------------------------
@@ -16,10 +30,50 @@ from typing import Dict, Any
 class YapyseqInternalError(RuntimeError):
     """An exception for errors not related to user content."""
 
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Cache of compiled expressions, keys are the expressions and values are code
+# objects. It is shared by every sequence of the process.
+_compiled_expressions: Dict[str, CodeType] = dict()
+
+# Cache files not used for this time are removed, in seconds (30 days)
+CACHE_MAX_AGE = 30 * 24 * 3600
+
 # ------------------------------------------------------------------------------
 # Common functions
 # ------------------------------------------------------------------------------
 
+def compile_expr(expr: str) -> CodeType:
+    """Compile a Python expression, or get it from the cache.
+
+    Args:
+        expr: a string with a Python expression.
+
+    Returns:
+        The code object of the expression, that can be given to eval().
+
+    Raises:
+        SyntaxError: if the expression is not a valid Python expression.
+    """
+    code = _compiled_expressions.get(expr)
+    if code is None:
+        code = compile(expr, '<expression>', 'eval')
+        _compiled_expressions[expr] = code
+    return code
+
+
+def add_compiled_expressions(compiled: Dict[str, CodeType]) -> None:
+    """Add already compiled expressions to the cache of compile_expr().
+
+    Args:
+        compiled: dictionary where keys are expressions and values their code
+            objects.
+    """
+    _compiled_expressions.update(compiled)
+
+
 def evaluate_expr(expr: Any, variables: Dict = None) -> Any:
     """Evaluate a Python expression if it is recognized as one.
 
@@ -30,14 +84,16 @@ def evaluate_expr(expr: Any, variables: Dict = None) -> Any:
             variables while evaluating the expression (arg of eval()).
 
     Returns:
-        The value of the evaluated expression, or the object itself if it is
-        not an expression.
+        The value of the evaluated expression, the value of a `Literal`, or
+        the object itself if it is not an expression.
     """
     if variables is None:
         variables = {}
     if type(expr) is str:
         # None is given as globals and variables are given as locals
-        value = eval(expr, None, variables)
+        value = eval(compile_expr(expr), None, variables)
+    elif type(expr) is Literal:
+        value = expr.value
     else:
         # If the expression is not an expression but directly
         # a value, do not evaluate it.
@@ -65,10 +121,110 @@ def evaluate_kwargs(kwargs_dict: Dict, variables: Dict = None) -> Dict:
     return evaluated_kwargs
 
 
+def get_version() -> str:
+    """Get the version of the installed yapyseq package.
+
+    Returns:
+        The version string, or 'unknown' if yapyseq is not installed.
+    """
+    try:
+        from importlib.metadata import version
+        return version('yapyseq')
+    except Exception:
+        return 'unknown'
+
+
+def get_cache_dir() -> str:
+    """Get the path of the directory where yapyseq stores its cache files.
+
+    It is `$XDG_CACHE_HOME/yapyseq` if the environment variable is set, and
+    `~/.cache/yapyseq` otherwise. The directory is not created by this
+    function.
+
+    Returns:
+        The path to the cache directory of yapyseq.
+    """
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    if not cache_home:
+        cache_home = os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'yapyseq')
+
+
+def prune_cache_files(directory: str, pattern: str,
+                      max_age: float = CACHE_MAX_AGE) -> int:
+    """Remove the cache files that have not been used for a while.
+
+    A file is used when its modification time is updated, so cache files must
+    be touched when they are loaded. Errors are ignored because the cache is
+    only an optimization.
+
+    Args:
+        directory: the directory of the cache files.
+        pattern: the pattern of the names of the cache files, see `fnmatch`.
+        max_age: (optional) the time after which an unused file is removed,
+            in seconds. Default is CACHE_MAX_AGE.
+
+    Returns:
+        The number of removed files.
+    """
+    limit = time.time() - max_age
+    removed = 0
+    try:
+        names = fnmatch.filter(os.listdir(directory), pattern)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.join(directory, name)
+        try:
+            if os.stat(path).st_mtime < limit:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def get_resource_path(name: str) -> str:
+    """Get the path of a data file of the yapyseq package.
+
+    Files are located with `importlib.resources`, which is much faster to
+    import than `pkg_resources`. Before Python 3.9, which has no
+    `importlib.resources.files`, they are located next to this module.
+
+    Args:
+        name: name of the file in the yapyseq package, like 'seq_schema.yaml'.
+
+    Returns:
+        The path to the file.
+    """
+    try:
+        from importlib.resources import files
+    except ImportError:
+        return os.path.join(os.path.dirname(os.path.realpath(__file__)), name)
+    return str(files('yapyseq').joinpath(name))
+
+
 # ------------------------------------------------------------------------------
 # Common classes
 # ------------------------------------------------------------------------------
 
+class ImportMode(Enum):
+    """When node functions and wrappers are imported.
+
+    EAGER: everything is imported during the initialization of the runner.
+    LAZY: functions and wrappers are only located and checked during the
+        initialization, and they are imported the first time their node is
+        dispatched.
+    WORKER: functions and wrappers are only located and checked during the
+        initialization, and they are imported by the process running their
+        node, at every activation. User modules are never imported in the
+        process of the runner.
+    """
+    EAGER = 0
+    LAZY = 1
+    WORKER = 2
+
+
 class NodeWrapper(abc.ABC):
     """Parent class used to create node wrappers.
 
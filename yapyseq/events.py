@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Events of the life of the nodes of a run.
+
+A `SequenceRunner` publishes events in its `EventDispatcher`
+(`runner.events`). Every subscriber gets its own `EventSubscription`, a
+bounded buffer read with an iterator, an async iterator, or a callback run
+by a thread of the subscription. Publishing never waits: when the buffer of a
+slow subscriber is full, an event is dropped according to its `DropPolicy`,
+and counted in `EventSubscription.dropped`.
+
+Subscriptions are closed at the end of the run, after the RunFinished event.
+Iterators stop once the remaining events are read. The run waits at most
+CLOSE_TIMEOUT seconds for the callbacks to get the remaining events, then the
+threads of slow callbacks go on in the background.
+"""
+
+from typing import Callable, Iterable, List, Union
+from collections import deque, namedtuple
+from enum import Enum
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# Times are given by time.time().
+
+# A node is processed by the runner.
+NodeEngaged = namedtuple("NodeEngaged", "time nid node_type")
+
+# The process of a function node is started.
+NodeDispatched = namedtuple("NodeDispatched", "time nid function_name")
+
+# The result of a function node is received (a FunctionNodeResult).
+NodeFinished = namedtuple("NodeFinished", "time nid result")
+
+# A transition from the source node to the target node is followed.
+TransitionTaken = namedtuple("TransitionTaken", "time source target")
+
+# A parallel sync node received every branch. synchronized is the sorted list
+# of the IDs of the synchronized nodes.
+SyncCompleted = namedtuple("SyncCompleted", "time nid synchronized")
+
+# The run is over. duration is in seconds.
+RunFinished = namedtuple("RunFinished", "time sequence duration")
+
+
+class DropPolicy(Enum):
+    """Which event is dropped when the buffer of a subscription is full.
+
+    DROP_OLDEST: the oldest buffered event, so that the latest state is kept.
+    DROP_NEWEST: the published event, so that the buffered events are kept.
+    """
+    DROP_OLDEST = 0
+    DROP_NEWEST = 1
+
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Types of the events published by a SequenceRunner
+EVENT_TYPES = (NodeEngaged, NodeDispatched, NodeFinished, TransitionTaken,
+               SyncCompleted, RunFinished)
+
+# Default size of the buffer of a subscription
+DEFAULT_BUFFER_SIZE = 1000
+
+# Maximum time a runner waits for the callbacks at the end of a run, in
+# seconds
+CLOSE_TIMEOUT = 1.0
+
+
+# ------------------------------------------------------------------------------
+# Main classes
+# ------------------------------------------------------------------------------
+
+
+class EventSubscription(object):
+    """Bounded buffer of the events of one subscriber.
+
+    Events can be read with `get`, by iterating over the subscription, or with
+    `async for`. A subscription created with a callback is read by its own
+    thread, which calls the callback for every event.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_BUFFER_SIZE,
+                 drop_policy: DropPolicy = DropPolicy.DROP_OLDEST,
+                 event_types: Iterable[type] = None,
+                 callback: Callable[[tuple], None] = None):
+        """Initialize an open subscription.
+
+        Args:
+            maxsize: (optional) the number of events the buffer can hold.
+            drop_policy: (optional) which event is dropped when the buffer is
+                full.
+            event_types: (optional) the types of the events to receive, among
+                EVENT_TYPES. Default is every type.
+            callback: (optional) function called with every event, from a
+                thread of the subscription. Exceptions it raises are ignored.
+
+        Raises:
+            ValueError: if maxsize is not positive.
+        """
+        if maxsize < 1:
+            raise ValueError("The buffer must hold at least one event, got "
+                             "{}.".format(maxsize))
+        self.maxsize = maxsize
+        self.drop_policy = drop_policy
+        self.event_types = tuple(event_types) if event_types else EVENT_TYPES
+        self.dropped = 0
+        self._buffer = deque()
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = None
+        if callback is not None:
+            self._thread = threading.Thread(
+                target=self._call_back, args=(callback,),
+                name='yapyseq-events', daemon=True)
+            self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        """True once no more events can be published (read-only)."""
+        return self._closed
+
+    def put(self, event: tuple) -> bool:
+        """Add an event to the buffer, without waiting.
+
+        Args:
+            event: the event.
+
+        Returns:
+            False if the event is not of a subscribed type, if the
+            subscription is closed, or if it was dropped.
+        """
+        if self._closed or not isinstance(event, self.event_types):
+            return False
+        with self._condition:
+            if len(self._buffer) >= self.maxsize:
+                self.dropped += 1
+                if self.drop_policy is DropPolicy.DROP_NEWEST:
+                    return False
+                self._buffer.popleft()
+            self._buffer.append(event)
+            self._condition.notify()
+        return True
+
+    def get(self, timeout: float = None) -> Union[tuple, None]:
+        """Remove and return the oldest event of the buffer.
+
+        Args:
+            timeout: (optional) the maximum time to wait for an event, in
+                seconds. Default is to wait until an event is published or
+                the subscription is closed.
+
+        Returns:
+            The event, or None if there is none before the timeout or if the
+            subscription is closed and empty.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._buffer or self._closed,
+                                     timeout)
+            if self._buffer:
+                return self._buffer.popleft()
+        return None
+
+    def close(self, wait: bool = True, timeout: float = None) -> None:
+        """Stop receiving events. Buffered events can still be read.
+
+        Args:
+            wait: (optional) if the subscription has a callback, wait until
+                it has been called with every buffered event.
+            timeout: (optional) the maximum time to wait, in seconds. Default
+                is to wait until the callback got every event.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if wait and self._thread is not None and \
+                self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    def __iter__(self) -> 'EventSubscription':
+        return self
+
+    def __next__(self) -> tuple:
+        event = self.get()
+        if event is None:
+            raise StopIteration
+        return event
+
+    def __aiter__(self) -> 'EventSubscription':
+        return self
+
+    async def __anext__(self) -> tuple:
+        # Waiting is done by a thread of the default executor, so that the
+        # event loop is not blocked
+        import asyncio
+        event = await asyncio.get_running_loop().run_in_executor(None,
+                                                                 self.get)
+        if event is None:
+            raise StopAsyncIteration
+        return event
+
+    def _call_back(self, callback: Callable[[tuple], None]) -> None:
+        """Call the callback with every event, until the subscription is
+        closed and empty."""
+        for event in self:
+            try:
+                callback(event)
+            except Exception:
+                pass
+
+
+class EventDispatcher(object):
+    """Class publishing the events of a run to its subscriptions."""
+
+    def __init__(self):
+        """Initialize a dispatcher without subscription."""
+        self._subscriptions: List[EventSubscription] = []
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        """True if there is at least one subscription (read-only).
+
+        The runner only creates events when it is True.
+        """
+        return bool(self._subscriptions)
+
+    def subscribe(self, callback: Callable[[tuple], None] = None,
+                  event_types: Iterable[type] = None,
+                  maxsize: int = DEFAULT_BUFFER_SIZE,
+                  drop_policy: DropPolicy = DropPolicy.DROP_OLDEST
+                  ) -> EventSubscription:
+        """Subscribe to the events.
+
+        Args:
+            callback: (optional) function called with every event, from a
+                thread of the subscription. Without callback, read the events
+                from the returned subscription.
+            event_types: (optional) the types of the events to receive, among
+                EVENT_TYPES. Default is every type.
+            maxsize: (optional) the number of events the buffer can hold.
+            drop_policy: (optional) which event is dropped when the buffer is
+                full.
+
+        Returns:
+            The new EventSubscription.
+        """
+        subscription = EventSubscription(maxsize, drop_policy, event_types,
+                                         callback)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        return subscription
+
+    def unsubscribe(self, subscription: EventSubscription) -> None:
+        """Close a subscription and stop publishing to it.
+
+        Args:
+            subscription: a subscription of this dispatcher.
+        """
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions
+                                   if s is not subscription]
+        subscription.close(wait=False)
+
+    def publish(self, event: tuple) -> None:
+        """Publish an event to every subscription, without waiting.
+
+        Args:
+            event: one of EVENT_TYPES.
+        """
+        # The list is replaced, never modified, so it can be read unlocked
+        for subscription in self._subscriptions:
+            subscription.put(event)
+
+    def close(self, wait: bool = True, timeout: float = None) -> None:
+        """Close every subscription.
+
+        Args:
+            wait: (optional) wait until the callbacks have been called with
+                every buffered event.
+            timeout: (optional) the maximum time to wait for all the
+                callbacks, in seconds. Default is to wait until they got
+                every event.
+        """
+        with self._lock:
+            subscriptions, self._subscriptions = self._subscriptions, []
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for subscription in subscriptions:
+            if deadline is not None:
+                timeout = max(0.0, deadline - time.monotonic())
+            subscription.close(wait, timeout)
@@ -7,13 +7,46 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
-from typing import Callable, Set, Dict, List
+from typing import Callable, Set, Dict, List, Union, Any, Tuple
+from collections import namedtuple
 import os
 import sys
-from importlib import import_module
-import mmap
+from importlib import import_module, invalidate_caches, reload
+from importlib.util import find_spec
+import ast
+import hashlib
+import json
 import re
+import tempfile
 
+from yapyseq.common import get_cache_dir, prune_cache_files
+
+# ------------------------------------------------------------------------------
+# MODULE CONSTANTS
+# ------------------------------------------------------------------------------
+
+# Types of the AST nodes defining first level items, for each item type.
+ITEM_NODE_TYPES = {
+    "function": (ast.FunctionDef, ast.AsyncFunctionDef),
+    "class": (ast.ClassDef,),
+}
+
+# Patterns used to find first level items in a Python file that cannot be
+# parsed. They must be used on bytes. The name of the item is the first group.
+ITEM_PATTERNS = {
+    "function": re.compile(rb"^(?:async\s+)?def\s+(\w+)\s*\(", re.MULTILINE),
+    "class": re.compile(rb"^class\s+(\w+)\s*[(:]", re.MULTILINE),
+}
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# Reference to an item which is located but not imported yet.
+# `name` is the name of the item, and `path` the Python file defining it.
+# For a qualified name like "package.module:item", `path` is None because the
+# module is found by the import system.
+ItemReference = namedtuple("ItemReference", "name path")
 
 # ------------------------------------------------------------------------------
 # Custom exception for this module
@@ -37,10 +70,367 @@ class WrapperTypeError(ImportError):
 
 
 # ------------------------------------------------------------------------------
-# Main class
+# Common functions
 # ------------------------------------------------------------------------------
 
 
+def scan_file(file_path: str) -> Dict[str, List[str]]:
+    """Find all the first level items defined in a python file.
+
+    Only first level items are searched. It means they must be contained
+    in the file itself, and not nested in a class or in a function.
+
+    The file is parsed into an AST, so the encoding declared in the file is
+    respected, and `async def` and decorated definitions are found. If the
+    file cannot be parsed, items are searched with regular expressions, so that
+    the error is reported when trying to import them.
+
+    Args:
+        file_path: Path to the .py file where items must be searched.
+
+    Returns:
+        A dictionary where keys are the item types ("function" and "class")
+        and values are the lists of item names found in the file.
+
+    Raises:
+        FileNotFoundError: if file_path lead to no real file.
+        OSError: if file cannot be read.
+    """
+    if not os.path.isfile(file_path):
+        raise FileNotFoundError("No file can be found at"
+                                " {}".format(file_path))
+
+    with open(file_path, 'rb') as f:
+        source = f.read()
+
+    found_items = dict([(t, []) for t in ITEM_NODE_TYPES])
+    try:
+        tree = ast.parse(source, filename=file_path)
+    except (SyntaxError, ValueError):
+        for item_type, pattern in ITEM_PATTERNS.items():
+            found_items[item_type] = [i.decode('utf-8', errors='replace')
+                                      for i in pattern.findall(source)]
+        return found_items
+
+    # Only the statements of the module body are first level items
+    for statement in tree.body:
+        for item_type, node_types in ITEM_NODE_TYPES.items():
+            if isinstance(statement, node_types):
+                found_items[item_type].append(statement.name)
+
+    return found_items
+
+
+def split_item_name(item_name: str) -> Tuple[Union[str, None], str]:
+    """Split the name of an item into its module and its own name.
+
+    Items can be given with a bare name like "item", to be searched in a
+    directory, or with a qualified name like "package.module:item".
+
+    Args:
+        item_name: The name of the item.
+
+    Returns:
+        2-tuple: module name, name of the item in the module.
+        The module name is None for a bare name.
+
+    Raises:
+        ItemExistenceError: if the qualified name is malformed.
+    """
+    if ':' not in item_name:
+        return None, item_name
+    module_name, sep, attr_name = item_name.partition(':')
+    if (not module_name or not attr_name.isidentifier() or
+            not all(p.isidentifier() for p in module_name.split('.'))):
+        raise ItemExistenceError(("Following item name is not a valid "
+                                  "reference: {}").format(item_name))
+    return module_name, attr_name
+
+
+def import_qualified_item(item_name: str) -> Any:
+    """Import an item from its qualified name "package.module:item".
+
+    The module is imported with `importlib`, using the current path.
+    The path is not modified.
+
+    Args:
+        item_name: The qualified name of the item.
+
+    Returns:
+        The imported item.
+
+    Raises:
+        ItemExistenceError: if the qualified name is malformed.
+        ImportError: if a problem occurred during the importation.
+    """
+    module_name, attr_name = split_item_name(item_name)
+    try:
+        mod = import_module(module_name)
+        imported_item = getattr(mod, attr_name)
+    except (ImportError, AttributeError) as exc:
+        raise ImportError(("Error while trying to import the following"
+                           " item: {}").format(item_name)) from exc
+    return imported_item
+
+
+def import_item(item_name: str, file_path: str) -> Any:
+    """Import an item from a given Python file.
+
+    The directory of the file is added to the path, and the file is imported
+    as a module named after the file.
+
+    Args:
+        item_name: The name of the item to import.
+        file_path: Path to the .py file defining the item.
+
+    Returns:
+        The imported item.
+
+    Raises:
+        ImportError: if a problem occurred during the importation.
+    """
+    # Decompose the path
+    file_dir, file_name = os.path.split(file_path)
+    file_name_no_ext, ext = os.path.splitext(file_name)
+
+    # Add file directory to the path, only once
+    if file_dir not in sys.path:
+        sys.path.append(file_dir)
+
+    # Import the item
+    try:
+        mod = import_module(file_name_no_ext)
+        imported_item = getattr(mod, item_name)
+    except ImportError as exc:
+        raise ImportError(("Error while trying to import the following"
+                           " item: {}").format(item_name)) from exc
+    return imported_item
+
+
+def resolve_item(item: Any) -> Any:
+    """Get the actual object of an item that may not be imported yet.
+
+    Args:
+        item: An ItemReference, or an object already imported.
+
+    Returns:
+        The imported item if an ItemReference is given, or the given object
+        itself otherwise.
+
+    Raises:
+        Same as import_item()
+    """
+    if isinstance(item, ItemReference):
+        if item.path is None:
+            return import_qualified_item(item.name)
+        return import_item(item.name, item.path)
+    return item
+
+
+def default_index_cache_path(directory: str) -> str:
+    """Get the default path of the index cache file of a directory.
+
+    The file is stored in the cache directory of yapyseq, and its name depends
+    on the real path of the indexed directory.
+
+    Args:
+        directory: The directory indexed by a FunctionIndex.
+
+    Returns:
+        The path to the JSON cache file of the index of this directory.
+    """
+    real_path = os.path.realpath(directory)
+    digest = hashlib.sha1(real_path.encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir(), 'index-{}.json'.format(digest))
+
+
+def prune_index_cache() -> int:
+    """Remove the index cache files of the cache directory of yapyseq that
+    have not been used for `yapyseq.common.CACHE_MAX_AGE`.
+
+    Returns:
+        The number of removed files.
+    """
+    return prune_cache_files(get_cache_dir(), 'index-*.json')
+
+
+# ------------------------------------------------------------------------------
+# Main classes
+# ------------------------------------------------------------------------------
+
+
+class FunctionIndex(object):
+    """Index of the items defined in the Python files of a directory.
+
+    For every Python file found in the directory (search is recursive), the
+    index stores the names of the functions and classes defined at the first
+    level of the file. Each entry is keyed on the path, the modification time
+    and the size of its file, so that a file which did not change since the
+    last update is never read again.
+
+    The index can be saved in a JSON cache file, to be reused by other
+    instances and other processes.
+
+    Public attributes:
+        directory: The indexed directory.
+        cache_path: Path to the cache file, or None if the index is not saved.
+    """
+
+    # Version of the format of the cache file.
+    # Cache files with another version are ignored.
+    CACHE_VERSION = 2
+
+    # --------------------------------------------------------------------------
+    # Private methods
+    # --------------------------------------------------------------------------
+
+    def __init__(self, directory: str, cache_path: str = None):
+        """Initialize the index of a directory.
+
+        The cache file is loaded if it exists, but the index is not updated.
+        Call `update()` to synchronize it with the content of the directory.
+
+        Args:
+            directory: The directory to index.
+            cache_path: (optional) Path to the JSON file in which the index is
+                saved between two runs. None to keep the index in memory only.
+        """
+        self.directory = directory
+        self.cache_path = cache_path
+        # Keys are the paths of the files relatively to the directory,
+        # values are dicts with keys 'mtime', 'size', and the item types.
+        self._entries = dict()
+        self._load_cache()
+
+    def _load_cache(self) -> None:
+        """Load the entries of the index from its cache file.
+
+        A cache file that does not exist, that cannot be read or that has not
+        the expected format is simply ignored.
+        """
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                content = json.load(f)
+        except (OSError, ValueError):
+            return
+        if (not isinstance(content, dict) or
+                content.get('version') != self.CACHE_VERSION or
+                content.get('directory') !=
+                os.path.realpath(self.directory)):
+            return
+        self._entries = content.get('files', dict())
+        # Used cache files are not pruned
+        try:
+            os.utime(self.cache_path)
+        except OSError:
+            pass
+
+    def _save_cache(self) -> None:
+        """Save the entries of the index in its cache file.
+
+        The file is written atomically. Errors are ignored because the cache
+        is only an optimization.
+        """
+        if not self.cache_path:
+            return
+        content = {'version': self.CACHE_VERSION,
+                   'directory': os.path.realpath(self.directory),
+                   'files': self._entries}
+        cache_dir = os.path.dirname(os.path.abspath(self.cache_path))
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(content, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            pass
+
+    # --------------------------------------------------------------------------
+    # Public methods
+    # --------------------------------------------------------------------------
+
+    def update(self) -> Set[str]:
+        """Synchronize the index with the content of the directory.
+
+        The directory is walked once. Only new files and files whose
+        modification time or size changed are scanned again. Entries of
+        removed files are dropped. The cache file is saved if anything changed.
+
+        Returns:
+            The set of paths (relative to the directory) of the files that
+            have been scanned, or removed from the index.
+
+        Raises:
+            NotADirectoryError: if the indexed directory does not exist.
+            OSError: if a file cannot be read.
+        """
+        if not os.path.isdir(self.directory):
+            raise NotADirectoryError(
+                "The directory {} does not exist.".format(self.directory))
+
+        entries = dict()
+        # Keys are relative paths, values are the stat results of the files
+        to_scan = dict()
+        for (path, dir_list, file_list) in os.walk(self.directory):
+            for file_name in file_list:
+                if not file_name.endswith(".py"):
+                    continue
+                file_path = os.path.join(path, file_name)
+                rel_path = os.path.relpath(file_path, self.directory)
+                stat = os.stat(file_path)
+                entry = self._entries.get(rel_path)
+                if (entry is None or entry['mtime'] != stat.st_mtime_ns or
+                        entry['size'] != stat.st_size):
+                    to_scan[rel_path] = stat
+                else:
+                    entries[rel_path] = entry
+
+        # Scan new and modified files. Parsing holds the GIL, so threads
+        # would not scan them faster.
+        for rel_path, stat in to_scan.items():
+            entry = scan_file(os.path.join(self.directory, rel_path))
+            entry['mtime'] = stat.st_mtime_ns
+            entry['size'] = stat.st_size
+            entries[rel_path] = entry
+
+        changed = set(to_scan)
+        changed.update(set(self._entries).difference(entries))
+        self._entries = entries
+        if changed:
+            self._save_cache()
+        return changed
+
+    def locate(self, item_set: Set, item_type: str) -> Dict[str, List[str]]:
+        """Get the files where some items are defined.
+
+        Args:
+            item_set: The names of the items to locate.
+            item_type: The type of the items. Whether "function" or "class".
+
+        Returns:
+            A dictionary where keys are the item names and values are the
+            lists of paths of the files defining them. A list is empty if an
+            item has not been found, and has several paths if it is defined
+            several times.
+
+        Raises:
+            ValueError: if item_type is unknown.
+        """
+        if item_type not in ITEM_NODE_TYPES:
+            raise ValueError("Unknown item_type")
+        locations = dict([(i, []) for i in item_set])
+        for rel_path, entry in self._entries.items():
+            for item_name in entry[item_type]:
+                if item_name in locations:
+                    locations[item_name].append(
+                        os.path.join(self.directory, rel_path))
+        return locations
+
+
+
 class FunctionGrabber(object):
     """Class to get access to functions of a specific directory.
 
@@ -49,6 +439,17 @@ class FunctionGrabber(object):
           executed in a given sequence.
         * Provide these functions on demand through its API
 
+    Python files are found using a `FunctionIndex` of the directory, which
+    is built once per directory and shared by functions and wrappers. When
+    an item is not found, is found several times, or is found in a file that
+    does not exist anymore, the index is updated and the item is searched
+    again, so that added and removed files are taken into account. Call
+    `refresh` to also take modified files into account.
+
+    In lazy mode, items are only located and checked, but not imported.
+    `ItemReference` objects are provided instead, and they can be imported
+    later with `resolve_item()`.
+
     Public attributes:
         None
     """
@@ -57,9 +458,28 @@ class FunctionGrabber(object):
     # Private methods
     # --------------------------------------------------------------------------
 
-    def __init__(self):
+    def __init__(self, index_cache: Union[bool, str] = False,
+                 lazy: bool = False):
+        """Initialize the FunctionGrabber.
+
+        Args:
+            index_cache: (optional) this configures the cache file of the
+                directory indexes, and can have the following values:
+                    * True to save indexes in the cache directory of yapyseq.
+                      Index files not used for
+                      `yapyseq.common.CACHE_MAX_AGE` are removed.
+                    * False to keep indexes in memory only (default).
+                    * A path to the cache file to use. This is only relevant
+                      if a single directory is used with this object.
+            lazy: (optional) True to provide ItemReference objects instead of
+                importing the items. Default is False.
+        """
+        self._lazy = lazy
         self._imported_functions = dict()
         self._imported_wrappers = dict()
+        self._index_cache = index_cache
+        # Indexes of the directories, keys are the real paths of directories
+        self._indexes: Dict[str, FunctionIndex] = dict()
 
     @staticmethod
     def _search_items_in_file(file_path: str, item_set: Set, item_type: str) -> Set:
@@ -67,9 +487,7 @@ class FunctionGrabber(object):
 
         Only first level items are searched. It means they must be contained
         in the file itself, and not nested in a class or in a function.
-
-        Warning:
-            Only works on utf-8 encoded files.
+        See `scan_file()`.
 
         Args:
             file_path: Path to the .py file where items must be searched.
@@ -86,39 +504,68 @@ class FunctionGrabber(object):
             OSError: if file cannot be read.
             ValueError: if item_type is unknown
         """
-        if item_type == "function":
-            type_pattern = "def"
-        elif item_type == "class":
-            type_pattern = "class"
-        else:
+        if item_type not in ITEM_NODE_TYPES:
             raise ValueError("Unknown item_type")
-        if not os.path.isfile(file_path):
-            raise FileNotFoundError("No file can be found at"
-                                    " {}".format(file_path))
-
-        # Create a REGEX pattern to find all items in the files
-        # This pattern contains all the item names, it will be like
-        # this: "def (func1|func2|func3|)\s*\("
-        # It must be used with re.findall()
-        spattern = r"^{} (".format(type_pattern)
-        for item in item_set:
-            spattern = spattern + "{}|".format(item)
-        spattern = spattern + r")\s*\("
-        # pattern must be given in bytes because mmap read bytes
-        bpattern = bytes(spattern, "utf-8")  # files are utf-8
-
-        with open(file_path, 'rb', 0) as f:
-            # To know why mmap is used, read
-            # https://stackoverflow.com/questions/258091/when-should-i-use-mmap-for-file-access
-            # https://stackoverflow.com/questions/25268465/using-mmap-to-apply-regexp-to-whole-file-in-python
-            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mfile:
-                # Find all functions from the set in one shot
-                found_items = re.findall(bpattern, mfile, re.MULTILINE)
-
-        # Decode binary strings into utf-8
-        found_items = [f.decode('utf-8') for f in found_items]
-
-        return set(found_items)
+        found_items = scan_file(file_path)[item_type]
+        return set(found_items).intersection(item_set)
+
+    def _get_index(self, directory: str) -> FunctionIndex:
+        """Get the up-to-date index of a directory.
+
+        The index is created and updated the first time a directory is
+        requested, then it is reused.
+
+        Args:
+            directory: The directory to index.
+
+        Returns:
+            The FunctionIndex of this directory.
+
+        Raises:
+            Same as FunctionIndex.update()
+        """
+        real_path = os.path.realpath(directory)
+        if real_path not in self._indexes:
+            if self._index_cache is True:
+                cache_path = default_index_cache_path(directory)
+            elif self._index_cache is False:
+                cache_path = None
+            else:
+                cache_path = self._index_cache
+            index = FunctionIndex(directory, cache_path)
+            index.update()
+            self._indexes[real_path] = index
+            if self._index_cache is True:
+                prune_index_cache()
+        return self._indexes[real_path]
+
+    def _locate_items(self, directory: str, item_set: Set,
+                      item_type: str) -> Dict[str, List[str]]:
+        """Get the files where some items are defined, from the index of a
+        directory.
+
+        An index that was already built is updated if an item has not
+        exactly one location, or if a location does not exist anymore.
+
+        Args:
+            directory: The directory to search in.
+            item_set: The names of the items to locate.
+            item_type: The type of the items. Whether "function" or "class".
+
+        Returns:
+            Same as FunctionIndex.locate()
+
+        Raises:
+            Same as FunctionIndex.update()
+        """
+        is_new = os.path.realpath(directory) not in self._indexes
+        index = self._get_index(directory)
+        locations = index.locate(item_set, item_type)
+        if not is_new and not all([len(l) == 1 and os.path.isfile(l[0])
+                                   for l in locations.values()]):
+            index.update()
+            locations = index.locate(item_set, item_type)
+        return locations
 
     def _import_items(self, directory: str, item_set: Set, item_type: str) -> Dict:
         """Search for items in a directory and import them.
@@ -128,6 +575,10 @@ class FunctionGrabber(object):
         containing these items will also be imported, following the
         classical import management of Python.
 
+        Items with a qualified name like "package.module:item" are not
+        searched in the directory, they are directly imported from their
+        module, which must be importable with the current path.
+
         Args:
             directory: The directory in which items must be searched for.
                 Only the files contained in this directory and its sub-directories
@@ -137,7 +588,8 @@ class FunctionGrabber(object):
                 "class".
 
         Returns:
-            Dictionary of imported items.
+            Dictionary of imported items, or of ItemReference objects in lazy
+            mode.
 
         Raises:
             NotADirectoryError: if the given directory does not exist.
@@ -151,31 +603,19 @@ class FunctionGrabber(object):
             raise NotADirectoryError(
                 "The directory {} does not exist.".format(directory))
 
-        # Create a dict to store a counter for each item in the list
-        # Each counter counts the number of time an item has been found
-        # All counters are initialized to zero before the search begins
-        # Counters will serve to check uniqueness of items
-        counter_dict = dict([(i, 0) for i in item_set])
+        # Separate qualified names from the bare names to search for
+        qualified_set = set([i for i in item_set
+                             if split_item_name(i)[0] is not None])
+        item_set = set(item_set).difference(qualified_set)
 
-        # Create a dict that contains Python files to import for each function
-        # In other words, it contains the location of each function
-        location_dict = dict([(i, None) for i in item_set])
-
-        # For every Python file that is found, search for items
-        # and save their location.
-        for (path, dir_list, file_list) in os.walk(directory):
-            for file_name in file_list:
-                if file_name.endswith(".py"):
-                    file_path = os.path.join(path, file_name)
-                    # Search for items in this file
-                    found_items = self._search_items_in_file(file_path,
-                                                            item_set,
-                                                            item_type)
-                    for item_name in found_items:
-                        # Update the counter
-                        counter_dict[item_name] += 1
-                        # Save location
-                        location_dict[item_name] = file_path
+        # Get the location of each item from the index of the directory.
+        # Several locations for an item means it is not unique.
+        # The directory is not indexed if every name is qualified.
+        if item_set:
+            locations = self._locate_items(directory, item_set, item_type)
+        else:
+            locations = dict()
+        counter_dict = dict([(i, len(l)) for i, l in locations.items()])
 
         # Check uniqueness of all items
         non_unique_items = [i for i in item_set if counter_dict[i] > 1]
@@ -189,25 +629,29 @@ class FunctionGrabber(object):
             raise ItemExistenceError(("Following items have not been "
                                       "found: {}".format(not_found_items)))
 
-        # Import items
+        # Import items, or only reference them in lazy mode
         imported_items = {}
         for item_name in item_set:
-            # Decompose the path
-            file_path = location_dict[item_name]
-            file_dir, file_name = os.path.split(file_path)
-            file_name_no_ext, ext = os.path.splitext(file_name)
-
-            # Add file directory to the path
-            sys.path.append(file_dir)
-
-            # Import the item
-            try:
-                mod = import_module(file_name_no_ext)
-                imported_item = getattr(mod, item_name)
-            except ImportError as exc:
-                raise ImportError(("Error while trying to import the following"
-                                   " item: {}").format(item_name)) from exc
-            imported_items[item_name] = imported_item
+            file_path = locations[item_name][0]
+            if self._lazy:
+                imported_items[item_name] = ItemReference(item_name, file_path)
+            else:
+                imported_items[item_name] = import_item(item_name, file_path)
+        for item_name in qualified_set:
+            if self._lazy:
+                # Only check that the module can be found
+                module_name, attr_name = split_item_name(item_name)
+                try:
+                    spec = find_spec(module_name)
+                except ImportError:
+                    spec = None
+                if spec is None:
+                    raise ItemExistenceError(
+                        ("Module of the following item cannot be found: "
+                         "{}").format(item_name))
+                imported_items[item_name] = ItemReference(item_name, None)
+            else:
+                imported_items[item_name] = import_qualified_item(item_name)
 
         return imported_items
 
@@ -261,6 +705,37 @@ class FunctionGrabber(object):
         self._imported_wrappers = self._import_items(directory, wrapper_set,
                                                      "class")
 
+    def refresh(self, directory: str) -> Set[str]:
+        """Take into account the modifications of the files of a directory.
+
+        The index of the directory is updated, and the modules of the
+        modified files that are already imported are reloaded, so that the
+        next imports give their new content. Objects already given by
+        `get_function` and `get_wrappers` are not updated: items must be
+        imported again.
+
+        Args:
+            directory: The directory in which items are searched for.
+
+        Returns:
+            The set of real paths of the files that have been modified, added
+            or removed since the last refresh.
+
+        Raises:
+            Same as FunctionIndex.update()
+            Same as importlib.reload()
+        """
+        index = self._get_index(directory)
+        changed = set([os.path.realpath(os.path.join(index.directory, p))
+                       for p in index.update()])
+        if changed:
+            invalidate_caches()
+            for module in list(sys.modules.values()):
+                module_file = getattr(module, '__file__', None)
+                if module_file and os.path.realpath(module_file) in changed:
+                    reload(module)
+        return changed
+
     def get_function(self, func_name: str) -> Callable:
         """Get the function object of a given function name, already imported
 
@@ -269,7 +744,8 @@ class FunctionGrabber(object):
               imported previously, using import_functions().
 
         Returns:
-            The function object of type Callable.
+            The function object of type Callable, or an ItemReference in lazy
+            mode.
 
         Raises:
             UnknownFunction is the function has not been imported.
@@ -287,7 +763,7 @@ class FunctionGrabber(object):
 
         Returns:
             A dictionary where keys are wrapper names and values are references
-            to classes.
+            to classes, or ItemReference objects in lazy mode.
         """
         if any(name not in self._imported_wrappers for name in wrapper_names):
             raise UnknownItem('On of the required wrappers has not been '
@@ -0,0 +1,250 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Rendering of the graph of a sequence with Graphviz.
+
+`sequence_to_dot` describes the nodes and transitions of a sequence in the
+DOT language. With the activations of a run (see `yapyseq.analysis`), it
+becomes a heatmap of the run: nodes are coloured by their cumulative time or
+by their number of activations, and transitions are labelled with the number
+of times they were followed. Transitions never followed are dashed.
+
+DOT is written without any dependency. `render` converts it to SVG, PNG or
+PDF with the `dot` program of Graphviz, which must be installed.
+"""
+
+from typing import Dict, Iterable, Tuple
+from collections import namedtuple
+import shutil
+import subprocess
+
+from yapyseq.analysis import get_end_time
+
+# ------------------------------------------------------------------------------
+# Custom exception for this module
+# ------------------------------------------------------------------------------
+
+
+class GraphRenderError(RuntimeError):
+    """Raised when a graph cannot be rendered by Graphviz."""
+
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# Activity of a node during a run: number of activations, and cumulative time
+# from their readiness to their end, in seconds.
+NodeActivity = namedtuple("NodeActivity", "activations time")
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Values by which nodes can be coloured: fields of NodeActivity
+COLOR_FIELDS = ('time', 'activations')
+
+# Formats of `render`, supported by the `dot` program
+RENDER_FORMATS = ('svg', 'png', 'pdf')
+
+# Shapes of the nodes, by node type
+NODE_SHAPES = {'start': 'circle', 'stop': 'doublecircle', 'function': 'box',
+               'variable': 'note', 'parallel_split': 'trapezium',
+               'parallel_sync': 'invtrapezium'}
+
+# Hue of the coldest and of the hottest nodes (HSV, from 0 to 1): yellow to red
+_COLD_HUE, _HOT_HUE = 0.15, 0.0
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def collect_node_activity(activations: Iterable[Dict]) -> Dict[int,
+                                                               NodeActivity]:
+    """Add up the activations of every node.
+
+    Args:
+        activations: the descriptions of the activations, see
+            `yapyseq.analysis.load_activations`.
+
+    Returns:
+        A dictionary where keys are node IDs and values NodeActivity
+        namedtuples. Nodes never activated are not in it.
+    """
+    activity = dict()
+    for activation in activations:
+        count, time = activity.get(activation['nid'], (0, 0.0))
+        activity[activation['nid']] = NodeActivity(
+            count + 1,
+            time + get_end_time(activation) -
+            activation['timestamps']['ready'])
+    return activity
+
+
+def count_transitions(activations: Iterable[Dict]) -> Dict[Tuple[int, int],
+                                                           int]:
+    """Count how many times each transition was followed.
+
+    The node after a parallel sync is led by every synchronized activation,
+    but the transition is followed once.
+
+    Args:
+        activations: the descriptions of the activations, see
+            `yapyseq.analysis.load_activations`.
+
+    Returns:
+        A dictionary where keys are 2-tuples (source node ID, target node ID)
+        and values the number of times the transition was followed.
+    """
+    activations = list(activations)
+    nids = dict([(a['activation'], a['nid']) for a in activations])
+    counts = dict()
+    for activation in activations:
+        for source in set([nids[p] for p in activation['previous']
+                           if p in nids]):
+            key = (source, activation['nid'])
+            counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def heat_color(fraction: float) -> str:
+    """Get the fill colour of a node, from cold (0) to hot (1).
+
+    Args:
+        fraction: the value of the node divided by the greatest value.
+
+    Returns:
+        A Graphviz colour, as "hue saturation value".
+    """
+    fraction = min(max(fraction, 0.0), 1.0)
+    return '{:.3f} {:.3f} 1.000'.format(
+        _COLD_HUE + (_HOT_HUE - _COLD_HUE) * fraction, 0.15 + 0.85 * fraction)
+
+
+def sequence_to_dot(nodes: Dict, activations: Iterable[Dict] = None,
+                    color_by: str = 'time', name: str = 'sequence') -> str:
+    """Describe the graph of a sequence in the DOT language.
+
+    Args:
+        nodes: dictionary where keys are node IDs and values Node objects,
+            see `SequenceReader.get_node_dict`.
+        activations: (optional) the descriptions of the activations of a run,
+            see `yapyseq.analysis.load_activations`. Without them, only the
+            structure of the sequence is described.
+        color_by: (optional) the field of NodeActivity by which nodes are
+            coloured, see COLOR_FIELDS.
+        name: (optional) the name of the graph.
+
+    Returns:
+        The DOT source of a directed graph.
+
+    Raises:
+        ValueError: if color_by is not in COLOR_FIELDS.
+    """
+    if color_by not in COLOR_FIELDS:
+        raise ValueError("Nodes can be coloured by {}, not {}.".format(
+            COLOR_FIELDS, color_by))
+    traced = activations is not None
+    if traced:
+        activations = list(activations)
+        activity = collect_node_activity(activations)
+        fired = count_transitions(activations)
+        hottest = max([getattr(a, color_by) for a in activity.values()] or
+                      [0])
+    lines = ['digraph {} {{'.format(_quote(name)),
+             '  node [fontname="Helvetica", style="filled", '
+             'fillcolor="white"];',
+             '  edge [fontname="Helvetica", fontsize=10];']
+
+    for nid in sorted(nodes):
+        node = nodes[nid]
+        label = [node.name or 'Node {}'.format(nid)]
+        function_name = getattr(node, 'function_name', None)
+        label.append(function_name or node.node_type.replace('_', ' '))
+        attributes = {'shape': NODE_SHAPES.get(node.node_type, 'box')}
+        if traced:
+            node_activity = activity.get(nid)
+            if node_activity is None:
+                attributes['style'] = 'dashed'
+                label.append('not activated')
+            else:
+                label.append('{} activation(s), {:.3f} s'.format(
+                    node_activity.activations, node_activity.time))
+                value = getattr(node_activity, color_by)
+                attributes['fillcolor'] = heat_color(
+                    value / hottest if hottest else 0)
+        attributes['label'] = '\n'.join(label)
+        lines.append('  {} [{}];'.format(nid, _format_attributes(attributes)))
+
+    for nid in sorted(nodes):
+        for transition in getattr(nodes[nid], 'transitions', ()):
+            attributes = dict()
+            label = [transition.condition] if transition.condition else []
+            if traced:
+                count = fired.get((nid, transition.target), 0)
+                label.append('x{}'.format(count))
+                if count:
+                    attributes['penwidth'] = '{:.1f}'.format(
+                        1 + 3 * count / max(fired.values()))
+                else:
+                    attributes['style'] = 'dashed'
+                    attributes['color'] = 'gray'
+            if label:
+                attributes['label'] = '\n'.join(label)
+            lines.append('  {} -> {}{};'.format(
+                nid, transition.target,
+                ' [{}]'.format(_format_attributes(attributes))
+                if attributes else ''))
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+
+def render(dot: str, path: str, output_format: str = 'svg') -> None:
+    """Render a DOT source in a file with the `dot` program of Graphviz.
+
+    Args:
+        dot: the DOT source.
+        path: the path of the file to write.
+        output_format: (optional) one of RENDER_FORMATS.
+
+    Raises:
+        ValueError: if the format is not supported.
+        GraphRenderError: if Graphviz is not installed or fails.
+    """
+    if output_format not in RENDER_FORMATS:
+        raise ValueError("Graphs can be rendered as {}, not {}.".format(
+            RENDER_FORMATS, output_format))
+    executable = shutil.which('dot')
+    if executable is None:
+        raise GraphRenderError("The program 'dot' of Graphviz is needed to "
+                               "render {} files. Write a .dot file "
+                               "instead.".format(output_format.upper()))
+    process = subprocess.run(
+        [executable, '-T{}'.format(output_format), '-o', path],
+        input=dot.encode('utf-8'), stderr=subprocess.PIPE)
+    if process.returncode != 0:
+        raise GraphRenderError("Graphviz failed: {}".format(
+            process.stderr.decode('utf-8', 'replace').strip()))
+
+
+# ------------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------------
+
+
+def _quote(text: str) -> str:
+    """Quote a string for the DOT language."""
+    return '"{}"'.format(str(text).replace('\\', '\\\\').replace('"', '\\"')
+                         .replace('\n', '\\n'))
+
+
+def _format_attributes(attributes: Dict[str, str]) -> str:
+    """Format the attributes of a node or an edge, sorted by name."""
+    return ', '.join(['{}={}'.format(key, _quote(value))
+                      for key, value in sorted(attributes.items())])
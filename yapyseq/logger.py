@@ -5,9 +5,59 @@
 This Source Code Form is subject to the terms of the Mozilla Public
 License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Logging of yapyseq.
+
+Every run logs with its own `RunLog`: a logger which is not registered in the
+logging module, with a single handler, so that runs of the same process never
+share handlers. While a run is going on, records are put in a queue and
+written by a listener thread, so that writing to the console or to a file
+never delays the scheduling of the nodes. Before and after the run, records
+are written directly.
+
+Messages use the lazy %-style of the logging module, so that they are not
+formatted when their level is disabled. Events of nodes give their fields
+with `event_fields`, and `JsonFormatter` writes them as one JSON object per
+line.
 """
 
+from typing import Dict, Union
+import json
 import logging
+import logging.handlers
+import queue
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Default format of text records
+DEFAULT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Formats of the records of a RunLog
+LOG_FORMATS = ('text', 'json')
+
+# Attribute of the handlers added by `get_logger`
+_HANDLER_MARK = '_yapyseq_handler'
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def event_fields(event: str, **fields) -> Dict:
+    """Describe an event, to give as `extra` to the logging methods.
+
+    Args:
+        event: the name of the event, for instance "node_engaged".
+        fields: other fields of the event, with JSON types.
+
+    Returns:
+        A dictionary to give as `extra`. The fields are written by
+        `JsonFormatter`, and ignored by text formatters.
+    """
+    fields['event'] = event
+    return {'event': fields}
 
 
 def get_logger(name: str,
@@ -17,8 +67,11 @@ def get_logger(name: str,
                disabled: bool=False):
     """Create and get a logging.Logger object with a single handler.
 
+    The handler added by a previous call for the same name is replaced, so
+    that records are never written twice.
+
     Args:
-        name: (str) the name of the logger to get with logging.getLogger
+        name: (str) the name of the logger to get with logging.getLogger
         level: (int) (optional) the level of logging.
             Default is logging.INFO.
         file_path: (str) (optional) A string being a path to a file to write
@@ -26,31 +79,203 @@ def get_logger(name: str,
             already exists. None to display log in console (default).
         entry_format: (str) (optional) String being the format of the logs.
             If None (default) a default format will be used.
-        disabled: (bool) (optional) Set to True to disable the logging. If a
+        disabled: (bool) (optional) Set to True to disable this logger. If a
             file path is given, it will still be created but with nothing
-            inside. Default is False.
+            inside. Other loggers are not affected. Default is False.
 
     Returns:
         A logging.Logger object, already configured.
     """
     logger = logging.getLogger(name)
     logger.setLevel(level)
+    for handler in list(logger.handlers):
+        if getattr(handler, _HANDLER_MARK, False):
+            logger.removeHandler(handler)
+            handler.close()
+
+    handler = make_handler(file_path)
+    handler.setFormatter(logging.Formatter(entry_format or DEFAULT_FORMAT))
+    setattr(handler, _HANDLER_MARK, True)
+    logger.addHandler(handler)
+    logger.disabled = disabled
+
+    return logger
+
 
+def make_handler(file_path: str = None) -> logging.Handler:
+    """Create a handler writing in a file, or in the console.
+
+    Args:
+        file_path: (optional) the path of the file, overwritten if it exists.
+            Default is the console (stderr).
+
+    Returns:
+        A logging.Handler object, without formatter.
+    """
     if file_path:
-        handler = logging.FileHandler(file_path)
-    else:
-        handler = logging.StreamHandler()
+        return logging.FileHandler(file_path, mode='w')
+    return logging.StreamHandler()
 
-    if entry_format:
-        formatter = logging.Formatter(entry_format)
-    else:
-        formatter = logging.Formatter(
-            '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
 
-    logger.addHandler(handler)
+def disabled_logger(name: str) -> logging.Logger:
+    """Create a logger which does not log anything.
 
-    if disabled:
-        logging.disable(logging.CRITICAL)
+    It is not registered in the logging module, and other loggers are not
+    affected.
 
+    Args:
+        name: the name of the logger.
+
+    Returns:
+        A logging.Logger object.
+    """
+    logger = logging.Logger(name)
+    logger.disabled = True
     return logger
+
+
+# ------------------------------------------------------------------------------
+# Main classes
+# ------------------------------------------------------------------------------
+
+
+class JsonFormatter(logging.Formatter):
+    """Formatter writing every record as a JSON object on one line.
+
+    The object has the keys 'time' (seconds since the epoch), 'level',
+    'logger' and 'message', the static fields given to the formatter, the
+    fields of the event of the record (see `event_fields`), and 'exception'
+    if an exception is logged.
+    """
+
+    def __init__(self, fields: Dict = None):
+        """Initialize the formatter.
+
+        Args:
+            fields: (optional) fields added to every record, for instance the
+                name of the sequence.
+        """
+        super().__init__()
+        self.fields = dict(fields or dict())
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {'time': record.created, 'level': record.levelname,
+                 'logger': record.name, 'message': record.getMessage()}
+        entry.update(self.fields)
+        entry.update(getattr(record, 'event', None) or dict())
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=repr)
+
+
+class _RunQueueHandler(logging.handlers.QueueHandler):
+    """Queue the records of a RunLog while its listener is running."""
+
+    def __init__(self, run_log: 'RunLog'):
+        super().__init__(run_log._queue)
+        self._run_log = run_log
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """Prepare a record for the listener thread.
+
+        Only the message is formatted here, with its arguments, which may
+        change after the call. The exception is formatted as text, as the
+        traceback cannot be kept.
+        """
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if self._run_log.is_listening:
+            super().emit(record)
+        elif self._run_log.closed:
+            # A closed FileHandler would open its file again, and could
+            # truncate it
+            return
+        elif record.levelno >= self._run_log.handler.level:
+            self._run_log.handler.handle(record)
+
+
+class RunLog(object):
+    """Logging of one run, with its own logger and handler.
+
+    Attributes:
+        logger: the logging.Logger of the run. It is not registered in the
+            logging module, so it does not propagate to the root logger.
+        handler: the handler writing the records.
+    """
+
+    def __init__(self, name: str,
+                 level: int = logging.INFO,
+                 file_path: str = None,
+                 log_format: str = 'text',
+                 entry_format: str = None,
+                 fields: Dict = None):
+        """Initialize the log. Records are written directly until `start`.
+
+        Args:
+            name: the name of the logger.
+            level: (optional) the level of logging. Default is logging.INFO.
+            file_path: (optional) the path of the file to write, overwritten
+                if it exists. Default is the console.
+            log_format: (optional) 'text', or 'json' for one JSON object per
+                record (see `JsonFormatter`).
+            entry_format: (optional) the format of text records.
+            fields: (optional) fields added to every JSON record.
+
+        Raises:
+            ValueError: if the format is not in LOG_FORMATS.
+        """
+        if log_format not in LOG_FORMATS:
+            raise ValueError("Log format must be in {}, got {}.".format(
+                LOG_FORMATS, log_format))
+        self.handler = make_handler(file_path)
+        if log_format == 'json':
+            self.handler.setFormatter(JsonFormatter(fields))
+        else:
+            self.handler.setFormatter(
+                logging.Formatter(entry_format or DEFAULT_FORMAT))
+        self._queue = queue.SimpleQueue()
+        self._listener: Union[logging.handlers.QueueListener, None] = None
+        self._closed = False
+        self.logger = logging.Logger(name, level)
+        self.logger.addHandler(_RunQueueHandler(self))
+
+    @property
+    def closed(self) -> bool:
+        """True once the handler is closed. Next records are dropped."""
+        return self._closed
+
+    @property
+    def is_listening(self) -> bool:
+        """True while records are written by the listener thread."""
+        return self._listener is not None
+
+    def start(self) -> None:
+        """Write the next records from a listener thread."""
+        if self._listener is None:
+            self._listener = logging.handlers.QueueListener(
+                self._queue, self.handler, respect_handler_level=True)
+            self._listener.start()
+
+    def stop(self) -> None:
+        """Write the queued records, and stop the listener thread."""
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self.handler.flush()
+
+    def close(self) -> None:
+        """Stop the listener thread and close the handler."""
+        self.stop()
+        self._closed = True
+        self.handler.close()
+
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Metrics of runs: counters, gauges and histograms in the Prometheus text
+format.
+
+A `MetricsRegistry` holds metrics, and renders them in the text exposition
+format of Prometheus. It can be written in a file, or served on a local HTTP
+port by a `MetricsServer`. `SequenceMetrics` registers the metrics updated by
+a `SequenceRunner`:
+    * yapyseq_node_activations_total: activations per node type.
+    * yapyseq_function_failures_total: function nodes with an exception, per
+      function.
+    * yapyseq_function_timeouts_total: function nodes that timed out, per
+      function.
+    * yapyseq_queue_wait_seconds: time between a function node getting ready
+      and the start of its process, per function.
+    * yapyseq_function_duration_seconds: time spent by a function node in its
+      process, wrappers included, per function.
+    * yapyseq_running_nodes: number of running function nodes.
+    * yapyseq_ready_nodes: number of nodes waiting to be processed.
+"""
+
+from typing import Dict, Tuple, List, Iterable
+from bisect import bisect_left
+import math
+import os
+import threading
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Upper bounds of the buckets of histograms, in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Content type of the text exposition format
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def format_value(value: float) -> str:
+    """Format a sample value like Prometheus does."""
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def format_labels(labels: Dict[str, str]) -> str:
+    """Format labels of a sample, like `{name="value"}`."""
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        ['{}="{}"'.format(name, str(value).replace('\\', '\\\\')
+                          .replace('"', '\\"').replace('\n', '\\n'))
+         for name, value in labels.items()]) + '}'
+
+# ------------------------------------------------------------------------------
+# Main classes
+# ------------------------------------------------------------------------------
+
+
+class Metric(object):
+    """Parent class of the metrics.
+
+    A metric has a value per combination of label values. Children classes
+    define the value and how it is rendered.
+    """
+
+    metric_type = None
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Iterable[str] = ()):
+        """Initialize a metric without any value.
+
+        Args:
+            name: the name of the metric.
+            documentation: the help text of the metric.
+            labelnames: (optional) the names of the labels of the metric.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Keys are tuples of label values
+        self._values: Dict[Tuple, object] = dict()
+        self._lock = threading.Lock()
+
+    def _new_value(self):
+        """Create the value of a new combination of labels."""
+        raise NotImplementedError
+
+    def _get_value(self, labels: Dict):
+        """Get the value of a combination of labels, created if needed.
+
+        Raises:
+            ValueError: if the labels do not match the label names.
+        """
+        if set(labels) != set(self.labelnames):
+            raise ValueError("Metric {} expects the labels {}, got {}.".format(
+                self.name, self.labelnames, tuple(labels)))
+        key = tuple([str(labels[name]) for name in self.labelnames])
+        value = self._values.get(key)
+        if value is None:
+            with self._lock:
+                value = self._values.setdefault(key, self._new_value())
+        return value
+
+    def _samples(self) -> List[Tuple[str, Dict, float]]:
+        """Get the samples of the metric.
+
+        Returns:
+            A list of 3-tuples (sample name, labels, value).
+        """
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Render the metric in the Prometheus text format."""
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.metric_type)]
+        for sample_name, labels, value in self._samples():
+            lines.append('{}{} {}'.format(sample_name, format_labels(labels),
+                                          format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+    def _items(self) -> List[Tuple[Dict, object]]:
+        """Get the values with their labels, as a list of 2-tuples."""
+        with self._lock:
+            items = list(self._values.items())
+        return [(dict(zip(self.labelnames, key)), value)
+                for key, value in items]
+
+
+class Counter(Metric):
+    """A value that only goes up."""
+
+    metric_type = 'counter'
+
+    def _new_value(self):
+        return [0.0]
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        """Increment the counter of the given labels.
+
+        Raises:
+            ValueError: if the amount is negative.
+        """
+        if amount < 0:
+            raise ValueError("Counters can only be incremented.")
+        self._get_value(labels)[0] += amount
+
+    def get(self, **labels) -> float:
+        """Get the value of the counter of the given labels."""
+        return self._get_value(labels)[0]
+
+    def _samples(self):
+        return [(self.name, labels, value[0])
+                for labels, value in self._items()]
+
+
+class Gauge(Metric):
+    """A value that can go up and down."""
+
+    metric_type = 'gauge'
+
+    def _new_value(self):
+        return [0.0]
+
+    def set(self, value: float, **labels) -> None:
+        """Set the value of the gauge of the given labels."""
+        self._get_value(labels)[0] = value
+
+    def get(self, **labels) -> float:
+        """Get the value of the gauge of the given labels."""
+        return self._get_value(labels)[0]
+
+    def _samples(self):
+        return [(self.name, labels, value[0])
+                for labels, value in self._items()]
+
+
+class Histogram(Metric):
+    """Distribution of observed values in buckets."""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str,
+                 labelnames: Iterable[str] = (),
+                 buckets: Iterable[float] = DEFAULT_BUCKETS):
+        """Initialize a histogram without any observation.
+
+        Args:
+            name: the name of the metric.
+            documentation: the help text of the metric.
+            labelnames: (optional) the names of the labels of the metric.
+            buckets: (optional) the sorted upper bounds of the buckets. The
+                bucket +Inf is always added.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(set(buckets) - {math.inf})) + (math.inf,)
+
+    def _new_value(self):
+        # Count of each bucket (not cumulative), sum and count
+        return {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+
+    def observe(self, value: float, **labels) -> None:
+        """Add an observation to the histogram of the given labels."""
+        histogram = self._get_value(labels)
+        histogram['buckets'][bisect_left(self.buckets, value)] += 1
+        histogram['sum'] += value
+        histogram['count'] += 1
+
+    def get(self, **labels) -> Dict:
+        """Get the histogram of the given labels.
+
+        Returns:
+            A dictionary with the cumulative count of each bucket ('buckets',
+            keys are upper bounds), the sum ('sum') and the count ('count') of
+            the observations.
+        """
+        histogram = self._get_value(labels)
+        cumulative = 0
+        buckets = dict()
+        for bound, count in zip(self.buckets, list(histogram['buckets'])):
+            cumulative += count
+            buckets[bound] = cumulative
+        return {'buckets': buckets, 'sum': histogram['sum'],
+                'count': histogram['count']}
+
+    def _samples(self):
+        samples = []
+        for labels, _ in self._items():
+            histogram = self.get(**labels)
+            for bound, count in histogram['buckets'].items():
+                bucket_labels = dict(labels)
+                bucket_labels['le'] = format_value(bound)
+                samples.append((self.name + '_bucket', bucket_labels, count))
+            samples.append((self.name + '_sum', labels, histogram['sum']))
+            samples.append((self.name + '_count', labels,
+                            histogram['count']))
+        return samples
+
+
+class MetricsRegistry(object):
+    """Collection of metrics, rendered together."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = dict()
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name: str, *args, **kwargs) -> Metric:
+        """Get a metric, created if it is not registered yet.
+
+        Raises:
+            ValueError: if a metric of another type has the same name.
+        """
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, *args, **kwargs)
+                self._metrics[name] = metric
+            elif type(metric) is not cls:
+                raise ValueError("Metric {} is already registered as a "
+                                 "{}.".format(name, metric.metric_type))
+        return metric
+
+    def counter(self, name: str, documentation: str,
+                labelnames: Iterable[str] = ()) -> Counter:
+        """Get the counter of a given name, created if needed."""
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str,
+              labelnames: Iterable[str] = ()) -> Gauge:
+        """Get the gauge of a given name, created if needed."""
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str,
+                  labelnames: Iterable[str] = (),
+                  buckets: Iterable[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Get the histogram of a given name, created if needed."""
+        return self._register(Histogram, name, documentation, labelnames,
+                              buckets)
+
+    def get(self, name: str) -> Metric:
+        """Get a registered metric by its name.
+
+        Raises:
+            KeyError: if no metric has this name.
+        """
+        return self._metrics[name]
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return ''.join([metric.render() for metric in metrics])
+
+    def write(self, path: str) -> None:
+        """Write the metrics in a file, in the Prometheus text format.
+
+        The file is replaced atomically, so that a collector never reads a
+        partial file.
+
+        Args:
+            path: the path of the file.
+        """
+        tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+
+class SequenceMetrics(object):
+    """Metrics updated by a `SequenceRunner`, see the module documentation."""
+
+    def __init__(self, registry: MetricsRegistry):
+        """Register the metrics of runs in a registry.
+
+        Args:
+            registry: the registry. Several runners can share it, their
+                metrics are added.
+        """
+        self.registry = registry
+        self.activations = registry.counter(
+            'yapyseq_node_activations_total',
+            'Number of node activations.', ['type'])
+        self.failures = registry.counter(
+            'yapyseq_function_failures_total',
+            'Number of function nodes with an exception.', ['function'])
+        self.timeouts = registry.counter(
+            'yapyseq_function_timeouts_total',
+            'Number of function nodes that timed out.', ['function'])
+        self.queue_wait = registry.histogram(
+            'yapyseq_queue_wait_seconds',
+            'Time between a function node getting ready and the start of its '
+            'process.', ['function'])
+        self.duration = registry.histogram(
+            'yapyseq_function_duration_seconds',
+            'Time spent by a function node in its process, wrappers '
+            'included.', ['function'])
+        self.running = registry.gauge(
+            'yapyseq_running_nodes', 'Number of running function nodes.')
+        self.ready = registry.gauge(
+            'yapyseq_ready_nodes', 'Number of nodes waiting to be processed.')
+
+
+class MetricsServer(object):
+    """HTTP server of the metrics of a registry, in a background thread."""
+
+    def __init__(self, registry: MetricsRegistry, port: int,
+                 host: str = '127.0.0.1'):
+        """Initialize the server. It does not listen before `start`.
+
+        Args:
+            registry: the registry of the metrics to serve.
+            port: the TCP port to listen on. 0 to choose a free port.
+            host: (optional) the address to listen on. Default is localhost.
+        """
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._server = None
+        self._thread = None
+
+    def start(self) -> None:
+        """Start to serve the metrics on any path, in a daemon thread.
+
+        Raises:
+            OSError: if the port cannot be used.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='yapyseq metrics', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
@@ -8,16 +8,35 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 from typing import Callable, Union, Set, Dict, Any, Tuple
 from collections import namedtuple, OrderedDict, Counter
+import cProfile
 import multiprocessing as mp
+import os
+import time
+import tracemalloc
 from queue import Empty as EmptyQueueException
-from yapyseq.common import YapyseqInternalError, evaluate_kwargs
+from yapyseq.common import YapyseqInternalError, evaluate_kwargs, \
+    compile_expr
+from yapyseq.functiongrabber import ItemReference, resolve_item, \
+    split_item_name
+from yapyseq.resources import NodeResources, take_snapshot, \
+    measure_resources, limit_resources
 
 # ------------------------------------------------------------------------------
 # Custom types for this module
 # ------------------------------------------------------------------------------
 
 ExceptInfo = namedtuple("ExceptInfo", "function wrappers")
-FunctionNodeResult = namedtuple("FunctionNodeResult", "nid exception returned")
+# Timestamps (time.time()) of the phases of a function node in its process.
+# Phases that did not happen are None.
+NodeTimings = namedtuple("NodeTimings",
+                         "pid started pre_done function_done post_done")
+# profile_stats are the cProfile statistics of the function, if it has been
+# profiled (see `yapyseq.profiling`). resources are the resources used by the
+# process of the node (see `yapyseq.resources.NodeResources`).
+FunctionNodeResult = namedtuple("FunctionNodeResult",
+                                "nid exception returned timings "
+                                "profile_stats resources",
+                                defaults=(None, None, None))
 
 # ------------------------------------------------------------------------------
 # Custom exception for this module
@@ -47,6 +66,14 @@ class NodeFunctionTimeout(TimeoutError):
     pass
 
 
+class NodeMemoryLimitExceeded(MemoryError):
+    """Raised when a function exceeds the memory limit of its node."""
+
+
+class NodeCpuTimeLimitExceeded(TimeoutError):
+    """Raised when a function exceeds the CPU time limit of its node."""
+
+
 class NodeWrapperInitError(RuntimeError):
     """Raised when an error appears in the init of a wrapper."""
     def __init__(self, nid, wrapper_name, cause=None):
@@ -122,9 +149,59 @@ class NodeWrapperPostError(RuntimeError):
 # Main classes
 # ------------------------------------------------------------------------------
 
-class Transition(object):
+class FrozenObject(object):
+    """Parent class of immutable objects based on `__slots__`.
+
+    Attributes of children classes must be declared in their `__slots__`,
+    and set only once in their `__init__` with `_set_attributes`.
+    """
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise AttributeError("{} objects are immutable.".format(
+            type(self).__name__))
+
+    def __delattr__(self, name):
+        raise AttributeError("{} objects are immutable.".format(
+            type(self).__name__))
+
+    def _set_attributes(self, **attributes) -> None:
+        """Set attributes of the object. Only used during initialization."""
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def __getstate__(self) -> Dict:
+        """Get the state of the object for pickle and copy."""
+        return dict([(name, getattr(self, name))
+                     for cls in type(self).__mro__
+                     for name in getattr(cls, '__slots__', ())])
+
+    def __setstate__(self, state: Dict) -> None:
+        """Restore the state of the object for pickle and copy."""
+        self._set_attributes(**state)
+
+    def _replace(self, **attributes) -> 'FrozenObject':
+        """Get a copy of the object with some attributes replaced.
+
+        Args:
+            attributes: the new values of the attributes, by slot name.
+
+        Returns:
+            A new object of the same class.
+        """
+        new = object.__new__(type(self))
+        state = self.__getstate__()
+        state.update(attributes)
+        new.__setstate__(state)
+        return new
+
+
+class Transition(FrozenObject):
     """Class representing a transition."""
 
+    __slots__ = ('_target', '_condition')
+
     def __init__(self, target: int, condition: str = None):
         """Initialize a Transition.
 
@@ -132,13 +209,17 @@ class Transition(object):
             target: the nid of the targeted Node.
             condition: (optional) the condition to fulfill for this transition.
         """
-        self._target = target
-        self._condition = condition
+        self._set_attributes(_target=target, _condition=condition)
 
     @property
     def target(self):
         return self._target
 
+    @property
+    def condition(self) -> Union[str, None]:
+        """The condition of the transition, or None (read-only)."""
+        return self._condition
+
     def is_condition_fulfilled(self, variables: Dict):
         """Check if the condition is fulfilled with the given variables.
 
@@ -152,7 +233,7 @@ class Transition(object):
 
         # Evaluate the condition as a Python expression.
         # None is given as globals and variables are given as locals
-        cond_res = eval(self._condition, None, variables)
+        cond_res = eval(compile_expr(self._condition), None, variables)
 
         # If condition does not return a bool, raise an error
         if type(cond_res) is not bool:
@@ -164,13 +245,22 @@ class Transition(object):
             return cond_res
 
 
-class Node(object):
+class Node(FrozenObject):
     """Class representing a Node.
 
     This class is not likely to be instantiated, as some children class describe
     the different types of nodes available in a sequence.
+
+    Nodes are immutable specifications, they can be shared by several runs.
+    The state of a node during a run is managed by the `SequenceRunner`.
+
+    The class attribute `node_type` is the type of the node, as written in
+    sequence files.
     """
 
+    __slots__ = ('_nid', '_name')
+    node_type = None
+
     def __init__(self, nid: int, name: str = None):
         """Initialize a Node.
 
@@ -178,9 +268,7 @@ class Node(object):
             nid: the unique ID of the node.
             name: (optional) the name of the node.
         """
-        self._nid = nid
-        self._name = name
-        self._previous_node_id = None
+        self._set_attributes(_nid=nid, _name=name)
 
     @property
     def nid(self) -> int:
@@ -195,26 +283,15 @@ class Node(object):
         """
         return self._name
 
-    @property
-    def previous_node_id(self):
-        """The saved previous node id of this node.
 
-        Raises:
-            PreviousNodeUndefined: if no previous node is saved.
-        """
-        if self._previous_node_id:
-            return self._previous_node_id
-        else:
-            raise PreviousNodeUndefined("Trying to get the previous node id"
-                                        "but it is unknown...")
+class WrappedNode(Node):
+    """Class representing a node that contains wrappers.
 
-    @previous_node_id.setter
-    def previous_node_id(self, value):
-        self._previous_node_id = value
+    Children classes must declare the slot `_wrappers_desc`. It is not declared
+    here to allow multiple inheritance with other kinds of nodes.
+    """
 
-
-class WrappedNode(Node):
-    """Class representing a node that contains wrappers."""
+    __slots__ = ()
 
     def __init__(self, wrappers: OrderedDict, nid: int, name: str = None):
         """Initialize a WrapperManager.
@@ -227,47 +304,27 @@ class WrappedNode(Node):
             name: (optional) the name of the node.
         """
         super().__init__(nid, name)
-        self._wrappers_desc = wrappers if wrappers else OrderedDict()
-        self._wrapper_objects = {}
-        self._wrapper_classes = {}
-        # Prepare a list of wrappers that run pre() successfully
-        self._wrappers_pre_success = []
+        self._set_attributes(
+            _wrappers_desc=wrappers if wrappers else OrderedDict())
 
     @property
     def wrapper_names(self) -> Set[str]:
         """The set of wrapper names for this function (read-only)."""
         return set(self._wrappers_desc.keys())
 
-    @property
-    def wrapper_classes(self) -> Dict:
-        """A dict. where keys are wrapper names and values are their classes."""
-        return self._wrapper_classes
-
-    @wrapper_classes.setter
-    def wrapper_classes(self, given_dict: Dict):
-        """Setter of wrapper_classes.
-
-        Args:
-            given_dict: dictionary where keys are wrapper names and values are
-                their classes.
-
-        Classes must inherit from yapyseq.NodeWrapper.
-        """
-        # Check that given dict contains all the required wrappers
-        if not (Counter(given_dict.keys()) == Counter(self.wrapper_names)):
-            raise YapyseqInternalError(
-                ("Given wrapper classes does not match"
-                 " saved wrapper names. Get {}, "
-                 "expected {}").format(given_dict.keys(), self.wrapper_names))
-        self._wrapper_classes = given_dict
-
-    def _run_wrappers_pre(self, variables: Dict) -> None:
+    def _run_wrappers_pre(self, variables: Dict, wrapper_classes: Dict,
+                          succeeded_wrappers: OrderedDict) -> None:
         """Initialize wrappers and run their 'pre' function.
 
         Args:
             variables: local variables taken into account while
                 evaluating arguments of wrappers. It will be updated inside
                 this function to add the sub-dictionnary 'wrappers'.
+            wrapper_classes: dictionary where keys are wrapper names and
+                values are their classes.
+            succeeded_wrappers: an empty OrderedDict, filled by this function
+                with the wrapper objects whose 'pre' function succeeded.
+                Keys are the wrapper names.
         Raises:
             * NodeWrapperPreError if one of the wrappers raised an exception.
               Original exception is set as a *cause* of this exception.
@@ -275,8 +332,6 @@ class WrappedNode(Node):
               while being instanciated. Original exception is set as a *cause*
               of this exception.
         """
-        # Clean the previous dictionary
-        self._wrapper_objects = {}
         # Initialize the wrapper dictionary inside variables
         variables['wrappers'] = {}
         # Iterate over all the wrappers
@@ -285,29 +340,29 @@ class WrappedNode(Node):
             try:
                 # Make an instance of the wrapper, with its evaluated arguments
                 evaluated_kwargs = evaluate_kwargs(wrapper_kwargs, variables)
-                self._wrapper_objects[wrapper_name] = self._wrapper_classes[
-                    wrapper_name](**evaluated_kwargs)
+                wrapper_obj = wrapper_classes[wrapper_name](**evaluated_kwargs)
             except Exception as exc:
                 raise NodeWrapperInitError(self.nid, wrapper_name, exc)
             # Run its `pre` function
             try:
-                variables['wrappers'][wrapper_name] = self._wrapper_objects[
-                    wrapper_name].pre()
+                variables['wrappers'][wrapper_name] = wrapper_obj.pre()
             except Exception as exc:
                 raise NodeWrapperPreError(self.nid, wrapper_name, exc)
-            self._wrappers_pre_success.append(wrapper_name)
+            succeeded_wrappers[wrapper_name] = wrapper_obj
 
-    def _run_wrappers_post(self) -> None:
+    def _run_wrappers_post(self, succeeded_wrappers: OrderedDict) -> None:
         """Run the 'post' function of the wrappers.
 
+        Args:
+            succeeded_wrappers: the wrapper objects whose 'pre' function
+                succeeded, filled by `_run_wrappers_pre`.
+
         Raises:
             NodeWrapperPostError if one of the wrappers raised an exception.
             Original exception is set as a *cause* of this exception.
         """
-        for wrapper_name, wrapper_obj in self._wrapper_objects.items():
-            # Only run the post of wrappers that correctly did their pre
-            if wrapper_name not in self._wrappers_pre_success:
-                continue
+        # Only run the post of wrappers that correctly did their pre
+        for wrapper_name, wrapper_obj in succeeded_wrappers.items():
             try:
                 wrapper_obj.post()
             except Exception as exc:
@@ -321,6 +376,8 @@ class TransitionalNode(Node):
     the different types of nodes available in a sequence.
     """
 
+    __slots__ = ('_transitions',)
+
     def __init__(self, nid: int, transitions: Set, name: str = None):
         """Initialize a TransitionalNode.
 
@@ -334,10 +391,15 @@ class TransitionalNode(Node):
             name: (optional) the name of the node.
         """
         super().__init__(nid, name)
-        self._transitions = set([
+        self._set_attributes(_transitions=tuple([
             Transition(t.get('target'), t.get('condition'))
             for t in transitions
-        ])
+        ]))
+
+    @property
+    def transitions(self) -> Tuple[Transition, ...]:
+        """The outgoing transitions of the node (read-only)."""
+        return self._transitions
 
     def get_all_next_node_ids(self) -> Set[int]:
         """Get the IDs of every nodes that can be reached from this one.
@@ -400,6 +462,8 @@ class SimpleTransitionalNode(TransitionalNode):
     to find the next node, only one transition can win.
     """
 
+    __slots__ = ()
+
     def get_next_node_id(self, variables: dict):
         """Overriding of parent class.
 
@@ -418,75 +482,39 @@ class SimpleTransitionalNode(TransitionalNode):
 
 class StartNode(SimpleTransitionalNode):
     """Class representing a node of type start."""
-    pass
+    __slots__ = ()
+    node_type = 'start'
 
 
 class StopNode(Node):
     """Class representing a node of type stop."""
-    pass
+    __slots__ = ()
+    node_type = 'stop'
 
 
 class ParallelSplitNode(TransitionalNode):
     """Class representing a node of type 'parallel split'."""
-    pass
+    __slots__ = ()
+    node_type = 'parallel_split'
 
 
 class ParallelSyncNode(SimpleTransitionalNode):
-    """Class representing a node of type 'parallel sync'."""
-
-    def __init__(self, nid: int, transitions: Set, name: str = None):
-        """Initialize a ParallelSyncNode.
-
-        Args:
-            nid: the unique ID of the node.
-            transitions: the outgoing transitions of the node.
-            name: (optional) the name of the node.
-        """
-        super().__init__(nid, transitions, name)
-        # sync_history is the history of synchronization for a ParallelSyncNode.
-        # It keeps track of the IDs of the previous nodes that led to this
-        # synchronization node.
-        self._sync_history = set()
-
-        # the set of nodes that this ParallelSyncNode must synchronize.
-        # It must set after initialization.
-        self._nodes_to_sync = set()
+    """Class representing a node of type 'parallel sync'.
 
-    def set_nodes_to_sync(self, nids: Set[int]):
-        """Set the list of nid to synchronize through this ParallelSyncNode.
-
-        Args:
-            nids: set containing the NIDs of the nodes that are targeting this
-              ParallelSyncNode.
-        """
-        self._nodes_to_sync = nids
-
-    def is_sync_initialized(self):
-        """Check if the nodes to sync have been already declared."""
-        return len(self._nodes_to_sync) > 0
-
-    def is_sync_complete(self):
-        """Check if the synchronization process of this node is complete."""
-        if len(self._nodes_to_sync) == 0:
-            raise ParallelSyncFailure(
-                "Cannot check synchronization for node n°{}. "
-                "Set of nodes to synchronize has not been "
-                "initialized.".format(self.nid))
-        if self._nodes_to_sync == self._sync_history:
-            return True
-        else:
-            return False
-
-    def clear_history(self):
-        self._sync_history = set()
-
-    def add_to_history(self, nid):
-        self._sync_history.add(nid)
+    The history of synchronization is managed by the `SequenceRunner`.
+    """
+    __slots__ = ()
+    node_type = 'parallel_sync'
 
 
 class FunctionNode(SimpleTransitionalNode, WrappedNode):
     """Class representing a node of type function."""
 
+    __slots__ = ('_wrappers_desc', '_function_name', '_function_kwargs',
+                 '_timeout', '_return_var_name', '_profile',
+                 '_memory_limit', '_cpu_time_limit')
+    node_type = 'function'
+
     def __init__(self,
                  nid: int,
                  function_name: str,
@@ -495,7 +523,10 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
                  name: str = None,
                  timeout: int = None,
                  return_var_name: str = None,
-                 wrappers: OrderedDict = None):
+                 wrappers: OrderedDict = None,
+                 profile: bool = False,
+                 memory_limit: int = None,
+                 cpu_time_limit: Union[int, float] = None):
         """Initialize a FunctionNode.
 
         Args:
@@ -511,16 +542,26 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
             wrappers: (optional) an OrderedDict of wrappers around this node.
                 Keys are the names of wrapper classes, and values are arguments
                 for constructors of these classes.
+            profile: (optional) set to True to run the function under
+                cProfile. Default is False.
+            memory_limit: (optional) the memory the function can allocate,
+                in bytes. See `yapyseq.resources.limit_resources`.
+            cpu_time_limit: (optional) the CPU time the function can use, in
+                seconds.
         """
         # Here I do NOT use super() because it becomes really hard to maintain
         # in case of inheritance diamond like here. Fore more information, read
         # https://fuhm.org/super-harmful/
         SimpleTransitionalNode.__init__(self, nid, transitions, name)
         WrappedNode.__init__(self, wrappers, nid, name)
-        self._function_name = function_name
-        self._function_kwargs = function_kwargs if function_kwargs else dict()
-        self._timeout = timeout
-        self._return_var_name = return_var_name
+        self._set_attributes(
+            _function_name=function_name,
+            _function_kwargs=function_kwargs if function_kwargs else dict(),
+            _timeout=timeout,
+            _return_var_name=return_var_name,
+            _profile=bool(profile),
+            _memory_limit=memory_limit,
+            _cpu_time_limit=cpu_time_limit)
 
     @property
     def function_name(self) -> str:
@@ -533,29 +574,71 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
         return self._return_var_name
 
     @property
-    def function_callable(self) -> Dict:
-        """The callable of the function of this node."""
-        return self._func_callable
-
-    @function_callable.setter
-    def function_callable(self, func_callable: Callable):
-        """Setter of function_callable."""
-        # Check that the name of the callable is the one expected
-        if self._function_name != func_callable.__name__:
+    def profile(self) -> bool:
+        """True if the function must be run under cProfile (read-only)."""
+        return self._profile
+
+    @property
+    def memory_limit(self) -> Union[int, None]:
+        """The memory the function can allocate, in bytes (read-only)."""
+        return self._memory_limit
+
+    @property
+    def cpu_time_limit(self) -> Union[int, float, None]:
+        """The CPU time the function can use, in seconds (read-only)."""
+        return self._cpu_time_limit
+
+    def check_callables(self,
+                        function_callable: Union[Callable, ItemReference],
+                        wrapper_classes: Dict) -> None:
+        """Check that given callables match the description of this node.
+
+        Args:
+            function_callable: the function of this node, or an ItemReference
+                if it is not imported yet.
+            wrapper_classes: dictionary where keys are wrapper names and values
+                are their classes, or ItemReference objects.
+
+        Raises:
+            YapyseqInternalError: if the name of the function or the set of
+                wrapper names is not the expected one.
+        """
+        # Check that the name of the callable is the one expected.
+        # A qualified function name is compared without its module.
+        if isinstance(function_callable, ItemReference):
+            callable_name = function_callable.name
+            expected_name = self._function_name
+        else:
+            callable_name = function_callable.__name__
+            expected_name = split_item_name(self._function_name)[1]
+        if expected_name != callable_name:
             raise YapyseqInternalError(
                 ("Given callable has not the expected name. "
                  "Get {}, expected {}").format(
-                     func_callable.__name__, self._function_name))
-        self._func_callable = func_callable
+                     callable_name, expected_name))
+        # Check that given dict contains all the required wrappers
+        if not (Counter(wrapper_classes.keys()) == Counter(self.wrapper_names)):
+            raise YapyseqInternalError(
+                ("Given wrapper classes does not match"
+                 " saved wrapper names. Get {}, "
+                 "expected {}").format(wrapper_classes.keys(),
+                                       self.wrapper_names))
 
     def _create_node_result(self, function_exception: Union[None, Exception],
                             wrappers_exception: Union[None, Exception],
-                            returned_obj: Any) -> FunctionNodeResult:
+                            returned_obj: Any,
+                            timings: NodeTimings = None,
+                            profile_stats: Dict = None,
+                            resources: NodeResources = None
+                            ) -> FunctionNodeResult:
         """Return an easy data structure containing result of a node.
 
         Args:
             exception: the exception object if the function raised one.
             returned_obj: the returned object if the function returned one.
+            timings: (optional) the timestamps of the phases of the node.
+            profile_stats: (optional) the cProfile statistics of the function.
+            resources: (optional) the resources used by the node.
 
         Returns:
             A namedtuple containing all the given data in a structured form.
@@ -571,45 +654,101 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
         else:
             except_info = None
         # Create final result object
-        res = FunctionNodeResult(self.nid, except_info, returned_obj)
+        res = FunctionNodeResult(self.nid, except_info, returned_obj, timings,
+                                 profile_stats, resources)
         return res
 
     def _run_function_no_timeout(self,
+                                 function_callable: Callable,
                                  kwargs: Dict = None,
-                                 queue: mp.Queue = None) -> Tuple:
+                                 queue: mp.Queue = None,
+                                 profile: bool = False,
+                                 trace_memory: bool = False) -> Tuple:
         """Run the function without a timeout and return result.
 
-        Property `function_callable` must be set before calling this method.
-
         Args:
+            function_callable: The function to run.
             kwargs: (optional) The arguments to give to the function.
             queue: (optional) A queue to put the result, if given.
+            profile: (optional) set to True to run the function under
+                cProfile.
+            trace_memory: (optional) set to True to measure the peak of memory
+                allocated by the function with tracemalloc.
         Returns:
-            2-tuple: returned_obj, raised_exception
-            One of the items is necessary None.
+            4-tuple: returned_obj, raised_exception, profile_stats,
+            memory_peak
+            One of the two first items is necessary None. profile_stats is
+            None if the function is not profiled, and memory_peak is None if
+            its memory is not traced.
         """
-        # Run the callable
+        profiler = cProfile.Profile() if profile else None
+        if trace_memory:
+            tracemalloc.start()
+        # Run the callable, within the resource limits of the node
         try:
-            func_res = self._func_callable(**kwargs)
+            with limit_resources(self._memory_limit, self._cpu_time_limit,
+                                 self._raise_cpu_time_limit_exceeded):
+                if profiler:
+                    func_res = profiler.runcall(function_callable, **kwargs)
+                else:
+                    func_res = function_callable(**kwargs)
+        except MemoryError as exc:
+            if self._memory_limit is not None:
+                limit_exc = NodeMemoryLimitExceeded(
+                    "Function {} of node {} exceeded its memory limit of {} "
+                    "bytes.".format(self.function_name, self.nid,
+                                    self._memory_limit))
+                limit_exc.__cause__ = exc
+                exc = limit_exc
+            res = None, exc
         except Exception as exc:
             res = None, exc
         else:
             res = func_res, None
+        if profiler:
+            profiler.create_stats()
+            res += (profiler.stats,)
+        else:
+            res += (None,)
+        if trace_memory:
+            res += (tracemalloc.get_traced_memory()[1],)
+            tracemalloc.stop()
+        else:
+            res += (None,)
         if queue:
             queue.put(res)
         return res
 
-    def _run_function_with_timeout(self, kwargs: Dict = None) -> Tuple:
-        """Run the function with a timeout and return result.
+    def _raise_cpu_time_limit_exceeded(self) -> None:
+        """Raise the exception of the CPU time limit of the node.
 
-        Property `function_callable` must be set before calling this method.
+        Raises:
+            NodeCpuTimeLimitExceeded: always.
+        """
+        raise NodeCpuTimeLimitExceeded(
+            "Function {} of node {} exceeded its CPU time limit of {} "
+            "s.".format(self.function_name, self.nid, self._cpu_time_limit))
+
+    def _run_function_with_timeout(self,
+                                   function_callable: Callable,
+                                   kwargs: Dict = None,
+                                   profile: bool = False,
+                                   trace_memory: bool = False) -> Tuple:
+        """Run the function with a timeout and return result.
 
         Args:
+            function_callable: The function to run.
             kwargs: (optional) The arguments to give to the function.
+            profile: (optional) set to True to run the function under
+                cProfile.
+            trace_memory: (optional) set to True to measure the peak of memory
+                allocated by the function with tracemalloc.
 
         Returns:
-            2-tuple: returned_obj, raised_exception
-            One of the items is necessary None.
+            4-tuple: returned_obj, raised_exception, profile_stats,
+            memory_peak
+            See `_run_function_no_timeout`. The two last items are None if the
+            function timed out.
         """
         # Create a sub-result queue for the real run of the function
         sub_result_queue = mp.Queue()
@@ -617,35 +756,47 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
         process = mp.Process(target=self._run_function_no_timeout,
                              name="Node {} sub-process".format(self.nid),
                              kwargs={
+                                 'function_callable': function_callable,
                                  'queue': sub_result_queue,
-                                 'kwargs': kwargs
+                                 'kwargs': kwargs,
+                                 'profile': profile,
+                                 'trace_memory': trace_memory
                              })
         process.start()
         try:
             # Wait until result or timeout
-            ret, exc = sub_result_queue.get(block=True, timeout=self._timeout)
+            res = sub_result_queue.get(block=True, timeout=self._timeout)
         except EmptyQueueException:
             # timeout occurred !
             # Create a timeout exception to put in the result
             exc = NodeFunctionTimeout(
                 "Function {} of node {} timed out !".format(
                     self.function_name, self.nid))
-            return None, exc
+            return None, exc, None, None
         else:
-            return ret, exc
+            # Wait for the end of the sub-process, so that its CPU time is
+            # counted in the resources of the node
+            process.join()
+            return res
 
     def run(self,
             result_queue: mp.Queue,
-            variables: Dict) -> None:
+            variables: Dict,
+            function_callable: Union[Callable, ItemReference],
+            wrapper_classes: Dict,
+            profile: bool = None,
+            trace_memory: bool = False) -> None:
         """Function that can be called in a subprocess to run a node function.
 
-        Property `function_callable` must be set before calling this method.
-
         This function does:
+          * Import the function and wrappers if it is not done yet
           * Run wrappers of the node, with given arguments
           * Run the given callable that has been given, with the given arguments
           * Manage a Timeout on this callable if the node has one
-          * Provide the result of the callable through a Queue
+          * Profile this callable with cProfile if asked
+          * Provide the result of the callable through a Queue, with the
+            timestamps of these phases (see `NodeTimings`) and the resources
+            used by the process (see `yapyseq.resources.NodeResources`)
 
         Args:
             result_queue: The Queue object to store the result of the node
@@ -654,15 +805,47 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
                 evaluating arguments of wrappers and function.
                 Warning: this dict is modified by this function. Give a copy to
                 avoid access conflict.
+            function_callable: The function of the node. If it is an
+                ItemReference, it is imported here, in the subprocess.
+            wrapper_classes: dictionary where keys are wrapper names of the
+                node and values are their classes, or ItemReference objects
+                to import here.
+            profile: (optional) set to True or False to force or prevent the
+                profiling of the function. By default, the function is
+                profiled if the node has `profile` set.
+            trace_memory: (optional) set to True to measure the peak of memory
+                allocated by the function with tracemalloc, which slows it
+                down. Default is False.
         """
+        if profile is None:
+            profile = self._profile
+        snapshot = take_snapshot()
+        started = time.time()
+        # Import the function and wrappers if it has not been done before.
+        # An import error is saved as a function exception, and neither the
+        # wrappers nor the function are run.
+        try:
+            function_callable = resolve_item(function_callable)
+            wrapper_classes = dict([(name, resolve_item(cls))
+                                    for name, cls in wrapper_classes.items()])
+        except Exception as exc:
+            result_queue.put(self._create_node_result(
+                exc, None, None,
+                NodeTimings(os.getpid(), started, None, None, None),
+                resources=measure_resources(snapshot)))
+            return
+
         # Run wrappers pre
         pre_exc = None
         wrappers_failed = False
+        succeeded_wrappers = OrderedDict()
         try:
-            self._run_wrappers_pre(variables)
+            self._run_wrappers_pre(variables, wrapper_classes,
+                                   succeeded_wrappers)
         except (NodeWrapperInitError, NodeWrapperPreError) as exc:
             pre_exc = exc
             wrappers_failed = True
+        pre_done = time.time()
 
         # Run the function only if all of the wrappers succeeded
         if not wrappers_failed:
@@ -672,7 +855,8 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
             except Exception as exc:
                 # If evaluation failed, do not run the function and save the
                 # exception as a function exception.
-                func_ret, func_exc = None, exc
+                func_ret, func_exc, profile_stats, memory_peak = \
+                    None, exc, None, None
             else:
                 if not self._timeout:
                     # Just start the function without timeout
@@ -680,26 +864,36 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
                     # Note: this separate condition could be avoided because Queue.get
                     # manages a None timeout, but this implementation avoids creating
                     # unnecessary sub-processes, so it is better like this !
-                    func_ret, func_exc = self._run_function_no_timeout(
-                        evaluated_kwargs)
+                    func_ret, func_exc, profile_stats, memory_peak = \
+                        self._run_function_no_timeout(
+                            function_callable, evaluated_kwargs,
+                            profile=profile, trace_memory=trace_memory)
                 else:
-                    func_ret, func_exc = self._run_function_with_timeout(
-                        evaluated_kwargs)
+                    func_ret, func_exc, profile_stats, memory_peak = \
+                        self._run_function_with_timeout(
+                            function_callable, evaluated_kwargs, profile,
+                            trace_memory)
         # Function is not run and results are None
         else:
-            func_ret, func_exc = None, None
+            func_ret, func_exc, profile_stats, memory_peak = \
+                None, None, None, None
+        function_done = None if wrappers_failed else time.time()
 
         # Run wrappers post
         post_exc = None
         try:
-            self._run_wrappers_post()
+            self._run_wrappers_post(succeeded_wrappers)
         except NodeWrapperPostError as exc:
             post_exc = exc
 
         # Create the final result object
+        timings = NodeTimings(os.getpid(), started, pre_done, function_done,
+                              time.time())
         result = self._create_node_result(func_exc,
                                           pre_exc if pre_exc else post_exc,
-                                          func_ret)
+                                          func_ret, timings, profile_stats,
+                                          measure_resources(snapshot,
+                                                            memory_peak))
         # Provide result through the Queue
         result_queue.put(result)
 
@@ -707,6 +901,9 @@ class FunctionNode(SimpleTransitionalNode, WrappedNode):
 class VariableNode(SimpleTransitionalNode):
     """Class representing a node of type variable."""
 
+    __slots__ = ('_variables',)
+    node_type = 'variable'
+
     def __init__(self,
                  nid: int,
                  variables: Dict,
@@ -722,7 +919,7 @@ class VariableNode(SimpleTransitionalNode):
             name: (optional) the name of the node.
         """
         super().__init__(nid, transitions, name)
-        self._variables = variables
+        self._set_attributes(_variables=variables)
 
     @property
     def variables(self):
@@ -0,0 +1,461 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Simplification of the nodes of a sequence once its constants are known.
+
+Constants cannot change during a run, so an expression that only uses
+constants has the same value at every evaluation. Such expressions are
+evaluated once, before the run:
+    * arguments of functions and wrappers are replaced by their values.
+    * conditions that are always true are removed, and transitions whose
+      condition is always false are removed.
+    * variable nodes that only assign constant values are removed, if no
+      other node assigns their variables and if they have a single
+      unconditional transition. Their variables are set before the run and
+      folded like constants, and the nodes leading to them lead to their
+      target.
+
+An expression is only folded if evaluating it has no side effect and gives an
+immutable value, so that the run behaves exactly as without the optimization.
+In particular, parallel sync nodes still wait for every node that has a
+transition to them in the sequence, even if this transition has been pruned
+or this node cannot be reached anymore. The only difference is that the
+variables of removed variable nodes exist before these nodes would have been
+reached.
+"""
+
+from typing import Dict, Any, Tuple, Set, List
+from collections import namedtuple, Counter, OrderedDict
+import ast
+import builtins
+
+from yapyseq.common import Literal, compile_expr
+from yapyseq.nodes import Node, Transition, TransitionalNode, FunctionNode, \
+    VariableNode, StartNode, ParallelSyncNode
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# A simplification done by the optimizer.
+# kind is one of the SIMPLIFICATION_KINDS, expression is the original
+# expression and value is its folded value. For a pruned transition, value is
+# its target. For a removed variable node, value is the dictionary of its
+# variables.
+Simplification = namedtuple("Simplification", "nid kind expression value")
+
+# Result of `optimize_nodes`
+OptimizedNodes = namedtuple("OptimizedNodes",
+                            "nodes prev_node_ids simplifications variables")
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+SIMPLIFICATION_KINDS = ('argument', 'wrapper argument', 'condition',
+                        'pruned transition', 'variable', 'variable node',
+                        'unreachable node')
+
+# Built-in functions that can be called in folded expressions. They have no
+# side effect and do not depend on anything else than their arguments.
+PURE_BUILTINS = {'abs', 'all', 'any', 'bool', 'chr', 'divmod', 'float',
+                 'format', 'frozenset', 'hex', 'int', 'len', 'max', 'min',
+                 'oct', 'ord', 'pow', 'repr', 'round', 'sorted', 'str', 'sum',
+                 'tuple'}
+
+# Types of the values that can replace an expression
+IMMUTABLE_TYPES = (bool, int, float, complex, str, bytes, type(None))
+
+# Nodes of an expression that prevent its folding: attribute access may run
+# any code, and names of comprehensions and lambdas are not constants.
+_FORBIDDEN_AST_NODES = (ast.Attribute, ast.Lambda, ast.ListComp, ast.SetComp,
+                        ast.DictComp, ast.GeneratorExp, ast.NamedExpr,
+                        ast.Await, ast.Yield, ast.YieldFrom)
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def is_immutable(value: Any) -> bool:
+    """Tell if a value can be shared by every evaluation of an expression.
+
+    Args:
+        value: any object.
+
+    Returns:
+        True if the value is a number, a string, bytes, None, or a tuple or a
+        frozenset of such values.
+    """
+    if type(value) in IMMUTABLE_TYPES:
+        return True
+    if type(value) in (tuple, frozenset):
+        return all(is_immutable(item) for item in value)
+    return False
+
+
+def get_foldable_constants(nodes: Dict[int, Node], constants: Dict) -> Dict:
+    """Get the constants that cannot be modified by the nodes.
+
+    Constants are read-only, but the returned object of a function can still
+    be stored in a variable with the same name.
+
+    Args:
+        nodes: dictionary of the nodes, keys are node IDs.
+        constants: every constant of the sequence.
+
+    Returns:
+        The constants that keep the same value during the whole run.
+    """
+    assigned = {'results', 'wrappers'}
+    for node in nodes.values():
+        if isinstance(node, FunctionNode) and node.return_var_name:
+            assigned.add(node.return_var_name)
+        elif isinstance(node, VariableNode):
+            assigned.update(node.variables)
+    return dict([(name, value) for name, value in constants.items()
+                 if name not in assigned])
+
+
+def fold_expression(expr: Any, constants: Dict) -> Tuple[bool, Any]:
+    """Evaluate an expression if it only depends on constants.
+
+    Args:
+        expr: an expression of a sequence. Objects that are not strings are
+            not expressions and are never folded.
+        constants: the constants that keep the same value during the run.
+
+    Returns:
+        A 2-tuple (folded, value). folded is True if the expression has been
+        evaluated, and value is its value.
+    """
+    if type(expr) is not str:
+        return False, None
+    try:
+        tree = ast.parse(expr, mode='eval')
+    except SyntaxError:
+        return False, None
+    for ast_node in ast.walk(tree):
+        if isinstance(ast_node, _FORBIDDEN_AST_NODES):
+            return False, None
+        if isinstance(ast_node, ast.Name) and not (
+                ast_node.id in constants or (
+                    ast_node.id in PURE_BUILTINS and
+                    hasattr(builtins, ast_node.id))):
+            return False, None
+    try:
+        # Same evaluation as at run time, with only the constants
+        value = eval(compile_expr(expr), None, dict(constants))
+    except Exception:
+        # The error is kept for the run
+        return False, None
+    if not is_immutable(value):
+        return False, None
+    return True, value
+
+
+def _as_literal(value: Any) -> Any:
+    """Get the object that replaces a folded expression in a node.
+
+    Strings are wrapped in a `Literal` so that they are not evaluated again.
+    """
+    return Literal(value) if type(value) is str else value
+
+
+def _fold_kwargs(kwargs: Dict, constants: Dict, nid: int, kind: str,
+                 simplifications: List[Simplification]) -> Tuple[Dict, int]:
+    """Fold the values of a dictionary of arguments.
+
+    Returns:
+        A 2-tuple with the new dictionary and the number of folded values.
+    """
+    new_kwargs = dict()
+    folded_count = 0
+    for name, expr in kwargs.items():
+        folded, value = fold_expression(expr, constants)
+        if folded:
+            new_kwargs[name] = _as_literal(value)
+            folded_count += 1
+            simplifications.append(Simplification(nid, kind, expr, value))
+        else:
+            new_kwargs[name] = expr
+    return new_kwargs, folded_count
+
+
+def _fold_transitions(node: TransitionalNode, constants: Dict,
+                      simplifications: List[Simplification]
+                      ) -> Tuple[Tuple[Transition], bool]:
+    """Fold the conditions of the transitions of a node.
+
+    Returns:
+        A 2-tuple with the new transitions and True if anything changed.
+    """
+    kept = []
+    pruned = []
+    folded_conditions = []
+    for transition in node._transitions:
+        folded, value = fold_expression(transition._condition, constants)
+        # Conditions that do not give a boolean raise an error at run time
+        if not folded or type(value) is not bool:
+            kept.append(transition)
+        elif value:
+            kept.append(Transition(transition.target))
+            folded_conditions.append(Simplification(
+                node.nid, 'condition', transition._condition, value))
+        else:
+            pruned.append(Simplification(
+                node.nid, 'pruned transition', transition._condition,
+                transition.target))
+    if not kept:
+        # A node without possible transition raises an error at run time
+        return node._transitions, False
+    simplifications.extend(folded_conditions)
+    simplifications.extend(pruned)
+    return tuple(kept), bool(folded_conditions or pruned)
+
+
+def optimize_node(node: Node, constants: Dict
+                  ) -> Tuple[Node, List[Simplification]]:
+    """Fold the expressions of a node that only depend on constants.
+
+    Args:
+        node: the node to optimize. It is not modified.
+        constants: the constants that keep the same value during the run, see
+            `get_foldable_constants`.
+
+    Returns:
+        A 2-tuple with the optimized node (the same node if nothing has been
+        simplified), and the list of simplifications.
+    """
+    simplifications = []
+    attributes = dict()
+
+    if isinstance(node, TransitionalNode):
+        transitions, changed = _fold_transitions(node, constants,
+                                                 simplifications)
+        if changed:
+            attributes['_transitions'] = transitions
+
+    if isinstance(node, FunctionNode):
+        kwargs, folded_count = _fold_kwargs(
+            node._function_kwargs, constants, node.nid, 'argument',
+            simplifications)
+        if folded_count:
+            attributes['_function_kwargs'] = kwargs
+        wrappers = OrderedDict()
+        wrapper_folded_count = 0
+        for wrapper_name, wrapper_kwargs in node._wrappers_desc.items():
+            wrappers[wrapper_name], folded_count = _fold_kwargs(
+                wrapper_kwargs, constants, node.nid, 'wrapper argument',
+                simplifications)
+            wrapper_folded_count += folded_count
+        if wrapper_folded_count:
+            attributes['_wrappers_desc'] = wrappers
+
+    elif isinstance(node, VariableNode):
+        variables, folded_count = _fold_kwargs(
+            node.variables, constants, node.nid, 'variable', simplifications)
+        if folded_count:
+            attributes['_variables'] = variables
+
+    if attributes:
+        node = node._replace(**attributes)
+    return node, simplifications
+
+
+def _get_prev_node_ids(nodes: Dict[int, Node]) -> Dict[int, Set[int]]:
+    """Get the IDs of the nodes that have a transition to every node.
+
+    Returns:
+        A dictionary where keys are node IDs and values the sets of IDs of
+        the nodes that have a transition to them.
+    """
+    prev_node_ids: Dict[int, Set[int]] = dict()
+    for node in nodes.values():
+        if isinstance(node, TransitionalNode):
+            for next_nid in node.get_all_next_node_ids():
+                prev_node_ids.setdefault(next_nid, set()).add(node.nid)
+    return prev_node_ids
+
+
+def _walk_nodes(nodes: Dict[int, Node]) -> Set[int]:
+    """Walk the graph of the nodes from the start nodes.
+
+    Returns:
+        The set of IDs of the reached nodes.
+    """
+    reached = set([nid for nid, node in nodes.items()
+                   if isinstance(node, StartNode)])
+    to_visit = list(reached)
+    while to_visit:
+        node = nodes[to_visit.pop()]
+        if not isinstance(node, TransitionalNode):
+            continue
+        for next_nid in node.get_all_next_node_ids():
+            if next_nid not in reached:
+                reached.add(next_nid)
+                to_visit.append(next_nid)
+    return reached
+
+
+def _remove_variable_nodes(nodes: Dict[int, Node], reached: Set[int],
+                           constants: Dict,
+                           prev_node_ids: Dict[int, Set[int]],
+                           simplifications: List[Simplification]) -> Dict:
+    """Remove the variable nodes whose values are all known before the run.
+
+    A reached variable node is removed if it has a single unconditional
+    transition, and if its variables are neither constants nor assigned by
+    another node. The transitions to this node are redirected to its target,
+    unless the node leading to it already has a transition to this target:
+    a parallel sync node would then receive the same node twice. A variable
+    node leading to a parallel sync node is only removed if a single node
+    leads to it, which the sync node then waits for instead.
+
+    Args:
+        nodes: dictionary of the optimized nodes, keys are node IDs. It is
+            modified in place.
+        reached: the IDs of the nodes that can be reached.
+        constants: every constant of the sequence.
+        prev_node_ids: dictionary where keys are node IDs and values the sets
+            of IDs of the nodes that parallel sync nodes wait for. It is
+            modified in place.
+        simplifications: the list where simplifications are added.
+
+    Returns:
+        The dictionary of the variables of the removed nodes, with their
+        values.
+    """
+    assigned = Counter(['results', 'wrappers'])
+    assigned.update(list(constants))
+    for node in nodes.values():
+        if isinstance(node, FunctionNode) and node.return_var_name:
+            assigned[node.return_var_name] += 1
+        elif isinstance(node, VariableNode):
+            assigned.update(list(node.variables))
+    # Keys are node IDs, values are the IDs of every node leading to them
+    previous: Dict[int, Set[int]] = dict()
+    for node in nodes.values():
+        if isinstance(node, TransitionalNode):
+            for transition in node._transitions:
+                previous.setdefault(transition.target, set()).add(node.nid)
+
+    variables = dict()
+    for nid in sorted(nodes):
+        node = nodes[nid]
+        if (nid not in reached or not isinstance(node, VariableNode) or
+                any(type(expr) is str for expr in node.variables.values()) or
+                any(assigned[name] > 1 for name in node.variables) or
+                len(node._transitions) != 1 or
+                node._transitions[0]._condition is not None):
+            continue
+        target = node._transitions[0].target
+        sources = previous.get(nid, set())
+        if target == nid or target not in nodes or any(
+                [target in [t.target for t in nodes[source]._transitions]
+                 for source in sources]):
+            continue
+        if isinstance(nodes[target], ParallelSyncNode) and len(sources) != 1:
+            # The sync node would wait for every source instead of one
+            continue
+        for source in sources:
+            nodes[source] = nodes[source]._replace(_transitions=tuple(
+                [Transition(target, t._condition) if t.target == nid else t
+                 for t in nodes[source]._transitions]))
+        previous.setdefault(target, set()).update(sources)
+        previous[target].discard(nid)
+        prev_node_ids.setdefault(target, set()).update(sources)
+        prev_node_ids[target].discard(nid)
+        prev_node_ids.pop(nid, None)
+        del nodes[nid]
+        values = dict([(name, value.value if type(value) is Literal else value)
+                       for name, value in node.variables.items()])
+        variables.update(values)
+        simplifications.append(Simplification(nid, 'variable node', None,
+                                              values))
+    return variables
+
+
+def optimize_nodes(nodes: Dict[int, Node], constants: Dict) -> OptimizedNodes:
+    """Fold the expressions of the nodes of a sequence.
+
+    The variables of the removed variable nodes are folded like constants,
+    so the nodes are folded again until no more variable node is removed.
+
+    Args:
+        nodes: dictionary of the nodes, keys are node IDs. Nodes are not
+            modified.
+        constants: every constant of the sequence, including the constants
+            given for the run.
+
+    Returns:
+        An OptimizedNodes namedtuple with:
+            * nodes: dictionary of the optimized nodes, keys are node IDs.
+              Removed variable nodes are not in it.
+            * prev_node_ids: dictionary where keys are node IDs and values
+              the sets of IDs of the nodes that have a transition to them in
+              the sequence, including the pruned transitions. A removed
+              variable node is replaced by the node leading to it. Parallel
+              sync nodes wait for these nodes.
+            * simplifications: the list of the Simplification objects.
+            * variables: dictionary of the variables of the removed variable
+              nodes, with their values, to set before the run.
+    """
+    foldable = get_foldable_constants(nodes, constants)
+    optimized = dict(nodes)
+    simplifications = []
+    variables = dict()
+    # Computed before the pruning, as without the optimization
+    prev_node_ids = _get_prev_node_ids(nodes)
+    while True:
+        for nid in list(optimized):
+            optimized[nid], node_simplifications = optimize_node(
+                optimized[nid], foldable)
+            simplifications.extend(node_simplifications)
+        reached = _walk_nodes(optimized)
+        removed = _remove_variable_nodes(optimized, reached, constants,
+                                         prev_node_ids, simplifications)
+        if not removed:
+            break
+        variables.update(removed)
+        foldable.update(removed)
+
+    # Walk the graph from the start nodes, without the pruned transitions
+    reached = _walk_nodes(optimized)
+    for nid in sorted(set(optimized) - reached):
+        simplifications.append(Simplification(nid, 'unreachable node', None,
+                                              None))
+    return OptimizedNodes(optimized, prev_node_ids, simplifications,
+                          variables)
+
+
+def describe_simplifications(simplifications: List[Simplification]
+                             ) -> List[str]:
+    """Describe simplifications in a human readable way.
+
+    Args:
+        simplifications: the list of Simplification objects.
+
+    Returns:
+        One line of text per simplification.
+    """
+    lines = []
+    for s in simplifications:
+        if s.kind == 'pruned transition':
+            lines.append('Node {}: transition to node {} removed, its '
+                         'condition is always false: {}'.format(
+                             s.nid, s.value, s.expression))
+        elif s.kind == 'unreachable node':
+            lines.append('Node {}: cannot be reached anymore'.format(s.nid))
+        elif s.kind == 'variable node':
+            lines.append('Node {}: variable node removed, its variables are '
+                         'set before the run: {}'.format(s.nid, s.value))
+        else:
+            lines.append('Node {}: {} {} folded to {!r}'.format(
+                s.nid, s.kind, s.expression, s.value))
+    return lines
@@ -0,0 +1,223 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Profiling of the functions of function nodes with cProfile.
+
+A profiled function node runs its function under cProfile, in the process of
+the node, and sends the statistics back with its result (see
+`FunctionNodeResult`). The runner merges the statistics of every activation
+of a function in a `ProfileCollector`, which writes:
+    * one `<function>.pstats` file per function, that can be read with the
+      module `pstats` or with tools like snakeviz.
+    * a `profile.collapsed` file with the collapsed stacks of every function,
+      that can be read by flame graph tools (flamegraph.pl, speedscope...).
+
+cProfile does not record whole stacks, only the callers of every function.
+Stacks are rebuilt from them: the time of a function called from several
+places is split among the places in proportion to the time spent from each
+of them.
+"""
+
+from typing import Dict, List, Tuple
+import os
+import pstats
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Name of the file of collapsed stacks written by `ProfileCollector.write`
+COLLAPSED_FILE_NAME = 'profile.collapsed'
+
+# Stacks taking less than this fraction of the time of their function are not
+# rebuilt, so that the number of stacks stays small for large call graphs.
+MIN_STACK_FRACTION = 0.0001
+
+# Entry of the profiler itself, added when it is stopped
+_PROFILER_ENTRY = ('~', 0, "<method 'disable' of '_lsprof.Profiler' objects>")
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def frame_label(func: Tuple[str, int, str]) -> str:
+    """Get the label of a function in a collapsed stack.
+
+    Args:
+        func: a function as given by pstats, a 3-tuple (file name, line
+            number, function name).
+
+    Returns:
+        "function (file:line)", or the bare name of built-in functions.
+        Semicolons are replaced as they separate frames.
+    """
+    file_name, line, name = func
+    if file_name == '~':
+        label = name
+    else:
+        label = '{} ({}:{})'.format(name, os.path.basename(file_name), line)
+    return label.replace(';', ',')
+
+
+def collapse_stats(stats: Dict, root: str = None) -> Dict[str, int]:
+    """Rebuild the stacks of a profile.
+
+    Args:
+        stats: the statistics of a pstats.Stats object (its attribute `stats`).
+        root: (optional) a frame added at the bottom of every stack, for
+            instance the name of the profiled function node.
+
+    Returns:
+        A dictionary where keys are stacks, as frame labels separated by
+        semicolons from the bottom of the stack, and values are the time spent
+        in the top frame of the stack, in microseconds.
+    """
+    # Cumulative time spent in each callee of each function
+    callees: Dict[Tuple, Dict[Tuple, float]] = dict()
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, caller_stats in callers.items():
+            callees.setdefault(caller, dict())[func] = caller_stats[3]
+
+    roots = [func for func, func_stats in stats.items()
+             if not func_stats[4] and func != _PROFILER_ENTRY]
+    min_time = MIN_STACK_FRACTION * sum([stats[func][3] for func in roots])
+    stacks: Dict[str, float] = dict()
+
+    def walk(func: Tuple, path: Tuple, cumulative_time: float) -> None:
+        """Add the stacks of a function called from the given path."""
+        path = path + (func,)
+        _, _, total_time, total_cumulative_time, _ = stats[func]
+        ratio = (cumulative_time / total_cumulative_time
+                 if total_cumulative_time else 0)
+        if total_time * ratio > 0:
+            stack = ';'.join(([root] if root else []) +
+                             [frame_label(f) for f in path])
+            stacks[stack] = stacks.get(stack, 0) + total_time * ratio
+        for callee, callee_time in callees.get(func, dict()).items():
+            # Recursive calls are already counted in the time of the caller
+            if callee not in path and callee_time * ratio >= min_time:
+                walk(callee, path, callee_time * ratio)
+
+    for func in roots:
+        walk(func, (), stats[func][3])
+    return dict([(stack, int(round(seconds * 1000000)))
+                 for stack, seconds in stacks.items()
+                 if round(seconds * 1000000)])
+
+
+# ------------------------------------------------------------------------------
+# Private classes
+# ------------------------------------------------------------------------------
+
+
+class _RawStats(object):
+    """Statistics sent by a node, in the form expected by pstats.Stats."""
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        """Nothing to do, statistics are already created."""
+
+
+# ------------------------------------------------------------------------------
+# Main class
+# ------------------------------------------------------------------------------
+
+
+class ProfileCollector(object):
+    """Class merging the profiles of the function nodes of a run."""
+
+    def __init__(self):
+        """Initialize an empty collector."""
+        # Keys are function names, values are pstats.Stats objects
+        self._stats: Dict[str, pstats.Stats] = dict()
+        # Keys are function names, values are numbers of profiled activations
+        self._activations: Dict[str, int] = dict()
+
+    @property
+    def functions(self) -> List[str]:
+        """The sorted names of the profiled functions (read-only)."""
+        return sorted(self._stats)
+
+    def add(self, function_name: str, stats: Dict) -> None:
+        """Add the profile of an activation of a function node.
+
+        Args:
+            function_name: the name of the function of the node, as written
+                in the sequence.
+            stats: the statistics sent by the node, as created by
+                `cProfile.Profile.create_stats`.
+        """
+        new_stats = pstats.Stats(_RawStats(stats))
+        if function_name in self._stats:
+            self._stats[function_name].add(new_stats)
+        else:
+            self._stats[function_name] = new_stats
+        self._activations[function_name] = \
+            self._activations.get(function_name, 0) + 1
+
+    def get_stats(self, function_name: str) -> pstats.Stats:
+        """Get the merged statistics of a function.
+
+        Args:
+            function_name: the name of the function, as written in the
+                sequence.
+
+        Returns:
+            A pstats.Stats object.
+
+        Raises:
+            KeyError: if the function has not been profiled.
+        """
+        return self._stats[function_name]
+
+    def get_activation_count(self, function_name: str) -> int:
+        """Get the number of profiled activations of a function."""
+        return self._activations.get(function_name, 0)
+
+    def collapsed_stacks(self) -> Dict[str, int]:
+        """Get the collapsed stacks of every function.
+
+        Returns:
+            A dictionary where keys are stacks, whose bottom frame is the
+            name of the function node, and values are times in microseconds.
+            See `collapse_stats`.
+        """
+        stacks = dict()
+        for function_name in self.functions:
+            stacks.update(collapse_stats(self._stats[function_name].stats,
+                                         root=function_name))
+        return stacks
+
+    def write(self, directory: str) -> List[str]:
+        """Write the profiles in a directory.
+
+        Args:
+            directory: the directory of the files. It is created if needed.
+
+        Returns:
+            The paths of the written files: one `.pstats` file per function,
+            and the file of collapsed stacks (COLLAPSED_FILE_NAME).
+        """
+        os.makedirs(directory, exist_ok=True)
+        paths = []
+        for function_name in self.functions:
+            # Qualified function names contain ':' (package.module:name)
+            path = os.path.join(directory, '{}.pstats'.format(
+                function_name.replace(':', '.').replace(os.sep, '_')))
+            self._stats[function_name].dump_stats(path)
+            paths.append(path)
+        path = os.path.join(directory, COLLAPSED_FILE_NAME)
+        with open(path, 'w') as f:
+            for stack, microseconds in sorted(
+                    self.collapsed_stacks().items()):
+                f.write('{} {}\n'.format(stack, microseconds))
+        paths.append(path)
+        return paths
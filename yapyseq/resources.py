@@ -0,0 +1,332 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Accounting of the resources used by function nodes.
+
+The process of a function node measures what it used (see `NodeResources`)
+and sends it with its result, in `FunctionNodeResult.resources`. Conditions
+of transitions can read it, for instance
+`results[3].resources.user_time > 10`.
+
+The runner adds up the resources of every activation of a node in a
+`ResourceTotals`, and `format_summary` ranks the nodes by each resource.
+
+Function nodes can also limit the memory and the CPU time of their function,
+see `limit_resources`.
+"""
+
+from typing import Callable, Dict, List, Tuple, Union
+from collections import namedtuple
+from contextlib import contextmanager
+import math
+import os
+import re
+import signal
+import sys
+import time
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# ------------------------------------------------------------------------------
+# Custom types for this module
+# ------------------------------------------------------------------------------
+
+# Resources used by the process of a function node, wrappers included:
+#   * wall_time: elapsed time, in seconds.
+#   * user_time, system_time: CPU time in user and system mode, in seconds,
+#     the sub-process of a timeout included.
+#   * max_rss: peak resident memory of the process, in bytes, or None if it
+#     cannot be measured. It includes the memory shared with the runner.
+#   * memory_peak: peak of the memory allocated by the function, measured with
+#     tracemalloc, in bytes, or None if it has not been measured.
+NodeResources = namedtuple("NodeResources",
+                           "wall_time user_time system_time max_rss "
+                           "memory_peak")
+
+# Resources of every activation of a node. Times are added up, memory is the
+# maximum of the activations.
+ResourceTotals = namedtuple("ResourceTotals",
+                            "activations wall_time user_time system_time "
+                            "max_rss memory_peak")
+
+# State of the process when a measure starts, see `take_snapshot`
+UsageSnapshot = namedtuple("UsageSnapshot", "wall user system")
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Resources by which nodes can be ranked, with their unit
+RESOURCE_FIELDS = (('wall_time', 's'), ('user_time', 's'),
+                   ('system_time', 's'), ('max_rss', 'B'),
+                   ('memory_peak', 'B'))
+
+# Multiples of the sizes given to `parse_size`
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3,
+              'T': 1024 ** 4}
+
+_SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)(?:I?B)?\s*$',
+                           re.IGNORECASE)
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def take_snapshot() -> UsageSnapshot:
+    """Get the times used by the current process and its finished children."""
+    times = os.times()
+    return UsageSnapshot(time.perf_counter(),
+                         times.user + times.children_user,
+                         times.system + times.children_system)
+
+
+def get_max_rss() -> Union[int, None]:
+    """Get the peak resident memory of the current process, in bytes.
+
+    Returns:
+        The maximum of the peaks of the process and of its finished children,
+        or None if the platform cannot measure it.
+    """
+    if resource is None:
+        return None
+    max_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is in bytes on macOS, and in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+def measure_resources(start: UsageSnapshot,
+                      memory_peak: int = None) -> NodeResources:
+    """Measure the resources used by the current process since a snapshot.
+
+    Args:
+        start: the snapshot taken at the start of the measure.
+        memory_peak: (optional) the peak of memory allocation measured with
+            tracemalloc, in bytes.
+
+    Returns:
+        A NodeResources namedtuple.
+    """
+    end = take_snapshot()
+    return NodeResources(end.wall - start.wall, end.user - start.user,
+                         end.system - start.system, get_max_rss(),
+                         memory_peak)
+
+
+def add_resources(totals: Union[ResourceTotals, None],
+                  resources: NodeResources) -> ResourceTotals:
+    """Add the resources of an activation to the totals of a node.
+
+    Args:
+        totals: the totals of the previous activations, or None for the first
+            one.
+        resources: the resources of the new activation.
+
+    Returns:
+        A new ResourceTotals namedtuple.
+    """
+    if totals is None:
+        return ResourceTotals(1, *resources)
+    return ResourceTotals(
+        totals.activations + 1,
+        totals.wall_time + resources.wall_time,
+        totals.user_time + resources.user_time,
+        totals.system_time + resources.system_time,
+        _max(totals.max_rss, resources.max_rss),
+        _max(totals.memory_peak, resources.memory_peak))
+
+
+def rank_nodes(totals: Dict[int, ResourceTotals],
+               field: str) -> List[Tuple[int, Union[int, float]]]:
+    """Rank nodes by a resource, from the greatest to the smallest.
+
+    Args:
+        totals: dictionary where keys are node IDs and values their totals.
+        field: a field of ResourceTotals, see RESOURCE_FIELDS.
+
+    Returns:
+        A list of 2-tuples (node ID, value). Nodes for which the resource has
+        not been measured are not listed.
+    """
+    ranking = [(nid, getattr(node_totals, field))
+               for nid, node_totals in totals.items()
+               if getattr(node_totals, field) is not None]
+    return sorted(ranking, key=lambda item: (-item[1], item[0]))
+
+
+def format_summary(totals: Dict[int, ResourceTotals],
+                   labels: Dict[int, str] = None,
+                   top: int = 10) -> List[str]:
+    """Describe the nodes that used the most of each resource.
+
+    Args:
+        totals: dictionary where keys are node IDs and values their totals.
+        labels: (optional) dictionary where keys are node IDs and values
+            the names to display. Default is "Node <ID>".
+        top: (optional) the number of nodes listed for each resource.
+
+    Returns:
+        Lines of text, with a title per resource.
+    """
+    labels = labels or dict()
+    lines = []
+    for field, unit in RESOURCE_FIELDS:
+        ranking = rank_nodes(totals, field)[:top]
+        if not ranking:
+            continue
+        lines.append('Nodes by {}:'.format(field.replace('_', ' ')))
+        for nid, value in ranking:
+            lines.append('  {:>12}  {} ({} activation(s))'.format(
+                _format_value(value, unit),
+                labels.get(nid, 'Node {}'.format(nid)),
+                totals[nid].activations))
+    return lines
+
+
+def parse_size(size: Union[int, str]) -> int:
+    """Parse a size of memory.
+
+    Args:
+        size: a number of bytes, or a string like "512K", "100M", "1.5GB" or
+            "2GiB". Units are powers of 1024.
+
+    Returns:
+        The size in bytes.
+
+    Raises:
+        ValueError: if the size is not valid or not positive.
+    """
+    if isinstance(size, bool):
+        raise ValueError("Not a valid size: {}".format(size))
+    if isinstance(size, int):
+        value = size
+    else:
+        match = _SIZE_PATTERN.match(str(size))
+        if not match:
+            raise ValueError("Not a valid size: {}".format(size))
+        value = int(float(match.group(1)) *
+                    SIZE_UNITS[match.group(2).upper()])
+    if value <= 0:
+        raise ValueError("A size must be positive, got {}".format(size))
+    return value
+
+
+def get_address_space_size() -> Union[int, None]:
+    """Get the size of the virtual memory of the current process, in bytes.
+
+    Returns:
+        The size, or None if it cannot be read from `/proc`.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+@contextmanager
+def limit_resources(memory_limit: int = None,
+                    cpu_time_limit: Union[int, float] = None,
+                    on_cpu_time_limit: Callable[[], None] = None):
+    """Limit the memory and the CPU time of the current process in a block.
+
+    The soft limits of the process are lowered with `resource.setrlimit`, and
+    restored at the end of the block. Limits already lower are kept.
+
+    * The memory limit applies to the address space (RLIMIT_AS), on top of
+      the size of the process when the block starts. Allocations above it
+      raise a MemoryError.
+    * The CPU time limit applies to the CPU time of the process (RLIMIT_CPU),
+      on top of the time it already used, rounded up to the second. When it
+      is exceeded, the kernel sends SIGXCPU, which calls `on_cpu_time_limit`.
+      It must be called from the main thread.
+
+    Args:
+        memory_limit: (optional) the memory the block can allocate, in bytes.
+        cpu_time_limit: (optional) the CPU time the block can use, in seconds.
+        on_cpu_time_limit: (optional) function called when the CPU time limit
+            is exceeded, usually raising an exception. By default, the process
+            is killed by the signal.
+
+    Raises:
+        OSError: if the platform cannot limit resources.
+    """
+    if memory_limit is None and cpu_time_limit is None:
+        yield
+        return
+    if resource is None:
+        raise OSError("Resource limits are not supported on this platform.")
+    previous_limits = []
+    previous_handler = None
+    try:
+        if memory_limit is not None:
+            new_limit = (get_address_space_size() or 0) + memory_limit
+            previous_limits.append(
+                (resource.RLIMIT_AS, resource.getrlimit(resource.RLIMIT_AS)))
+            _lower_soft_limit(resource.RLIMIT_AS, new_limit)
+        if cpu_time_limit is not None:
+            usage = resource.getrusage(resource.RUSAGE_SELF)
+            new_limit = int(math.ceil(usage.ru_utime + usage.ru_stime +
+                                      cpu_time_limit))
+            if on_cpu_time_limit is not None:
+                previous_handler = signal.signal(
+                    signal.SIGXCPU,
+                    lambda signum, frame: on_cpu_time_limit())
+            previous_limits.append(
+                (resource.RLIMIT_CPU, resource.getrlimit(resource.RLIMIT_CPU)))
+            _lower_soft_limit(resource.RLIMIT_CPU, new_limit)
+        yield
+    finally:
+        for limit, values in reversed(previous_limits):
+            resource.setrlimit(limit, values)
+        if previous_handler is not None:
+            signal.signal(signal.SIGXCPU, previous_handler)
+
+
+# ------------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------------
+
+
+def _lower_soft_limit(limit: int, value: int) -> None:
+    """Lower the soft limit of a resource of the current process.
+
+    The hard limit is not changed, so that the soft limit can be restored.
+    """
+    soft, hard = resource.getrlimit(limit)
+    for current in (soft, hard):
+        if current != resource.RLIM_INFINITY:
+            value = min(value, current)
+    resource.setrlimit(limit, (value, hard))
+
+
+def _max(a: Union[int, None], b: Union[int, None]) -> Union[int, None]:
+    """Get the maximum of two values which may be None."""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+def _format_value(value: Union[int, float], unit: str) -> str:
+    """Format a time in seconds or a size in bytes for display."""
+    if unit == 's':
+        return '{:.3f} s'.format(value)
+    if value < 1024:
+        return '{} B'.format(int(value))
+    for prefix in ('Ki', 'Mi', 'Gi'):
+        value /= 1024
+        if value < 1024:
+            break
+    return '{:.1f} {}B'.format(value, prefix)
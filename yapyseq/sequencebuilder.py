@@ -0,0 +1,277 @@
+#!/usr/bin/env python
+# coding: utf-8
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+"""
+
+from typing import Dict, List, Union, Any
+import copy
+
+from yapyseq.sequencereader import SequenceReader, SEQUENCE_SCHEMA_PATH
+
+# ------------------------------------------------------------------------------
+# Custom exception for this module
+# ------------------------------------------------------------------------------
+
+
+class SequenceBuilderError(ValueError):
+    pass
+
+
+# ------------------------------------------------------------------------------
+# Main class
+# ------------------------------------------------------------------------------
+
+
+class SequenceBuilder(object):
+    """Class that describes a sequence programmatically.
+
+    The aim of an instance of `SequenceBuilder` is to create the description
+    of a sequence from Python code, without writing a sequence file. Every
+    method adding something to the sequence returns the builder itself, so
+    calls can be chained:
+
+        builder = SequenceBuilder()
+        builder.start().transition(1)
+        builder.function('my_function', {'arg': 'spam'}, nid=1).transition(2)
+        builder.stop(nid=2)
+
+    A method adding a node makes it the *current* node. `transition` adds a
+    transition from the current node, unless another source is given.
+
+    The description is a document made of Python built-in types, with the
+    same content as a sequence file (see `seq_schema.yaml`). It is turned
+    into a `SequenceReader` with `build`, and a `SequenceRunner` accepts a
+    builder directly.
+    """
+
+    # --------------------------------------------------------------------------
+    # Private methods
+    # --------------------------------------------------------------------------
+
+    def __init__(self, constants: Dict = None):
+        """Initialize an empty sequence.
+
+        Args:
+            constants: (optional) the constants of the sequence.
+        """
+        self._constants = dict(constants) if constants else dict()
+        # Keys are node ids, values are node dictionaries as found in a
+        # sequence document. Nodes are kept in their order of creation.
+        self._nodes: Dict[int, Dict] = dict()
+        # ID of the node that `transition` uses by default
+        self._current_id = None
+        # ID given to the next node created without an explicit ID
+        self._next_id = 0
+
+    def _add_node(self, node_type: str, nid: Union[int, None],
+                  name: Union[str, None], **fields) -> 'SequenceBuilder':
+        """Add a node to the sequence and make it the current node.
+
+        Args:
+            node_type: the type of the node, as written in a sequence file.
+            nid: the unique ID of the node, or None to use the lowest integer
+                greater than every ID used so far.
+            name: the name of the node, or None.
+            fields: other keys of the node dictionary. Keys whose value is
+                None are not written.
+
+        Returns:
+            This builder.
+
+        Raises:
+            SequenceBuilderError: if the ID is not an integer or is already
+                used.
+        """
+        if nid is None:
+            nid = self._next_id
+        if type(nid) is not int:
+            raise SequenceBuilderError(
+                "ID of a node must be an integer, got {!r}.".format(nid))
+        if nid in self._nodes:
+            raise SequenceBuilderError(
+                "Node n°{} is already defined.".format(nid))
+        node_dict = {'id': nid, 'type': node_type}
+        if name is not None:
+            node_dict['name'] = name
+        for key, value in fields.items():
+            if value is not None:
+                node_dict[key] = value
+        self._nodes[nid] = node_dict
+        self._current_id = nid
+        self._next_id = max(self._next_id, nid + 1)
+        return self
+
+    # --------------------------------------------------------------------------
+    # Public methods
+    # --------------------------------------------------------------------------
+
+    @property
+    def current_id(self) -> Union[int, None]:
+        """ID of the current node, None if there is no node (read-only)."""
+        return self._current_id
+
+    def constant(self, name: str, value: Any) -> 'SequenceBuilder':
+        """Add a constant to the sequence.
+
+        Args:
+            name: the name of the constant.
+            value: the value of the constant.
+
+        Returns:
+            This builder.
+        """
+        self._constants[name] = value
+        return self
+
+    def start(self, nid: int = None, name: str = None) -> 'SequenceBuilder':
+        """Add a node of type start. See `SequenceBuilder._add_node`."""
+        return self._add_node('start', nid, name, transitions=[])
+
+    def stop(self, nid: int = None, name: str = None) -> 'SequenceBuilder':
+        """Add a node of type stop. See `SequenceBuilder._add_node`."""
+        return self._add_node('stop', nid, name)
+
+    def parallel_split(self, nid: int = None,
+                       name: str = None) -> 'SequenceBuilder':
+        """Add a node of type parallel split. See `SequenceBuilder._add_node`.
+        """
+        return self._add_node('parallel_split', nid, name, transitions=[])
+
+    def parallel_sync(self, nid: int = None,
+                      name: str = None) -> 'SequenceBuilder':
+        """Add a node of type parallel sync. See `SequenceBuilder._add_node`."""
+        return self._add_node('parallel_sync', nid, name, transitions=[])
+
+    def variable(self, variables: Dict, nid: int = None,
+                 name: str = None) -> 'SequenceBuilder':
+        """Add a node of type variable.
+
+        Args:
+            variables: a dictionary of variables and their assignations in
+              the form of {var_name: python_expression}
+            nid: (optional) see `SequenceBuilder._add_node`.
+            name: (optional) the name of the node.
+
+        Returns:
+            This builder.
+        """
+        return self._add_node('variable', nid, name,
+                              variables=dict(variables), transitions=[])
+
+    def function(self,
+                 function: str,
+                 arguments: Dict = None,
+                 nid: int = None,
+                 name: str = None,
+                 timeout: Union[int, float] = None,
+                 return_var_name: str = None,
+                 wrappers: List[Union[str, Dict]] = None,
+                 profile: bool = False,
+                 memory_limit: Union[int, str] = None,
+                 cpu_time_limit: Union[int, float] = None
+                 ) -> 'SequenceBuilder':
+        """Add a node of type function.
+
+        Args:
+            function: the name of the function to run in the node.
+            arguments: (optional) the keyword arguments to give to the
+                function, as Python expressions.
+            nid: (optional) see `SequenceBuilder._add_node`.
+            name: (optional) the name of the node.
+            timeout: (optional) the timeout limit of the function, in seconds.
+            return_var_name: (optional) the variable name in which the
+                sequence runner will store the returned object of the function.
+            wrappers: (optional) the wrappers around this node, as written in
+                a sequence file: a list of wrapper names, or of dictionaries
+                with a wrapper name as key and its arguments as value.
+            profile: (optional) set to True to run the function under
+                cProfile. See `yapyseq.profiling`.
+            memory_limit: (optional) the memory the function can allocate, in
+                bytes or as a string like "512M".
+            cpu_time_limit: (optional) the CPU time the function can use, in
+                seconds.
+
+        Returns:
+            This builder.
+        """
+        return self._add_node(
+            'function', nid, name,
+            function=function,
+            arguments=dict(arguments) if arguments else None,
+            timeout=timeout,
+            transitions=[],
+            wrappers=list(wrappers) if wrappers else None,
+            profile=True if profile else None,
+            memory_limit=memory_limit,
+            cpu_time_limit=cpu_time_limit,
+            **{'return': return_var_name})
+
+    def transition(self, target: int, condition: str = None,
+                   source: int = None) -> 'SequenceBuilder':
+        """Add a transition to the sequence.
+
+        The current node is not changed, so several transitions can be added
+        to the same node in a row.
+
+        Args:
+            target: the ID of the targeted node. It may be defined later.
+            condition: (optional) the condition to fulfill for this transition.
+            source: (optional) the ID of the node owning the transition.
+                Default is the current node.
+
+        Returns:
+            This builder.
+
+        Raises:
+            SequenceBuilderError: if the source node does not exist or cannot
+                have transitions.
+        """
+        if source is None:
+            source = self._current_id
+        if source not in self._nodes:
+            raise SequenceBuilderError(
+                "Cannot add a transition from node {}, it does not "
+                "exist.".format(source))
+        node_dict = self._nodes[source]
+        if 'transitions' not in node_dict:
+            raise SequenceBuilderError(
+                "Node n°{} of type {} cannot have transitions.".format(
+                    source, node_dict['type']))
+        transition = {'target': target}
+        if condition is not None:
+            transition['condition'] = condition
+        node_dict['transitions'].append(transition)
+        return self
+
+    def to_document(self) -> Dict:
+        """Get the document describing the sequence.
+
+        Returns:
+            A copy of the document, with the same content as a sequence file
+            loaded with a YAML parser.
+        """
+        document = {'sequence': {'nodes': list(self._nodes.values())}}
+        if self._constants:
+            document['sequence']['constants'] = self._constants
+        return copy.deepcopy(document)
+
+    def build(self, schema_path: str = SEQUENCE_SCHEMA_PATH,
+              check: bool = True) -> SequenceReader:
+        """Create the node objects of the sequence.
+
+        Args:
+            schema_path: (optional) Path to a schema YAML file, used by YAMALE.
+            check: (optional) False to skip the validation of the document
+                with the schema. See `SequenceReader.from_document`.
+
+        Returns:
+            A SequenceReader object of the sequence.
+
+        Raises:
+            Same as `SequenceReader.from_document`
+        """
+        return SequenceReader.from_document(self.to_document(), schema_path,
+                                            check)
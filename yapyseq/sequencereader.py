@@ -8,15 +8,28 @@ file, You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import os
 from collections import Counter, OrderedDict
-from typing import Set, Dict
+from functools import lru_cache
+from typing import Set, Dict, List, Union, IO, Iterable, Iterator, Tuple, \
+    Any
 import copy
+import hashlib
+import importlib.util
+import marshal
+import pickle
+import tempfile
 
 from ruamel.yaml import YAML
+from ruamel.yaml.events import AliasEvent, ScalarEvent, SequenceStartEvent, \
+    SequenceEndEvent, MappingStartEvent, MappingEndEvent, DocumentEndEvent
+from ruamel.yaml.nodes import ScalarNode, SequenceNode, MappingNode
 import yamale
 
-from yapyseq.nodes import StartNode, StopNode, ParallelSplitNode, \
+from yapyseq.nodes import Node, StartNode, StopNode, ParallelSplitNode, \
     ParallelSyncNode, \
     FunctionNode, VariableNode, TransitionalNode
+from yapyseq.common import get_cache_dir, get_version, compile_expr, \
+    add_compiled_expressions, prune_cache_files
+from yapyseq.resources import parse_size
 
 # ------------------------------------------------------------------------------
 # MODULE CONSTANTS
@@ -26,6 +39,16 @@ from yapyseq.nodes import StartNode, StopNode, ParallelSplitNode, \
 SEQUENCE_SCHEMA_PATH = "{}/seq_schema.yaml".format(
     os.path.dirname(os.path.realpath(__file__)))
 
+# Version of the format of compiled sequences.
+# It must be incremented when the content of the compiled form changes.
+COMPILED_SEQUENCE_VERSION = 5
+
+# Number of nodes validated at once by the low-memory loader
+STREAM_CHUNK_SIZE = 1000
+
+# Size of the blocks read to hash a sequence file, in bytes
+READ_BLOCK_SIZE = 1 << 20
+
 # ------------------------------------------------------------------------------
 # Custom exception for this module
 # ------------------------------------------------------------------------------
@@ -35,6 +58,497 @@ class SequenceFileError(OSError):
     pass
 
 
+class SequenceStructureError(SequenceFileError):
+    """Raised when the structure of the node graph of a sequence is wrong."""
+    def __init__(self, seq_file_path, errors):
+        """Initialize the exception.
+
+        Args:
+            seq_file_path: path to the sequence file, or None if unknown.
+            errors: list of strings describing every error found in the
+                sequence. Stored as a public attribute of this object.
+        """
+        super().__init__(seq_file_path, errors)
+        self.seq_file_path = seq_file_path
+        self.errors = errors
+
+    def __str__(self):
+        msg = "{} error(s) found in the structure of the sequence {}:".format(
+            len(self.errors), self.seq_file_path)
+        return '\n  * '.join([msg] + self.errors)
+
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+@lru_cache()
+def _make_schema(schema_path: str, mtime: int) -> yamale.schema.Schema:
+    """Build a yamale schema, and keep it in cache.
+
+    The modification time is part of the arguments so that a modified
+    schema file is built again.
+    """
+    return yamale.make_schema(schema_path)
+
+
+def get_schema(schema_path: str = SEQUENCE_SCHEMA_PATH
+               ) -> yamale.schema.Schema:
+    """Get the compiled yamale schema of a schema file.
+
+    Schemas are built only once per process, and reused as long as their file
+    is not modified.
+
+    Args:
+        schema_path: (optional) Path to a schema YAML file, used by YAMALE.
+
+    Returns:
+        The yamale Schema object.
+
+    Raises:
+        FileNotFoundError: if the given path does not lead to a file.
+    """
+    if not os.path.isfile(schema_path):
+        raise FileNotFoundError("Schema file cannot be found at given "
+                                "path: {}".format(schema_path))
+    real_path = os.path.realpath(schema_path)
+    return _make_schema(real_path, os.stat(real_path).st_mtime_ns)
+
+
+def read_sequence_file(seq_file_path: str) -> bytes:
+    """Read the raw content of a sequence file.
+
+    Args:
+        seq_file_path: Path to a YAML file describing a sequence.
+
+    Returns:
+        The content of the file.
+
+    Raises:
+        FileNotFoundError: if the given path does not lead to a file.
+        OSError: if the file cannot be read.
+    """
+    if not os.path.isfile(seq_file_path):
+        raise FileNotFoundError("Sequence file cannot be found at given "
+                                "path: {}".format(seq_file_path))
+    with open(seq_file_path, 'rb') as f:
+        return f.read()
+
+
+def load_sequence_file(seq_file_path: str) -> Dict:
+    """Parse a sequence file without checking it.
+
+    The safe loader of ruamel.yaml is used. It is based on the libyaml C
+    bindings when `ruamel.yaml.clib` is installed.
+
+    Args:
+        seq_file_path: Path to a YAML file describing a sequence.
+
+    Returns:
+        The document of the sequence file, made of Python built-in types.
+
+    Raises:
+        Same as `read_sequence_file`
+    """
+    return YAML(typ='safe').load(read_sequence_file(seq_file_path))
+
+
+def compiled_sequence_path(content: Union[bytes, Iterable[bytes]],
+                           cache_dir: str,
+                           schema_path: str = SEQUENCE_SCHEMA_PATH) -> str:
+    """Get the path of the compiled form of a sequence in a cache directory.
+
+    The name of the file is a hash of the content of the sequence, the content
+    of the schema, the versions of yapyseq and of the compiled form, and the
+    bytecode version of the interpreter, as expressions are stored as code
+    objects. When yapyseq is not installed, the modification times of its
+    modules replace its version.
+
+    Args:
+        content: The raw content of the sequence file, or an iterable of
+            blocks of this content.
+        cache_dir: The directory of compiled sequences.
+        schema_path: (optional) Path to the schema used to check the sequence.
+
+    Returns:
+        The path to the compiled sequence file, that may not exist.
+    """
+    digest = hashlib.sha256()
+    digest.update('{}\0{}\0'.format(COMPILED_SEQUENCE_VERSION,
+                                     get_version()).encode('utf-8'))
+    digest.update(importlib.util.MAGIC_NUMBER)
+    digest.update(_get_source_stamp())
+    with open(schema_path, 'rb') as f:
+        digest.update(f.read())
+    digest.update(b'\0')
+    if isinstance(content, bytes):
+        content = [content]
+    for block in content:
+        digest.update(block)
+    return os.path.join(cache_dir, '{}.pickle'.format(digest.hexdigest()))
+
+
+@lru_cache()
+def _get_source_stamp() -> bytes:
+    """Identify the source of yapyseq when it is not installed.
+
+    Without an installed version, compiled sequences could outlive a change
+    of the node classes in a source checkout.
+
+    Returns:
+        The modification times and sizes of the modules of yapyseq, or
+        nothing if yapyseq is installed.
+    """
+    if get_version() != 'unknown':
+        return b''
+    package_dir = os.path.dirname(os.path.realpath(__file__))
+    stamp = []
+    for name in sorted(os.listdir(package_dir)):
+        if name.endswith('.py'):
+            stat = os.stat(os.path.join(package_dir, name))
+            stamp.append('{}:{}:{}'.format(name, stat.st_mtime_ns,
+                                           stat.st_size))
+    return '\0'.join(stamp).encode('utf-8')
+
+
+def check_sequence_structure(node_dicts: List[Dict]) -> List[str]:
+    """Check the graph formed by the nodes of a sequence.
+
+    The following rules are checked, in a time proportional to the number of
+    nodes and transitions:
+        * IDs of the nodes are unique.
+        * Transitions lead to existing nodes.
+        * Transitions do not lead to start nodes.
+        * Every node can be reached from a start node.
+
+    Args:
+        node_dicts: the list of nodes of a sequence document. The format of
+            each node must be valid, see `seq_schema.yaml`.
+
+    Returns:
+        The list of errors found, as strings. Empty if the structure is valid.
+    """
+    errors = []
+
+    # Check uniqueness of the IDs
+    # Count the occurrence of each ID, and keep those that appear more than
+    # once.
+    id_counter = Counter([n['id'] for n in node_dicts])
+    non_unique_ids = sorted([k for k, v in id_counter.items() if v > 1])
+    if non_unique_ids:
+        errors.append("The following ids for nodes are not unique:"
+                      " {}".format(non_unique_ids))
+
+    # Check compliance between transition IDs and node IDs
+    # And check that start nodes do not have IN transitions
+    start_nids = set([n['id'] for n in node_dicts if n['type'] == "start"])
+    # Keys are node ids, values are the targets of their transitions
+    targets_dict: Dict[int, Set[int]] = dict()
+    for node in node_dicts:
+        targets = set([t['target'] for t in node.get('transitions') or []])
+        targets_dict.setdefault(node['id'], set()).update(targets)
+        wrong_nids = sorted([t for t in targets if t not in id_counter])
+        if wrong_nids:
+            errors.append("Node with ID n°{} has transitions with nonexistent "
+                          "targets: {}".format(node['id'], wrong_nids))
+        wrong_nids = sorted(targets.intersection(start_nids))
+        if wrong_nids:
+            errors.append("Node with ID n°{} has transitions leading to start "
+                          "nodes: {}".format(node['id'], wrong_nids))
+
+    # Check that every node can be reached, browsing the graph from the
+    # start nodes.
+    reached = set(start_nids)
+    to_browse = list(start_nids)
+    while to_browse:
+        for target in targets_dict[to_browse.pop()]:
+            if target not in reached and target in targets_dict:
+                reached.add(target)
+                to_browse.append(target)
+    unreachable = sorted([nid for nid in targets_dict if nid not in reached])
+    if unreachable:
+        errors.append("The following nodes cannot be reached from a start "
+                      "node: {}".format(unreachable))
+
+    return errors
+
+
+def read_file_blocks(file_path: str) -> Iterator[bytes]:
+    """Read a file block by block.
+
+    Args:
+        file_path: Path to the file to read.
+
+    Yields:
+        Blocks of the file of at most `READ_BLOCK_SIZE` bytes.
+    """
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE), b''):
+            yield block
+
+
+def validate_document(loaded: Dict, schema: yamale.schema.Schema,
+                      seq_file_path: str = None) -> None:
+    """Validate a sequence document with a yamale schema.
+
+    Args:
+        loaded: The document of a sequence file, to check.
+        schema: The yamale schema.
+        seq_file_path: (optional) Path to the sequence file, only used in
+            error messages.
+
+    Raises:
+        SequenceFileError: if format of sequence does not respect the rules.
+        Same as `yamale.validate` in case it raises others than ValueError
+    """
+    try:
+        yamale.validate(schema, [(loaded, seq_file_path)])
+    except ValueError as e:
+        raise SequenceFileError(("Errors found in the sequence file: {}"
+                                 "\nGot following message:\n"
+                                 "{}").format(seq_file_path, str(e)))
+
+
+def _compose_yaml_node(parser, anchors: Dict):
+    """Compose the YAML node starting at the next event of a parser.
+
+    This does the job of the composer of ruamel.yaml, which is not available
+    with its C parser, for a single node.
+
+    Args:
+        parser: A ruamel.yaml loader providing parsing events.
+        anchors: Dictionary of the anchored nodes. Keys are anchor names.
+
+    Returns:
+        A ruamel.yaml node, that can be given to `construct_document` of the
+        loader.
+    """
+    event = parser.get_event()
+    if isinstance(event, AliasEvent):
+        return anchors[event.anchor]
+    if isinstance(event, ScalarEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = parser.resolve(ScalarNode, event.value, event.implicit)
+        node = ScalarNode(tag, event.value, event.start_mark, event.end_mark,
+                          style=event.style)
+    elif isinstance(event, SequenceStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = parser.resolve(SequenceNode, None, event.implicit)
+        node = SequenceNode(tag, [], event.start_mark, None,
+                            flow_style=event.flow_style)
+        while not parser.check_event(SequenceEndEvent):
+            node.value.append(_compose_yaml_node(parser, anchors))
+        node.end_mark = parser.get_event().end_mark
+    elif isinstance(event, MappingStartEvent):
+        tag = event.tag
+        if tag is None or tag == '!':
+            tag = parser.resolve(MappingNode, None, event.implicit)
+        node = MappingNode(tag, [], event.start_mark, None,
+                           flow_style=event.flow_style)
+        while not parser.check_event(MappingEndEvent):
+            key = _compose_yaml_node(parser, anchors)
+            node.value.append((key, _compose_yaml_node(parser, anchors)))
+        node.end_mark = parser.get_event().end_mark
+    else:
+        raise SequenceFileError("Unexpected YAML event: {}".format(event))
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def iter_sequence_items(stream: IO,
+                        seq_file_path: str = None) -> Iterator[Tuple[str, Any]]:
+    """Parse a sequence file item by item.
+
+    Only the item being parsed is held in memory: the file is read by blocks,
+    and each node is built from the parsing events as soon as it is complete.
+
+    Args:
+        stream: A binary file-like object providing the sequence file.
+        seq_file_path: (optional) Path to the sequence file, only used in
+            error messages.
+
+    Yields:
+        2-tuples (key, value). Key is 'constants' for the constants of the
+        sequence, and 'node' for each node of the sequence, in the order of
+        the file. Values are made of Python built-in types.
+
+    Raises:
+        SequenceFileError: if the file is not a mapping with a single key
+            'sequence', containing a mapping of 'constants' and 'nodes'.
+    """
+    error = SequenceFileError(("Errors found in the sequence file: {}\n"
+                               "It must be a mapping with a key 'sequence', "
+                               "containing the keys 'nodes' and "
+                               "'constants'.").format(seq_file_path))
+    parser = YAML(typ='safe').get_constructor_parser(stream)[1]
+    anchors = dict()
+
+    def construct_next():
+        return parser.construct_document(_compose_yaml_node(parser, anchors))
+
+    # Skip StreamStartEvent and DocumentStartEvent
+    parser.get_event()
+    parser.get_event()
+    if not parser.check_event(MappingStartEvent):
+        raise error
+    parser.get_event()
+    if construct_next() != 'sequence' or \
+            not parser.check_event(MappingStartEvent):
+        raise error
+    parser.get_event()
+    while not parser.check_event(MappingEndEvent):
+        key = construct_next()
+        if key == 'nodes' and parser.check_event(SequenceStartEvent):
+            parser.get_event()
+            while not parser.check_event(SequenceEndEvent):
+                yield 'node', construct_next()
+            parser.get_event()
+        elif key == 'constants':
+            yield 'constants', construct_next()
+        else:
+            raise error
+    # End of the mapping 'sequence', which must be the only key
+    parser.get_event()
+    if not parser.check_event(MappingEndEvent):
+        raise error
+    parser.get_event()
+    if not parser.check_event(DocumentEndEvent):
+        raise error
+
+
+def make_node(node_dict: Dict) -> Node:
+    """Create a node object from its description in a sequence document.
+
+    Args:
+        node_dict: The description of the node. Its format must be valid, see
+            `seq_schema.yaml`.
+
+    Returns:
+        The node object. Its class depends on the type of the node.
+
+    Raises:
+        SequenceFileError: if the type of the node is unknown.
+    """
+    ntype = node_dict['type']
+
+    if ntype == "function":
+        # list of wrappers is converted into an OrderedDict
+        wrapper_list = node_dict.get('wrappers')
+        if wrapper_list:
+            wrapper_dict = OrderedDict()
+            for wrapper in wrapper_list:
+                # A wrapper can be written as a simple string (name)
+                # or as a dict if some arguments are given.
+                if isinstance(wrapper, str):
+                    wrapper_dict[wrapper] = {}
+                elif isinstance(wrapper, dict):
+                    wrapper_dict.update(wrapper)
+                else:
+                    raise SequenceFileError(
+                        ('The following wrapper is neiter a str '
+                         ' or a dict: {}').format(wrapper))
+        else:
+            wrapper_dict = None
+        memory_limit = node_dict.get('memory_limit')
+        if memory_limit is not None:
+            try:
+                memory_limit = parse_size(memory_limit)
+            except ValueError as exc:
+                raise SequenceFileError(
+                    'Memory limit of node {} is not valid: {}'.format(
+                        node_dict.get('id'), exc))
+        # create function node
+        return FunctionNode(
+            nid=node_dict.get('id'),
+            name=node_dict.get('name'),
+            transitions=node_dict.get('transitions'),
+            function_name=node_dict.get('function'),
+            function_kwargs=node_dict.get('arguments'),
+            timeout=node_dict.get('timeout'),
+            return_var_name=node_dict.get('return'),
+            wrappers=wrapper_dict,
+            profile=node_dict.get('profile', False),
+            memory_limit=memory_limit,
+            cpu_time_limit=node_dict.get('cpu_time_limit'))
+
+    elif ntype == "start":
+        return StartNode(nid=node_dict.get('id'),
+                         name=node_dict.get('name'),
+                         transitions=node_dict.get('transitions'))
+
+    elif ntype == "stop":
+        return StopNode(nid=node_dict.get('id'),
+                        name=node_dict.get('name'))
+
+    elif ntype == "variable":
+        return VariableNode(
+            nid=node_dict.get('id'),
+            name=node_dict.get('name'),
+            transitions=node_dict.get('transitions'),
+            variables=node_dict.get('variables'))
+
+    elif ntype == "parallel_split":
+        return ParallelSplitNode(
+            nid=node_dict.get('id'),
+            name=node_dict.get('name'),
+            transitions=node_dict.get('transitions'))
+
+    elif ntype == "parallel_sync":
+        return ParallelSyncNode(
+            nid=node_dict.get('id'),
+            name=node_dict.get('name'),
+            transitions=node_dict.get('transitions'))
+
+    else:
+        raise SequenceFileError("Node n°{} has an unknown type "
+                                "{}.".format(node_dict['id'],
+                                             node_dict['type']))
+
+
+def collect_node_expressions(node_dict: Dict) -> Set[str]:
+    """Get all the Python expressions of a node.
+
+    Args:
+        node_dict: The description of a valid node.
+
+    Returns:
+        The set of expressions found in conditions, arguments of functions and
+        wrappers, and variable nodes.
+    """
+    expressions = set()
+    for transition in node_dict.get('transitions') or []:
+        if transition.get('condition') is not None:
+            expressions.add(transition['condition'])
+    values = list((node_dict.get('arguments') or {}).values())
+    values.extend((node_dict.get('variables') or {}).values())
+    for wrapper in node_dict.get('wrappers') or []:
+        if isinstance(wrapper, dict):
+            for wrapper_kwargs in wrapper.values():
+                values.extend((wrapper_kwargs or {}).values())
+    expressions.update([v for v in values if type(v) is str])
+    return expressions
+
+
+def collect_expressions(loaded: Dict) -> Set[str]:
+    """Get all the Python expressions of a sequence document.
+
+    Args:
+        loaded: The document of a valid sequence file.
+
+    Returns:
+        The set of expressions found in conditions, arguments of functions and
+        wrappers, and variable nodes.
+    """
+    expressions = set()
+    for node_dict in loaded['sequence']['nodes']:
+        expressions.update(collect_node_expressions(node_dict))
+    return expressions
+
+
 # ------------------------------------------------------------------------------
 # Main class
 # ------------------------------------------------------------------------------
@@ -49,6 +563,17 @@ class SequenceReader(object):
 
     Contents of a sequence file is described in the file `seq_schema.yaml`.
 
+    A sequence can also be read from a string or a stream, with
+    `SequenceReader.from_string` and `SequenceReader.from_stream`, or created
+    from a document made of Python built-in types with
+    `SequenceReader.from_document` (see `yapyseq.SequenceBuilder`).
+
+    With `cache=True`, once a sequence is checked and parsed, its compiled
+    form (node objects, indexes and compiled expressions) is saved in a cache
+    directory. Next loads of the same content skip the check and the parsing.
+    Compiled sequences not used for `yapyseq.common.CACHE_MAX_AGE` are
+    removed.
+
     # TODO: implement sub-sequences
     # TODO: allow transitions to use node names instead of ids OR remove names and ids can be strings
     """
@@ -59,41 +584,216 @@ class SequenceReader(object):
 
     def __init__(self,
                  seq_file_path: str,
-                 schema_path: str = SEQUENCE_SCHEMA_PATH):
+                 schema_path: str = SEQUENCE_SCHEMA_PATH,
+                 cache: Union[bool, str] = False,
+                 low_memory: bool = False):
         """Initialize the SequenceReader with a given sequence.
 
         Given sequence file is checked using given schema to ensure validity
         of the sequence description. Schema must respect YAMALE syntax.
 
+        With `low_memory`, the file is never held in memory as a whole. Nodes
+        are parsed, validated and turned into node objects one by one while
+        the file is read, see `iter_sequence_items`. This is slower, but the
+        peak memory is close to the memory of the node objects.
+
         Args:
             seq_file_path: Path to a .yaml file describing a sequence.
             schema_path: (optional) Path to a schema YAML file, used by YAMALE.
+            cache: (optional) this configures the cache of compiled sequences
+                and can have the following values:
+                    * True to use the cache directory of yapyseq.
+                    * False to disable the cache (default).
+                    * A path to the directory to use as a cache.
+            low_memory: (optional) True to parse the sequence file node by
+                node. Default is False.
 
         Raises:
             Same as `SequenceReader.check_sequence_file`
         """
+        self._init_attributes(seq_file_path)
+        if low_memory:
+            self._load_file_low_memory(seq_file_path, schema_path, cache)
+        else:
+            self._load_content(read_sequence_file(seq_file_path), schema_path,
+                               cache)
+
+    def _init_attributes(self, seq_file_path: Union[str, None]) -> None:
+        """Initialize the attributes of a reader with no sequence yet.
+
+        Args:
+            seq_file_path: Path to the sequence file, or None if the sequence
+                does not come from a file.
+        """
         # Save the path to the sequence file
         self._seq_file_path = seq_file_path
         # Initialize the set of nodes
         self._nodes = set()
+        # Keys are node ids, values are the ids of the nodes leading to them
+        self._prev_node_ids: Dict[int, Set[int]] = dict()
+
+    def _load_content(self, content: bytes, schema_path: str,
+                      cache: Union[bool, str]) -> None:
+        """Load, check and parse the raw content of a sequence.
 
-        # Check the sequence file. Raises an exception if there is an issue.
-        self.check_sequence_file(seq_file_path, schema_path)
+        The compiled form of the sequence is used if it is in the cache.
+
+        Args:
+            content: The raw content of the sequence, in YAML.
+            schema_path: Path to a schema YAML file, used by YAMALE.
+            cache: Configuration of the cache of compiled sequences. See
+                `SequenceReader.__init__`.
+
+        Raises:
+            Same as `SequenceReader.check_sequence_document`
+        """
+        cache_dir = self._get_compiled_dir(cache)
+        if cache_dir:
+            compiled_path = compiled_sequence_path(content, cache_dir,
+                                                   schema_path)
+            if self._load_compiled(compiled_path):
+                return
+
+        # Load and check the sequence file.
+        # Raises an exception if there is an issue.
+        loaded = YAML(typ='safe').load(content)
+        self.check_sequence_document(loaded, self._seq_file_path, schema_path)
 
         # Parse the sequence to create node objects
-        self._parse_sequence()
+        self._parse_sequence(loaded)
+
+        if cache_dir:
+            self._save_compiled(compiled_path)
+
+    def _load_file_low_memory(self, seq_file_path: str, schema_path: str,
+                              cache: Union[bool, str]) -> None:
+        """Load, check and parse a sequence file node by node.
+
+        The compiled sequence is used if it is in the cache. The file is
+        hashed block by block to find it.
+
+        Args:
+            seq_file_path: Path to a .yaml file describing a sequence.
+            schema_path: Path to a schema YAML file, used by YAMALE.
+            cache: Configuration of the cache of compiled sequences. See
+                `SequenceReader.__init__`.
+
+        Raises:
+            Same as `SequenceReader.check_sequence_file`
+        """
+        if not os.path.isfile(seq_file_path):
+            raise FileNotFoundError("Sequence file cannot be found at given "
+                                    "path: {}".format(seq_file_path))
+        cache_dir = self._get_compiled_dir(cache)
+        if cache_dir:
+            compiled_path = compiled_sequence_path(
+                read_file_blocks(seq_file_path), cache_dir, schema_path)
+            if self._load_compiled(compiled_path):
+                return
 
-    def _parse_sequence(self):
-        """Parse a sequence file to be able to provide information about it.
+        with open(seq_file_path, 'rb') as f:
+            self._parse_sequence_stream(f, schema_path)
 
-        Make sure the sequence file is valid before calling this function.
-        File can be checked with `SequenceReader.check_sequence`.
+        if cache_dir:
+            self._save_compiled(compiled_path)
+
+    @staticmethod
+    def _get_compiled_dir(cache: Union[bool, str]) -> Union[str, None]:
+        """Get the directory of compiled sequences.
+
+        Args:
+            cache: Configuration of the cache of compiled sequences. See
+                `SequenceReader.__init__`.
+
+        Returns:
+            The path of the directory, or None if the cache is disabled.
+        """
+        if cache is True:
+            return os.path.join(get_cache_dir(), 'sequences')
+        elif cache is False:
+            return None
+        else:
+            return cache
+
+    def _load_compiled(self, compiled_path: str) -> bool:
+        """Load the compiled form of the sequence.
+
+        Args:
+            compiled_path: Path to the compiled sequence file.
+
+        Returns:
+            True if the compiled sequence has been loaded, False if it does
+            not exist or cannot be read. A file that cannot be read is
+            removed.
+        """
+        try:
+            with open(compiled_path, 'rb') as f:
+                compiled = pickle.load(f)
+            nodes = compiled['nodes']
+            constants = compiled['constants']
+            prev_node_ids = compiled['prev_node_ids']
+            expressions = dict([(e, marshal.loads(c)) for e, c in
+                                compiled['expressions'].items()])
+        except FileNotFoundError:
+            return False
+        except Exception:
+            try:
+                os.remove(compiled_path)
+            except OSError:
+                pass
+            return False
+        self._nodes = nodes
+        self._constants = constants
+        self._prev_node_ids = prev_node_ids
+        self._expressions = set(expressions)
+        add_compiled_expressions(expressions)
+        # Used compiled sequences are not pruned
+        try:
+            os.utime(compiled_path)
+        except OSError:
+            pass
+        return True
+
+    def _save_compiled(self, compiled_path: str) -> None:
+        """Save the compiled form of the sequence.
+
+        The file is written atomically. Errors are ignored because the cache
+        is only an optimization.
+
+        Args:
+            compiled_path: Path to the compiled sequence file.
         """
-        with open(self._seq_file_path) as f:
-            yaml = YAML(typ='safe')
-            yaml.preserve_quotes = True
-            loaded = yaml.load(f)
+        expressions = dict()
+        for expr in self._expressions:
+            try:
+                expressions[expr] = marshal.dumps(compile_expr(expr))
+            except SyntaxError:
+                # The error will be raised when evaluating the expression
+                pass
+        compiled = {'nodes': self._nodes,
+                    'constants': self._constants,
+                    'prev_node_ids': self._prev_node_ids,
+                    'expressions': expressions}
+        cache_dir = os.path.dirname(os.path.abspath(compiled_path))
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, compiled_path)
+        except (OSError, pickle.PicklingError):
+            return
+        prune_cache_files(cache_dir, '*.pickle')
 
+    def _parse_sequence(self, loaded: Dict):
+        """Parse a sequence document to be able to provide information about it.
+
+        Make sure the sequence document is valid before calling this function.
+        It can be checked with `SequenceReader.check_sequence_document`.
+
+        Args:
+            loaded: The document of the sequence file.
+        """
         # Collect constants
         if 'constants' in loaded['sequence']:
             self._constants = loaded['sequence']['constants']
@@ -102,92 +802,190 @@ class SequenceReader(object):
 
         # Create node objects
         for node_dict in loaded['sequence']['nodes']:
-            ntype = node_dict['type']
-
-            if ntype == "function":
-                # list of wrappers is converted into an OrderedDict
-                wrapper_list = node_dict.get('wrappers')
-                if wrapper_list:
-                    wrapper_dict = OrderedDict()
-                    for wrapper in wrapper_list:
-                        # A wrapper can be written as a simple string (name)
-                        # or as a dict if some arguments are given.
-                        if isinstance(wrapper, str):
-                            wrapper_dict[wrapper] = {}
-                        elif isinstance(wrapper, dict):
-                            wrapper_dict.update(wrapper)
-                        else:
-                            raise SequenceFileError(
-                                ('The following wrapper is neiter a str '
-                                 ' or a dict: {}').format(wrapper))
-                else:
-                    wrapper_dict = None
-                # create function node
-                new_node = FunctionNode(
-                    nid=node_dict.get('id'),
-                    name=node_dict.get('name'),
-                    transitions=node_dict.get('transitions'),
-                    function_name=node_dict.get('function'),
-                    function_kwargs=node_dict.get('arguments'),
-                    timeout=node_dict.get('timeout'),
-                    return_var_name=node_dict.get('return'),
-                    wrappers=wrapper_dict)
-
-            elif ntype == "start":
-                new_node = StartNode(nid=node_dict.get('id'),
-                                     name=node_dict.get('name'),
-                                     transitions=node_dict.get('transitions'))
-
-            elif ntype == "stop":
-                new_node = StopNode(nid=node_dict.get('id'),
-                                    name=node_dict.get('name'))
-
-            elif ntype == "variable":
-                new_node = VariableNode(
-                    nid=node_dict.get('id'),
-                    name=node_dict.get('name'),
-                    transitions=node_dict.get('transitions'),
-                    variables=node_dict.get('variables'))
-
-            elif ntype == "parallel_split":
-                new_node = ParallelSplitNode(
-                    nid=node_dict.get('id'),
-                    name=node_dict.get('name'),
-                    transitions=node_dict.get('transitions'))
-
-            elif ntype == "parallel_sync":
-                new_node = ParallelSyncNode(
-                    nid=node_dict.get('id'),
-                    name=node_dict.get('name'),
-                    transitions=node_dict.get('transitions'))
+            self._nodes.add(make_node(node_dict))
+
+        self._index_prev_node_ids()
+
+        # Collect the Python expressions of the sequence
+        self._expressions = collect_expressions(loaded)
+
+    def _parse_sequence_stream(self, stream: IO, schema_path: str) -> None:
+        """Check and parse a sequence file node by node.
+
+        Nodes are validated with the schema by chunks of `STREAM_CHUNK_SIZE`
+        nodes, then turned into node objects, and their description is
+        dropped. Only the IDs, types and transitions of the nodes are kept
+        until the structure of the node graph is checked.
 
+        Args:
+            stream: A binary file-like object providing the sequence file.
+            schema_path: Path to a schema YAML file, used by YAMALE.
+
+        Raises:
+            Same as `SequenceReader.check_sequence_document`
+        """
+        schema = get_schema(schema_path)
+        self._constants = dict()
+        self._expressions = set()
+        # Light description of the nodes for check_sequence_structure
+        structure = []
+        chunk = []
+        has_nodes = False
+
+        def parse_chunk():
+            validate_document({'sequence': {'nodes': chunk}}, schema,
+                              self._seq_file_path)
+            for node_dict in chunk:
+                structure.append({'id': node_dict['id'],
+                                  'type': node_dict['type'],
+                                  'transitions': node_dict.get('transitions')})
+                self._expressions.update(collect_node_expressions(node_dict))
+                self._nodes.add(make_node(node_dict))
+            chunk.clear()
+
+        for key, value in iter_sequence_items(stream, self._seq_file_path):
+            if key == 'constants':
+                validate_document({'sequence': {'constants': value,
+                                                'nodes': []}},
+                                  schema, self._seq_file_path)
+                self._constants = value
             else:
-                raise SequenceFileError("Node n°{} has an unknown type "
-                                        "{}.".format(node_dict['id'],
-                                                     node_dict['type']))
-            # Add the new node to set of nodes in the SequenceReader
-            self._nodes.add(new_node)
+                has_nodes = True
+                chunk.append(value)
+                if len(chunk) >= STREAM_CHUNK_SIZE:
+                    parse_chunk()
+        if not has_nodes:
+            raise SequenceFileError(("Errors found in the sequence file: {}"
+                                     "\nNo nodes found.").format(
+                                         self._seq_file_path))
+        parse_chunk()
+
+        # Check the graph of nodes, and report all the errors at once
+        errors = check_sequence_structure(structure)
+        if errors:
+            raise SequenceStructureError(self._seq_file_path, errors)
 
-        # TODO: Set required history for parallel sync node HERE
+        self._index_prev_node_ids()
+
+    def _index_prev_node_ids(self) -> None:
+        """Index the previous nodes of every node."""
+        for node in self._nodes:
+            if isinstance(node, TransitionalNode):
+                for next_nid in node.get_all_next_node_ids():
+                    self._prev_node_ids.setdefault(next_nid, set()).add(
+                        node.nid)
 
     # --------------------------------------------------------------------------
     # Public methods
     # --------------------------------------------------------------------------
 
+    @classmethod
+    def from_string(cls, content: Union[str, bytes],
+                    schema_path: str = SEQUENCE_SCHEMA_PATH,
+                    cache: Union[bool, str] = False) -> 'SequenceReader':
+        """Create a SequenceReader from the YAML content of a sequence.
+
+        Args:
+            content: The YAML description of a sequence.
+            schema_path: (optional) Path to a schema YAML file, used by YAMALE.
+            cache: (optional) Configuration of the cache of compiled sequences.
+                See `SequenceReader.__init__`.
+
+        Returns:
+            A SequenceReader object of the given sequence.
+
+        Raises:
+            Same as `SequenceReader.check_sequence_document`
+        """
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        reader = cls.__new__(cls)
+        reader._init_attributes(None)
+        reader._load_content(content, schema_path, cache)
+        return reader
+
+    @classmethod
+    def from_stream(cls, stream: IO,
+                    schema_path: str = SEQUENCE_SCHEMA_PATH,
+                    cache: Union[bool, str] = False) -> 'SequenceReader':
+        """Create a SequenceReader from a stream providing a sequence.
+
+        Args:
+            stream: A text or binary file-like object, read until its end.
+                Its `name` attribute is used in error messages if it has one.
+            schema_path: (optional) Path to a schema YAML file, used by YAMALE.
+            cache: (optional) Configuration of the cache of compiled sequences.
+                See `SequenceReader.__init__`.
+
+        Returns:
+            A SequenceReader object of the given sequence.
+
+        Raises:
+            Same as `SequenceReader.check_sequence_document`
+        """
+        content = stream.read()
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        name = getattr(stream, 'name', None)
+        reader = cls.__new__(cls)
+        reader._init_attributes(name if isinstance(name, str) else None)
+        reader._load_content(content, schema_path, cache)
+        return reader
+
+    @classmethod
+    def from_document(cls, loaded: Dict,
+                      schema_path: str = SEQUENCE_SCHEMA_PATH,
+                      check: bool = True) -> 'SequenceReader':
+        """Create a SequenceReader from a sequence document.
+
+        The document is used as is, without any YAML round trip. The compiled
+        sequence cache is not used.
+
+        Args:
+            loaded: The document of a sequence, made of Python built-in types,
+                as it would be loaded from a sequence file.
+            schema_path: (optional) Path to a schema YAML file, used by YAMALE.
+            check: (optional) False to skip the validation of the document
+                with the schema, for documents that are valid by construction.
+                The structure of the node graph is always checked.
+
+        Returns:
+            A SequenceReader object of the given sequence.
+
+        Raises:
+            Same as `SequenceReader.check_sequence_document`
+        """
+        if check:
+            cls.check_sequence_document(loaded, schema_path=schema_path)
+        else:
+            errors = check_sequence_structure(loaded['sequence']['nodes'])
+            if errors:
+                raise SequenceStructureError(None, errors)
+        reader = cls.__new__(cls)
+        reader._init_attributes(None)
+        reader._parse_sequence(loaded)
+        return reader
+
+    @property
+    def seq_file_path(self) -> Union[str, None]:
+        """Path to the sequence file, or None if unknown (read-only)."""
+        return self._seq_file_path
+
     @staticmethod
     def check_sequence_file(seq_file_path: str,
-                            schema_path: str = SEQUENCE_SCHEMA_PATH):
+                            schema_path: str = SEQUENCE_SCHEMA_PATH) -> Dict:
         """Check the validity of a given sequence file.
 
-        Given sequence file is checked using given schema to ensure validity
-        of the sequence description. Schema must respect YAMALE syntax.
-        # TODO: add description of additional checks
-        # TODO: add check of constant names (must be string)
+        Given sequence file is parsed once, and the resulting document is
+        checked using `SequenceReader.check_sequence_document`.
 
         Args:
             seq_file_path: Path to a YAML file describing a sequence, to check.
             schema_path: (optional) Path to a schema YAML file, used by YAMALE.
 
+        Returns:
+            The document of the sequence file, made of Python built-in types.
+
         Raises:
             FileNotFoundError: if the given path does not lead to a file.
             OSError: if the file cannot be read.
@@ -195,66 +993,45 @@ class SequenceReader(object):
              See `seq_schema.yaml`.
             Same as `yamale.validate` in case it raises others than ValueError
         """
-        if not os.path.isfile(seq_file_path):
-            raise FileNotFoundError("Sequence file cannot be found at given "
-                                    "path: {}".format(seq_file_path))
+        loaded = load_sequence_file(seq_file_path)
+        SequenceReader.check_sequence_document(loaded, seq_file_path,
+                                               schema_path)
+        return loaded
 
-        if not os.path.isfile(schema_path):
-            raise FileNotFoundError("Schema file cannot be found at given "
-                                    "path: {}".format(schema_path))
+    @staticmethod
+    def check_sequence_document(loaded: Dict, seq_file_path: str = None,
+                                schema_path: str = SEQUENCE_SCHEMA_PATH):
+        """Check the validity of a sequence document already loaded.
+
+        Given document is checked using given schema to ensure validity
+        of the sequence description. Schema must respect YAMALE syntax.
+        Then the structure of the node graph is checked, see
+        `check_sequence_structure`.
+        # TODO: add check of constant names (must be string)
+
+        Args:
+            loaded: The document of a sequence file, to check.
+            seq_file_path: (optional) Path to the sequence file, only used in
+                error messages.
+            schema_path: (optional) Path to a schema YAML file, used by YAMALE.
 
-        schema = yamale.make_schema(schema_path)
-        data = yamale.make_data(seq_file_path)
+        Raises:
+            FileNotFoundError: if the schema file does not exist.
+            SequenceFileError: if format of sequence does not respect the rules.
+             See `seq_schema.yaml`.
+            SequenceStructureError: if the node graph is not valid. It lists
+             all the errors found.
+            Same as `yamale.validate` in case it raises others than ValueError
+        """
+        schema = get_schema(schema_path)
 
         # Validate most of the sequence structure using the schema
-        try:
-            yamale.validate(schema, data)
-        except ValueError as e:
-            raise SequenceFileError(("Errors found in the sequence file: {}"
-                                     "\nGot following message:\n"
-                                     "{}").format(seq_file_path, str(e)))
-
-        # Load the sequence file
-        with open(seq_file_path) as f:
-            yaml = YAML(typ='safe')
-            yaml.preserve_quotes = True
-            loaded = yaml.load(f)
-
-        # Check uniqueness of the IDs
-        item_ids = [i['id'] for i in loaded['sequence']['nodes']]
-        # Count the occurrence of each ID, and keep those that appear
-        # more than once to raise an exception.
-        non_unique_ids = [k for k, v in Counter(item_ids).items() if v > 1]
-        if non_unique_ids:
-            raise SequenceFileError(
-                "The following ids for nodes are not unique :"
-                " {}".format(*non_unique_ids))
-
-        # Check compliance between transition IDs and node IDs
-        # And check that start nodes do not have IN transitions
-        # First, get all the ids of start nodes
-        start_nids = [
-            i['id'] for i in loaded['sequence']['nodes'] if i['type'] == "start"
-        ]
-        # Then, browse every node to check its transitions
-        for node in loaded['sequence']['nodes']:
-            if 'transitions' in node:
-                transitions = node['transitions']
-                targets = set([t['target'] for t in transitions])
-            else:
-                targets = set()
-            # Check that the IDs exist
-            wrong_nids = targets.difference(set(item_ids))
-            if wrong_nids:
-                raise SequenceFileError(("Node with ID n°{} has transitions"
-                                         " with nonexistent targets:"
-                                         " {}".format(node['id'], wrong_nids)))
-            # Check that the target is not a start node
-            wrong_nids = targets.intersection(set(start_nids))
-            if wrong_nids:
-                raise SequenceFileError(("Node with ID n°{} has transitions"
-                                         " leading to start nodes {}"
-                                         "").format(node['id'], wrong_nids))
+        validate_document(loaded, schema, seq_file_path)
+
+        # Check the graph of nodes, and report all the errors at once
+        errors = check_sequence_structure(loaded['sequence']['nodes'])
+        if errors:
+            raise SequenceStructureError(seq_file_path, errors)
 
     def get_nodes(self) -> Set:
         """Get the instantiated Node objects creating during parsing.
@@ -262,10 +1039,9 @@ class SequenceReader(object):
         Returns:
             A Set of Node objects (can be different classes in function of the
             node type), created during parsing of the sequence file.
-            A copy of the original is sent, in order to avoid modifications of
-            the original content.
+            Nodes are immutable, so they are not copied.
         """
-        return copy.deepcopy(self._nodes)
+        return set(self._nodes)
 
     def get_node_dict(self) -> Dict:
         """Get a dict of the instantiated Node objects creating during parsing.
@@ -274,11 +1050,9 @@ class SequenceReader(object):
             A dictionary where keys are the IDs of the nodes, and values
             are the Node objects (can be different classes in function of the
             node type), created during parsing of the sequence file.
-            A copy of the original is sent, in order to avoid modifications of
-            the original content.
+            Nodes are immutable, so they are not copied.
         """
-        node_dict = dict([(n.nid, n) for n in self._nodes])
-        return copy.deepcopy(node_dict)
+        return dict([(n.nid, n) for n in self._nodes])
 
     def get_constants(self) -> Dict:
         """Get the constants defined in the sequence file.
@@ -333,21 +1107,6 @@ class SequenceReader(object):
             node_id: the id of the target node.
 
         Returns:
-            A set of node ids.
-
-        Raises:
-            KeyError: if the node_id is not a valid node id.
+            A set of node ids. Empty if no node leads to the given one.
         """
-        # Initialize the value that will be returned
-        previous_node_ids = set()
-
-        # Browser nodes
-        for node in self._nodes:
-            # Only browse transitional nodes
-            if issubclass(type(node), TransitionalNode):
-                next_nodes = node.get_all_next_node_ids()
-                # If given nid is in the target list, add this previous node
-                if node_id in next_nodes:
-                    previous_node_ids.add(node.nid)
-
-        return previous_node_ids
+        return set(self._prev_node_ids.get(node_id, set()))
@@ -7,18 +7,30 @@ License, v. 2.0. If a copy of the MPL was not distributed with this
 file, You can obtain one at http://mozilla.org/MPL/2.0/.
 """
 
-from typing import Dict, Set, Union, Any
+from typing import Dict, Set, Union, Any, Tuple, IO, List
+from collections import deque
 import multiprocessing as mp
 from enum import Enum
-from logging import Logger
+from logging import Logger, DEBUG, INFO
 import os
-
-from yapyseq.functiongrabber import FunctionGrabber
+import time
+import warnings
+
+from yapyseq.functiongrabber import FunctionGrabber, resolve_item
+from yapyseq.optimizer import optimize_nodes, describe_simplifications
+from yapyseq.tracing import TraceRecorder
+from yapyseq.metrics import MetricsRegistry, SequenceMetrics
+from yapyseq.profiling import ProfileCollector
+from yapyseq.resources import ResourceTotals, add_resources, format_summary
 from yapyseq.sequencereader import SequenceReader
+from yapyseq.sequencebuilder import SequenceBuilder
 from yapyseq.nodes import FunctionNode, StartNode, StopNode, VariableNode, \
-    ParallelSyncNode, ParallelSplitNode, FunctionNodeResult
-from yapyseq.logger import get_logger
-from yapyseq.common import evaluate_expr
+    ParallelSyncNode, ParallelSplitNode, FunctionNodeResult, \
+    ParallelSyncFailure, NodeFunctionTimeout, NodeTimings
+from yapyseq.logger import RunLog, disabled_logger, event_fields
+from yapyseq.events import EventDispatcher, NodeEngaged, NodeDispatched, \
+    NodeFinished, TransitionTaken, SyncCompleted, RunFinished, CLOSE_TIMEOUT
+from yapyseq.common import evaluate_expr, ImportMode
 
 # ------------------------------------------------------------------------------
 # Custom exception for this module
@@ -70,43 +82,143 @@ class SequenceRunner(object):
 
     Attributes:
         status:
+        simplifications: list of the `yapyseq.optimizer.Simplification`
+            done on the nodes before the run.
+        trace: the `yapyseq.tracing.TraceRecorder` of the run, or None if
+            the run is not traced.
+        metrics: the `yapyseq.metrics.MetricsRegistry` of the run, or None if
+            the run is not measured.
+        profiles: the `yapyseq.profiling.ProfileCollector` merging the
+            profiles of the functions, or None if no node is profiled.
+        resources: dictionary where keys are the IDs of the function nodes
+            that ran, and values the `yapyseq.resources.ResourceTotals` of
+            all their activations.
+        events: the `yapyseq.events.EventDispatcher` publishing the events of
+            the nodes. Subscribe to it before calling `run`.
     """
 
     # --------------------------------------------------------------------------
     # Private methods
     # --------------------------------------------------------------------------
 
-    def __init__(self, sequence_path: str, func_dir: str,
+    def __init__(self,
+                 sequence: Union[str, SequenceReader, SequenceBuilder,
+                                 IO] = None,
+                 func_dir: str = None,
                  constants: dict = None,
-                 logger: Union[bool, Logger] = True):
+                 logger: Union[bool, Logger] = True,
+                 import_mode: ImportMode = ImportMode.EAGER,
+                 function_grabber: FunctionGrabber = None,
+                 optimize: bool = True,
+                 trace: bool = False,
+                 metrics: Union[bool, MetricsRegistry] = False,
+                 profile: bool = False,
+                 trace_memory: bool = False,
+                 log_file: str = None,
+                 log_format: str = 'text',
+                 sequence_path: str = None):
         """Initialize the runner with a given sequence.
 
         Args:
+            sequence: the sequence to run. It can be:
+                * the path to a sequence file.
+                * a SequenceReader object, for instance created from a string
+                  with `SequenceReader.from_string`.
+                * a SequenceBuilder object.
+                * a stream providing the content of a sequence file.
             func_dir: directory where to search the node functions for.
-            sequence_path: path to the sequence file to run.
             constants: sequence constants given for this run.
             logger: this configures the logger and can have the following
                 values:
                     * False to disable the logger.
-                    * True to enable the default logger in console.
+                    * True to enable the default logger of the run, see
+                      `yapyseq.logger.RunLog`. Records are written from a
+                      separate thread during the run.
                     * A logging.Logger object to use this one to log. It must be
                       already configured.
+            import_mode: (optional) when node functions and wrappers are
+                imported. See `ImportMode`. Default is ImportMode.EAGER.
+            function_grabber: (optional) the FunctionGrabber to use, to share
+                its indexes between several runners. It must be lazy if the
+                import mode is not ImportMode.EAGER. A new one is created by
+                default.
+            optimize: (optional) set to False to disable the folding of the
+                expressions that only depend on constants. See
+                `yapyseq.optimizer`. Default is True.
+            trace: (optional) set to True to record the timestamps of every
+                activation of the nodes in `self.trace`. Default is False.
+            metrics: (optional) the metrics of the run, see
+                `yapyseq.metrics.SequenceMetrics`. It can be:
+                    * False to not measure anything (default).
+                    * True to use a new registry.
+                    * A MetricsRegistry object, for instance shared by several
+                      runners.
+            profile: (optional) set to True to run the functions of every
+                function node under cProfile, and not only the ones of the
+                nodes with `profile` set. Profiles are merged per function in
+                `self.profiles`. Default is False.
+            trace_memory: (optional) set to True to measure the peak of memory
+                allocated by every function with tracemalloc, in the
+                resources of its result. It slows the functions down.
+                Default is False.
+            log_file: (optional) path of the file where the default logger
+                writes, overwritten if it exists, and closed at the end of
+                the run. Default is the console.
+            log_format: (optional) format of the records of the default
+                logger: 'text', or 'json' for one JSON object per line with
+                the fields of the events of the nodes. Default is 'text'.
+            sequence_path: deprecated, use `sequence` instead.
 
         Raises:
             Exceptions from SequenceAnalyzer and FunctionGrabber.
         """
+        if sequence_path is not None:
+            warnings.warn("sequence_path is deprecated, use sequence instead.",
+                          DeprecationWarning, stacklevel=2)
+            if sequence is not None:
+                raise TypeError("sequence and sequence_path cannot be both "
+                                "given.")
+            sequence = sequence_path
+        if func_dir is None:
+            raise TypeError("func_dir must be given.")
+
+        # Get the reader of the sequence
+        if isinstance(sequence, SequenceReader):
+            self._seqreader = sequence
+        elif isinstance(sequence, SequenceBuilder):
+            self._seqreader = sequence.build()
+        elif isinstance(sequence, str):
+            self._seqreader = SequenceReader(sequence)
+        elif hasattr(sequence, 'read'):
+            self._seqreader = SequenceReader.from_stream(sequence)
+        else:
+            raise TypeError("sequence must be a path, a SequenceReader, a "
+                            "SequenceBuilder or a stream, got {}.".format(
+                                type(sequence)))
+
         # Create logger
         # Get the name of the sequence file without the extension
-        self.basename = os.path.splitext((os.path.basename(sequence_path)))[0]
-        entry_format = ('%(asctime)s - %(name)s - %(levelname)s '
-                        '- seq. {} - %(message)s').format(self.basename)
+        seq_file_path = self._seqreader.seq_file_path
+        if seq_file_path:
+            self.basename = os.path.splitext(
+                (os.path.basename(seq_file_path)))[0]
+        else:
+            seq_file_path = self.basename = '<{}>'.format(
+                type(sequence).__name__)
+        # Every runner has its own handler, so that several runs in the same
+        # process never write the same record twice.
+        self._run_log = None
         if logger is False:
-            self._logger = get_logger(name=__name__,
-                                      entry_format=entry_format,
-                                      disabled=True)
+            self._logger = disabled_logger(__name__)
         elif logger is True:
-            self._logger = get_logger(name=__name__,
-                                      entry_format=entry_format)
+            entry_format = ('%(asctime)s - %(name)s - %(levelname)s '
+                            '- seq. {} - %(message)s').format(
+                                self.basename.replace('%', '%%'))
+            self._run_log = RunLog(__name__, file_path=log_file,
+                                   log_format=log_format,
+                                   entry_format=entry_format,
+                                   fields={'sequence': self.basename})
+            self._logger = self._run_log.logger
         elif isinstance(logger, Logger):
             self._logger = logger
         else:
@@ -114,12 +226,39 @@ class SequenceRunner(object):
                              "logging.Logger instance.")
 
         self._logger.info('Started initialization of sequence '
-                          '{} now referred as {}'.format(sequence_path,
-                                                         self.basename))
+                          '%s now referred as %s', seq_file_path,
+                          self.basename)
+
+        try:
+            self._initialize(func_dir, constants, import_mode,
+                             function_grabber, optimize, trace, metrics,
+                             profile, trace_memory)
+        except BaseException:
+            # The file of the log must not stay open
+            if self._run_log is not None:
+                self._run_log.close()
+            raise
+
+    def _initialize(self, func_dir: str, constants: Union[dict, None],
+                    import_mode: ImportMode,
+                    function_grabber: Union[FunctionGrabber, None],
+                    optimize: bool, trace: bool,
+                    metrics: Union[bool, MetricsRegistry], profile: bool,
+                    trace_memory: bool) -> None:
+        """Import the functions, optimize the nodes and prepare the run.
+
+        Args:
+            Same as `SequenceRunner.__init__`.
 
+        Raises:
+            Same as `SequenceRunner.__init__`.
+        """
         # Create basic objects
-        self._funcgrab = FunctionGrabber()
-        self._seqreader = SequenceReader(sequence_path)
+        self._import_mode = import_mode
+        if function_grabber is None:
+            function_grabber = FunctionGrabber(
+                lazy=(import_mode is not ImportMode.EAGER))
+        self._funcgrab = function_grabber
 
         # Define the set of variables that are read-only
         # There are yapyseq built-in variables, sequence constants,
@@ -143,7 +282,8 @@ class SequenceRunner(object):
         self._result_queue = mp.Queue()
 
         # Grab all functions and wrappers
-        # This is where all the imports can fail
+        # This is where all the imports can fail, except in lazy and worker
+        # modes where they can fail when a node is dispatched.
         self._funcgrab.import_functions(
             func_dir,
             self._seqreader.get_node_function_names())
@@ -152,38 +292,118 @@ class SequenceRunner(object):
             self._seqreader.get_node_wrapper_names())
 
         # Get the dictionary of nodes
-        # keys are the nids, and values the node objects
+        # keys are the nids, and values the node objects.
+        # Nodes are immutable and shared with the reader. Everything that
+        # changes during the run is stored in the state table below.
+        # Optimized nodes are copies, where expressions that only depend on
+        # constants are replaced by their values.
         self._nodes = self._seqreader.get_node_dict()
-
-        # Set callable of each nodes with the ones imported earlier
-        # This is necessary before running the nodes
+        self.simplifications = []
+        if optimize:
+            constant_dict = dict(constants) if constants else dict()
+            constant_dict.update(self._seqreader.get_constants())
+            optimized = optimize_nodes(self._nodes, constant_dict)
+            self._nodes = optimized.nodes
+            self._prev_node_ids = optimized.prev_node_ids
+            self.simplifications = optimized.simplifications
+            # Variables of the removed variable nodes
+            self._variables.update(optimized.variables)
+            if self._logger.isEnabledFor(DEBUG):
+                for line in describe_simplifications(self.simplifications):
+                    self._logger.debug('Optimization: %s', line)
+            self._logger.info('Optimization: %d simplifications',
+                              len(self.simplifications))
+        else:
+            self._prev_node_ids = dict(
+                [(nid, self._seqreader.get_prev_node_ids(nid))
+                 for nid in self._nodes])
+
+        # State table of the run.
+        # * callables: for each function node, a 2-tuple with its function
+        #   and a dict of its wrapper classes. They are ItemReference objects
+        #   until they are imported.
+        # * sync_history: for each parallel sync node, the set of IDs of the
+        #   previous nodes that already reached it.
+        # * sync_activations: for each parallel sync node, the IDs of the
+        #   activations that reached it. Only used when the run is traced.
+        # * running_activations: for each running function node, the ID of
+        #   its activation. Only used when the run is traced.
+        self._callables: Dict[int, Tuple] = dict()
+        self._sync_history: Dict[int, Set[int]] = dict()
+        self._sync_activations: Dict[int, List[int]] = dict()
+        self._running_activations: Dict[int, int] = dict()
+        self.trace = TraceRecorder() if trace else None
+        self.events = EventDispatcher()
+        if metrics is True:
+            metrics = MetricsRegistry()
+        elif metrics is False:
+            metrics = None
+        elif not isinstance(metrics, MetricsRegistry):
+            raise ValueError("metrics must be either a boolean or a "
+                             "MetricsRegistry instance.")
+        self.metrics = metrics
+        self._metrics = SequenceMetrics(metrics) if metrics else None
+        self._profile_all = profile
+        self.profiles = None
+        self._trace_memory = trace_memory
+        self.resources: Dict[int, ResourceTotals] = dict()
         for node in self._nodes.values():
             if isinstance(node, FunctionNode):
-                node.function_callable = self._funcgrab.get_function(
+                function_callable = self._funcgrab.get_function(
                     node.function_name)
-                node.wrapper_classes = self._funcgrab.get_wrappers(
+                wrapper_classes = self._funcgrab.get_wrappers(
                     node.wrapper_names)
-
-        # Initialize new_nodes as a set of objects of type NewNode.
-        # At first, new nodes are the start nodes of the sequence.
-        self._new_nodes = set()
+                node.check_callables(function_callable, wrapper_classes)
+                self._callables[node.nid] = (function_callable,
+                                             wrapper_classes)
+                if (profile or node.profile) and self.profiles is None:
+                    self.profiles = ProfileCollector()
+                if self._metrics:
+                    # Failures of every function are exposed, even at 0
+                    self._metrics.failures.inc(0, function=node.function_name)
+                    self._metrics.timeouts.inc(0, function=node.function_name)
+            elif isinstance(node, ParallelSyncNode):
+                self._sync_history[node.nid] = set()
+                self._sync_activations[node.nid] = []
+
+        # Initialize new_nodes as a queue of 4-tuples (node ID, previous
+        # node ID, activation ID, time at which the node got ready). At first,
+        # new nodes are the start nodes of the sequence. Activation IDs are
+        # None if the run is not traced.
+        self._new_nodes = deque()
         start_nid = self._seqreader.get_start_node_ids()
         self._add_new_nodes(start_nid, None)  # previous nodes are None
 
         # Initialize running_nodes
         # A dictionary of nodes that are currently running
-        # Node ids are keys, and their processes are values
-        self._running_nodes: Dict[int, mp.Process] = dict()
+        # Node ids are keys, and their processes are values. The process is
+        # None if the node result has been given without running it.
+        self._running_nodes: Dict[int, Union[mp.Process, None]] = dict()
 
         # Update status
         self.status = SeqRunnerStatus.INITIALIZED
 
-        self._logger.info(('Finished initialization of sequence {}'
-                           ).format(self.basename))
+        self._logger.info('Finished initialization of sequence %s',
+                          self.basename)
+
+    def _log_event(self, event: str, message: str, *args, **fields) -> None:
+        """Log an event at the INFO level, with its fields.
+
+        Nothing is evaluated if the level is disabled.
 
+        Args:
+            event: the name of the event, see `yapyseq.logger.event_fields`.
+            message: the message, in the %-style of the logging module.
+            args: the arguments of the message.
+            fields: the fields of the event.
+        """
+        if self._logger.isEnabledFor(INFO):
+            self._logger.info(message, *args,
+                              extra=event_fields(event, **fields))
 
     def _add_new_nodes(self, new_node_ids: Union[int, Set[int]],
-                       previous_node_id: Union[int, None]) -> None:
+                       previous_node_id: Union[int, None],
+                       previous_activations: List[int] = ()) -> None:
         """Add one or several new nodes to self._new_nodes.
 
         Warning:
@@ -194,20 +414,32 @@ class SequenceRunner(object):
         Args:
             new_node_ids: The ID or a set of IDs of the new nodes to add.
             previous_node_id: the ID of the previous node of the new one.
+            previous_activations: (optional) the IDs of the activations that
+                led to the new ones, if the run is traced.
         """
         # Transform the argument into a set if it is not
         if type(new_node_ids) is not set:
             new_node_ids = {new_node_ids}
 
+        now = time.time()
         for new_node_id in new_node_ids:
-            # Get the corresponding node object
-            new_node = self._nodes[new_node_id]
-            # Update the previous node of this node
-            new_node.previous_node_id = previous_node_id
-            # Add this node object to the set of new nodes
-            self._new_nodes.add(new_node)
-
-    def _manage_new_node(self, new_node) -> None:
+            if self.trace is None:
+                activation_id = None
+            else:
+                activation_id = self.trace.new_activation(
+                    self._nodes[new_node_id], previous_activations, now)
+            self._new_nodes.append((new_node_id, previous_node_id,
+                                    activation_id, now))
+            if previous_node_id is not None and self.events.active:
+                self.events.publish(TransitionTaken(now, previous_node_id,
+                                                    new_node_id))
+        if self._metrics:
+            self._metrics.ready.set(len(self._new_nodes))
+
+    def _manage_new_node(self, new_node,
+                         previous_node_id: Union[int, None],
+                         activation_id: int = None,
+                         ready_time: float = None) -> None:
         """Manage a new node in the running sequence.
 
         Warning:
@@ -216,63 +448,100 @@ class SequenceRunner(object):
 
         Args:
             new_node: the node object to process.
+            previous_node_id: the ID of the node that led to this one, or None
+                for the start nodes.
+            activation_id: (optional) the ID of the activation of the node, if
+                the run is traced.
+            ready_time: (optional) the time at which the node got ready.
 
         Raises:
             UnknownNodeTypeError: if the given node has an unknown type.
         """
+        # Function nodes are dispatched when their process starts
+        if activation_id is not None:
+            previous = [activation_id]
+            if not isinstance(new_node, FunctionNode):
+                self.trace.mark(activation_id, 'dispatched', time.time())
+        else:
+            previous = ()
+        if self.events.active:
+            self.events.publish(NodeEngaged(time.time(), new_node.nid,
+                                            new_node.node_type))
+        if self._metrics:
+            self._metrics.activations.inc(type=new_node.node_type)
+
         # ----------------------------------------------------------------------
         # If the node is a "start" node, just get the next node
         if isinstance(new_node, StartNode):
             next_node_ids = new_node.get_next_node_id(self._variables)
-            self._add_new_nodes(next_node_ids, None)
-            self._logger.info(('Node {} engaged. Type is "start". '
-                               'Next node is {}').format(new_node.nid,
-                                                         next_node_ids.pop()))
+            self._add_new_nodes(next_node_ids, new_node.nid, previous)
+            self._log_event('node_engaged',
+                            'Node %d engaged. Type is "start". '
+                            'Next node is %s', new_node.nid,
+                            min(next_node_ids), nid=new_node.nid,
+                            type=new_node.node_type,
+                            next=sorted(next_node_ids))
 
         # ----------------------------------------------------------------------
         # If the node is "stop" node, do nothing
         elif isinstance(new_node, StopNode):
-            self._logger.info(('Node {} engaged. Type is "stop". '
-                               'Nothing to do.').format(new_node.nid))
-            pass
+            self._log_event('node_engaged',
+                            'Node %d engaged. Type is "stop". Nothing to do.',
+                            new_node.nid, nid=new_node.nid,
+                            type=new_node.node_type)
 
         # ----------------------------------------------------------------------
         # If the node is a "parallel split", get all next nodes
         elif isinstance(new_node, ParallelSplitNode):
             next_node_ids = new_node.get_next_node_id(self._variables)
-            self._add_new_nodes(next_node_ids, new_node.nid)
-            self._logger.info(('Node {} engaged. Type is "parallel split". '
-                               'Next nodes are {}').format(new_node.nid,
-                                                           next_node_ids))
+            self._add_new_nodes(next_node_ids, new_node.nid, previous)
+            self._log_event('node_engaged',
+                            'Node %d engaged. Type is "parallel split". '
+                            'Next nodes are %s', new_node.nid, next_node_ids,
+                            nid=new_node.nid, type=new_node.node_type,
+                            next=sorted(next_node_ids))
 
         # ----------------------------------------------------------------------
         # If the node is a "parallel sync"...
         elif isinstance(new_node, ParallelSyncNode):
-            # Initialize this parallel sync node if not already done
-            if not new_node.is_sync_initialized():
-                # This synchronization node must wait for all its
-                # possible previous nodes.
-                new_node.set_nodes_to_sync(
-                    self._seqreader.get_prev_node_ids(new_node.nid))
+            # This synchronization node must wait for all its
+            # possible previous nodes.
+            nodes_to_sync = self._prev_node_ids.get(new_node.nid, set())
+            if not nodes_to_sync:
+                raise ParallelSyncFailure(
+                    "Cannot check synchronization for node n°{}. "
+                    "It has no previous node.".format(new_node.nid))
 
             # Update the history with the previous node
-            new_node.add_to_history(new_node.previous_node_id)
+            sync_history = self._sync_history[new_node.nid]
+            sync_history.add(previous_node_id)
+            sync_activations = self._sync_activations[new_node.nid]
+            sync_activations.extend(previous)
 
             # If all transitions met the parallel_sync
             # Get the next node after the parallel_sync
-            if new_node.is_sync_complete():
-                new_node.clear_history()
+            if sync_history == nodes_to_sync:
+                if self.events.active:
+                    self.events.publish(SyncCompleted(
+                        time.time(), new_node.nid, sorted(sync_history)))
+                sync_history.clear()
                 next_node_ids = new_node.get_next_node_id(self._variables)
-                self._add_new_nodes(next_node_ids, new_node.nid)
-                self._logger.info(('Node {} engaged. Type is "parallel sync". '
-                                   'Synchronisation is completed. '
-                                   'Next node is {}').format(
-                                        new_node.nid,
-                                        next_node_ids.pop()))
+                self._add_new_nodes(next_node_ids, new_node.nid,
+                                    list(sync_activations))
+                sync_activations.clear()
+                self._log_event('node_engaged',
+                                'Node %d engaged. Type is "parallel sync". '
+                                'Synchronisation is completed. '
+                                'Next node is %s', new_node.nid,
+                                min(next_node_ids), nid=new_node.nid,
+                                type=new_node.node_type, synchronized=True,
+                                next=sorted(next_node_ids))
             else:
-                self._logger.info(('Node {} engaged. Type is "parallel sync". '
-                                   'Synchronisation is not completed yet.'
-                                   ).format(new_node.nid))
+                self._log_event('node_engaged',
+                                'Node %d engaged. Type is "parallel sync". '
+                                'Synchronisation is not completed yet.',
+                                new_node.nid, nid=new_node.nid,
+                                type=new_node.node_type, synchronized=False)
 
         # ----------------------------------------------------------------------
         # If the node is of type 'variable', evaluate expressions
@@ -291,31 +560,100 @@ class SequenceRunner(object):
                 self._variables[var_name] = value
             # Apply transition
             next_node_ids = new_node.get_next_node_id(self._variables)
-            self._add_new_nodes(next_node_ids, None)
-            self._logger.info(('Node {} engaged. Type is "variable". '
-                               'Next node is {}').format(new_node.nid,
-                                                         next_node_ids.pop()))
+            self._add_new_nodes(next_node_ids, new_node.nid, previous)
+            self._log_event('node_engaged',
+                            'Node %d engaged. Type is "variable". '
+                            'Next node is %s', new_node.nid,
+                            min(next_node_ids), nid=new_node.nid,
+                            type=new_node.node_type,
+                            next=sorted(next_node_ids))
 
         # ----------------------------------------------------------------------
         # if the node is of type "function", run the function in a process
         elif isinstance(new_node, FunctionNode):
+            function_callable, wrapper_classes = self._callables[new_node.nid]
+            # Import the function and wrappers if it is not done yet.
+            # Imported objects are kept in the state table for the next
+            # activations. In worker mode, they are imported by the process of
+            # the node.
+            if self._import_mode is not ImportMode.WORKER:
+                try:
+                    function_callable = resolve_item(function_callable)
+                    wrapper_classes = dict(
+                        [(name, resolve_item(cls))
+                         for name, cls in wrapper_classes.items()])
+                except Exception as exc:
+                    self._give_import_error(new_node, exc, activation_id)
+                    return
+                self._callables[new_node.nid] = (function_callable,
+                                                 wrapper_classes)
             # Create a new Process to run this function
             process = mp.Process(
                 target=new_node.run,
                 name="Node {}".format(new_node.nid),
                 kwargs={'result_queue': self._result_queue,
-                        'variables': self._variables.copy()})
+                        'variables': self._variables.copy(),
+                        'function_callable': function_callable,
+                        'wrapper_classes': wrapper_classes,
+                        'profile': self._profile_all or new_node.profile,
+                        'trace_memory': self._trace_memory})
+            now = time.time()
+            if activation_id is not None:
+                self.trace.mark(activation_id, 'dispatched', now)
+                self._running_activations[new_node.nid] = activation_id
             process.start()
+            if self.events.active:
+                self.events.publish(NodeDispatched(now, new_node.nid,
+                                                   new_node.function_name))
             # Store this process in the dict of running nodes
             self._running_nodes[new_node.nid] = process
-            self._logger.info(('Node {} engaged. Type is "function". '
-                               'Function is started.').format(new_node.nid))
+            if self._metrics:
+                if ready_time is not None:
+                    self._metrics.queue_wait.observe(
+                        now - ready_time, function=new_node.function_name)
+                self._metrics.running.set(len(self._running_nodes))
+            self._log_event('node_engaged',
+                            'Node %d engaged. Type is "function". '
+                            'Function is started.', new_node.nid,
+                            nid=new_node.nid, type=new_node.node_type,
+                            function=new_node.function_name)
 
         # ----------------------------------------------------------------------
         else:
             raise UnknownNodeTypeError(("Type of node {} is unknown: {}"
                                         ).format(new_node.nid, type(new_node)))
 
+    def _give_import_error(self, node: FunctionNode, exc: Exception,
+                           activation_id: Union[int, None]) -> None:
+        """Give the import error of a function node as its result.
+
+        As in a node process, an import error is saved as a function
+        exception, so that transitions can use it. No process is started and
+        the result is managed like the result of a process.
+
+        Warning:
+            This method should only be used in the run() function of this class.
+            It modifies the internal state of the SequenceRunner object.
+
+        Args:
+            node: the function node.
+            exc: the exception raised by the import.
+            activation_id: the ID of the activation of the node if the run is
+                traced, else None.
+        """
+        now = time.time()
+        if activation_id is not None:
+            self.trace.mark(activation_id, 'dispatched', now)
+            self._running_activations[node.nid] = activation_id
+        self._running_nodes[node.nid] = None
+        self._result_queue.put(node._create_node_result(
+            exc, None, None, NodeTimings(os.getpid(), now, None, None, None)))
+        self._log_event('node_engaged',
+                        'Node %d engaged. Type is "function". '
+                        'Function cannot be imported.', node.nid,
+                        nid=node.nid, type=node.node_type,
+                        function=node.function_name)
+
     def _manage_new_function_result(self,
                                     new_result: FunctionNodeResult):
         """Manage a new result of FunctionNode in the running sequence.
@@ -330,9 +668,24 @@ class SequenceRunner(object):
         """
         # Get the node of the result
         node_object = self._nodes[new_result.nid]
+        activation_id = self._running_activations.pop(new_result.nid, None)
+        if activation_id is not None:
+            self.trace.mark(activation_id, 'received', time.time())
+            self.trace.add_node_timings(activation_id, new_result.timings)
+        # Merge the profile, which is not kept in the results
+        if new_result.profile_stats is not None:
+            self.profiles.add(node_object.function_name,
+                              new_result.profile_stats)
+            new_result = new_result._replace(profile_stats=None)
+        if new_result.resources is not None:
+            self.resources[new_result.nid] = add_resources(
+                self.resources.get(new_result.nid), new_result.resources)
 
         # Save this result into the sequence variables
         self._variables['results'][new_result.nid] = new_result
+        if self.events.active:
+            self.events.publish(NodeFinished(time.time(), new_result.nid,
+                                             new_result))
 
         # If a name has been given, store the return object into a
         # sequence variable with this name.
@@ -342,13 +695,42 @@ class SequenceRunner(object):
         # Remove this node from the running nodes
         self._running_nodes.pop(new_result.nid)
 
+        if self._metrics:
+            self._update_result_metrics(node_object, new_result)
+
         # Get the next node according to transitions
         # and add it to the set of new nodes
         next_node_ids = node_object.get_next_node_id(self._variables)
-        self._add_new_nodes(next_node_ids, new_result.nid)
+        self._add_new_nodes(
+            next_node_ids, new_result.nid,
+            [activation_id] if activation_id is not None else ())
+
+        self._log_event('function_terminated',
+                        'Function node %d is terminated. Next node is %s.',
+                        new_result.nid, min(next_node_ids),
+                        nid=new_result.nid,
+                        function=node_object.function_name,
+                        failed=new_result.exception is not None,
+                        next=sorted(next_node_ids))
+
+    def _update_result_metrics(self, node: FunctionNode,
+                               result: FunctionNodeResult) -> None:
+        """Update the metrics with the result of a function node.
 
-        self._logger.info(('Function node {} is terminated. Next node is '
-                           '{}.').format(new_result.nid, next_node_ids.pop()))
+        Args:
+            node: the function node.
+            result: the result of the node.
+        """
+        function = node.function_name
+        self._metrics.running.set(len(self._running_nodes))
+        if result.exception is not None:
+            self._metrics.failures.inc(function=function)
+            if isinstance(result.exception.function, NodeFunctionTimeout):
+                self._metrics.timeouts.inc(function=function)
+        timings = result.timings
+        if timings is not None and timings.post_done is not None:
+            self._metrics.duration.observe(
+                timings.post_done - timings.started, function=function)
 
     # --------------------------------------------------------------------------
     # Public methods
@@ -367,24 +749,63 @@ class SequenceRunner(object):
         # TODO: implement the non blocking feature
         # This implies to manage a new call to "run" after pause has been called
 
-        self._logger.info('Running sequence {}'.format(self.basename))
+        self._logger.info('Running sequence %s', self.basename)
+        start = time.time()
         self.status = SeqRunnerStatus.RUNNING  # useless if blocking call
+        # Records are written by another thread during the run
+        if self._run_log is not None:
+            self._run_log.start()
+        try:
+            try:
+                self._run_nodes()
+            except Exception:
+                # Logged here, as the log is closed when run returns
+                self._logger.exception('An exception was raised during the '
+                                       'run of the sequence.')
+                raise
+            finally:
+                if self._run_log is not None:
+                    self._run_log.stop()
+                # Subscribers are released even if the run failed
+                end = time.time()
+                self.events.publish(RunFinished(end, self.basename,
+                                                end - start))
+                # A slow callback must not keep the run from returning
+                self.events.close(timeout=CLOSE_TIMEOUT)
+
+            self.status = SeqRunnerStatus.STOPPED
+            self._logger.info('END of the run of sequence %s', self.basename)
+        finally:
+            # The file of the log must not stay open after the run
+            if self._run_log is not None:
+                self._run_log.close()
+
+    def _run_nodes(self) -> None:
+        """Run the nodes until there are no more nodes to run.
 
+        Warning:
+            This method should only be used in the run() function of this class.
+        """
         # Continue to run the sequence while there are still some nodes to run
         while self._running_nodes or self._new_nodes:
 
             # Continue to process all the new nodes until none is left
             while self._new_nodes:
                 # Retrieve a new node
-                new_node = self._new_nodes.pop()
+                new_node_id, previous_node_id, activation_id, ready_time = \
+                    self._new_nodes.popleft()
+                if self._metrics:
+                    self._metrics.ready.set(len(self._new_nodes))
                 # Do the appropriate action for this new node
-                self._manage_new_node(new_node)
+                self._manage_new_node(self._nodes[new_node_id],
+                                      previous_node_id, activation_id,
+                                      ready_time)
 
             # Finally, if there are some running nodes,
             # just wait for the end of one of them.
             if self._running_nodes:
-                self._logger.debug(('There are currently {} running '
-                                    'nodes.').format(len(self._running_nodes)))
+                self._logger.debug('There are currently %d running nodes.',
+                                   len(self._running_nodes))
                 # A single queue is shared by all threads to provide function
                 # node results. To know when a function node is over the queue
                 # is polled for a result.
@@ -393,13 +814,26 @@ class SequenceRunner(object):
                 # Process the new result
                 self._manage_new_function_result(new_result)
 
-        self.status = SeqRunnerStatus.STOPPED
-        self._logger.info('END of the run of sequence {}'.format(self.basename))
+    def get_resource_summary(self, top: int = 10) -> List[str]:
+        """Rank the function nodes by each resource they used.
+
+        Args:
+            top: (optional) the number of nodes listed for each resource.
+
+        Returns:
+            Lines of text, see `yapyseq.resources.format_summary`.
+        """
+        labels = dict()
+        for nid in self.resources:
+            node = self._nodes[nid]
+            labels[nid] = '{} ({})'.format(node.name or 'Node {}'.format(nid),
+                                           node.function_name)
+        return format_summary(self.resources, labels, top)
 
     def pause(self):
         # TODO
         raise NotImplemented
-        self._logger.info('Pausing sequence {}'.format(self.basename))
+        self._logger.info('Pausing sequence %s', self.basename)
         self.status = SeqRunnerStatus.PAUSING
         # Some code...
         self.status = SeqRunnerStatus.PAUSED
@@ -407,7 +841,7 @@ class SequenceRunner(object):
     def stop(self):
         # TODO
         raise NotImplemented
-        self._logger.info('Stopping sequence {}'.format(self.basename))
+        self._logger.info('Stopping sequence %s', self.basename)
         self.status = SeqRunnerStatus.STOPPING
         # Some code
         self.status = SeqRunnerStatus.STOPPED
@@ -0,0 +1,323 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Long-lived process running sequences on request.
+
+A `SequenceServer` listens on a Unix socket. It keeps the sequences it has
+read, the indexes of function directories and the imported function modules,
+so that successive runs skip the start of Python, the parsing of sequences
+and the imports. Changed sequence files and function files are reloaded,
+based on their modification time.
+
+Requests and responses are JSON objects, one per line. Heavy modules are only
+imported by the server, so that `submit` stays fast.
+"""
+
+from typing import Dict, Any, Tuple
+import json
+import logging
+import os
+import socket
+import socketserver
+import time
+
+from yapyseq.common import get_cache_dir
+
+# ------------------------------------------------------------------------------
+# Custom exception for this module
+# ------------------------------------------------------------------------------
+
+
+class ServerError(RuntimeError):
+    """Raised by the client when the server reports an error."""
+
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Default logger of the servers, which logs nothing
+_default_logger = logging.getLogger(__name__)
+_default_logger.addHandler(logging.NullHandler())
+_default_logger.propagate = False
+
+# ------------------------------------------------------------------------------
+# Common functions
+# ------------------------------------------------------------------------------
+
+
+def default_socket_path() -> str:
+    """Get the default path of the socket of the server.
+
+    Returns:
+        `$XDG_RUNTIME_DIR/yapyseq.sock` if the environment variable is set,
+        or `yapyseq.sock` in the cache directory of yapyseq otherwise.
+    """
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'yapyseq.sock')
+    return os.path.join(get_cache_dir(), 'yapyseq.sock')
+
+
+def submit_request(request: Dict, socket_path: str = None) -> Dict:
+    """Send a request to a running server and wait for its response.
+
+    Args:
+        request: the request, see `SequenceServer.handle_request`.
+        socket_path: (optional) path to the socket of the server. Default is
+            `default_socket_path()`.
+
+    Returns:
+        The response of the server, see `SequenceServer.handle_request`.
+
+    Raises:
+        OSError: if the server cannot be reached.
+        ServerError: if the server could not handle the request.
+    """
+    if socket_path is None:
+        socket_path = default_socket_path()
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with sock.makefile('rb') as stream:
+            line = stream.readline()
+    if not line:
+        raise ServerError("The server closed the connection without "
+                          "response.")
+    response = json.loads(line.decode('utf-8'))
+    if response.get('status') != 'ok':
+        raise ServerError("{}: {}".format(response.get('error'),
+                                          response.get('message')))
+    return response
+
+
+def describe_results(results: Dict) -> Dict[str, Dict]:
+    """Describe the results of function nodes with JSON types.
+
+    Args:
+        results: the results of a run, as found in the sequence variable
+            'results'.
+
+    Returns:
+        A dictionary where keys are the node IDs as strings, and values are
+        dictionaries with the keys 'returned' (repr of the returned object),
+        'exception' (None, or a dictionary with the repr of the function
+        and wrappers exceptions) and 'resources' (None, or the dictionary of
+        the resources used by the node, see
+        `yapyseq.resources.NodeResources`).
+    """
+    described = dict()
+    for nid, result in results.items():
+        if result.exception is None:
+            exception = None
+        else:
+            exception = dict([
+                (key, None if exc is None else repr(exc))
+                for key, exc in result.exception._asdict().items()])
+        resources = result.resources
+        described[str(nid)] = {
+            'returned': repr(result.returned), 'exception': exception,
+            'resources': None if resources is None else resources._asdict()}
+    return described
+
+
+# ------------------------------------------------------------------------------
+# Main class
+# ------------------------------------------------------------------------------
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    """Handle the connection of a client: one request, one response."""
+
+    def handle(self):
+        line = self.rfile.readline()
+        try:
+            request = json.loads(line.decode('utf-8'))
+            response = self.server.sequence_server.handle_request(request)
+        except Exception as exc:
+            self.server.sequence_server.logger.exception(
+                'Request failed: %s', line[:200])
+            response = {'status': 'error', 'error': type(exc).__name__,
+                        'message': str(exc)}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+
+
+class SequenceServer(object):
+    """Class that runs sequences on request, with warm caches.
+
+    Runs are done one at a time, in the process of the server. Function nodes
+    are run in sub-processes as usual, which inherit the imported modules.
+
+    Supported requests:
+        * {"command": "ping"}
+        * {"command": "run", "sequence": path, "function_dir": path,
+           "constants": dict, "import_mode": "eager" | "lazy" | "worker"}
+          Paths must be absolute. constants and import_mode are optional.
+        * {"command": "shutdown"}
+    """
+
+    def __init__(self, socket_path: str = None, logger=None, metrics=None):
+        """Initialize the server. It does not listen before `serve_forever`.
+
+        Args:
+            socket_path: (optional) path of the Unix socket to listen on.
+                Default is `default_socket_path()`.
+            logger: (optional) the logging.Logger used by the server and by
+                the runners. By default, nothing is logged.
+            metrics: (optional) a yapyseq.metrics.MetricsRegistry shared by
+                every run. By default, runs are not measured.
+        """
+        self.logger = _default_logger if logger is None else logger
+        self.metrics = metrics
+        self.socket_path = socket_path or default_socket_path()
+        # Keys are real paths of sequence files, values are 3-tuples
+        # (modification time, size, SequenceReader)
+        self._readers: Dict[str, Tuple] = dict()
+        # Keys are 2-tuples (real path of a function directory, lazy), values
+        # are FunctionGrabber objects
+        self._grabbers: Dict[Tuple[str, bool], Any] = dict()
+        self._server = None
+
+    def _get_reader(self, sequence_path: str):
+        """Get the reader of a sequence file, read again if it changed.
+
+        Args:
+            sequence_path: path to the sequence file.
+
+        Returns:
+            A SequenceReader of the current content of the file.
+        """
+        from yapyseq.sequencereader import SequenceReader
+        real_path = os.path.realpath(sequence_path)
+        stat = os.stat(real_path)
+        cached = self._readers.get(real_path)
+        if cached is None or cached[:2] != (stat.st_mtime_ns, stat.st_size):
+            self.logger.info('Reading sequence %s', real_path)
+            reader = SequenceReader(real_path, cache=True)
+            self._readers[real_path] = (stat.st_mtime_ns, stat.st_size,
+                                        reader)
+        return self._readers[real_path][2]
+
+    def _get_grabber(self, func_dir: str, lazy: bool):
+        """Get the function grabber of a directory, refreshed.
+
+        Modules of the modified files of the directory are reloaded.
+
+        Args:
+            func_dir: the directory of the functions.
+            lazy: True for a grabber which does not import the items.
+
+        Returns:
+            A FunctionGrabber object.
+        """
+        from yapyseq.functiongrabber import FunctionGrabber
+        key = (os.path.realpath(func_dir), lazy)
+        if key not in self._grabbers:
+            self._grabbers[key] = FunctionGrabber(index_cache=True,
+                                                  lazy=lazy)
+        grabber = self._grabbers[key]
+        changed = grabber.refresh(func_dir)
+        if changed:
+            self.logger.info('Reloaded function files %s', sorted(changed))
+        return grabber
+
+    def run_sequence(self, sequence: str, function_dir: str,
+                     constants: Dict = None,
+                     import_mode: str = 'eager') -> Dict:
+        """Run a sequence and describe its results.
+
+        Args:
+            sequence: absolute path to the sequence file.
+            function_dir: absolute path to the directory of the functions.
+            constants: (optional) constants given to the sequence.
+            import_mode: (optional) name of the ImportMode, in lower case.
+
+        Returns:
+            A dictionary with the duration of the run in seconds ('duration'),
+            and the results of the function nodes ('results', see
+            `describe_results`).
+        """
+        from yapyseq.common import ImportMode
+        from yapyseq.sequencerunner import SequenceRunner
+        if not (os.path.isabs(sequence) and os.path.isabs(function_dir)):
+            raise ValueError("Paths of run requests must be absolute.")
+        start = time.perf_counter()
+        mode = ImportMode[import_mode.upper()]
+        runner = SequenceRunner(
+            self._get_reader(sequence), function_dir, constants,
+            logger=self.logger, import_mode=mode,
+            metrics=self.metrics if self.metrics is not None else False,
+            function_grabber=self._get_grabber(
+                function_dir, mode is not ImportMode.EAGER))
+        runner.run()
+        return {'duration': time.perf_counter() - start,
+                'results': describe_results(runner.variables['results'])}
+
+    def handle_request(self, request: Dict) -> Dict:
+        """Handle a request of a client.
+
+        Args:
+            request: the request. See the documentation of the class.
+
+        Returns:
+            The response to send to the client. Its key 'status' is 'ok', and
+            other keys depend on the command.
+
+        Raises:
+            ValueError: if the command is unknown.
+            Any exception raised while running a sequence.
+        """
+        command = request.get('command')
+        if command == 'ping':
+            return {'status': 'ok', 'pid': os.getpid()}
+        elif command == 'run':
+            self.logger.info('Running %s', request.get('sequence'))
+            response = self.run_sequence(request['sequence'],
+                                         request['function_dir'],
+                                         request.get('constants'),
+                                         request.get('import_mode', 'eager'))
+            response['status'] = 'ok'
+            return response
+        elif command == 'shutdown':
+            # shutdown() waits for serve_forever() to return, so it must be
+            # called from another thread than the one handling requests.
+            import threading
+            threading.Thread(target=self._server.shutdown).start()
+            return {'status': 'ok'}
+        else:
+            raise ValueError("Unknown command: {}".format(command))
+
+    def serve_forever(self) -> None:
+        """Listen on the socket and handle requests until a shutdown request.
+
+        A stale socket file left by a server that is not running anymore is
+        replaced.
+
+        Raises:
+            OSError: if another server is already listening on the socket.
+        """
+        if os.path.exists(self.socket_path):
+            try:
+                submit_request({'command': 'ping'}, self.socket_path)
+            except (OSError, ServerError):
+                os.remove(self.socket_path)
+            else:
+                raise OSError("A server is already listening on {}.".format(
+                    self.socket_path))
+        os.makedirs(os.path.dirname(os.path.abspath(self.socket_path)),
+                    exist_ok=True)
+        self._server = socketserver.UnixStreamServer(self.socket_path,
+                                                     _RequestHandler)
+        self._server.sequence_server = self
+        self.logger.info('Listening on %s', self.socket_path)
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            os.remove(self.socket_path)
+            self.logger.info('Server stopped')
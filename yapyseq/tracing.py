@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+"""
+This Source Code Form is subject to the terms of the Mozilla Public
+License, v. 2.0. If a copy of the MPL was not distributed with this
+file, You can obtain one at http://mozilla.org/MPL/2.0/.
+
+Timing of the activations of the nodes of a run.
+
+Every time a node is reached, an activation is recorded with the timestamps
+of its phases. Phases of the runner process are recorded for every node, and
+function nodes add the phases of their own process (see `NodeTimings`):
+    * ready: the node has been reached by a transition.
+    * dispatched: the runner started to process the node, or started the
+      process of a function node.
+    * started: the process of the function node started.
+    * pre_done: the `pre` functions of the wrappers are done.
+    * function_done: the function of the node returned.
+    * post_done: the `post` functions of the wrappers are done.
+    * received: the runner received the result of the function node.
+
+Activations can be exported as a Chrome trace (trace event format), that can
+be opened in Perfetto (https://ui.perfetto.dev) or chrome://tracing.
+"""
+
+from typing import Dict, List, Iterable
+import json
+import os
+
+from yapyseq.nodes import Node, NodeTimings
+
+# ------------------------------------------------------------------------------
+# Module variables
+# ------------------------------------------------------------------------------
+
+# Phases of an activation, in chronological order
+PHASES = ('ready', 'dispatched', 'started', 'pre_done', 'function_done',
+          'post_done', 'received')
+
+# Spans of the track of a function node in a Chrome trace.
+# Each one is a 3-tuple (name, first phase, last phase).
+FUNCTION_SPANS = (('queued', 'ready', 'dispatched'),
+                  ('process start', 'dispatched', 'started'),
+                  ('wrappers pre', 'started', 'pre_done'),
+                  ('function', 'pre_done', 'function_done'),
+                  ('wrappers post', 'function_done', 'post_done'),
+                  ('result transfer', 'post_done', 'received'))
+
+# ------------------------------------------------------------------------------
+# Main classes
+# ------------------------------------------------------------------------------
+
+
+class Activation(object):
+    """Record of one activation of a node.
+
+    Attributes:
+        aid: the ID of the activation, unique in the run.
+        nid: the ID of the node.
+        node_type: the type of the node, as written in sequence files.
+        label: a short description of the node, for display.
+        previous: the IDs of the activations that led to this one. A parallel
+            sync node is led by every synchronized activation.
+        pid: the ID of the process that ran the node.
+        timestamps: dictionary where keys are PHASES and values their
+            timestamps (time.time()).
+    """
+
+    __slots__ = ('aid', 'nid', 'node_type', 'label', 'previous', 'pid',
+                 'timestamps')
+
+    def __init__(self, aid: int, node: Node, previous: List[int],
+                 timestamp: float):
+        """Initialize an activation in the phase 'ready'.
+
+        Args:
+            aid: the ID of the activation.
+            node: the activated node.
+            previous: the IDs of the activations that led to this one.
+            timestamp: the time at which the node is ready.
+        """
+        self.aid = aid
+        self.nid = node.nid
+        self.node_type = node.node_type
+        label = node.name or 'Node {}'.format(node.nid)
+        function_name = getattr(node, 'function_name', None)
+        if function_name:
+            label = '{} ({})'.format(label, function_name)
+        self.label = label
+        self.previous = list(previous)
+        self.pid = None
+        self.timestamps = {'ready': timestamp}
+
+    def to_dict(self) -> Dict:
+        """Describe the activation with JSON types."""
+        return {'activation': self.aid, 'nid': self.nid,
+                'type': self.node_type, 'label': self.label,
+                'previous': self.previous, 'pid': self.pid,
+                'timestamps': dict(self.timestamps)}
+
+
+class TraceRecorder(object):
+    """Class recording the activations of the nodes during a run."""
+
+    def __init__(self, pid: int = None):
+        """Initialize an empty recorder.
+
+        Args:
+            pid: (optional) the ID of the process of the runner. Default is
+                the current process.
+        """
+        self.pid = pid if pid is not None else os.getpid()
+        self._activations: List[Activation] = []
+
+    @property
+    def activations(self) -> List[Activation]:
+        """The recorded activations, in the order they got ready."""
+        return list(self._activations)
+
+    def new_activation(self, node: Node, previous: Iterable[int],
+                       timestamp: float) -> int:
+        """Record a new activation of a node, in the phase 'ready'.
+
+        Args:
+            node: the activated node.
+            previous: the IDs of the activations that led to this one.
+            timestamp: the time at which the node got ready.
+
+        Returns:
+            The ID of the new activation.
+        """
+        aid = len(self._activations)
+        self._activations.append(Activation(aid, node, previous, timestamp))
+        return aid
+
+    def mark(self, aid: int, phase: str, timestamp: float) -> None:
+        """Record the timestamp of a phase of an activation.
+
+        Args:
+            aid: the ID of the activation.
+            phase: one of PHASES.
+            timestamp: the time of the phase.
+        """
+        self._activations[aid].timestamps[phase] = timestamp
+
+    def add_node_timings(self, aid: int, timings: NodeTimings) -> None:
+        """Record the phases measured by the process of a function node.
+
+        Args:
+            aid: the ID of the activation.
+            timings: the timings of the result of the node, or None.
+        """
+        if timings is None:
+            return
+        activation = self._activations[aid]
+        activation.pid = timings.pid
+        for phase in ('started', 'pre_done', 'function_done', 'post_done'):
+            value = getattr(timings, phase)
+            if value is not None:
+                activation.timestamps[phase] = value
+
+    def to_chrome_trace(self, name: str = 'yapyseq') -> Dict:
+        """Export the activations in the Chrome trace event format.
+
+        Every process running a function node gets its own track, with one
+        span for the whole activation and one span per phase. Other nodes are
+        instant events on the track of the runner. Arguments of every event
+        give the activation, so that the graph of a run can be rebuilt from
+        the trace.
+
+        Args:
+            name: (optional) the name of the run, shown as the process name.
+
+        Returns:
+            A dictionary that can be written as JSON.
+        """
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                   'tid': self.pid, 'args': {'name': name}},
+                  {'name': 'thread_name', 'ph': 'M', 'pid': self.pid,
+                   'tid': self.pid, 'args': {'name': 'runner'}}]
+        for activation in self._activations:
+            ts = activation.timestamps
+            args = activation.to_dict()
+            if activation.node_type != 'function':
+                events.append({
+                    'name': activation.label, 'cat': activation.node_type,
+                    'ph': 'i', 's': 't', 'pid': self.pid, 'tid': self.pid,
+                    'ts': _to_us(ts.get('dispatched', ts['ready'])),
+                    'args': args})
+                continue
+            tid = activation.pid if activation.pid is not None else \
+                -activation.aid - 1
+            events.append({'name': 'thread_name', 'ph': 'M',
+                           'pid': self.pid, 'tid': tid,
+                           'args': {'name': 'Node {} (pid {})'.format(
+                               activation.nid, activation.pid)}})
+            last_phase = max([p for p in PHASES if p in ts],
+                             key=PHASES.index)
+            events.append(_span(activation.label, 'function', self.pid, tid,
+                                ts['ready'], ts[last_phase], args))
+            for span_name, first, last in FUNCTION_SPANS:
+                if first in ts and last in ts:
+                    events.append(_span(span_name, 'phase', self.pid, tid,
+                                        ts[first], ts[last],
+                                        {'activation': activation.aid}))
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'name': name}}
+
+    def write_chrome_trace(self, path: str, name: str = 'yapyseq') -> None:
+        """Write the activations in a Chrome trace file.
+
+        Args:
+            path: the path of the JSON file to write.
+            name: (optional) the name of the run, shown as the process name.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_chrome_trace(name), f)
+
+# ------------------------------------------------------------------------------
+# Private functions
+# ------------------------------------------------------------------------------
+
+
+def _to_us(timestamp: float) -> float:
+    """Convert a timestamp in seconds to microseconds."""
+    return round(timestamp * 1000000, 3)
+
+
+def _span(name: str, category: str, pid: int, tid: int, start: float,
+          end: float, args: Dict) -> Dict:
+    """Create a complete event of a Chrome trace."""
+    return {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+            'ts': _to_us(start), 'dur': _to_us(max(end - start, 0)),
+            'args': args}